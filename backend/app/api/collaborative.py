@@ -14,7 +14,9 @@ from ..services.delivery import (
     get_collaborative_deliveries, get_delivery, get_collaborative_delivery,
     update_collaborative_delivery_status, calculate_collaborative_earnings
 )
+from ..schemas.collaborative import CollaborativeLegResponse
 from ..services.notification import send_delivery_notification
+from ..services.relay_planner import get_relay_legs, replan_relay, complete_relay_leg
 
 router = APIRouter()
 
@@ -197,6 +199,78 @@ async def update_participant_share(
     
     return collaborative
 
+@router.get("/{delivery_id}/relay", response_model=List[CollaborativeLegResponse])
+async def read_relay_legs(
+    delivery_id: int = Path(..., title="ID de la livraison collaborative"),
+    db: Session = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """
+    Récupérer les tronçons du relais d'une livraison collaborative.
+    Accessible aux gestionnaires et aux coursiers participants.
+    """
+    legs = get_relay_legs(db, delivery_id)
+    if current_user.role != UserRole.manager and current_user.id not in {leg.courier_id for leg in legs}:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Vous ne participez pas à ce relais"
+        )
+    
+    return legs
+
+@router.post("/{delivery_id}/relay/plan", response_model=List[CollaborativeLegResponse])
+async def plan_relay(
+    delivery_id: int = Path(..., title="ID de la livraison collaborative"),
+    background_tasks: BackgroundTasks = None,
+    db: Session = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """
+    Découper une livraison collaborative en tronçons de relais, à partir des
+    positions actuelles des participants. Les tronçons non commencés sont remplacés.
+    Seuls les gestionnaires peuvent accéder à cette route.
+    """
+    if current_user.role != UserRole.manager:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seuls les gestionnaires peuvent accéder à cette route"
+        )
+    
+    legs = replan_relay(db, delivery_id, force=True)
+    
+    # Prévenir chaque coursier de son tronçon
+    if background_tasks:
+        for leg in legs:
+            if leg.status == "planned":
+                background_tasks.add_task(
+                    send_delivery_notification,
+                    db=db,
+                    delivery_id=delivery_id,
+                    user_id=leg.courier_id,
+                    message=f"Relais #{delivery_id}: tronçon {leg.sequence} jusqu'à {leg.end_label or 'la destination'}"
+                )
+    
+    return legs
+
+@router.post("/{delivery_id}/relay/legs/{leg_id}/handoff", response_model=List[CollaborativeLegResponse])
+async def confirm_relay_handoff(
+    delivery_id: int = Path(..., title="ID de la livraison collaborative"),
+    leg_id: int = Path(..., title="ID du tronçon"),
+    db: Session = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """
+    Confirmer la fin d'un tronçon : passage du colis au coursier suivant, ou remise finale.
+    Seul le coursier du tronçon peut le confirmer.
+    """
+    if current_user.role != UserRole.courier:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seuls les coursiers peuvent confirmer un relais"
+        )
+    
+    return complete_relay_leg(db, delivery_id, leg_id, current_user.id)
+
 @router.get("/{delivery_id}/earnings", response_model=Dict[str, Any])
 async def get_collaborative_earnings(
     delivery_id: int = Path(..., title="ID de la livraison collaborative"),
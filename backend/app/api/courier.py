@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Path, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Path, BackgroundTasks, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 
 from ..db.session import get_db
+from ..core.config import settings
 from ..core.dependencies import get_current_user, get_current_active_user
 from ..models.user import User, UserRole
 from ..schemas.user import UserResponse
@@ -20,21 +21,24 @@ from ..services.collaborative_service import (
     calculate_collaborative_earnings, get_collaborative_stats
 )
 from ..services.notification import send_delivery_notification
+from ..services.pagination import next_cursor, NEXT_CURSOR_HEADER
 
 router = APIRouter()
 
 @router.get("/deliveries", response_model=List[DeliveryResponse])
 async def read_courier_deliveries(
+    response: Response,
     status: Optional[str] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    skip: int = 0,
-    limit: int = 100,
+    active: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=settings.PAGINATION_MAX_LIMIT),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
-    Récupérer les livraisons d'un coursier.
+    Récupérer les livraisons d'un coursier (`active` : seulement celles acceptées ou en cours).
     """
     if current_user.role != UserRole.courier:
         raise HTTPException(
@@ -42,7 +46,11 @@ async def read_courier_deliveries(
             detail="Seuls les coursiers peuvent accéder à cette route"
         )
     
-    return get_courier_deliveries(db, current_user.id, status, start_date, end_date, skip, limit)
+    deliveries = get_courier_deliveries(db, current_user.id, status, start_date, end_date, cursor, limit, active)
+    cursor = next_cursor(deliveries, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return deliveries
 
 @router.get("/collaborative-deliveries", response_model=List[Dict[str, Any]])
 async def read_collaborative_deliveries(
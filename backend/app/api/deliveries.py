@@ -1,33 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks, Response, File, UploadFile
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Dict, Any
 from datetime import datetime
 
-from ..db.session import get_db
+from ..db.session import SessionLocal, get_db, get_async_db, get_async_read_db
+from ..core.config import settings
 from ..core.dependencies import get_current_user, get_current_active_user
 from ..schemas.delivery import (
     DeliveryCreate, DeliveryUpdate, DeliveryResponse, StatusUpdate,
     BidCreate, BidResponse, TrackingPointCreate, TrackingPointResponse,
     CollaborativeDeliveryCreate, CollaborativeDeliveryResponse,
-    ExpressDeliveryCreate
+    ExpressDeliveryCreate, TourResponse, DeliveryImportReport
 )
 from ..schemas.user import UserResponse
 from ..services.delivery import (
-    create_delivery, get_delivery, get_deliveries, update_delivery,
-    update_delivery_status, delete_delivery, get_user_deliveries,
-    create_bid, get_bids, accept_bid, get_bid,
-    add_tracking_point, get_tracking_points,
+    create_delivery, get_delivery, update_delivery, delete_delivery,
     create_collaborative_delivery, get_collaborative_deliveries, join_collaborative_delivery,
-    create_express_delivery
+    create_express_delivery,
+    get_delivery_async, get_deliveries_async, get_user_deliveries_async,
+    update_delivery_status_async, create_bid_async, get_bids_for_delivery_async,
+    accept_bid_async, add_tracking_point_async, get_tracking_points_async
 )
 from ..services.notification import send_delivery_notification
 from ..services.gamification import add_points_for_delivery
 from ..services.payment import process_payment
 from ..services.geolocation import calculate_distance_and_duration
+from ..services.assignment import get_courier_offer, accept_offer, decline_offer
+from ..services.tour_planner import plan_courier_tour
+from ..services.pagination import next_cursor, NEXT_CURSOR_HEADER
+from ..services.delivery_import import import_deliveries, detect_format
 from ..models.user import UserRole
 
 router = APIRouter()
 
+# Tâches de fond : la session de la requête est fermée quand elles s'exécutent,
+# elles ouvrent donc la leur
+def _add_points_task(courier_id: int, delivery_id: int) -> None:
+    with SessionLocal() as db:
+        add_points_for_delivery(db, courier_id=courier_id, delivery_id=delivery_id)
+
+async def _process_payment_task(delivery_id: int) -> None:
+    with SessionLocal() as db:
+        await process_payment(db, delivery_id=delivery_id)
+
 # Routes pour les livraisons
 @router.post("/", response_model=DeliveryResponse, status_code=status.HTTP_201_CREATED)
 async def create_new_delivery(
@@ -71,21 +87,38 @@ async def create_new_delivery(
     
     return db_delivery
 
+@router.post("/import", response_model=DeliveryImportReport)
+async def import_delivery_file(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="csv ou ndjson, déduit du fichier par défaut"),
+    db: Session = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """
+    Importer des livraisons en masse depuis un fichier CSV ou NDJSON.
+    Les colonnes reprennent les champs de création d'une livraison.
+    Le rapport indique, ligne par ligne, la livraison créée ou les erreurs.
+    Réservé aux entreprises.
+    """
+    if current_user.role != UserRole.business:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seules les entreprises peuvent importer des livraisons"
+        )
+    
+    fmt = detect_format(file.filename, file.content_type, format)
+    return await import_deliveries(db, file.file, fmt, current_user.id)
+
 @router.get("/{delivery_id}", response_model=DeliveryResponse)
 async def read_delivery(
     delivery_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
     Récupérer les détails d'une livraison.
     """
-    delivery = get_delivery(db, delivery_id)
-    if not delivery:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Livraison non trouvée"
-        )
+    delivery = await get_delivery_async(db, delivery_id)
     
     # Vérifier les permissions
     if current_user.role == UserRole.manager:
@@ -100,26 +133,33 @@ async def read_delivery(
 
 @router.get("/", response_model=List[DeliveryResponse])
 async def read_deliveries(
+    response: Response,
     status: Optional[str] = None,
     commune: Optional[str] = None,
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=settings.PAGINATION_MAX_LIMIT),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
-    Récupérer la liste des livraisons.
-    Filtrage par statut et commune possible.
+    Récupérer la liste des livraisons, des plus récentes aux plus anciennes.
+    Filtrage par statut et commune possible. La page suivante s'obtient en
+    renvoyant le curseur de l'en-tête X-Next-Cursor.
     """
     if current_user.role == UserRole.manager:
         # Les gestionnaires peuvent voir toutes les livraisons
-        return get_deliveries(db, status=status, commune=commune, skip=skip, limit=limit)
+        deliveries = await get_deliveries_async(db, status=status, commune=commune, cursor=cursor, limit=limit)
     elif current_user.role == UserRole.courier:
         # Les coursiers voient les livraisons disponibles et les leurs
-        return get_user_deliveries(db, user_id=current_user.id, role=UserRole.courier, status=status, commune=commune, skip=skip, limit=limit)
+        deliveries = await get_user_deliveries_async(db, user_id=current_user.id, role=UserRole.courier, status=status, commune=commune, cursor=cursor, limit=limit)
     else:
         # Les clients et entreprises ne voient que leurs livraisons
-        return get_user_deliveries(db, user_id=current_user.id, role=UserRole.client, status=status, commune=commune, skip=skip, limit=limit)
+        deliveries = await get_user_deliveries_async(db, user_id=current_user.id, role=UserRole.client, status=status, commune=commune, cursor=cursor, limit=limit)
+    
+    cursor = next_cursor(deliveries, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return deliveries
 
 @router.put("/{delivery_id}", response_model=DeliveryResponse)
 async def update_existing_delivery(
@@ -160,59 +200,31 @@ async def update_delivery_status_endpoint(
     delivery_id: int,
     status_update: StatusUpdate,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    async_db: AsyncSession = Depends(get_async_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
     Mettre à jour le statut d'une livraison.
+    Les transitions autorisées dépendent du rôle : le coursier assigné fait
+    avancer la livraison, le client la confirme ou l'annule, un gestionnaire
+    peut tout faire. Avec `expected_version`, la mise à jour échoue (409) si
+    la livraison a changé depuis sa lecture.
     """
-    db_delivery = get_delivery(db, delivery_id)
-    if not db_delivery:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Livraison non trouvée"
-        )
-    
-    # Vérifier les permissions selon le statut demandé
-    if status_update.status == "cancelled":
-        # Seul le client ou un gestionnaire peut annuler
-        if current_user.role != UserRole.manager and current_user.id != db_delivery.client_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Vous n'avez pas la permission d'annuler cette livraison"
-            )
-    elif status_update.status in ["in_progress", "delivered"]:
-        # Seul le coursier assigné peut mettre à jour ces statuts
-        if current_user.role != UserRole.manager and current_user.id != db_delivery.courier_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Vous n'avez pas la permission de mettre à jour cette livraison"
-            )
-    elif status_update.status == "completed":
-        # Seul le client peut confirmer la livraison
-        if current_user.role != UserRole.manager and current_user.id != db_delivery.client_id:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Vous n'avez pas la permission de confirmer cette livraison"
-            )
-    
-    # Mettre à jour le statut
-    updated_delivery = update_delivery_status(db, delivery_id, status_update.status)
+    # Transition vérifiée et appliquée par la base (statut, appartenance, version)
+    updated_delivery = await update_delivery_status_async(async_db, delivery_id, status_update, current_user.id, current_user.role)
     
     # Actions supplémentaires selon le statut
     if status_update.status == "completed":
         # Ajouter des points au coursier
         background_tasks.add_task(
-            add_points_for_delivery,
-            db=db,
-            courier_id=db_delivery.courier_id,
+            _add_points_task,
+            courier_id=updated_delivery.courier_id,
             delivery_id=delivery_id
         )
         
         # Traiter le paiement final
         background_tasks.add_task(
-            process_payment,
-            db=db,
+            _process_payment_task,
             delivery_id=delivery_id
         )
     
@@ -230,20 +242,18 @@ async def update_delivery_status_endpoint(
             # Notifier le client
             background_tasks.add_task(
                 send_delivery_notification,
-                db=db,
                 delivery_id=delivery_id,
-                user_id=db_delivery.client_id,
+                user_id=updated_delivery.client_id,
                 message=status_messages[status_update.status]
             )
         
-        if status_update.status in ["completed", "cancelled"] and db_delivery.courier_id:
+        if status_update.status in ["completed", "cancelled"] and updated_delivery.courier_id:
             # Notifier le coursier
             background_tasks.add_task(
                 send_delivery_notification,
-                db=db,
                 delivery_id=delivery_id,
-                user_id=db_delivery.courier_id,
-                message=f"La livraison #{delivery_id} a été {status_update.status}"
+                user_id=updated_delivery.courier_id,
+                message=f"La livraison #{delivery_id} a été {status_update.status.value}"
             )
     
     return updated_delivery
@@ -288,7 +298,7 @@ async def create_new_bid(
     delivery_id: int,
     bid: BidCreate,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
@@ -301,27 +311,13 @@ async def create_new_bid(
             detail="Seuls les coursiers peuvent créer des enchères"
         )
     
-    # Vérifier si la livraison existe et est en attente d'enchères
-    delivery = get_delivery(db, delivery_id)
-    if not delivery:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Livraison non trouvée"
-        )
-    
-    if delivery.status != "bidding":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Cette livraison n'est pas ouverte aux enchères"
-        )
-    
-    # Créer l'enchère
-    db_bid = create_bid(db, delivery_id, current_user.id, bid)
+    # Créer l'enchère (la livraison doit être en attente ou en enchères)
+    db_bid = await create_bid_async(db, delivery_id, current_user.id, bid)
+    delivery = await get_delivery_async(db, delivery_id)
     
     # Notifier le client
     background_tasks.add_task(
         send_delivery_notification,
-        db=db,
         delivery_id=delivery_id,
         user_id=delivery.client_id,
         message=f"Nouvelle enchère de {db_bid.amount} FCFA pour votre livraison"
@@ -332,26 +328,21 @@ async def create_new_bid(
 @router.get("/{delivery_id}/bids", response_model=List[BidResponse])
 async def read_bids(
     delivery_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
     Récupérer la liste des enchères pour une livraison.
     """
     # Vérifier si la livraison existe
-    delivery = get_delivery(db, delivery_id)
-    if not delivery:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Livraison non trouvée"
-        )
+    delivery = await get_delivery_async(db, delivery_id)
     
     # Vérifier les permissions
     if current_user.role == UserRole.manager or current_user.id == delivery.client_id:
-        return get_bids(db, delivery_id)
+        return await get_bids_for_delivery_async(db, delivery_id)
     elif current_user.role == UserRole.courier:
         # Les coursiers ne peuvent voir que leurs propres enchères
-        bids = get_bids(db, delivery_id)
+        bids = await get_bids_for_delivery_async(db, delivery_id)
         return [bid for bid in bids if bid.courier_id == current_user.id]
     else:
         raise HTTPException(
@@ -364,114 +355,151 @@ async def accept_bid_endpoint(
     delivery_id: int,
     bid_id: int,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
     Accepter une enchère pour une livraison.
-    Seul le client qui a créé la livraison ou un gestionnaire peut accepter une enchère.
+    Seul le client qui a créé la livraison peut accepter une enchère.
     """
-    # Vérifier si la livraison existe
-    delivery = get_delivery(db, delivery_id)
-    if not delivery:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Livraison non trouvée"
-        )
+    # Vérifie l'appartenance, l'enchère, la capacité du véhicule et le statut
+    updated_delivery = await accept_bid_async(db, delivery_id, bid_id, current_user.id)
     
-    # Vérifier les permissions
-    if current_user.role != UserRole.manager and current_user.id != delivery.client_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Vous n'avez pas la permission d'accepter une enchère pour cette livraison"
-        )
+    # Notifier le coursier
+    background_tasks.add_task(
+        send_delivery_notification,
+        delivery_id=delivery_id,
+        user_id=updated_delivery.courier_id,
+        message=f"Votre enchère de {updated_delivery.final_price} FCFA a été acceptée pour la livraison #{delivery_id}"
+    )
     
-    # Vérifier si la livraison est en attente d'enchères
-    if delivery.status != "bidding":
+    return updated_delivery
+
+# Routes pour les offres d'affectation automatique
+@router.get("/offers/current", response_model=Optional[Dict[str, Any]])
+async def read_current_offer(
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """
+    Récupérer l'offre de livraison en cours proposée au coursier connecté.
+    """
+    if current_user.role != UserRole.courier:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Cette livraison n'est pas ouverte aux enchères"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seuls les coursiers reçoivent des offres"
         )
     
-    # Vérifier si l'enchère existe
-    bid = get_bid(db, bid_id)
-    if not bid or bid.delivery_id != delivery_id:
+    return await get_courier_offer(current_user.id)
+
+@router.post("/{delivery_id}/offer/accept", response_model=DeliveryResponse)
+async def accept_offer_endpoint(
+    delivery_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """
+    Accepter l'offre d'affectation d'une livraison, au prix proposé par le client.
+    """
+    if current_user.role != UserRole.courier:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Enchère non trouvée"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seuls les coursiers peuvent accepter une offre"
         )
     
-    # Accepter l'enchère
-    updated_delivery = accept_bid(db, delivery_id, bid_id)
+    delivery = await accept_offer(db, delivery_id, current_user.id)
     
-    # Notifier le coursier
+    # Notifier le client
     background_tasks.add_task(
         send_delivery_notification,
         db=db,
         delivery_id=delivery_id,
-        user_id=bid.courier_id,
-        message=f"Votre enchère de {bid.amount} FCFA a été acceptée pour la livraison #{delivery_id}"
+        user_id=delivery.client_id,
+        message=f"Un coursier a accepté votre livraison #{delivery_id}"
     )
     
-    return updated_delivery
+    return delivery
 
-# Routes pour le tracking
-@router.post("/{delivery_id}/tracking", response_model=TrackingPointResponse, status_code=status.HTTP_201_CREATED)
-async def add_tracking_point_endpoint(
+@router.post("/{delivery_id}/offer/decline", status_code=status.HTTP_204_NO_CONTENT)
+async def decline_offer_endpoint(
     delivery_id: int,
-    tracking_point: TrackingPointCreate,
-    db: Session = Depends(get_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
-    Ajouter un point de tracking pour une livraison.
-    Seul le coursier assigné à la livraison peut ajouter des points de tracking.
+    Refuser l'offre d'affectation d'une livraison.
     """
-    # Vérifier si la livraison existe
-    delivery = get_delivery(db, delivery_id)
-    if not delivery:
+    if current_user.role != UserRole.courier:
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Livraison non trouvée"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seuls les coursiers peuvent refuser une offre"
         )
     
-    # Vérifier les permissions
-    if current_user.role != UserRole.manager and current_user.id != delivery.courier_id:
+    await decline_offer(delivery_id, current_user.id)
+
+# Routes pour les tournées multi-arrêts
+@router.get("/tour/current", response_model=TourResponse)
+async def read_current_tour(
+    db: Session = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """
+    Récupérer l'ordre de passage des livraisons acceptées ou en cours du coursier connecté.
+    Les livraisons acceptées depuis le dernier calcul sont insérées dans la tournée existante.
+    """
+    if current_user.role != UserRole.courier:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Vous n'avez pas la permission d'ajouter des points de tracking pour cette livraison"
+            detail="Seuls les coursiers ont une tournée"
         )
     
-    # Vérifier si la livraison est en cours
-    if delivery.status != "in_progress":
+    return await plan_courier_tour(db, current_user.id)
+
+@router.post("/tour/optimize", response_model=TourResponse)
+async def optimize_current_tour(
+    db: Session = Depends(get_db),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """
+    Recalculer entièrement la tournée du coursier connecté.
+    """
+    if current_user.role != UserRole.courier:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Cette livraison n'est pas en cours"
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seuls les coursiers ont une tournée"
         )
     
-    # Ajouter le point de tracking
-    return add_tracking_point(db, delivery_id, tracking_point)
+    return await plan_courier_tour(db, current_user.id, reoptimize=True)
+
+# Routes pour le tracking
+@router.post("/{delivery_id}/tracking", response_model=TrackingPointResponse, status_code=status.HTTP_201_CREATED)
+async def add_tracking_point_endpoint(
+    delivery_id: int,
+    tracking_point: TrackingPointCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """
+    Ajouter un point de tracking pour une livraison.
+    Seul le coursier qui porte le colis peut ajouter des points de tracking.
+    """
+    # Vérifie le coursier (ou le relais en cours) et le statut de la livraison
+    return await add_tracking_point_async(db, delivery_id, current_user.id, tracking_point)
 
 @router.get("/{delivery_id}/tracking", response_model=List[TrackingPointResponse])
 async def get_tracking_points_endpoint(
     delivery_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
     Récupérer les points de tracking pour une livraison.
     """
     # Vérifier si la livraison existe
-    delivery = get_delivery(db, delivery_id)
-    if not delivery:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Livraison non trouvée"
-        )
+    delivery = await get_delivery_async(db, delivery_id)
     
     # Vérifier les permissions
     if current_user.role == UserRole.manager or current_user.id == delivery.client_id or current_user.id == delivery.courier_id:
-        return get_tracking_points(db, delivery_id)
+        return await get_tracking_points_async(db, delivery_id)
     else:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
 
-from ..db.session import get_db
+from ..db.session import get_db, get_read_db
 from ..core.dependencies import get_current_user, get_current_active_user
 from ..schemas.gamification import (
     CourierPointsResponse, PointTransactionResponse, RewardCreate, RewardResponse,
@@ -49,7 +49,7 @@ async def read_point_transactions(
     courier_id: int,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
@@ -100,7 +100,7 @@ async def read_rewards(
     status: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
@@ -122,7 +122,7 @@ async def read_rewards(
 async def read_leaderboard(
     commune: Optional[str] = None,
     limit: int = 10,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
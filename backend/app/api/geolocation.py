@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+
+from ..core.config import settings
+from ..core.dependencies import get_current_active_user
+from ..schemas.geolocation import DistanceMatrixRequest, DistanceMatrixResponse, CommuneResponse
+from ..schemas.user import UserResponse
+from ..services.geolocation import calculate_distance_and_duration_matrix, get_commune
+
+router = APIRouter()
+
+@router.post("/distance-matrix", response_model=DistanceMatrixResponse)
+def compute_distance_matrix(
+    request: DistanceMatrixRequest,
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """
+    Calculer les distances et durées entre plusieurs origines et destinations.
+    Route synchrone : le calcul des matrices et leur conversion tournent dans
+    le pool de threads, pas sur la boucle d'événements.
+    """
+    pairs = len(request.origins) * len(request.destinations)
+    if pairs > settings.DISTANCE_MATRIX_MAX_PAIRS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"La matrice demandée est trop grande ({pairs} paires, maximum {settings.DISTANCE_MATRIX_MAX_PAIRS})"
+        )
+    
+    distances, durations = calculate_distance_and_duration_matrix(
+        [(point.lat, point.lng) for point in request.origins],
+        [(point.lat, point.lng) for point in request.destinations],
+        request.traffic_factor
+    )
+    
+    return {
+        "distances": distances.round(3).tolist(),
+        "durations": durations.tolist()
+    }
+
+@router.get("/commune", response_model=CommuneResponse)
+async def read_commune(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """
+    Déterminer la commune d'un point GPS, sans géocodage réseau.
+    """
+    return {"lat": lat, "lng": lng, "commune": get_commune(lat, lng)}
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks, File, UploadFile, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 
-from ..db.session import get_db
+from ..db.session import get_db, get_read_db
+from ..core.config import settings
 from ..core.dependencies import get_current_user, get_current_active_user
 from ..schemas.user import UserResponse, UserStatusUpdate, KYCUpdate
 from ..services.manager import (
@@ -15,6 +16,11 @@ from ..services.manager import (
     generate_financial_report,
     update_app_config, get_app_config
 )
+from ..services.delivery import get_deliveries, get_deliveries_by_client, get_deliveries_by_courier
+from ..services.pagination import next_cursor, next_rank_cursor, NEXT_CURSOR_HEADER
+from ..services.delivery_search import search_deliveries
+from ..services.tracking_ingest import tracking_ingestor
+from ..schemas.delivery import DeliveryResponse
 from ..models.user import UserRole
 
 router = APIRouter()
@@ -27,7 +33,7 @@ async def read_clients(
     search: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
@@ -57,7 +63,7 @@ async def read_couriers(
     search: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
@@ -82,7 +88,7 @@ async def read_couriers(
 @router.get("/couriers/{courier_id}/performance")
 async def read_courier_performance(
     courier_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
@@ -105,7 +111,7 @@ async def read_businesses(
     search: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
@@ -132,7 +138,7 @@ async def read_business_finances(
     company_id: int,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
@@ -147,6 +153,77 @@ async def read_business_finances(
     
     return get_business_finances(db, company_id, start_date, end_date)
 
+# Routes pour le suivi des livraisons
+@router.get("/deliveries", response_model=List[DeliveryResponse])
+async def read_all_deliveries(
+    response: Response,
+    status: Optional[str] = None,
+    commune: Optional[str] = None,
+    client_id: Optional[int] = None,
+    courier_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=settings.PAGINATION_MAX_LIMIT),
+    db: Session = Depends(get_read_db),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """
+    Parcourir toutes les livraisons, par exemple pour un export : la page
+    suivante s'obtient avec le curseur de l'en-tête X-Next-Cursor.
+    Seuls les gestionnaires peuvent accéder à cette route.
+    """
+    if current_user.role != UserRole.manager:
+        raise HTTPException(
+            status_code=403,
+            detail="Seuls les gestionnaires peuvent accéder à cette route"
+        )
+    
+    if client_id is not None:
+        deliveries = get_deliveries_by_client(db, client_id, cursor=cursor, limit=limit, status=status)
+    elif courier_id is not None:
+        deliveries = get_deliveries_by_courier(db, courier_id, cursor=cursor, limit=limit, status=status)
+    else:
+        deliveries = get_deliveries(db, cursor=cursor, limit=limit, status=status, commune=commune)
+    
+    cursor = next_cursor(deliveries, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return deliveries
+
+@router.get("/deliveries/search", response_model=List[DeliveryResponse])
+async def search_all_deliveries(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    status: Optional[str] = None,
+    commune: Optional[str] = None,
+    delivery_type: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=settings.PAGINATION_MAX_LIMIT),
+    db: Session = Depends(get_read_db),
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """
+    Rechercher des livraisons par adresse, description ou nom de contact,
+    sans tenir compte des accents ni des fautes légères. Les résultats sont
+    classés par pertinence ; la page suivante s'obtient avec le curseur de
+    l'en-tête X-Next-Cursor.
+    Seuls les gestionnaires peuvent accéder à cette route.
+    """
+    if current_user.role != UserRole.manager:
+        raise HTTPException(
+            status_code=403,
+            detail="Seuls les gestionnaires peuvent accéder à cette route"
+        )
+    
+    results = search_deliveries(
+        db, q, cursor=cursor, limit=limit,
+        status=status, commune=commune, delivery_type=delivery_type
+    )
+    
+    cursor = next_rank_cursor(results, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return [delivery for delivery, _ in results]
+
 # Routes pour la mise à jour des utilisateurs
 @router.put("/users/{user_id}/status", response_model=UserResponse)
 async def update_user_status_endpoint(
@@ -192,7 +269,7 @@ async def read_global_stats(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     commune: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
@@ -213,7 +290,7 @@ async def read_chart_data(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     commune: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
@@ -233,7 +310,7 @@ async def read_chart_data(
 async def read_revenue_stats(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
@@ -252,7 +329,7 @@ async def read_revenue_stats(
 async def read_expense_stats(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
@@ -309,7 +386,7 @@ async def update_config(
 
 @router.get("/config")
 async def read_config(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: UserResponse = Depends(get_current_active_user)
 ):
     """
@@ -323,3 +400,19 @@ async def read_config(
         )
     
     return get_app_config(db)
+
+@router.get("/tracking/ingestion", response_model=Dict[str, Any])
+async def read_tracking_ingestion(
+    current_user: UserResponse = Depends(get_current_active_user)
+):
+    """
+    Indicateurs de l'écriture par lots des positions : tampon, lots écrits et contre-pression.
+    Seuls les gestionnaires peuvent accéder à cette route.
+    """
+    if current_user.role != UserRole.manager:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seuls les gestionnaires peuvent accéder à cette route"
+        )
+    
+    return tracking_ingestor.metrics()
@@ -1,16 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadForm, Query
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
 
 from app.db.session import get_db
-from app.core.dependencies import get_current_user, get_current_active_user, get_current_manager
-from app.models.user import User
+from app.core.config import settings
+from app.core.dependencies import get_current_user, get_current_active_user, get_current_manager, get_current_business_or_manager
+from app.models.user import User, UserRole
 from app.schemas.transport import (
     Vehicle, VehicleCreate, VehicleUpdate,
     CourierVehicle, CourierVehicleCreate, CourierVehicleUpdate,
     TransportRule, TransportRuleCreate, TransportRuleUpdate,
     VehicleRecommendationRequest, VehicleRecommendation,
+    VehicleRecommendationBatchRequest, VehicleRecommendationBatch,
+    LoadPlanRequest, LoadPlan, LoadCheckRequest, LoadCheck,
     VehicleUsage, VehicleUsageCreate, VehicleUsageUpdate,
     DocumentUpload, VehicleType, CargoCategory, VehicleStatus, DocumentType
 )
@@ -18,11 +21,12 @@ from app.services.transport_service import (
     create_vehicle, get_vehicle, get_vehicles, update_vehicle, delete_vehicle,
     get_courier_vehicles, assign_vehicle_to_courier, update_courier_vehicle, remove_courier_vehicle, set_primary_vehicle,
     create_transport_rule, get_transport_rule, get_transport_rules, update_transport_rule, delete_transport_rule,
-    get_vehicle_recommendation,
+    get_vehicle_recommendation, get_vehicle_recommendations,
     create_vehicle_usage, get_vehicle_usage, update_vehicle_usage,
     upload_vehicle_document,
     get_vehicle_usage_stats, get_vehicle_performance_stats, get_vehicle_environmental_stats
 )
+from app.services.load_planner import plan_pending_loads, check_delivery_load
 from app.services.storage import upload_file_to_storage
 
 router = APIRouter(prefix="/transport", tags=["transport"])
@@ -49,10 +53,6 @@ def get_vehicle_endpoint(
     return vehicle
 
 
-@router.get("/vehicles", response_model=  detail="Vehicle not found")
-    return vehicle
-
-
 @router.get("/vehicles", response_model=List[Vehicle])
 def get_vehicles_endpoint(
     skip: int = 0,
@@ -306,6 +306,50 @@ def get_vehicle_recommendation_endpoint(
     return get_vehicle_recommendation(db=db, request=request)
 
 
+@router.post("/recommend/batch", response_model=VehicleRecommendationBatch)
+def get_vehicle_recommendations_endpoint(
+    batch: VehicleRecommendationBatchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    if len(batch.requests) > settings.TRANSPORT_RECOMMEND_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many requests in batch (max {settings.TRANSPORT_RECOMMEND_BATCH_MAX_ITEMS})"
+        )
+    return {"results": get_vehicle_recommendations(db=db, requests=batch.requests)}
+
+
+# Load planning endpoints
+@router.post("/load-plan", response_model=LoadPlan)
+def plan_loads_endpoint(
+    request: LoadPlanRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_business_or_manager)
+):
+    # A business only plans its own pending deliveries
+    client_id = current_user.id if current_user.role == UserRole.business else request.client_id
+    if client_id is None and not request.delivery_ids:
+        raise HTTPException(status_code=400, detail="client_id or delivery_ids is required")
+    return plan_pending_loads(
+        db=db,
+        client_id=client_id,
+        delivery_ids=request.delivery_ids,
+        vehicle_ids=request.vehicle_ids
+    )
+
+
+@router.post("/vehicles/{vehicle_id}/load-check", response_model=LoadCheck)
+def check_vehicle_load_endpoint(
+    vehicle_id: int,
+    request: LoadCheckRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_business_or_manager)
+):
+    client_id = current_user.id if current_user.role == UserRole.business else None
+    return check_delivery_load(db=db, vehicle_id=vehicle_id, delivery_ids=request.delivery_ids, client_id=client_id)
+
+
 # Vehicle Usage endpoints
 @router.post("/usage", response_model=VehicleUsage)
 def create_vehicle_usage_endpoint(
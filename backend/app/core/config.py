@@ -21,6 +21,8 @@ class Settings(BaseSettings):
     
     # Base de données
     DATABASE_URL: str = os.getenv("DATABASE_URL", "")
+    # Réplicas de lecture, URLs séparées par des virgules (vide : tout sur le primaire)
+    DATABASE_REPLICA_URLS: str = os.getenv("DATABASE_REPLICA_URLS", "")
     
     # Redis
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
@@ -89,6 +91,131 @@ class Settings(BaseSettings):
         "Marcory", "Plateau", "Port-Bouët", "Treichville", "Yopougon"
     ]
     
+    # Index spatial des coursiers
+    COURIER_INDEX_CELL_SIZE: float = float(os.getenv("COURIER_INDEX_CELL_SIZE", "0.01"))  # en degrés (~1,1 km)
+    COURIER_LOCATION_MAX_AGE_MINUTES: int = int(os.getenv("COURIER_LOCATION_MAX_AGE_MINUTES", "15"))
+    COURIER_INDEX_SYNC_SECONDS: int = int(os.getenv("COURIER_INDEX_SYNC_SECONDS", "5"))
+    
+    # Matrices de distances : paires origine × destination par requête (100 × 100
+    # par défaut), pour une réponse calculée et sérialisée rapidement
+    DISTANCE_MATRIX_MAX_PAIRS: int = int(os.getenv("DISTANCE_MATRIX_MAX_PAIRS", "10000"))
+    
+    # Géocodage
+    GEOCODE_LRU_SIZE: int = int(os.getenv("GEOCODE_LRU_SIZE", "20000"))
+    GEOCODE_CACHE_TTL: int = int(os.getenv("GEOCODE_CACHE_TTL", str(30 * 24 * 3600)))  # 30 jours
+    GEOCODE_NEGATIVE_CACHE_TTL: int = int(os.getenv("GEOCODE_NEGATIVE_CACHE_TTL", "3600"))
+    GEOCODE_REVERSE_PRECISION: int = int(os.getenv("GEOCODE_REVERSE_PRECISION", "3"))  # décimales (~110 m)
+    GEOCODE_GAZETTEER_RADIUS_KM: float = float(os.getenv("GEOCODE_GAZETTEER_RADIUS_KM", "0.3"))
+    GEOCODER_MIN_INTERVAL_SECONDS: float = float(os.getenv("GEOCODER_MIN_INTERVAL_SECONDS", "1.0"))
+    GEOCODER_TIMEOUT_SECONDS: float = float(os.getenv("GEOCODER_TIMEOUT_SECONDS", "5.0"))
+    
+    # Estimation des temps de trajet (grille de vitesses)
+    ETA_GRID_CELL_SIZE: float = float(os.getenv("ETA_GRID_CELL_SIZE", "0.01"))  # en degrés (~1,1 km)
+    ETA_DEFAULT_SPEED_KMH: float = float(os.getenv("ETA_DEFAULT_SPEED_KMH", "30.0"))
+    ETA_PRIOR_WEIGHT: float = float(os.getenv("ETA_PRIOR_WEIGHT", "5"))  # poids de l'a priori, en nombre d'observations
+    ETA_MAX_SAMPLES_PER_CELL: int = int(os.getenv("ETA_MAX_SAMPLES_PER_CELL", "500"))
+    ETA_HISTORY_DAYS: int = int(os.getenv("ETA_HISTORY_DAYS", "28"))
+    ETA_LIVE_MAX_AGE_MINUTES: int = int(os.getenv("ETA_LIVE_MAX_AGE_MINUTES", "30"))
+    ETA_INCIDENT_RADIUS_KM: float = float(os.getenv("ETA_INCIDENT_RADIUS_KM", "0.5"))
+    ETA_REFRESH_SECONDS: int = int(os.getenv("ETA_REFRESH_SECONDS", "60"))
+    ETA_REFRESH_BATCH_SIZE: int = int(os.getenv("ETA_REFRESH_BATCH_SIZE", "20000"))
+    ETA_REFRESH_OVERLAP_SECONDS: int = int(os.getenv("ETA_REFRESH_OVERLAP_SECONDS", "300"))  # marge relue à chaque rafraîchissement
+    
+    # Calcul d'itinéraires hors ligne (extrait OSM local, vide = vol d'oiseau)
+    ROUTING_OSM_PATH: str = os.getenv("ROUTING_OSM_PATH", "")
+    ROUTING_CACHE_PATH: str = os.getenv("ROUTING_CACHE_PATH", "")  # par défaut à côté de l'extrait
+    ROUTING_SNAP_MAX_KM: float = float(os.getenv("ROUTING_SNAP_MAX_KM", "0.5"))
+    
+    # Affectation automatique des livraisons aux coursiers
+    ASSIGNMENT_ENABLED: bool = os.getenv("ASSIGNMENT_ENABLED", "True").lower() == "true"
+    ASSIGNMENT_INTERVAL_SECONDS: int = int(os.getenv("ASSIGNMENT_INTERVAL_SECONDS", "5"))
+    ASSIGNMENT_TIME_BUDGET_MS: int = int(os.getenv("ASSIGNMENT_TIME_BUDGET_MS", "1500"))
+    ASSIGNMENT_MAX_DELIVERIES: int = int(os.getenv("ASSIGNMENT_MAX_DELIVERIES", "5000"))
+    ASSIGNMENT_MAX_AGE_HOURS: int = int(os.getenv("ASSIGNMENT_MAX_AGE_HOURS", "24"))
+    ASSIGNMENT_MAX_PICKUP_KM: float = float(os.getenv("ASSIGNMENT_MAX_PICKUP_KM", "5.0"))
+    ASSIGNMENT_MAX_CANDIDATES: int = int(os.getenv("ASSIGNMENT_MAX_CANDIDATES", "15"))
+    ASSIGNMENT_OFFER_TTL_SECONDS: int = int(os.getenv("ASSIGNMENT_OFFER_TTL_SECONDS", "45"))
+    ASSIGNMENT_UNASSIGNED_COST: float = float(os.getenv("ASSIGNMENT_UNASSIGNED_COST", "60"))  # en minutes équivalentes
+    ASSIGNMENT_RATING_WEIGHT: float = float(os.getenv("ASSIGNMENT_RATING_WEIGHT", "3.0"))  # minutes par étoile manquante
+    ASSIGNMENT_OVERSIZE_WEIGHT: float = float(os.getenv("ASSIGNMENT_OVERSIZE_WEIGHT", "1.0"))
+    ASSIGNMENT_WAITING_WEIGHT: float = float(os.getenv("ASSIGNMENT_WAITING_WEIGHT", "0.2"))
+    
+    # Tournées multi-arrêts des coursiers
+    TOUR_MAX_DELIVERIES: int = int(os.getenv("TOUR_MAX_DELIVERIES", "30"))
+    TOUR_SERVICE_MINUTES: float = float(os.getenv("TOUR_SERVICE_MINUTES", "5"))  # temps passé à chaque arrêt
+    TOUR_LATENESS_WEIGHT: float = float(os.getenv("TOUR_LATENESS_WEIGHT", "10"))  # coût d'une minute de retard
+    TOUR_TIME_BUDGET_MS: int = int(os.getenv("TOUR_TIME_BUDGET_MS", "500"))
+    TOUR_CACHE_TTL_SECONDS: int = int(os.getenv("TOUR_CACHE_TTL_SECONDS", str(24 * 3600)))
+    
+    # Livraisons collaboratives en relais
+    RELAY_ENABLED: bool = os.getenv("RELAY_ENABLED", "True").lower() == "true"
+    RELAY_MAX_LEGS: int = int(os.getenv("RELAY_MAX_LEGS", "3"))
+    RELAY_MIN_LEG_KM: float = float(os.getenv("RELAY_MIN_LEG_KM", "2.0"))
+    RELAY_CORRIDOR_DETOUR: float = float(os.getenv("RELAY_CORRIDOR_DETOUR", "1.3"))  # détour maximal vers un point de relais
+    RELAY_MAX_HANDOFF_POINTS: int = int(os.getenv("RELAY_MAX_HANDOFF_POINTS", "25"))
+    RELAY_HANDOFF_MINUTES: float = float(os.getenv("RELAY_HANDOFF_MINUTES", "5"))
+    RELAY_BUSY_WEIGHT: float = float(os.getenv("RELAY_BUSY_WEIGHT", "1.0"))  # poids de la plus longue immobilisation d'un coursier
+    RELAY_REPLAN_INTERVAL_SECONDS: int = int(os.getenv("RELAY_REPLAN_INTERVAL_SECONDS", "60"))
+    RELAY_REPLAN_MIN_GAIN_MINUTES: float = float(os.getenv("RELAY_REPLAN_MIN_GAIN_MINUTES", "5"))
+    
+    # Index des règles de transport (recommandation de véhicule)
+    TRANSPORT_RULE_INDEX_MAX_AGE_SECONDS: int = int(os.getenv("TRANSPORT_RULE_INDEX_MAX_AGE_SECONDS", "300"))
+    TRANSPORT_RECOMMEND_BATCH_MAX_ITEMS: int = int(os.getenv("TRANSPORT_RECOMMEND_BATCH_MAX_ITEMS", "1000"))
+    
+    # Plan de chargement des véhicules
+    LOAD_PLAN_MAX_PACKAGES: int = int(os.getenv("LOAD_PLAN_MAX_PACKAGES", "500"))
+    LOAD_PLAN_MAX_VEHICLES: int = int(os.getenv("LOAD_PLAN_MAX_VEHICLES", "200"))
+    
+    # Pagination par curseur des listes
+    PAGINATION_MAX_LIMIT: int = int(os.getenv("PAGINATION_MAX_LIMIT", "500"))
+    
+    # Pool du moteur de base de données asynchrone
+    ASYNC_DB_POOL_SIZE: int = int(os.getenv("ASYNC_DB_POOL_SIZE", "20"))
+    ASYNC_DB_MAX_OVERFLOW: int = int(os.getenv("ASYNC_DB_MAX_OVERFLOW", "20"))
+    
+    # Routage des lectures vers les réplicas
+    REPLICA_POOL_SIZE: int = int(os.getenv("REPLICA_POOL_SIZE", "10"))
+    REPLICA_MAX_LAG_SECONDS: float = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+    REPLICA_LAG_CHECK_INTERVAL_SECONDS: float = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL_SECONDS", "2"))
+    # Durée pendant laquelle un client qui vient d'écrire est suivi pour relire ses écritures
+    REPLICA_READ_YOUR_WRITES_SECONDS: int = int(os.getenv("REPLICA_READ_YOUR_WRITES_SECONDS", "30"))
+    
+    # Écriture par lots des positions reçues en temps réel (write-behind)
+    TRACKING_FLUSH_BATCH_SIZE: int = int(os.getenv("TRACKING_FLUSH_BATCH_SIZE", "500"))
+    TRACKING_FLUSH_INTERVAL_SECONDS: float = float(os.getenv("TRACKING_FLUSH_INTERVAL_SECONDS", "1.0"))
+    # Au-delà, les connexions qui envoient des positions attendent l'écriture en cours
+    TRACKING_BUFFER_MAX_SIZE: int = int(os.getenv("TRACKING_BUFFER_MAX_SIZE", "20000"))
+    
+    # Durée de conservation de la dernière position diffusée pour une livraison
+    TRACKING_LAST_POSITION_TTL_SECONDS: int = int(os.getenv("TRACKING_LAST_POSITION_TTL_SECONDS", "3600"))
+    
+    # Cadence de diffusion des positions : par défaut et maximale demandable par un abonné (Hz)
+    TRACKING_DEFAULT_MAX_RATE_HZ: float = float(os.getenv("TRACKING_DEFAULT_MAX_RATE_HZ", "1.0"))
+    TRACKING_MAX_RATE_HZ: float = float(os.getenv("TRACKING_MAX_RATE_HZ", "5.0"))
+    # En dessous de ce déplacement, une position n'est renvoyée qu'après l'intervalle d'arrêt
+    TRACKING_MIN_MOVEMENT_METERS: float = float(os.getenv("TRACKING_MIN_MOVEMENT_METERS", "10"))
+    TRACKING_STATIONARY_INTERVAL_SECONDS: float = float(os.getenv("TRACKING_STATIONARY_INTERVAL_SECONDS", "15"))
+    # Ancienneté maximale de l'horodatage d'une position reçue en trame binaire
+    # (relevés mis en tampon hors connexion) ; au-delà, il est ramené à cette borne
+    TRACKING_MAX_POINT_AGE_SECONDS: int = int(os.getenv("TRACKING_MAX_POINT_AGE_SECONDS", "3600"))
+    # Délai d'envoi d'une position à un abonné, au-delà duquel sa connexion est fermée
+    TRACKING_SEND_TIMEOUT_SECONDS: float = float(os.getenv("TRACKING_SEND_TIMEOUT_SECONDS", "10"))
+    
+    # Partitions mensuelles des points de suivi
+    TRACKING_PARTITION_MONTHS_AHEAD: int = int(os.getenv("TRACKING_PARTITION_MONTHS_AHEAD", "3"))
+    # Mois d'historique conservés avant suppression des partitions (0 : tout conserver)
+    TRACKING_RETENTION_MONTHS: int = int(os.getenv("TRACKING_RETENTION_MONTHS", "0"))
+    PARTITION_MAINTENANCE_INTERVAL_SECONDS: float = float(os.getenv("PARTITION_MAINTENANCE_INTERVAL_SECONDS", "21600"))
+    
+    # Import de livraisons en masse (CSV / NDJSON)
+    DELIVERY_IMPORT_BATCH_SIZE: int = int(os.getenv("DELIVERY_IMPORT_BATCH_SIZE", "500"))
+    DELIVERY_IMPORT_MAX_ROWS: int = int(os.getenv("DELIVERY_IMPORT_MAX_ROWS", "20000"))
+    
+    # Publication des événements de livraison (outbox transactionnelle)
+    OUTBOX_ENABLED: bool = os.getenv("OUTBOX_ENABLED", "True").lower() == "true"
+    OUTBOX_POLL_INTERVAL_SECONDS: float = float(os.getenv("OUTBOX_POLL_INTERVAL_SECONDS", "1.0"))
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", "200"))
+    
     # Langues supportées
     SUPPORTED_LANGUAGES: List[str] = ["fr", "dioula", "baoulé"]
     
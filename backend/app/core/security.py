@@ -5,10 +5,11 @@ from jose import jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .config import settings
-from ..db.session import get_db
+from ..db.session import get_async_db
 from ..models.user import User
 
 # Configuration de la sécurité
@@ -36,7 +37,7 @@ def get_token_expiration() -> datetime:
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -48,13 +49,11 @@ async def get_current_user(
         phone: str = payload.get("sub")
         if phone is None:
             raise credentials_exception
-    except jwt.JWTError:
-        raise credentials_exception 
-            raise credentials_exception
     except jwt.JWTError:
         raise credentials_exception
-        
-    user = db.query(User).filter(User.phone == phone).first()
+    
+    # Lecture asynchrone : l'authentification de chaque requête ne bloque pas la boucle
+    user = (await db.scalars(select(User).where(User.phone == phone))).first()
     if user is None:
         raise credentials_exception
     if user.status == "suspended":
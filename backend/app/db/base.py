@@ -1,8 +1,10 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from ..core.config import settings
+from .replicas import ReplicaSet
 
 # Créer l'URL de connexion à la base de données
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
@@ -20,5 +22,46 @@ engine = create_engine(
 # Créer une session locale
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def async_database_url(url: str) -> str:
+    """
+    URL du pilote asyncpg correspondant à l'URL de connexion synchrone.
+    """
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+# Moteur asynchrone des routes les plus sollicitées : une requête lente ne bloque plus la boucle
+async_engine = create_async_engine(
+    async_database_url(SQLALCHEMY_DATABASE_URL),
+    pool_size=settings.ASYNC_DB_POOL_SIZE,
+    max_overflow=settings.ASYNC_DB_MAX_OVERFLOW,
+    pool_timeout=30,
+    pool_recycle=1800,
+)
+
+# Les objets restent lisibles après le commit, pour la sérialisation de la réponse
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Réplicas de lecture, en moteurs synchrones et asynchrones
+REPLICA_URLS = [url.strip() for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+
+replica_engines = [
+    create_engine(url, pool_size=settings.REPLICA_POOL_SIZE, max_overflow=10, pool_timeout=30, pool_recycle=1800)
+    for url in REPLICA_URLS
+]
+ReplicaSessionLocals = [sessionmaker(autocommit=False, autoflush=False, bind=replica) for replica in replica_engines]
+
+async_replica_engines = [
+    create_async_engine(async_database_url(url), pool_size=settings.REPLICA_POOL_SIZE, max_overflow=10, pool_timeout=30, pool_recycle=1800)
+    for url in REPLICA_URLS
+]
+AsyncReplicaSessionLocals = [
+    async_sessionmaker(replica, autoflush=False, expire_on_commit=False) for replica in async_replica_engines
+]
+
+# Retard mesuré des réplicas et choix du réplica de chaque lecture
+replica_set = ReplicaSet(len(REPLICA_URLS), settings.REPLICA_MAX_LAG_SECONDS)
+
 # Créer une classe de base pour les modèles
 Base = declarative_base()
@@ -0,0 +1,75 @@
+from typing import List, Optional
+import hashlib
+import itertools
+import time
+
+# Requête de retard d'un réplica : inconnu (NULL, réplica écarté) si sa
+# réception du WAL n'est pas en cours, car il a alors rejoué tout ce qu'il a
+# reçu sans plus rien recevoir ; nul s'il a tout rejoué en recevant le flux
+# (primaire inactif) ; sinon l'âge de la dernière transaction rejouée. Le rôle
+# de supervision doit pouvoir lire pg_stat_wal_receiver (pg_read_all_stats).
+REPLICA_LAG_SQL = (
+    "SELECT CASE "
+    "WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+# Clé Redis de la dernière écriture d'un client
+LAST_WRITE_KEY = "db:last_write:{client}"
+
+# Méthodes HTTP sans écriture
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class ReplicaSet:
+    """
+    État des réplicas de lecture et choix d'un réplica assez à jour pour une
+    lecture. Pour chaque réplica, on retient l'instant jusqu'auquel il a
+    rejoué le primaire, déduit du retard mesuré.
+    """
+
+    def __init__(self, size: int, max_lag_seconds: float):
+        self.size = size
+        self.max_lag_seconds = max_lag_seconds
+        # None tant que le retard n'est pas mesuré, ou si le réplica est injoignable
+        self.replayed_until: List[Optional[float]] = [None] * size
+        self._next = itertools.count()
+
+    def update_lag(self, index: int, lag: Optional[float], measured_at: Optional[float] = None) -> None:
+        if lag is None:
+            self.replayed_until[index] = None
+            return
+        measured_at = time.time() if measured_at is None else measured_at
+        self.replayed_until[index] = measured_at - lag
+
+    def choose(self, last_write_at: Optional[float] = None, now: Optional[float] = None) -> Optional[int]:
+        """
+        Indice d'un réplica utilisable (tour à tour), ou None pour lire sur le
+        primaire. Un réplica est utilisable s'il était à jour à moins de
+        `max_lag_seconds` près, mesure comprise : sans nouvelle mesure, il
+        sort de lui-même de la rotation. Quand le client a écrit récemment, le
+        réplica doit aussi avoir rejoué cette écriture, pour que le client
+        relise toujours ses propres écritures.
+        """
+        if not self.size:
+            return None
+        now = time.time() if now is None else now
+        eligible = [
+            index for index, replayed_until in enumerate(self.replayed_until)
+            if replayed_until is not None and now - replayed_until <= self.max_lag_seconds
+            and (last_write_at is None or replayed_until > last_write_at)
+        ]
+        if not eligible:
+            return None
+        return eligible[next(self._next) % len(eligible)]
+
+
+def client_key(authorization: Optional[str]) -> Optional[str]:
+    """
+    Identifiant du client pour la lecture de ses propres écritures : empreinte
+    du jeton d'authentification, sans décoder celui-ci.
+    """
+    if not authorization:
+        return None
+    return hashlib.sha1(authorization.encode()).hexdigest()
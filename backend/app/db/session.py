@@ -1,4 +1,20 @@
-from .base import SessionLocal
+from typing import Optional
+import asyncio
+import logging
+import time
+
+from fastapi import Request
+from sqlalchemy import text
+
+from .base import (
+    SessionLocal, AsyncSessionLocal, ReplicaSessionLocals, AsyncReplicaSessionLocals,
+    async_replica_engines, replica_set
+)
+from .replicas import REPLICA_LAG_SQL, LAST_WRITE_KEY, client_key
+from ..core.config import settings
+from ..services.cache import get_redis_connection
+
+logger = logging.getLogger(__name__)
 
 # Fonction pour obtenir une session de base de données
 def get_db():
@@ -7,3 +23,74 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Session asynchrone (asyncpg) pour les routes portées sur AsyncSession
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def _last_write_at(request: Request) -> Optional[float]:
+    """
+    Instant de la dernière écriture du client à l'origine de la requête.
+    """
+    key = client_key(request.headers.get("Authorization"))
+    if key is None:
+        return None
+    try:
+        r = await get_redis_connection()
+        value = await r.get(LAST_WRITE_KEY.format(client=key))
+    except Exception as e:
+        # Sans Redis, on ne peut pas garantir la relecture : lire sur le primaire
+        logger.warning(f"Suivi des écritures indisponible: {str(e)}")
+        return time.time()
+    return float(value) if value else None
+
+async def _choose_replica(request: Request) -> Optional[int]:
+    if not replica_set.size:
+        return None
+    return replica_set.choose(await _last_write_at(request))
+
+# Sessions des routes en lecture seule : un réplica assez à jour, sinon le primaire
+async def get_read_db(request: Request):
+    index = await _choose_replica(request)
+    db = SessionLocal() if index is None else ReplicaSessionLocals[index]()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request):
+    index = await _choose_replica(request)
+    session_factory = AsyncSessionLocal if index is None else AsyncReplicaSessionLocals[index]
+    async with session_factory() as db:
+        yield db
+
+async def record_write(request: Request) -> None:
+    """
+    Noter qu'un client vient d'écrire : ses lectures suivantes n'iront que sur
+    des réplicas ayant rejoué cette écriture.
+    """
+    key = client_key(request.headers.get("Authorization"))
+    if key is None or not replica_set.size:
+        return
+    try:
+        r = await get_redis_connection()
+        await r.set(LAST_WRITE_KEY.format(client=key), time.time(), ex=settings.REPLICA_READ_YOUR_WRITES_SECONDS)
+    except Exception as e:
+        logger.warning(f"Suivi des écritures indisponible: {str(e)}")
+
+async def replica_lag_monitor() -> None:
+    """
+    Mesurer périodiquement le retard de chaque réplica. Un réplica injoignable
+    ou trop en retard ne reçoit plus de lectures jusqu'à la mesure suivante.
+    """
+    while True:
+        for index, replica in enumerate(async_replica_engines):
+            try:
+                async with replica.connect() as connection:
+                    lag = (await connection.execute(text(REPLICA_LAG_SQL))).scalar()
+                replica_set.update_lag(index, float(lag) if lag is not None else None)
+            except Exception as e:
+                replica_set.update_lag(index, None)
+                logger.warning(f"Réplica de lecture {index} injoignable: {str(e)}")
+        await asyncio.sleep(settings.REPLICA_LAG_CHECK_INTERVAL_SECONDS)
@@ -1,14 +1,28 @@
-from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
+import asyncio
 
 from .core.config import settings
 from .db.base import Base
-from .db.session import get_db
+from .db.session import get_db, record_write, replica_lag_monitor
+from .db.base import replica_set
+from .db.replicas import SAFE_METHODS
 from .db.init_db import init_db
-from .api import auth, users, deliveries, ratings, gamification, market, wallet, traffic, manager, transport
+from .api import auth, users, deliveries, ratings, gamification, market, wallet, traffic, manager, transport, geolocation
 from .websockets import tracking
+from .services.courier_index import courier_index
+from .services.eta_engine import eta_refresh_loop
+from .services.routing import routing_engine
+from .services.assignment import assignment_loop
+from .services.relay_planner import relay_replan_loop
+from .services.outbox import outbox_relay_loop
+from .services.pagination import NEXT_CURSOR_HEADER
+from .services.partitions import partition_maintenance_loop
+from .services.tracking_ingest import tracking_ingestor
+from .services.tracking_fanout import tracking_fanout
+from .services.transport_rule_index import transport_rule_index, transport_rule_listener
 
 # Créer l'application FastAPI
 app = FastAPI(
@@ -26,8 +40,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Curseur de la page suivante, lu par le tableau de bord depuis le navigateur
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+# Boucles de fond lancées au démarrage : la boucle d'événements ne garde
+# qu'une référence faible aux tâches, et l'arrêt doit pouvoir les annuler
+background_loops = set()
+
+def start_background_loop(coroutine) -> None:
+    task = asyncio.create_task(coroutine)
+    background_loops.add(task)
+    task.add_done_callback(background_loops.discard)
+
+# Noter les écritures de chaque client pour qu'il relise ses propres écritures
+@app.middleware("http")
+async def track_client_writes(request: Request, call_next):
+    response = await call_next(request)
+    if replica_set.size and request.method not in SAFE_METHODS and response.status_code < 400:
+        await record_write(request)
+    return response
+
 # Monter le dossier des fichiers statiques
 os.makedirs("uploads", exist_ok=True)
 app.mount("/static", StaticFiles(directory="uploads"), name="static")
@@ -43,6 +76,7 @@ app.include_router(wallet.router, prefix=f"{settings.API_V1_STR}/wallet", tags=[
 app.include_router(traffic.router, prefix=f"{settings.API_V1_STR}/traffic", tags=["Trafic et Météo"])
 app.include_router(manager.router, prefix=f"{settings.API_V1_STR}/manager", tags=["Gestionnaires"])
 app.include_router(transport.router)
+app.include_router(geolocation.router, prefix=f"{settings.API_V1_STR}/geo", tags=["Géolocalisation"])
 
 # Endpoint WebSocket pour le tracking en temps réel
 @app.websocket("/ws/tracking/{delivery_id}")
@@ -59,6 +93,55 @@ async def startup_event():
     # Initialiser la base de données avec les données de base
     db = next(get_db())
     init_db(db)
+    
+    # Charger les positions des coursiers dans l'index spatial
+    courier_index.load_from_db(db)
+    
+    # Compiler les règles de transport et suivre leurs modifications
+    transport_rule_index.load_from_db(db)
+    start_background_loop(transport_rule_listener())
+    
+    # Construire puis rafraîchir en tâche de fond la grille de vitesses utilisée
+    # pour les estimations de durée (profil par défaut en attendant)
+    start_background_loop(eta_refresh_loop())
+    
+    # Charger le précalcul du graphe routier sans bloquer le démarrage (vol d'oiseau en attendant)
+    routing_engine.load_in_background()
+    
+    # Proposer périodiquement les livraisons en attente aux coursiers disponibles
+    if settings.ASSIGNMENT_ENABLED:
+        start_background_loop(assignment_loop())
+    
+    # Ajuster les relais des livraisons collaboratives aux déplacements des coursiers
+    if settings.RELAY_ENABLED:
+        start_background_loop(relay_replan_loop())
+    
+    # Écrire par lots les positions reçues par WebSocket
+    tracking_ingestor.start()
+    
+    # Créer à l'avance les partitions mensuelles des points de suivi
+    start_background_loop(partition_maintenance_loop())
+    
+    # Mesurer le retard des réplicas de lecture
+    if replica_set.size:
+        start_background_loop(replica_lag_monitor())
+    
+    # Publier sur Redis les événements de livraison écrits dans l'outbox
+    if settings.OUTBOX_ENABLED:
+        start_background_loop(outbox_relay_loop())
+
+# Événement d'arrêt
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Arrêter les boucles de fond
+    tasks = list(background_loops)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    
+    # Écrire les positions encore en mémoire avant de quitter
+    await tracking_ingestor.close()
+    await tracking_fanout.close()
 
 # Route de base
 @app.get("/")
@@ -21,6 +21,12 @@ class CollaborativeStatus(str, PyEnum):
     CANCELLED = "cancelled"
 
 
+class RelayLegStatus(str, PyEnum):
+    PLANNED = "planned"
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+
+
 class CollaborativeDelivery(Base):
     __tablename__ = "collaborative_deliveries"
 
@@ -76,3 +82,31 @@ class CollaborativeEarning(Base):
     # Relations
     delivery = relationship("Delivery")
     courier = relationship("User")
+
+
+class CollaborativeLeg(Base):
+    __tablename__ = "collaborative_legs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    delivery_id = Column(Integer, ForeignKey("deliveries.id"), nullable=False, index=True)
+    courier_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    sequence = Column(Integer, nullable=False)  # Ordre du tronçon dans le relais
+    status = Column(String(20), default=RelayLegStatus.PLANNED.value, nullable=False)
+    start_lat = Column(Float, nullable=False)
+    start_lng = Column(Float, nullable=False)
+    start_label = Column(String(255), nullable=True)  # Point de rendez-vous
+    end_lat = Column(Float, nullable=False)
+    end_lng = Column(Float, nullable=False)
+    end_label = Column(String(255), nullable=True)
+    planned_distance = Column(Float, nullable=True)  # en km
+    actual_distance = Column(Float, nullable=True)  # en km, mesurée sur les points de suivi
+    estimated_start = Column(DateTime(timezone=True), nullable=True)
+    estimated_end = Column(DateTime(timezone=True), nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    # Relations
+    delivery = relationship("Delivery")
+    courier = relationship("User", foreign_keys=[courier_id])
@@ -1,6 +1,6 @@
 # Ajouter ces imports si nécessaire
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Text, Enum, Table
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Text, Enum, Table, Index, Computed, DDL, event, text
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 import enum
 from datetime import datetime
@@ -8,6 +8,24 @@ from datetime import datetime
 from ..db.base import Base
 from .transport import VehicleType
 
+# Variante IMMUTABLE de unaccent(), utilisable dans une colonne générée et un index
+SEARCH_FUNCTIONS_DDL = """
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS
+$$ SELECT public.unaccent('public.unaccent', $1) $$
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+"""
+
+# Texte indexé pour la recherche : adresses, description et contacts, en minuscules et sans accents
+SEARCH_DOCUMENT_SQL = (
+    "f_unaccent(lower("
+    "coalesce(pickup_address, '') || ' ' || coalesce(delivery_address, '') || ' ' || "
+    "coalesce(package_description, '') || ' ' || "
+    "coalesce(pickup_contact_name, '') || ' ' || coalesce(delivery_contact_name, '')"
+    "))"
+)
+
 class DeliveryStatus(str, enum.Enum):
     pending = "pending"  # En attente d'enchères
     bidding = "bidding"  # Enchères en cours
@@ -17,6 +35,11 @@ class DeliveryStatus(str, enum.Enum):
     completed = "completed"  # Terminé et confirmé
     cancelled = "cancelled"  # Annulé
 
+# Livraisons « chaudes » : encore ouvertes aux coursiers, ou en cours chez un coursier.
+# Des index partiels ne couvrent que ces lignes, peu nombreuses face à l'historique.
+OPEN_STATUSES = (DeliveryStatus.pending, DeliveryStatus.bidding)
+IN_FLIGHT_STATUSES = (DeliveryStatus.accepted, DeliveryStatus.in_progress)
+
 class DeliveryType(str, enum.Enum):
     standard = "standard"
     express = "express"
@@ -73,6 +96,18 @@ class Delivery(Base):
     completed_at = Column(DateTime(timezone=True), nullable=True)
     cancelled_at = Column(DateTime(timezone=True), nullable=True)
     
+    # Fenêtres horaires de ramassage et de livraison
+    pickup_window_start = Column(DateTime(timezone=True), nullable=True)
+    pickup_window_end = Column(DateTime(timezone=True), nullable=True)
+    delivery_window_start = Column(DateTime(timezone=True), nullable=True)
+    delivery_window_end = Column(DateTime(timezone=True), nullable=True)
+    
+    # Version incrémentée à chaque transition (concurrence optimiste)
+    version = Column(Integer, default=1, server_default="1", nullable=False)
+    
+    # Texte de recherche calculé par la base, chargé seulement à la demande
+    search_document = deferred(Column(Text, Computed(SEARCH_DOCUMENT_SQL, persisted=True)))
+    
     # Métadonnées
     estimated_distance = Column(Float, nullable=True)  # en km
     estimated_duration = Column(Integer, nullable=True)  # en minutes
@@ -91,3 +126,70 @@ class Delivery(Base):
     # Nouveau champ pour le véhicule utilisé
     vehicle_id = Column(Integer, ForeignKey("vehicles.id"), nullable=True)
     vehicle = relationship("Vehicle")
+
+    # Index de la pagination par curseur (created_at, id), décroissante
+    __table_args__ = (
+        Index("ix_deliveries_created_at_id", "created_at", "id"),
+        Index("ix_deliveries_client_created_at_id", "client_id", "created_at", "id"),
+        Index("ix_deliveries_courier_created_at_id", "courier_id", "created_at", "id"),
+        Index("ix_deliveries_status_created_at_id", "status", "created_at", "id"),
+        # Index partiels des livraisons actives, qui ne grossissent pas avec l'historique
+        Index(
+            "ix_deliveries_open_created_at_id", "created_at", "id",
+            postgresql_where=text("courier_id IS NULL AND status IN ('pending', 'bidding')")
+        ),
+        Index(
+            "ix_deliveries_in_flight_courier_created_at_id", "courier_id", "created_at", "id",
+            postgresql_where=text("status IN ('accepted', 'in_progress')")
+        ),
+        # Recherche plein texte (préfixes) et approximative (trigrammes)
+        Index("ix_deliveries_search_tsv", text("to_tsvector('simple', search_document)"), postgresql_using="gin"),
+        Index(
+            "ix_deliveries_search_trgm", "search_document",
+            postgresql_using="gin", postgresql_ops={"search_document": "gin_trgm_ops"}
+        ),
+    )
+
+# Les extensions et f_unaccent doivent exister avant la colonne générée
+event.listen(Delivery.__table__, "before_create", DDL(SEARCH_FUNCTIONS_DDL).execute_if(dialect="postgresql"))
+
+class Bid(Base):
+    __tablename__ = "bids"
+
+    id = Column(Integer, primary_key=True, index=True)
+    delivery_id = Column(Integer, ForeignKey("deliveries.id"), nullable=False)
+    courier_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    amount = Column(Float, nullable=False)
+    note = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relations
+    delivery = relationship("Delivery", back_populates="bids")
+    courier = relationship("User", foreign_keys=[courier_id])
+
+class TrackingPoint(Base):
+    __tablename__ = "tracking_points"
+
+    # Table partitionnée par mois sur `timestamp` : la clé primaire doit inclure la clé de partition
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    delivery_id = Column(Integer, ForeignKey("deliveries.id"), nullable=False)
+    lat = Column(Float, nullable=False)
+    lng = Column(Float, nullable=False)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), index=True)
+    # Date d'insertion : le relevé (`timestamp`) d'un lot peut être bien antérieur
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relations
+    delivery = relationship("Delivery", back_populates="tracking_points")
+
+    __table_args__ = (
+        Index("ix_tracking_points_delivery_id_timestamp", "delivery_id", "timestamp"),
+        Index("ix_tracking_points_created_at_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+# Partition par défaut : reçoit les points hors des partitions mensuelles,
+# que la maintenance (services/partitions.py) crée à l'avance
+event.listen(TrackingPoint.__table__, "after_create", DDL(
+    "CREATE TABLE IF NOT EXISTS tracking_points_default PARTITION OF tracking_points DEFAULT"
+).execute_if(dialect="postgresql"))
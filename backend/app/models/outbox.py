@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Index
+from sqlalchemy.sql import func
+
+from ..db.base import Base
+
+class OutboxEvent(Base):
+    """
+    Événement métier écrit dans la même transaction que le changement qu'il
+    décrit, puis publié sur Redis par le relais de l'outbox.
+    """
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    aggregate_type = Column(String(50), nullable=False)  # delivery, ...
+    aggregate_id = Column(Integer, nullable=False)
+    event_type = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    published_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Le relais ne parcourt que les événements non publiés
+    __table_args__ = (
+        Index("ix_outbox_events_unpublished", "id", postgresql_where=published_at.is_(None)),
+    )
@@ -41,3 +41,18 @@ class WeatherAlert(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     expires_at = Column(DateTime(timezone=True), nullable=True)
+
+class TrafficData(Base):
+    __tablename__ = "traffic_data"
+
+    id = Column(Integer, primary_key=True, index=True)
+    segment_id = Column(String, nullable=True)
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    current_speed = Column(Float, nullable=True)  # en km/h
+    free_flow_speed = Column(Float, nullable=True)  # en km/h
+    current_travel_time = Column(Integer, nullable=True)  # en secondes
+    free_flow_travel_time = Column(Integer, nullable=True)  # en secondes
+    confidence = Column(Float, nullable=True)
+    road_closure = Column(Boolean, default=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
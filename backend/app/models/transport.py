@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Text, Enum, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Date, Text, Enum, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from enum import Enum as PyEnum
@@ -138,3 +138,28 @@ class VehicleUsage(Base):
 
     # Contrainte d'unicité
     __table_args__ = (UniqueConstraint("courier_vehicle_id", "delivery_id", name="uq_vehicle_usage_delivery"),)
+
+
+class VehicleDailyStats(Base):
+    """
+    Agrégats journaliers (UTC) des utilisations d'un véhicule, tenus à jour à
+    chaque écriture de VehicleUsage. Les moyennes se déduisent des sommes et
+    des compteurs.
+    """
+    __tablename__ = "vehicle_daily_stats"
+
+    id = Column(Integer, primary_key=True, index=True)
+    day = Column(Date, nullable=False)
+    vehicle_id = Column(Integer, ForeignKey("vehicles.id"), nullable=False, index=True)
+    usage_count = Column(Integer, default=0, nullable=False)
+    distance_count = Column(Integer, default=0, nullable=False)
+    total_distance = Column(Float, default=0, nullable=False)  # en km
+    total_fuel = Column(Float, default=0, nullable=False)  # en litres
+    total_co2 = Column(Float, default=0, nullable=False)  # en kg
+    fuel_efficiency_sum = Column(Float, default=0, nullable=False)  # somme des litres/km par trajet
+    fuel_efficiency_count = Column(Integer, default=0, nullable=False)
+    co2_per_km_sum = Column(Float, default=0, nullable=False)  # somme des kg/km par trajet
+    co2_per_km_count = Column(Integer, default=0, nullable=False)
+
+    # Contrainte d'unicité
+    __table_args__ = (UniqueConstraint("day", "vehicle_id", name="uq_vehicle_daily_stats"),)
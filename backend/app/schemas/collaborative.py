@@ -20,6 +20,12 @@ class CollaborativeStatus(str, Enum):
     CANCELLED = "cancelled"
 
 
+class RelayLegStatus(str, Enum):
+    PLANNED = "planned"
+    IN_PROGRESS = "in_progress"
+    COMPLETED = "completed"
+
+
 class MessageType(str, Enum):
     TEXT = "text"
     LOCATION = "location"
@@ -137,6 +143,30 @@ class CollaborativeDeliveryDetails(BaseModel):
     stats: Dict[str, Any]
 
 
+# Schémas pour les tronçons de relais
+class CollaborativeLegResponse(BaseModel):
+    id: int
+    delivery_id: int
+    courier_id: int
+    sequence: int
+    status: RelayLegStatus
+    start_lat: float
+    start_lng: float
+    start_label: Optional[str] = None
+    end_lat: float
+    end_lng: float
+    end_label: Optional[str] = None
+    planned_distance: Optional[float] = None
+    actual_distance: Optional[float] = None
+    estimated_start: Optional[datetime] = None
+    estimated_end: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+
 # Schémas pour rejoindre une livraison
 class JoinDeliveryRequest(BaseModel):
     role: CollaborativeRole
@@ -41,6 +41,10 @@ class DeliveryBase(BaseModel):
     is_fragile: Optional[bool] = False
     cargo_category: Optional[CargoCategory] = None
     required_vehicle_type: Optional[VehicleType] = None
+    pickup_window_start: Optional[datetime] = None
+    pickup_window_end: Optional[datetime] = None
+    delivery_window_start: Optional[datetime] = None
+    delivery_window_end: Optional[datetime] = None
     proposed_price: float
     delivery_type: DeliveryType = DeliveryType.standard
 
@@ -51,6 +55,20 @@ class DeliveryCreate(DeliveryBase):
         if v <= 0:
             raise ValueError('Le prix proposé doit être positif')
         return v
+    
+    @validator('pickup_window_end')
+    def pickup_window_must_end_after_start(cls, v, values):
+        start = values.get('pickup_window_start')
+        if v and start and v <= start:
+            raise ValueError('La fenêtre de ramassage doit finir après son début')
+        return v
+    
+    @validator('delivery_window_end')
+    def delivery_window_must_end_after_start(cls, v, values):
+        start = values.get('delivery_window_start')
+        if v and start and v <= start:
+            raise ValueError('La fenêtre de livraison doit finir après son début')
+        return v
 
 # Schéma pour la mise à jour d'une livraison
 class DeliveryUpdate(BaseModel):
@@ -72,6 +90,10 @@ class DeliveryUpdate(BaseModel):
     is_fragile: Optional[bool] = None
     cargo_category: Optional[CargoCategory] = None
     required_vehicle_type: Optional[VehicleType] = None
+    pickup_window_start: Optional[datetime] = None
+    pickup_window_end: Optional[datetime] = None
+    delivery_window_start: Optional[datetime] = None
+    delivery_window_end: Optional[datetime] = None
     proposed_price: Optional[float] = None
     delivery_type: Optional[DeliveryType] = None
 
@@ -92,6 +114,7 @@ class DeliveryResponse(DeliveryBase):
     completed_at: Optional[datetime] = None
     cancelled_at: Optional[datetime] = None
     vehicle_id: Optional[int] = None
+    version: int = 1
     
     # Informations supplémentaires
     client: Optional[Dict[str, Any]] = None
@@ -100,3 +123,80 @@ class DeliveryResponse(DeliveryBase):
     
     class Config:
         orm_mode = True
+
+# Schéma pour les changements de statut
+class StatusUpdate(BaseModel):
+    status: DeliveryStatus
+    # Version lue par le client : la transition échoue si la livraison a changé depuis
+    expected_version: Optional[int] = None
+
+# Schémas pour les enchères
+class BidCreate(BaseModel):
+    amount: float
+    note: Optional[str] = None
+
+    @validator('amount')
+    def amount_must_be_positive(cls, v):
+        if v <= 0:
+            raise ValueError('Le montant doit être positif')
+        return v
+
+class BidResponse(BaseModel):
+    id: int
+    delivery_id: int
+    courier_id: int
+    amount: float
+    note: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+# Schémas pour le tracking
+class TrackingPointCreate(BaseModel):
+    lat: float
+    lng: float
+
+class TrackingPointResponse(BaseModel):
+    id: int
+    delivery_id: int
+    lat: float
+    lng: float
+    timestamp: datetime
+
+    class Config:
+        orm_mode = True
+
+# Schémas pour l'import de livraisons en masse
+class DeliveryImportRowResult(BaseModel):
+    line: int
+    status: str  # created ou error
+    delivery_id: Optional[int] = None
+    errors: List[str] = []
+
+class DeliveryImportReport(BaseModel):
+    total: int
+    created: int
+    failed: int
+    results: List[DeliveryImportRowResult]
+
+# Schémas pour les tournées multi-arrêts
+class TourStopResponse(BaseModel):
+    delivery_id: int
+    type: str  # pickup ou dropoff
+    address: Optional[str] = None
+    commune: Optional[str] = None
+    lat: float
+    lng: float
+    estimated_arrival: datetime
+    late_minutes: float = 0
+    load_weight: float
+
+class TourResponse(BaseModel):
+    courier_id: int
+    stops: List[TourStopResponse]
+    total_distance: float
+    total_duration: int
+    late_stops: int
+    max_weight: Optional[float] = None
+    optimized_at: datetime
@@ -0,0 +1,30 @@
+from pydantic import BaseModel, Field, validator
+from typing import Optional, List
+
+# Schéma pour un point GPS
+class Coordinates(BaseModel):
+    lat: float = Field(..., ge=-90, le=90)
+    lng: float = Field(..., ge=-180, le=180)
+
+# Schéma pour la demande de matrice de distances
+class DistanceMatrixRequest(BaseModel):
+    origins: List[Coordinates]
+    destinations: List[Coordinates]
+    traffic_factor: float = 1.0
+    
+    @validator('traffic_factor')
+    def traffic_factor_must_be_positive(cls, v):
+        if v <= 0:
+            raise ValueError('Le facteur de trafic doit être positif')
+        return v
+
+# Schéma pour la réponse de matrice de distances
+class DistanceMatrixResponse(BaseModel):
+    distances: List[List[float]]  # en km, distances[i][j] de origins[i] vers destinations[j]
+    durations: List[List[int]]  # en minutes
+
+# Schéma pour la réponse de classement par commune
+class CommuneResponse(BaseModel):
+    lat: float
+    lng: float
+    commune: Optional[str] = None
@@ -228,6 +228,51 @@ class VehicleRecommendation(BaseModel):
     alternatives: List[VehicleAlternative]
 
 
+class VehicleRecommendationBatchRequest(BaseModel):
+    requests: List[VehicleRecommendationRequest]
+
+
+class VehicleRecommendationBatch(BaseModel):
+    results: List[VehicleRecommendation]
+
+
+# Load planning schemas
+class LoadPlanRequest(BaseModel):
+    client_id: Optional[int] = None
+    delivery_ids: Optional[List[int]] = None
+    vehicle_ids: Optional[List[int]] = None
+
+
+class VehicleLoad(BaseModel):
+    vehicle_id: int
+    vehicle_type: Optional[str] = None
+    vehicle_name: Optional[str] = None
+    delivery_ids: List[int]
+    total_weight: float
+    total_volume: float
+    weight_utilization: Optional[float] = None
+    volume_utilization: Optional[float] = None
+
+
+class LoadPlan(BaseModel):
+    loads: List[VehicleLoad]
+    unplaced_delivery_ids: List[int]
+    vehicle_count: int
+    lower_bound: int
+
+
+class LoadCheckRequest(BaseModel):
+    delivery_ids: List[int]
+
+
+class LoadCheck(BaseModel):
+    vehicle_id: int
+    fits: bool
+    reason: Optional[str] = None
+    total_weight: float
+    total_volume: float
+
+
 # VehicleUsage schemas
 class VehicleUsageBase(BaseModel):
     courier_vehicle_id: int
@@ -0,0 +1,488 @@
+from typing import Dict, List, Optional, Tuple, Any, Sequence
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import asyncio
+import json
+import logging
+import math
+import time
+
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+
+from ..core.config import settings
+from ..core.exceptions import NotFoundError, BadRequestError, ConflictError
+from .cache import get_redis_connection
+from .courier_index import courier_index, CourierPosition, _as_naive_utc
+from .eta_engine import eta_engine
+
+logger = logging.getLogger(__name__)
+
+# Charge maximale indicative (kg) par type de véhicule
+VEHICLE_CAPACITY_KG = {
+    "bicycle": 10,
+    "scooter": 20,
+    "motorcycle": 30,
+    "van": 800,
+    "pickup": 1000,
+    "kia_truck": 2500,
+    "moving_truck": 5000
+}
+
+# Poids estimé (kg) d'un colis selon sa taille, quand le poids n'est pas renseigné
+PACKAGE_SIZE_WEIGHT_KG = {
+    "small": 2,
+    "medium": 10,
+    "large": 25
+}
+
+# Facteur d'échelle des coûts (centièmes de minute) pour l'algorithme d'enchères
+COST_SCALE = 100
+
+OFFER_KEY = "assignment:offer:{delivery_id}"
+COURIER_OFFER_KEY = "assignment:courier:{courier_id}"
+DECLINED_KEY = "assignment:declined:{delivery_id}"
+ROUND_LOCK_KEY = "assignment:lock"
+
+
+@dataclass
+class OpenDelivery:
+    id: int
+    pickup_lat: float
+    pickup_lng: float
+    weight: float
+    required_vehicle_type: Optional[str]
+    waiting_minutes: float
+    proposed_price: float
+
+
+@dataclass
+class CandidateCourier:
+    position: CourierPosition
+    rating: float
+
+
+def package_weight(weight: Optional[float], size: Optional[str]) -> float:
+    if weight:
+        return weight
+    return PACKAGE_SIZE_WEIGHT_KG.get(size or "small", PACKAGE_SIZE_WEIGHT_KG["small"])
+
+
+def vehicle_fit_cost(vehicle_type: Optional[str], required_vehicle_type: Optional[str], weight: float) -> Optional[float]:
+    """
+    Pénalité (en minutes équivalentes) d'un véhicule pour un colis, ou None s'il ne convient pas.
+    Un véhicule surdimensionné est pénalisé pour le garder disponible pour les gros colis.
+    """
+    if required_vehicle_type and vehicle_type != required_vehicle_type:
+        return None
+    capacity = VEHICLE_CAPACITY_KG.get(vehicle_type or "motorcycle")
+    if capacity is None:
+        # Véhicule personnalisé : capacité inconnue, ni bonus ni pénalité
+        return 0.0
+    if weight > capacity:
+        return None
+    return settings.ASSIGNMENT_OVERSIZE_WEIGHT * math.log2(capacity / max(weight, 1.0))
+
+
+def assignment_cost(delivery: OpenDelivery, courier: CandidateCourier, distance: float) -> Optional[float]:
+    """
+    Coût d'une affectation : temps d'approche jusqu'au point de ramassage, adéquation
+    du véhicule et note du coursier. Les livraisons qui attendent depuis longtemps
+    deviennent moins chères à servir, donc prioritaires.
+    """
+    fit = vehicle_fit_cost(courier.position.vehicle_type, delivery.required_vehicle_type, delivery.weight)
+    if fit is None:
+        return None
+    eta = eta_engine.estimate_minutes(
+        courier.position.lat, courier.position.lng,
+        delivery.pickup_lat, delivery.pickup_lng,
+        distance=distance
+    )
+    rating_penalty = settings.ASSIGNMENT_RATING_WEIGHT * (5.0 - courier.rating)
+    waiting_bonus = settings.ASSIGNMENT_WAITING_WEIGHT * delivery.waiting_minutes
+    return max(0.0, eta + fit + rating_penalty - waiting_bonus)
+
+
+def solve_assignment(
+    arcs: Sequence[Sequence[Tuple[int, float]]],
+    unassigned_cost: float,
+    time_budget: Optional[float] = None
+) -> Dict[int, int]:
+    """
+    Affectation de coût minimal entre livraisons (lignes) et coursiers, sur un
+    graphe creux : `arcs[i]` liste les couples (coursier, coût) admissibles pour
+    la livraison `i`. Laisser une livraison sans coursier coûte `unassigned_cost`.
+    Retourne {indice de livraison: identifiant du coursier}.
+
+    Algorithme d'enchères avec réduction progressive d'epsilon, sur le problème
+    rendu carré : chaque livraison a une option « sans coursier » privée, et
+    chaque coursier une option « inactif » qui peut reprendre l'option libérée
+    par une livraison voisine. La dernière phase (epsilon d'un centième de
+    minute) garantit un coût à moins d'un centième de minute par participant
+    de l'optimum ; si le budget de temps (secondes) est épuisé, la dernière
+    phase terminée est retournée.
+    """
+    n = len(arcs)
+    couriers = sorted({j for row in arcs for j, cost in row if cost < unassigned_cost})
+    if not couriers:
+        return {}
+    courier_index_of = {courier_id: k for k, courier_id in enumerate(couriers)}
+    m = len(couriers)
+
+    # Personnes : livraisons (0..n-1) puis coursiers inactifs (n..n+m-1).
+    # Objets : coursiers (0..m-1) puis options « sans coursier » (m..m+n-1).
+    # Bénéfices entiers, opposés des coûts en centièmes de minute.
+    dummy = -int(round(unassigned_cost * COST_SCALE))
+    benefits: List[List[Tuple[int, int]]] = [[] for _ in range(n + m)]
+    for i, row in enumerate(arcs):
+        for courier_id, cost in row:
+            if cost < unassigned_cost:
+                k = courier_index_of[courier_id]
+                benefits[i].append((k, -int(round(cost * COST_SCALE))))
+                benefits[n + k].append((m + i, 0))
+        benefits[i].append((m + i, dummy))
+    for k in range(m):
+        benefits[n + k].append((k, 0))
+
+    size = n + m
+    spread = max(dummy - b for row in benefits for _, b in row)
+    epsilon = max(spread / 4.0, 1.0)
+    epsilon_min = 1.0
+    deadline = time.monotonic() + time_budget if time_budget else None
+
+    prices = [0.0] * size
+    best: Optional[List[Optional[int]]] = None
+    while True:
+        owner: List[Optional[int]] = [None] * size
+        assigned: List[Optional[int]] = [None] * size
+        queue = deque(range(size))
+        timed_out = False
+
+        while queue:
+            if deadline is not None and time.monotonic() > deadline:
+                timed_out = True
+                break
+            person = queue.popleft()
+
+            best_object, best_value, second_value = -1, -math.inf, -math.inf
+            for obj, benefit in benefits[person]:
+                value = benefit - prices[obj]
+                if value > best_value:
+                    best_object, best_value, second_value = obj, value, best_value
+                elif value > second_value:
+                    second_value = value
+            if second_value == -math.inf:
+                # Une seule option : la prendre sans faire monter les prix outre mesure
+                second_value = best_value - spread
+
+            prices[best_object] += best_value - second_value + epsilon
+            previous = owner[best_object]
+            owner[best_object] = person
+            assigned[person] = best_object
+            if previous is not None:
+                assigned[previous] = None
+                queue.append(previous)
+
+        if timed_out:
+            break
+        best = assigned
+        if epsilon <= epsilon_min:
+            break
+        epsilon = max(epsilon / 5.0, epsilon_min)
+
+    if best is None:
+        # Aucune phase terminée : l'affectation partielle en cours reste valide
+        best = assigned
+    return {
+        i: couriers[obj] for i, obj in enumerate(best[:n])
+        if obj is not None and obj < m
+    }
+
+
+def _load_open_deliveries(db: Session, now: datetime) -> List[OpenDelivery]:
+    from ..models.delivery import Delivery, OPEN_STATUSES
+
+    rows = db.query(
+        Delivery.id,
+        Delivery.pickup_lat,
+        Delivery.pickup_lng,
+        Delivery.package_weight,
+        Delivery.package_size,
+        Delivery.required_vehicle_type,
+        Delivery.created_at,
+        Delivery.proposed_price
+    ).filter(
+        Delivery.status.in_(OPEN_STATUSES),
+        Delivery.courier_id.is_(None),
+        Delivery.pickup_lat.isnot(None),
+        Delivery.pickup_lng.isnot(None),
+        Delivery.created_at >= now - timedelta(hours=settings.ASSIGNMENT_MAX_AGE_HOURS)
+    ).order_by(Delivery.created_at).limit(settings.ASSIGNMENT_MAX_DELIVERIES).all()
+
+    deliveries = []
+    for row in rows:
+        created_at = _as_naive_utc(row.created_at) if row.created_at else now
+        deliveries.append(OpenDelivery(
+            id=row.id,
+            pickup_lat=row.pickup_lat,
+            pickup_lng=row.pickup_lng,
+            weight=package_weight(row.package_weight, row.package_size),
+            required_vehicle_type=getattr(row.required_vehicle_type, "value", row.required_vehicle_type),
+            waiting_minutes=max(0.0, (now - created_at).total_seconds() / 60),
+            proposed_price=row.proposed_price
+        ))
+    return deliveries
+
+
+def _busy_courier_ids(db: Session) -> set:
+    from ..models.delivery import Delivery, IN_FLIGHT_STATUSES
+
+    rows = db.query(Delivery.courier_id).filter(
+        Delivery.courier_id.isnot(None),
+        Delivery.status.in_(IN_FLIGHT_STATUSES)
+    ).distinct().all()
+    return {row.courier_id for row in rows}
+
+
+def _courier_ratings(db: Session, courier_ids: List[int]) -> Dict[int, float]:
+    """
+    Note moyenne des coursiers, lissée vers 4/5 tant qu'ils ont peu d'évaluations.
+    """
+    from ..models.rating import Rating, ModerationStatus
+
+    ratings = {courier_id: 4.0 for courier_id in courier_ids}
+    if not courier_ids:
+        return ratings
+    rows = db.query(
+        Rating.rated_user_id,
+        func.sum(Rating.score),
+        func.count(Rating.id)
+    ).filter(
+        Rating.rated_user_id.in_(courier_ids),
+        Rating.moderation_status != ModerationStatus.rejected
+    ).group_by(Rating.rated_user_id).all()
+    for courier_id, total, count in rows:
+        ratings[courier_id] = (float(total or 0) + 3 * 4.0) / (count + 3)
+    return ratings
+
+
+async def _active_offers(r, delivery_ids: List[int]) -> Tuple[set, set]:
+    """
+    Livraisons et coursiers ayant déjà une offre en cours.
+    """
+    if not delivery_ids:
+        return set(), set()
+    values = await r.mget([OFFER_KEY.format(delivery_id=d) for d in delivery_ids])
+    offered_deliveries, offered_couriers = set(), set()
+    for delivery_id, value in zip(delivery_ids, values):
+        if value:
+            offered_deliveries.add(delivery_id)
+            offered_couriers.add(json.loads(value)["courier_id"])
+    return offered_deliveries, offered_couriers
+
+
+def _load_round(db: Session, now: datetime) -> Tuple[List[OpenDelivery], set]:
+    """
+    Lecture des livraisons ouvertes et des coursiers occupés (dans un thread).
+    """
+    if courier_index.needs_sync():
+        courier_index.sync_from_db(db)
+    deliveries = _load_open_deliveries(db, now)
+    if not deliveries:
+        return [], set()
+    return deliveries, _busy_courier_ids(db)
+
+
+def _match_round(
+    db: Session,
+    deliveries: List[OpenDelivery],
+    excluded: set,
+    declined: Dict[int, set]
+) -> Tuple[Dict[int, int], List[List[Tuple[int, float]]]]:
+    """
+    Candidats, coûts et résolution de l'affectation (dans un thread) :
+    retourne l'affectation et les arcs dont elle est issue.
+    """
+    # Arcs creux : seuls les coursiers proches du point de ramassage sont candidats
+    nearby: List[List[Tuple[float, CourierPosition]]] = []
+    candidate_ids = set()
+    for delivery in deliveries:
+        couriers = [
+            (distance, position) for distance, position in courier_index.within_radius(
+                delivery.pickup_lat, delivery.pickup_lng, settings.ASSIGNMENT_MAX_PICKUP_KM
+            )
+            if position.courier_id not in excluded
+        ][:settings.ASSIGNMENT_MAX_CANDIDATES]
+        nearby.append(couriers)
+        candidate_ids.update(position.courier_id for _, position in couriers)
+
+    ratings = _courier_ratings(db, list(candidate_ids))
+
+    arcs: List[List[Tuple[int, float]]] = []
+    for delivery, couriers in zip(deliveries, nearby):
+        row = []
+        for distance, position in couriers:
+            if position.courier_id in declined[delivery.id]:
+                continue
+            cost = assignment_cost(delivery, CandidateCourier(position, ratings[position.courier_id]), distance)
+            if cost is not None:
+                row.append((position.courier_id, cost))
+        arcs.append(row)
+
+    matching = solve_assignment(arcs, settings.ASSIGNMENT_UNASSIGNED_COST, settings.ASSIGNMENT_TIME_BUDGET_MS / 1000.0)
+    return matching, arcs
+
+
+async def run_assignment_round(db: Session) -> List[Dict[str, Any]]:
+    """
+    Un tour d'affectation : livraisons ouvertes × coursiers disponibles, résolution
+    de l'affectation de coût minimal, puis envoi d'une offre à chaque coursier retenu.
+    Les lectures en base, les estimations de durée et la résolution tournent dans
+    un thread ; seuls les échanges avec Redis restent sur la boucle d'événements.
+    """
+    r = await get_redis_connection()
+    # Un seul processus résout chaque tour
+    if not await r.set(ROUND_LOCK_KEY, "1", nx=True, ex=max(1, settings.ASSIGNMENT_INTERVAL_SECONDS)):
+        return []
+
+    now = datetime.utcnow()
+    deliveries, busy = await asyncio.to_thread(_load_round, db, now)
+    if not deliveries:
+        return []
+
+    offered_deliveries, offered_couriers = await _active_offers(r, [d.id for d in deliveries])
+    deliveries = [d for d in deliveries if d.id not in offered_deliveries]
+
+    pipe = r.pipeline()
+    for delivery in deliveries:
+        pipe.smembers(DECLINED_KEY.format(delivery_id=delivery.id))
+    declined = {
+        delivery.id: {int(member) for member in members}
+        for delivery, members in zip(deliveries, await pipe.execute())
+    }
+
+    matching, arcs = await asyncio.to_thread(_match_round, db, deliveries, busy | offered_couriers, declined)
+
+    offers = []
+    pipe = r.pipeline()
+    for index, courier_id in matching.items():
+        delivery = deliveries[index]
+        cost = dict(arcs[index])[courier_id]
+        offer = {
+            "delivery_id": delivery.id,
+            "courier_id": courier_id,
+            "proposed_price": delivery.proposed_price,
+            "score": round(cost, 2),
+            "expires_at": (now + timedelta(seconds=settings.ASSIGNMENT_OFFER_TTL_SECONDS)).isoformat()
+        }
+        pipe.set(OFFER_KEY.format(delivery_id=delivery.id), json.dumps(offer), ex=settings.ASSIGNMENT_OFFER_TTL_SECONDS)
+        pipe.set(COURIER_OFFER_KEY.format(courier_id=courier_id), delivery.id, ex=settings.ASSIGNMENT_OFFER_TTL_SECONDS)
+        pipe.publish("notifications", json.dumps({
+            "type": "delivery_offer",
+            "payload": dict(offer, recipient_id=str(courier_id)),
+            "sender_id": "system"
+        }))
+        offers.append(offer)
+    await pipe.execute()
+
+    logger.info(f"Tour d'affectation: {len(deliveries)} livraisons ouvertes, {len(offers)} offres envoyées")
+    return offers
+
+
+async def assignment_loop() -> None:
+    """
+    Boucle d'affectation lancée au démarrage de l'API.
+    """
+    from ..db.session import SessionLocal
+
+    while True:
+        await asyncio.sleep(settings.ASSIGNMENT_INTERVAL_SECONDS)
+        try:
+            with SessionLocal() as db:
+                await run_assignment_round(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Erreur lors du tour d'affectation: {str(e)}")
+
+
+async def get_courier_offer(courier_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Retourner l'offre en cours d'un coursier, s'il en a une.
+    """
+    r = await get_redis_connection()
+    delivery_id = await r.get(COURIER_OFFER_KEY.format(courier_id=courier_id))
+    if not delivery_id:
+        return None
+    value = await r.get(OFFER_KEY.format(delivery_id=int(delivery_id)))
+    if not value:
+        return None
+    offer = json.loads(value)
+    return offer if offer["courier_id"] == courier_id else None
+
+
+async def _get_offer(delivery_id: int, courier_id: int) -> Dict[str, Any]:
+    r = await get_redis_connection()
+    value = await r.get(OFFER_KEY.format(delivery_id=delivery_id))
+    offer = json.loads(value) if value else None
+    if not offer or offer["courier_id"] != courier_id:
+        raise NotFoundError("Aucune offre en cours pour cette livraison")
+    return offer
+
+
+async def _delete_offer(delivery_id: int, courier_id: int) -> None:
+    r = await get_redis_connection()
+    await r.delete(OFFER_KEY.format(delivery_id=delivery_id), COURIER_OFFER_KEY.format(courier_id=courier_id))
+
+
+async def _pop_offer(delivery_id: int, courier_id: int) -> Dict[str, Any]:
+    offer = await _get_offer(delivery_id, courier_id)
+    await _delete_offer(delivery_id, courier_id)
+    return offer
+
+
+def _take_delivery(db: Session, delivery_id: int, courier_id: int, offer: Dict[str, Any]):
+    from ..models.delivery import Delivery, DeliveryStatus
+    from .load_planner import ensure_courier_can_carry
+    from .delivery_state import transition, SYSTEM
+
+    delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
+    if delivery is None:
+        raise NotFoundError("Livraison non trouvée")
+    ensure_courier_can_carry(db, delivery, courier_id)
+
+    try:
+        return transition(
+            db, delivery_id, DeliveryStatus.accepted, SYSTEM,
+            user_id=courier_id,
+            values={"courier_id": courier_id, "final_price": offer["proposed_price"]},
+            conditions=[Delivery.courier_id.is_(None)],
+            payload={"courier_id": courier_id, "offer": True}
+        )
+    except (BadRequestError, ConflictError):
+        raise ConflictError("Cette livraison n'est plus disponible")
+
+
+async def accept_offer(db: Session, delivery_id: int, courier_id: int):
+    """
+    Accepter une offre : le coursier prend la livraison au prix proposé par le client.
+    La mise à jour est conditionnelle pour ne jamais écraser une enchère acceptée entre-temps.
+    L'offre n'est retirée qu'une fois la transition validée : un refus (capacité
+    du véhicule, livraison prise entre-temps) la laisse en place jusqu'à son expiration.
+    """
+    offer = await _get_offer(delivery_id, courier_id)
+    delivery = await asyncio.to_thread(_take_delivery, db, delivery_id, courier_id, offer)
+    await _delete_offer(delivery_id, courier_id)
+    return delivery
+
+
+async def decline_offer(delivery_id: int, courier_id: int) -> None:
+    """
+    Refuser une offre : la livraison ne sera plus proposée à ce coursier.
+    """
+    await _pop_offer(delivery_id, courier_id)
+    r = await get_redis_connection()
+    key = DECLINED_KEY.format(delivery_id=delivery_id)
+    await r.sadd(key, courier_id)
+    await r.expire(key, settings.ASSIGNMENT_MAX_AGE_HOURS * 3600)
@@ -2,6 +2,9 @@ import redis.asyncio as redis
 import json
 from typing import Any, Dict, List, Optional, Union
 import pickle
+import threading
+import time
+from collections import OrderedDict
 from datetime import timedelta
 
 from ..core.config import settings
@@ -9,6 +12,54 @@ from ..core.config import settings
 # Pool de connexion Redis
 redis_pool = None
 
+class LocalLRUCache:
+    """
+    Cache LRU en mémoire du processus, avec expiration par entrée.
+    Sert de premier niveau devant Redis pour les données très demandées.
+    """
+    
+    def __init__(self, maxsize: int = 10000, ttl: int = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+
 async def get_redis_connection():
     """
     Obtient une connexion Redis du pool.
@@ -12,6 +12,7 @@ from app.schemas.collaborative import (
     JoinDeliveryRequest, CollaborativeRole, CollaborativeStatus
 )
 from app.core.exceptions import NotFoundError, BadRequestError, ForbiddenError
+from app.services.relay_planner import relay_leg_distances
 
 
 def get_collaborative_deliveries(
@@ -261,12 +262,25 @@ def calculate_collaborative_earnings(db: Session, delivery_id: int) -> Dict[str,
     platform_fee = total_amount * 0.1  # 10% de frais de plateforme
     distributable_amount = total_amount - platform_fee
     
+    # En relais, la part de ceux qui ont porté le colis suit la distance de leurs tronçons ;
+    # les autres participants (soutien) gardent leur pourcentage
+    leg_distances = relay_leg_distances(db, delivery_id)
+    shares = {c.courier_id: c.share_percentage for c in collaborators}
+    total_leg_distance = sum(leg_distances.get(c.courier_id, 0.0) for c in collaborators)
+    if total_leg_distance > 0:
+        fixed_share = sum(c.share_percentage for c in collaborators if not leg_distances.get(c.courier_id))
+        relay_share = max(0.0, 100 - fixed_share)
+        for collaborator in collaborators:
+            if leg_distances.get(collaborator.courier_id):
+                shares[collaborator.courier_id] = relay_share * leg_distances[collaborator.courier_id] / total_leg_distance
+    
     earnings = {}
     total_distributed = 0
     
     for collaborator in collaborators:
         # Calcul de base selon le pourcentage
-        base_amount = distributable_amount * (collaborator.share_percentage / 100)
+        share_percentage = shares[collaborator.courier_id]
+        base_amount = distributable_amount * (share_percentage / 100)
         
         # Bonus selon le rôle
         bonus_amount = 0
@@ -283,7 +297,8 @@ def calculate_collaborative_earnings(db: Session, delivery_id: int) -> Dict[str,
             "courier_id": collaborator.courier_id,
             "courier_name": collaborator.courier.full_name if collaborator.courier else "Inconnu",
             "role": collaborator.role,
-            "share_percentage": collaborator.share_percentage,
+            "share_percentage": round(share_percentage, 2),
+            "leg_distance": round(leg_distances.get(collaborator.courier_id, 0.0), 3),
             "base_amount": base_amount,
             "bonus_amount": bonus_amount,
             "penalty_amount": penalty_amount,
@@ -0,0 +1,174 @@
+from typing import Dict, List, Optional, Tuple, Union
+import json
+import math
+import os
+
+COMMUNES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "abidjan_communes.geojson")
+
+# Un anneau est une liste de sommets (lng, lat), comme en GeoJSON
+Ring = List[Tuple[float, float]]
+
+
+class CommunePolygon:
+    def __init__(self, commune: str, polygons: List[List[Ring]]):
+        self.commune = commune
+        # Liste de polygones ; chacun est [anneau extérieur, trous...]
+        self.polygons = polygons
+        xs = [x for polygon in polygons for x, _ in polygon[0]]
+        ys = [y for polygon in polygons for _, y in polygon[0]]
+        self.bbox = (min(xs), min(ys), max(xs), max(ys))
+
+    def edges(self):
+        for polygon in self.polygons:
+            for ring in polygon:
+                for k in range(len(ring) - 1):
+                    yield ring[k], ring[k + 1]
+
+    def contains(self, lng: float, lat: float) -> bool:
+        min_x, min_y, max_x, max_y = self.bbox
+        if lng < min_x or lng > max_x or lat < min_y or lat > max_y:
+            return False
+        for polygon in self.polygons:
+            if _ring_contains(polygon[0], lng, lat) and not any(_ring_contains(hole, lng, lat) for hole in polygon[1:]):
+                return True
+        return False
+
+
+class CommuneClassifier:
+    """
+    Classement hors ligne d'un point GPS dans une commune d'Abidjan.
+
+    Une grille régulière est précalculée sur l'emprise des communes : chaque
+    cellule entièrement contenue dans une commune donne directement la réponse ;
+    les cellules traversées par une limite ne gardent que les quelques polygones
+    candidats, testés par lancer de rayon.
+    """
+
+    def __init__(self, polygons: List[CommunePolygon], cell_size: float = 0.005):
+        self.polygons = polygons
+        self.cell_size = cell_size
+
+        self.min_x = min(p.bbox[0] for p in polygons)
+        self.min_y = min(p.bbox[1] for p in polygons)
+        max_x = max(p.bbox[2] for p in polygons)
+        max_y = max(p.bbox[3] for p in polygons)
+        self.cols = int(math.ceil((max_x - self.min_x) / cell_size)) + 1
+        self.rows = int(math.ceil((max_y - self.min_y) / cell_size)) + 1
+
+        # Chaque cellule contient le nom de la commune (cellule intérieure) ou
+        # un tuple d'indices de polygones candidats
+        self._grid: List[List[Union[str, Tuple[int, ...]]]] = [
+            [self._build_cell(row, col) for col in range(self.cols)]
+            for row in range(self.rows)
+        ]
+
+    @classmethod
+    def load(cls, path: str = COMMUNES_PATH, cell_size: float = 0.005) -> "CommuneClassifier":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        polygons = []
+        for feature in data["features"]:
+            geometry = feature["geometry"]
+            if geometry["type"] == "Polygon":
+                rings = [geometry["coordinates"]]
+            elif geometry["type"] == "MultiPolygon":
+                rings = geometry["coordinates"]
+            else:
+                continue
+            polygons.append(CommunePolygon(
+                feature["properties"]["commune"],
+                [[[tuple(vertex) for vertex in ring] for ring in polygon] for polygon in rings]
+            ))
+        return cls(polygons, cell_size=cell_size)
+
+    def _build_cell(self, row: int, col: int) -> Union[str, Tuple[int, ...]]:
+        x0 = self.min_x + col * self.cell_size
+        y0 = self.min_y + row * self.cell_size
+        x1 = x0 + self.cell_size
+        y1 = y0 + self.cell_size
+
+        candidates = tuple(
+            index for index, polygon in enumerate(self.polygons)
+            if polygon.bbox[0] <= x1 and polygon.bbox[2] >= x0 and polygon.bbox[1] <= y1 and polygon.bbox[3] >= y0
+        )
+
+        for index in candidates:
+            polygon = self.polygons[index]
+            corners = ((x0, y0), (x1, y0), (x1, y1), (x0, y1))
+            if not all(polygon.contains(x, y) for x, y in corners):
+                continue
+            if any(_segment_intersects_box(a, b, x0, y0, x1, y1) for a, b in polygon.edges()):
+                continue
+            return polygon.commune
+
+        return candidates
+
+    def classify(self, lat: float, lng: float) -> Optional[str]:
+        """
+        Retourner la commune contenant le point, ou None s'il est hors des limites
+        (lagune, hors d'Abidjan).
+        """
+        if lat is None or lng is None:
+            return None
+        col = int((lng - self.min_x) / self.cell_size)
+        row = int((lat - self.min_y) / self.cell_size)
+        if row < 0 or col < 0 or row >= self.rows or col >= self.cols:
+            return None
+
+        cell = self._grid[row][col]
+        if isinstance(cell, str):
+            return cell
+        for index in cell:
+            if self.polygons[index].contains(lng, lat):
+                return self.polygons[index].commune
+        return None
+
+    def classify_many(self, points: List[Tuple[float, float]]) -> List[Optional[str]]:
+        return [self.classify(lat, lng) for lat, lng in points]
+
+    @property
+    def communes(self) -> List[str]:
+        return [polygon.commune for polygon in self.polygons]
+
+
+def _ring_contains(ring: Ring, x: float, y: float) -> bool:
+    """
+    Test du point dans un anneau par lancer de rayon (règle pair-impair).
+    """
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i]
+        xj, yj = ring[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def _orientation(a, b, c) -> float:
+    return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+
+def _segments_intersect(p1, p2, q1, q2) -> bool:
+    d1 = _orientation(q1, q2, p1)
+    d2 = _orientation(q1, q2, p2)
+    d3 = _orientation(p1, p2, q1)
+    d4 = _orientation(p1, p2, q2)
+    return ((d1 > 0) != (d2 > 0) or d1 == 0 or d2 == 0) and ((d3 > 0) != (d4 > 0) or d3 == 0 or d4 == 0)
+
+
+def _segment_intersects_box(a, b, x0: float, y0: float, x1: float, y1: float) -> bool:
+    if max(a[0], b[0]) < x0 or min(a[0], b[0]) > x1 or max(a[1], b[1]) < y0 or min(a[1], b[1]) > y1:
+        return False
+    if x0 <= a[0] <= x1 and y0 <= a[1] <= y1:
+        return True
+    if x0 <= b[0] <= x1 and y0 <= b[1] <= y1:
+        return True
+    corners = ((x0, y0), (x1, y0), (x1, y1), (x0, y1))
+    return any(_segments_intersect(a, b, corners[k], corners[(k + 1) % 4]) for k in range(4))
+
+
+# Classifieur chargé une seule fois par processus
+commune_classifier = CommuneClassifier.load()
@@ -0,0 +1,372 @@
+from typing import Dict, List, Optional, Set, Tuple, Any
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import heapq
+import math
+import threading
+import logging
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rayon de la Terre en kilomètres
+EARTH_RADIUS_KM = 6371.0
+# Longueur d'un degré de latitude en kilomètres
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180.0
+
+
+@dataclass
+class CourierPosition:
+    courier_id: int
+    lat: float
+    lng: float
+    vehicle_type: Optional[str]
+    is_online: bool
+    updated_at: datetime
+
+
+class CourierLocationIndex:
+    """
+    Index spatial en mémoire des positions des coursiers.
+
+    Les positions sont rangées dans une grille régulière (cellules de
+    `cell_size` degrés). Une recherche ne parcourt que les anneaux de cellules
+    autour du point demandé, au lieu de balayer toute la table des coursiers.
+    """
+
+    def __init__(self, cell_size: float = 0.01, max_age_minutes: int = 15):
+        self.cell_size = cell_size
+        self.max_age = timedelta(minutes=max_age_minutes)
+        self._positions: Dict[int, CourierPosition] = {}
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+        # Étendue (min_i, max_i, min_j, max_j) des cellules occupées, ne fait que s'élargir
+        self._bounds: Optional[List[int]] = None
+        self._lock = threading.RLock()
+        self._last_sync: Optional[datetime] = None
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_size)), int(math.floor(lng / self.cell_size))
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def upsert(
+        self,
+        courier_id: int,
+        lat: float,
+        lng: float,
+        vehicle_type: Optional[str] = None,
+        is_online: Optional[bool] = None,
+        updated_at: Optional[datetime] = None
+    ) -> None:
+        """
+        Ajouter ou déplacer un coursier dans l'index.
+        Les champs non fournis conservent leur valeur précédente.
+        """
+        updated_at = _as_naive_utc(updated_at) if updated_at else datetime.utcnow()
+
+        with self._lock:
+            previous = self._positions.get(courier_id)
+            if previous is not None:
+                old_cell = self._cell(previous.lat, previous.lng)
+                if vehicle_type is None:
+                    vehicle_type = previous.vehicle_type
+                if is_online is None:
+                    is_online = previous.is_online
+            else:
+                old_cell = None
+
+            position = CourierPosition(
+                courier_id=courier_id,
+                lat=lat,
+                lng=lng,
+                vehicle_type=_vehicle_type_value(vehicle_type),
+                is_online=bool(is_online) if is_online is not None else True,
+                updated_at=updated_at
+            )
+            self._positions[courier_id] = position
+
+            new_cell = self._cell(lat, lng)
+            if old_cell != new_cell:
+                if old_cell is not None:
+                    self._discard_from_cell(old_cell, courier_id)
+                self._cells.setdefault(new_cell, set()).add(courier_id)
+                self._extend_bounds(new_cell)
+
+    def set_status(self, courier_id: int, is_online: bool, vehicle_type: Optional[str] = None) -> None:
+        """
+        Mettre à jour le statut en ligne (et le véhicule) d'un coursier déjà indexé.
+        """
+        with self._lock:
+            position = self._positions.get(courier_id)
+            if position is None:
+                return
+            position.is_online = is_online
+            if vehicle_type is not None:
+                position.vehicle_type = _vehicle_type_value(vehicle_type)
+
+    def remove(self, courier_id: int) -> None:
+        with self._lock:
+            position = self._positions.pop(courier_id, None)
+            if position is not None:
+                self._discard_from_cell(self._cell(position.lat, position.lng), courier_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._positions.clear()
+            self._cells.clear()
+            self._bounds = None
+            self._last_sync = None
+
+    def _extend_bounds(self, cell: Tuple[int, int]) -> None:
+        i, j = cell
+        if self._bounds is None:
+            self._bounds = [i, i, j, j]
+        else:
+            self._bounds[0] = min(self._bounds[0], i)
+            self._bounds[1] = max(self._bounds[1], i)
+            self._bounds[2] = min(self._bounds[2], j)
+            self._bounds[3] = max(self._bounds[3], j)
+
+    def _discard_from_cell(self, cell: Tuple[int, int], courier_id: int) -> None:
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(courier_id)
+            if not members:
+                del self._cells[cell]
+
+    def _is_eligible(self, position: CourierPosition, vehicle_types: Optional[Set[str]], oldest: datetime) -> bool:
+        if not position.is_online:
+            return False
+        if position.updated_at < oldest:
+            return False
+        if vehicle_types and position.vehicle_type not in vehicle_types:
+            return False
+        return True
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        k: int = 5,
+        max_distance: Optional[float] = None,
+        vehicle_types: Optional[List[str]] = None
+    ) -> List[Tuple[float, CourierPosition]]:
+        """
+        Retourner les `k` coursiers en ligne les plus proches, sous forme de
+        couples (distance en km, position), triés par distance croissante.
+        """
+        if k <= 0:
+            return []
+
+        wanted = {_vehicle_type_value(v) for v in vehicle_types} if vehicle_types else None
+        oldest = datetime.utcnow() - self.max_age
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        # Taille minimale d'une cellule en kilomètres (la longitude rétrécit avec la latitude)
+        cell_km = self.cell_size * KM_PER_DEGREE * min(1.0, cos_lat)
+
+        center_i, center_j = self._cell(lat, lng)
+        heap: List[Tuple[float, int]] = []  # tas max via distances négatives
+
+        with self._lock:
+            if not self._cells:
+                return []
+            max_ring = self._max_ring(center_i, center_j, max_distance, cell_km)
+
+            ring = 0
+            while ring <= max_ring:
+                for cell in _ring_cells(center_i, center_j, ring):
+                    for courier_id in self._cells.get(cell, ()):
+                        position = self._positions[courier_id]
+                        if not self._is_eligible(position, wanted, oldest):
+                            continue
+                        distance = haversine(lat, lng, position.lat, position.lng)
+                        if max_distance is not None and distance > max_distance:
+                            continue
+                        if len(heap) < k:
+                            heapq.heappush(heap, (-distance, courier_id))
+                        elif distance < -heap[0][0]:
+                            heapq.heapreplace(heap, (-distance, courier_id))
+
+                # Tout point hors des anneaux déjà visités est au moins à `ring * cell_km`
+                if len(heap) == k and -heap[0][0] <= ring * cell_km:
+                    break
+                ring += 1
+
+            results = [(-d, self._positions[cid]) for d, cid in heap]
+
+        results.sort(key=lambda item: item[0])
+        return results
+
+    def within_radius(
+        self,
+        lat: float,
+        lng: float,
+        radius: float,
+        vehicle_types: Optional[List[str]] = None
+    ) -> List[Tuple[float, CourierPosition]]:
+        """
+        Retourner tous les coursiers en ligne dans un rayon donné (km), triés par distance.
+        """
+        wanted = {_vehicle_type_value(v) for v in vehicle_types} if vehicle_types else None
+        oldest = datetime.utcnow() - self.max_age
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        dlat = radius / KM_PER_DEGREE
+        dlng = radius / (KM_PER_DEGREE * cos_lat)
+
+        min_i, min_j = self._cell(lat - dlat, lng - dlng)
+        max_i, max_j = self._cell(lat + dlat, lng + dlng)
+
+        results = []
+        with self._lock:
+            for i in range(min_i, max_i + 1):
+                for j in range(min_j, max_j + 1):
+                    for courier_id in self._cells.get((i, j), ()):
+                        position = self._positions[courier_id]
+                        if not self._is_eligible(position, wanted, oldest):
+                            continue
+                        distance = haversine(lat, lng, position.lat, position.lng)
+                        if distance <= radius:
+                            results.append((distance, position))
+
+        results.sort(key=lambda item: item[0])
+        return results
+
+    def _max_ring(self, center_i: int, center_j: int, max_distance: Optional[float], cell_km: float) -> int:
+        """
+        Nombre maximal d'anneaux à parcourir : limité par le rayon de recherche
+        et par l'étendue des cellules occupées.
+        """
+        if self._bounds is None:
+            return 0
+        min_i, max_i, min_j, max_j = self._bounds
+        extent = max(abs(min_i - center_i), abs(max_i - center_i), abs(min_j - center_j), abs(max_j - center_j))
+        if max_distance is not None and cell_km > 0:
+            extent = min(extent, int(math.ceil(max_distance / cell_km)) + 1)
+        return extent
+
+    def load_from_db(self, db: Session) -> int:
+        """
+        Reconstruire l'index à partir des profils de coursier en base.
+        """
+        from ..models.user import CourierProfile
+
+        profiles = db.query(
+            CourierProfile.user_id,
+            CourierProfile.last_location_lat,
+            CourierProfile.last_location_lng,
+            CourierProfile.last_location_updated,
+            CourierProfile.vehicle_type,
+            CourierProfile.is_online
+        ).filter(
+            CourierProfile.last_location_lat.isnot(None),
+            CourierProfile.last_location_lng.isnot(None)
+        ).all()
+
+        with self._lock:
+            self._positions.clear()
+            self._cells.clear()
+            self._bounds = None
+            for profile in profiles:
+                self._apply_profile_row(profile)
+            self._last_sync = datetime.utcnow()
+
+        logger.info(f"Index des coursiers chargé: {len(profiles)} positions")
+        return len(profiles)
+
+    def sync_from_db(self, db: Session) -> int:
+        """
+        Appliquer les positions modifiées en base depuis la dernière synchronisation.
+        Permet aux différents workers de voir les mises à jour faites ailleurs.
+        """
+        if self._last_sync is None:
+            return self.load_from_db(db)
+
+        from ..models.user import CourierProfile
+
+        since = self._last_sync
+        now = datetime.utcnow()
+        profiles = db.query(
+            CourierProfile.user_id,
+            CourierProfile.last_location_lat,
+            CourierProfile.last_location_lng,
+            CourierProfile.last_location_updated,
+            CourierProfile.vehicle_type,
+            CourierProfile.is_online
+        ).filter(
+            CourierProfile.last_location_lat.isnot(None),
+            CourierProfile.last_location_lng.isnot(None),
+            (CourierProfile.last_location_updated >= since) | (CourierProfile.updated_at >= since)
+        ).all()
+
+        with self._lock:
+            for profile in profiles:
+                self._apply_profile_row(profile)
+            self._last_sync = now
+
+        return len(profiles)
+
+    def needs_sync(self) -> bool:
+        if self._last_sync is None:
+            return True
+        interval = timedelta(seconds=settings.COURIER_INDEX_SYNC_SECONDS)
+        return datetime.utcnow() - self._last_sync >= interval
+
+    def _apply_profile_row(self, profile: Any) -> None:
+        self.upsert(
+            profile.user_id,
+            profile.last_location_lat,
+            profile.last_location_lng,
+            vehicle_type=profile.vehicle_type,
+            is_online=bool(profile.is_online),
+            updated_at=profile.last_location_updated
+        )
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """
+    Distance de Haversine en kilomètres.
+    """
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    dlat = lat2_rad - lat1_rad
+    dlon = math.radians(lon2 - lon1)
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _ring_cells(center_i: int, center_j: int, ring: int):
+    """
+    Cellules situées exactement à `ring` cellules (distance de Chebyshev) du centre.
+    """
+    if ring == 0:
+        yield (center_i, center_j)
+        return
+    for j in range(center_j - ring, center_j + ring + 1):
+        yield (center_i - ring, j)
+        yield (center_i + ring, j)
+    for i in range(center_i - ring + 1, center_i + ring):
+        yield (i, center_j - ring)
+        yield (i, center_j + ring)
+
+
+def _as_naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value
+    return value.replace(tzinfo=None) - (value.utcoffset() or timedelta(0))
+
+
+def _vehicle_type_value(vehicle_type: Any) -> Optional[str]:
+    if vehicle_type is None:
+        return None
+    return getattr(vehicle_type, "value", vehicle_type)
+
+
+# Index partagé par le processus
+courier_index = CourierLocationIndex(
+    cell_size=settings.COURIER_INDEX_CELL_SIZE,
+    max_age_minutes=settings.COURIER_LOCATION_MAX_AGE_MINUTES
+)
@@ -1,13 +1,22 @@
 from typing import List, Optional, Dict, Any
 from datetime import datetime
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
+from sqlalchemy.orm import Session, noload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import desc, func, select
 
-from ..models.delivery import Delivery, DeliveryStatus, DeliveryType, Bid, TrackingPoint, CollaborativeDelivery
+from ..models.delivery import (
+    Delivery, DeliveryStatus, DeliveryType, Bid, TrackingPoint, CollaborativeDelivery, OPEN_STATUSES, IN_FLIGHT_STATUSES
+)
 from ..models.user import User, UserRole
 from ..schemas.delivery import DeliveryCreate, DeliveryUpdate, StatusUpdate, BidCreate, TrackingPointCreate, CollaborativeDeliveryCreate, ExpressDeliveryCreate
-from ..schemas.transport import VehicleRecommendationRequest, CargoCategory
-from ..services.transport_service import TransportService
+from ..schemas.transport import VehicleRecommendationRequest, CargoCategory, VehicleType
+from ..services.transport_service import get_vehicle_recommendation
+from ..services.geolocation import resolve_commune, calculate_distance
+from ..services.load_planner import courier_bin, ensure_vehicle_can_carry, primary_vehicle_id
+from ..services.relay_planner import relay_carrier_id
+from ..services.courier_index import courier_index
+from ..services.pagination import keyset_paginate, keyset_select
+from ..services.delivery_state import transition, SYSTEM, EVENT_BID_PLACED
 from ..core.exceptions import NotFoundError, BadRequestError, ForbiddenError, ConflictError
 from ..core.config import settings
 import logging
@@ -20,33 +29,44 @@ def get_delivery(db: Session, delivery_id: int) -> Delivery:
         raise NotFoundError("Livraison non trouvée")
     return delivery
 
-def get_deliveries(
-    db: Session, 
-    skip: int = 0, 
-    limit: int = 100, 
+def _delivery_criteria(
     status: Optional[DeliveryStatus] = None,
     commune: Optional[str] = None,
     delivery_type: Optional[DeliveryType] = None
-) -> List[Delivery]:
-    query = db.query(Delivery)
+) -> List[Any]:
+    """
+    Filtres communs aux listes de livraisons, synchrones et asynchrones.
+    """
+    criteria = []
     
     if status:
-        query = query.filter(Delivery.status == status)
+        criteria.append(Delivery.status == status)
     
     if commune:
-        query = query.filter(
+        criteria.append(
             (Delivery.pickup_commune == commune) | (Delivery.delivery_commune == commune)
         )
     
     if delivery_type:
-        query = query.filter(Delivery.delivery_type == delivery_type)
+        criteria.append(Delivery.delivery_type == delivery_type)
     
-    return query.order_by(desc(Delivery.created_at)).offset(skip).limit(limit).all()
+    return criteria
+
+def get_deliveries(
+    db: Session, 
+    cursor: Optional[str] = None, 
+    limit: int = 100, 
+    status: Optional[DeliveryStatus] = None,
+    commune: Optional[str] = None,
+    delivery_type: Optional[DeliveryType] = None
+) -> List[Delivery]:
+    query = db.query(Delivery).filter(*_delivery_criteria(status, commune, delivery_type))
+    return keyset_paginate(query, Delivery, limit, cursor)
 
 def get_deliveries_by_client(
     db: Session, 
     client_id: int, 
-    skip: int = 0, 
+    cursor: Optional[str] = None, 
     limit: int = 100, 
     status: Optional[DeliveryStatus] = None
 ) -> List[Delivery]:
@@ -55,12 +75,12 @@ def get_deliveries_by_client(
     if status:
         query = query.filter(Delivery.status == status)
     
-    return query.order_by(desc(Delivery.created_at)).offset(skip).limit(limit).all()
+    return keyset_paginate(query, Delivery, limit, cursor)
 
 def get_deliveries_by_courier(
     db: Session, 
     courier_id: int, 
-    skip: int = 0, 
+    cursor: Optional[str] = None, 
     limit: int = 100, 
     status: Optional[DeliveryStatus] = None
 ) -> List[Delivery]:
@@ -69,7 +89,67 @@ def get_deliveries_by_courier(
     if status:
         query = query.filter(Delivery.status == status)
     
-    return query.order_by(desc(Delivery.created_at)).offset(skip).limit(limit).all()
+    return keyset_paginate(query, Delivery, limit, cursor)
+
+def _user_delivery_criteria(
+    user_id: int,
+    role: UserRole,
+    status: Optional[DeliveryStatus] = None,
+    commune: Optional[str] = None
+) -> List[Any]:
+    """
+    Livraisons visibles par un utilisateur : pour un coursier, les siennes et
+    celles encore ouvertes aux enchères ; pour un client, les siennes.
+    Le filtre des livraisons ouvertes reprend le prédicat de l'index partiel
+    ix_deliveries_open_created_at_id, pour ne parcourir que les livraisons actives.
+    """
+    if role == UserRole.courier:
+        visible = (Delivery.courier_id == user_id) | (
+            Delivery.courier_id.is_(None) & Delivery.status.in_(OPEN_STATUSES)
+        )
+    else:
+        visible = Delivery.client_id == user_id
+    
+    return [visible, *_delivery_criteria(status, commune)]
+
+def get_user_deliveries(
+    db: Session,
+    user_id: int,
+    role: UserRole,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    status: Optional[DeliveryStatus] = None,
+    commune: Optional[str] = None
+) -> List[Delivery]:
+    query = db.query(Delivery).filter(*_user_delivery_criteria(user_id, role, status, commune))
+    return keyset_paginate(query, Delivery, limit, cursor)
+
+def get_courier_deliveries(
+    db: Session,
+    courier_id: int,
+    status: Optional[DeliveryStatus] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    active: bool = False
+) -> List[Delivery]:
+    query = db.query(Delivery).filter(Delivery.courier_id == courier_id)
+    
+    if status:
+        query = query.filter(Delivery.status == status)
+    
+    if active:
+        # Livraisons acceptées ou en cours : index partiel ix_deliveries_in_flight_courier_created_at_id
+        query = query.filter(Delivery.status.in_(IN_FLIGHT_STATUSES))
+    
+    if start_date:
+        query = query.filter(Delivery.created_at >= start_date)
+    
+    if end_date:
+        query = query.filter(Delivery.created_at <= end_date)
+    
+    return keyset_paginate(query, Delivery, limit, cursor)
 
 def create_delivery(db: Session, delivery_data: DeliveryCreate, client_id: int) -> Delivery:
     """
@@ -79,23 +159,33 @@ def create_delivery(db: Session, delivery_data: DeliveryCreate, client_id: int)
     if delivery_data.proposed_price < settings.MIN_DELIVERY_PRICE:
         raise BadRequestError(f"Le prix proposé doit être d'au moins {settings.MIN_DELIVERY_PRICE} FCFA")
     
+    # Compléter les communes absentes ou inconnues à partir des coordonnées
+    delivery_data.pickup_commune = resolve_commune(delivery_data.pickup_commune, delivery_data.pickup_lat, delivery_data.pickup_lng)
+    delivery_data.delivery_commune = resolve_commune(delivery_data.delivery_commune, delivery_data.delivery_lat, delivery_data.delivery_lng)
+    
     # Recommander un véhicule si nécessaire
     if delivery_data.cargo_category and not delivery_data.required_vehicle_type:
         try:
-            transport_service = TransportService(db)
+            distance = None
+            if delivery_data.pickup_lat and delivery_data.pickup_lng and delivery_data.delivery_lat and delivery_data.delivery_lng:
+                distance = calculate_distance(
+                    delivery_data.pickup_lat, delivery_data.pickup_lng,
+                    delivery_data.delivery_lat, delivery_data.delivery_lng
+                )
             recommendation_data = VehicleRecommendationRequest(
                 cargo_category=delivery_data.cargo_category,
-                distance=delivery_data.estimated_distance or 10,  # Valeur par défaut si non fournie
+                distance=distance or 10,  # Valeur par défaut si non fournie
                 weight=delivery_data.package_weight,
                 is_fragile=delivery_data.is_fragile or False
             )
-            recommendation = transport_service.recommend_vehicle(recommendation_data)
+            # Index des règles en mémoire : aucune requête SQL
+            recommendation = get_vehicle_recommendation(db, recommendation_data)
             
             # Appliquer le multiplicateur de prix
             delivery_data.proposed_price = delivery_data.proposed_price * recommendation["price_multiplier"]
             
             # Définir le type de véhicule requis
-            delivery_data.required_vehicle_type = recommendation["recommended_vehicle"].type
+            delivery_data.required_vehicle_type = VehicleType(recommendation["recommended_vehicle"]["type"])
         except Exception as e:
             # En cas d'erreur, continuer sans recommandation
             logger.error(f"Erreur lors de la recommandation de véhicule: {str(e)}")
@@ -133,94 +223,45 @@ def update_delivery(db: Session, delivery_id: int, delivery_data: DeliveryUpdate
     db.refresh(delivery)
     return delivery
 
-def update_delivery_status(db: Session, delivery_id: int, status_data: StatusUpdate, user_id: int) -> Delivery:
-    delivery = get_delivery(db, delivery_id)
-    user = db.query(User).filter(User.id == user_id).first()
-    
-    # Vérifier les autorisations selon le rôle
-    if user.role == UserRole.courier:
-        if delivery.courier_id != user_id:
-            raise ForbiddenError("Vous n'êtes pas le coursier assigné à cette livraison")
-        
-        # Vérifier les transitions d'état valides pour un coursier
-        valid_transitions = {
-            DeliveryStatus.accepted: [DeliveryStatus.in_progress],
-            DeliveryStatus.in_progress: [DeliveryStatus.delivered],
-        }
-        
-        if delivery.status not in valid_transitions or status_data.status not in valid_transitions.get(delivery.status, []):
-            raise BadRequestError("Transition d'état non valide")
-    
-    elif user.role == UserRole.client:
-        if delivery.client_id != user_id:
-            raise ForbiddenError("Vous n'êtes pas le client de cette livraison")
-        
-        # Vérifier les transitions d'état valides pour un client
-        valid_transitions = {
-            DeliveryStatus.delivered: [DeliveryStatus.completed],
-            DeliveryStatus.pending: [DeliveryStatus.cancelled],
-            DeliveryStatus.bidding: [DeliveryStatus.cancelled],
-        }
-        
-        if delivery.status not in valid_transitions or status_data.status not in valid_transitions.get(delivery.status, []):
-            raise BadRequestError("Transition d'état non valide")
-    
-    elif user.role == UserRole.manager:
-        # Les gestionnaires peuvent effectuer toutes les transitions
-        pass
-    
-    else:
+def update_delivery_status(db: Session, delivery_id: int, status_data: StatusUpdate, user_id: int, role: UserRole) -> Delivery:
+    # Seuls les clients, coursiers et gestionnaires modifient le statut ; le
+    # rôle vient de l'utilisateur authentifié, sans relecture en base
+    if role not in [UserRole.courier, UserRole.client, UserRole.manager]:
         raise ForbiddenError("Rôle non autorisé")
     
-    # Mettre à jour le statut
-    delivery.status = status_data.status
-    
-    # Mettre à jour les horodatages en fonction du statut
-    if status_data.status == DeliveryStatus.accepted:
-        delivery.accepted_at = datetime.utcnow()
-    elif status_data.status == DeliveryStatus.in_progress:
-        delivery.pickup_at = datetime.utcnow()
-    elif status_data.status == DeliveryStatus.delivered:
-        delivery.delivered_at = datetime.utcnow()
-    elif status_data.status == DeliveryStatus.completed:
-        delivery.completed_at = datetime.utcnow()
-        
-        # Calculer la durée réelle
-        if delivery.pickup_at:
-            delivery.actual_duration = int((datetime.utcnow() - delivery.pickup_at).total_seconds() / 60)
-        
-        # Mettre à jour les points du coursier (implémenté dans le service de gamification)
-        
-    elif status_data.status == DeliveryStatus.cancelled:
-        delivery.cancelled_at = datetime.utcnow()
-    
-    db.commit()
-    db.refresh(delivery)
+    # Transition atomique : statut de départ, appartenance et version vérifiés par la base
+    delivery = transition(
+        db, delivery_id, status_data.status, role,
+        user_id=user_id,
+        expected_version=status_data.expected_version
+    )
     
+    # Mettre à jour les points du coursier (implémenté dans le service de gamification)
     # Envoyer des notifications (implémenté dans le service de notification)
     
     return delivery
 
 def create_bid(db: Session, delivery_id: int, courier_id: int, bid_data: BidCreate) -> Bid:
-    delivery = get_delivery(db, delivery_id)
-    
-    # Vérifier si la livraison est disponible pour enchérir
-    if delivery.status not in [DeliveryStatus.pending, DeliveryStatus.bidding]:
-        raise BadRequestError("Cette livraison n'est plus disponible pour enchérir")
+    # Passer la livraison en enchères (ou l'y maintenir) ; échoue si elle n'est plus disponible
+    transition(
+        db, delivery_id, DeliveryStatus.bidding, SYSTEM,
+        user_id=courier_id,
+        event_type=EVENT_BID_PLACED,
+        payload={"courier_id": courier_id, "amount": bid_data.amount},
+        invalid_message="Cette livraison n'est plus disponible pour enchérir",
+        commit=False
+    )
     
     # Vérifier si le coursier a déjà enchéri
-    existing_bid = db.query(Bid).filter(
+    bid = db.query(Bid).filter(
         Bid.delivery_id == delivery_id,
         Bid.courier_id == courier_id
     ).first()
     
-    if existing_bid:
+    if bid:
         # Mettre à jour l'enchère existante
-        existing_bid.amount = bid_data.amount
-        existing_bid.note = bid_data.note
-        db.commit()
-        db.refresh(existing_bid)
-        bid = existing_bid
+        bid.amount = bid_data.amount
+        bid.note = bid_data.note
     else:
         # Créer une nouvelle enchère
         bid = Bid(
@@ -230,14 +271,10 @@ def create_bid(db: Session, delivery_id: int, courier_id: int, bid_data: BidCrea
             note=bid_data.note
         )
         db.add(bid)
-        
-        # Mettre à jour le statut de la livraison si c'est la première enchère
-        if delivery.status == DeliveryStatus.pending:
-            delivery.status = DeliveryStatus.bidding
-            db.commit()
-        
-        db.commit()
-        db.refresh(bid)
+    
+    # Statut, enchère et événement sont écrits ensemble
+    db.commit()
+    db.refresh(bid)
     
     # Notifier le client (implémenté dans le service de notification)
     
@@ -248,29 +285,39 @@ def get_bids_for_delivery(db: Session, delivery_id: int) -> List[Bid]:
     return db.query(Bid).filter(Bid.delivery_id == delivery_id).all()
 
 def accept_bid(db: Session, delivery_id: int, bid_id: int, client_id: int) -> Delivery:
-    delivery = get_delivery(db, delivery_id)
+    from ..models.transport import Vehicle
+    from ..models.user import CourierProfile
+    
+    # Livraison, enchère et véhicule du coursier lus en une seule requête
+    row = db.query(Delivery, Bid, Vehicle, CourierProfile.vehicle_type).outerjoin(
+        Bid, (Bid.delivery_id == Delivery.id) & (Bid.id == bid_id)
+    ).outerjoin(
+        Vehicle, Vehicle.id == primary_vehicle_id(Bid.courier_id)
+    ).outerjoin(
+        CourierProfile, CourierProfile.user_id == Bid.courier_id
+    ).filter(Delivery.id == delivery_id).first()
+    if row is None:
+        raise NotFoundError("Livraison non trouvée")
+    delivery, bid, vehicle, profile_vehicle_type = row
     
     # Vérifier les autorisations
     if delivery.client_id != client_id:
         raise ForbiddenError("Vous n'êtes pas autorisé à accepter cette enchère")
-    
-    # Vérifier si la livraison est en attente d'acceptation
-    if delivery.status != DeliveryStatus.bidding:
-        raise BadRequestError("Cette livraison n'est plus en attente d'enchères")
-    
-    # Récupérer l'enchère
-    bid = db.query(Bid).filter(Bid.id == bid_id, Bid.delivery_id == delivery_id).first()
-    if not bid:
+    if bid is None:
         raise NotFoundError("Enchère non trouvée")
     
-    # Mettre à jour la livraison
-    delivery.courier_id = bid.courier_id
-    delivery.final_price = bid.amount
-    delivery.status = DeliveryStatus.accepted
-    delivery.accepted_at = datetime.utcnow()
-    
-    db.commit()
-    db.refresh(delivery)
+    # Vérifier que le véhicule du coursier peut transporter le colis
+    ensure_vehicle_can_carry(courier_bin(vehicle, profile_vehicle_type), delivery)
+    
+    # Attribuer la livraison seulement si elle est toujours en enchères
+    delivery = transition(
+        db, delivery_id, DeliveryStatus.accepted, SYSTEM,
+        user_id=client_id,
+        values={"courier_id": bid.courier_id, "final_price": bid.amount},
+        conditions=[Delivery.client_id == client_id, Delivery.status == DeliveryStatus.bidding],
+        payload={"courier_id": bid.courier_id, "bid_id": bid.id},
+        invalid_message="Cette livraison n'est plus en attente d'enchères"
+    )
     
     # Notifier le coursier (implémenté dans le service de notification)
     
@@ -279,34 +326,54 @@ def accept_bid(db: Session, delivery_id: int, bid_id: int, client_id: int) -> De
 def add_tracking_point(db: Session, delivery_id: int, courier_id: int, tracking_data: TrackingPointCreate) -> TrackingPoint:
     delivery = get_delivery(db, delivery_id)
     
-    # Vérifier les autorisations
-    if delivery.courier_id != courier_id:
+    # Vérifier les autorisations (en relais, le coursier qui porte le colis)
+    if delivery.courier_id != courier_id and relay_carrier_id(db, delivery_id) != courier_id:
         raise ForbiddenError("Vous n'êtes pas le coursier assigné à cette livraison")
     
     # Vérifier si la livraison est en cours
-    if delivery.status not in [DeliveryStatus.accepted, DeliveryStatus.in_progress]:
+    if delivery.status not in IN_FLIGHT_STATUSES:
         raise BadRequestError("Cette livraison n'est pas en cours")
     
-    # Créer le point de tracking
+    # Créer le point de tracking et mettre à jour la position du coursier
+    # dans la même transaction
+    from ..services.user import get_courier_profile
+    profile = get_courier_profile(db, courier_id)
+    now = datetime.utcnow()
     tracking_point = TrackingPoint(
         delivery_id=delivery_id,
         lat=tracking_data.lat,
         lng=tracking_data.lng
     )
+    profile.last_location_lat = tracking_data.lat
+    profile.last_location_lng = tracking_data.lng
+    profile.last_location_updated = now
     
     db.add(tracking_point)
     db.commit()
     db.refresh(tracking_point)
     
-    # Mettre à jour la position du coursier
-    from ..services.user import update_courier_location
-    update_courier_location(db, courier_id, tracking_data.lat, tracking_data.lng)
+    courier_index.upsert(
+        courier_id, tracking_data.lat, tracking_data.lng,
+        vehicle_type=profile.vehicle_type,
+        is_online=bool(profile.is_online),
+        updated_at=now
+    )
     
     return tracking_point
 
+def _tracking_points_criteria(delivery: Delivery) -> List[Any]:
+    """
+    Points de suivi d'une livraison. Ils sont tous postérieurs à sa création :
+    la borne permet d'écarter les partitions mensuelles plus anciennes.
+    """
+    criteria = [TrackingPoint.delivery_id == delivery.id]
+    if delivery.created_at:
+        criteria.append(TrackingPoint.timestamp >= delivery.created_at)
+    return criteria
+
 def get_tracking_points(db: Session, delivery_id: int) -> List[TrackingPoint]:
     delivery = get_delivery(db, delivery_id)
-    return db.query(TrackingPoint).filter(TrackingPoint.delivery_id == delivery_id).order_by(TrackingPoint.timestamp).all()
+    return db.query(TrackingPoint).filter(*_tracking_points_criteria(delivery)).order_by(TrackingPoint.timestamp).all()
 
 def create_collaborative_delivery(db: Session, delivery_id: int, collaborative_data: CollaborativeDeliveryCreate) -> CollaborativeDelivery:
     delivery = get_delivery(db, delivery_id)
@@ -356,3 +423,66 @@ def create_express_delivery(db: Session, express_data: ExpressDeliveryCreate) ->
     donation_amount = settings.EXPRESS_DELIVERY_SURCHARGE * (express_data.donation_percentage / 100)
     
     return delivery
+
+# Versions asynchrones des routes les plus sollicitées (AsyncSession, pilote asyncpg).
+# Les lectures sont des requêtes natives ; les écritures transactionnelles réutilisent
+# les fonctions synchrones via run_sync, dont les accès base restent non bloquants.
+
+# Relations non chargées : un chargement paresseux échouerait hors de run_sync
+ASYNC_DELIVERY_OPTIONS = (noload(Delivery.client), noload(Delivery.courier), noload(Delivery.vehicle))
+
+async def get_delivery_async(db: AsyncSession, delivery_id: int) -> Delivery:
+    delivery = (await db.scalars(
+        select(Delivery).where(Delivery.id == delivery_id).options(*ASYNC_DELIVERY_OPTIONS)
+        .execution_options(populate_existing=True)
+    )).first()
+    if not delivery:
+        raise NotFoundError("Livraison non trouvée")
+    return delivery
+
+async def get_deliveries_async(
+    db: AsyncSession,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    status: Optional[DeliveryStatus] = None,
+    commune: Optional[str] = None,
+    delivery_type: Optional[DeliveryType] = None
+) -> List[Delivery]:
+    stmt = select(Delivery).where(*_delivery_criteria(status, commune, delivery_type)).options(*ASYNC_DELIVERY_OPTIONS)
+    return list((await db.scalars(keyset_select(stmt, Delivery, limit, cursor))).all())
+
+async def get_user_deliveries_async(
+    db: AsyncSession,
+    user_id: int,
+    role: UserRole,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    status: Optional[DeliveryStatus] = None,
+    commune: Optional[str] = None
+) -> List[Delivery]:
+    stmt = select(Delivery).where(*_user_delivery_criteria(user_id, role, status, commune)).options(*ASYNC_DELIVERY_OPTIONS)
+    return list((await db.scalars(keyset_select(stmt, Delivery, limit, cursor))).all())
+
+async def update_delivery_status_async(db: AsyncSession, delivery_id: int, status_data: StatusUpdate, user_id: int, role: UserRole) -> Delivery:
+    await db.run_sync(update_delivery_status, delivery_id, status_data, user_id, role)
+    return await get_delivery_async(db, delivery_id)
+
+async def create_bid_async(db: AsyncSession, delivery_id: int, courier_id: int, bid_data: BidCreate) -> Bid:
+    return await db.run_sync(create_bid, delivery_id, courier_id, bid_data)
+
+async def get_bids_for_delivery_async(db: AsyncSession, delivery_id: int) -> List[Bid]:
+    await get_delivery_async(db, delivery_id)
+    return list((await db.scalars(select(Bid).where(Bid.delivery_id == delivery_id))).all())
+
+async def accept_bid_async(db: AsyncSession, delivery_id: int, bid_id: int, client_id: int) -> Delivery:
+    await db.run_sync(accept_bid, delivery_id, bid_id, client_id)
+    return await get_delivery_async(db, delivery_id)
+
+async def add_tracking_point_async(db: AsyncSession, delivery_id: int, courier_id: int, tracking_data: TrackingPointCreate) -> TrackingPoint:
+    return await db.run_sync(add_tracking_point, delivery_id, courier_id, tracking_data)
+
+async def get_tracking_points_async(db: AsyncSession, delivery_id: int) -> List[TrackingPoint]:
+    delivery = await get_delivery_async(db, delivery_id)
+    return list((await db.scalars(
+        select(TrackingPoint).where(*_tracking_points_criteria(delivery)).order_by(TrackingPoint.timestamp)
+    )).all())
@@ -0,0 +1,372 @@
+from typing import Any, Dict, IO, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from itertools import chain, islice
+import asyncio
+import codecs
+import csv
+import io
+import json
+import logging
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.exceptions import BadRequestError
+from .geolocation import geocode_address, resolve_commune, calculate_distance_and_duration_batch
+
+logger = logging.getLogger(__name__)
+
+CSV = "csv"
+NDJSON = "ndjson"
+
+# Extensions et types MIME reconnus pour chaque format
+FORMAT_EXTENSIONS = {".csv": CSV, ".ndjson": NDJSON, ".jsonl": NDJSON}
+FORMAT_CONTENT_TYPES = {
+    "text/csv": CSV,
+    "application/vnd.ms-excel": CSV,
+    "application/x-ndjson": NDJSON,
+    "application/jsonl": NDJSON,
+}
+
+# Colonnes booléennes des fichiers CSV
+BOOLEAN_FIELDS = ("is_fragile",)
+TRUE_VALUES = {"1", "true", "vrai", "oui", "yes", "o", "y"}
+FALSE_VALUES = {"0", "false", "faux", "non", "no", "n"}
+
+
+class ImportRow(NamedTuple):
+    """
+    Ligne lue dans le fichier : données brutes ou erreur de lecture.
+    """
+    line: int
+    data: Optional[Dict[str, Any]]
+    error: Optional[str] = None
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str], requested: Optional[str] = None) -> str:
+    """
+    Format du fichier : celui demandé, sinon d'après l'extension puis le type MIME.
+    """
+    if requested:
+        if requested.lower() not in (CSV, NDJSON):
+            raise BadRequestError("Format d'import non supporté (csv ou ndjson)")
+        return requested.lower()
+    name = (filename or "").lower()
+    for extension, fmt in FORMAT_EXTENSIONS.items():
+        if name.endswith(extension):
+            return fmt
+    fmt = FORMAT_CONTENT_TYPES.get((content_type or "").split(";")[0].strip().lower())
+    if fmt is None:
+        raise BadRequestError("Format d'import non reconnu, préciser csv ou ndjson")
+    return fmt
+
+
+def _clean_csv_value(field: str, value: Optional[str]) -> Any:
+    value = (value or "").strip()
+    if not value:
+        return None
+    if field in BOOLEAN_FIELDS:
+        lowered = value.lower()
+        if lowered in TRUE_VALUES:
+            return True
+        if lowered in FALSE_VALUES:
+            return False
+    return value
+
+
+def iter_csv_rows(lines: Iterable[str]) -> Iterator[ImportRow]:
+    """
+    Lire un CSV ligne à ligne. Le séparateur (virgule ou point-virgule, courant
+    dans les exports Excel en français) est déduit de l'en-tête ; les cellules
+    vides sont omises pour laisser s'appliquer les valeurs par défaut.
+    """
+    lines = iter(lines)
+    header = next(lines, None)
+    if header is None:
+        return
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    reader = csv.DictReader(chain([header], lines), delimiter=delimiter)
+    fieldnames = [name.strip() for name in reader.fieldnames or []]
+    reader.fieldnames = fieldnames
+
+    for record in reader:
+        if None in record:
+            yield ImportRow(reader.line_num, None, "Nombre de colonnes supérieur à l'en-tête")
+            continue
+        data = {}
+        for field, value in record.items():
+            value = _clean_csv_value(field, value)
+            if value is not None:
+                data[field] = value
+        if data:
+            yield ImportRow(reader.line_num, data)
+
+
+def iter_ndjson_rows(lines: Iterable[str]) -> Iterator[ImportRow]:
+    """
+    Lire un fichier NDJSON : un objet JSON par ligne, lignes vides ignorées.
+    """
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield ImportRow(number, None, "JSON invalide")
+            continue
+        if not isinstance(data, dict):
+            yield ImportRow(number, None, "Chaque ligne doit contenir un objet JSON")
+            continue
+        yield ImportRow(number, {key: value for key, value in data.items() if value is not None})
+
+
+def iter_rows(lines: Iterable[str], fmt: str) -> Iterator[ImportRow]:
+    return iter_csv_rows(lines) if fmt == CSV else iter_ndjson_rows(lines)
+
+
+def batched(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _validation_errors(error: Exception) -> List[str]:
+    if hasattr(error, "errors"):
+        return [
+            f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}"
+            for item in error.errors()
+        ]
+    return [str(error)]
+
+
+def _error(line: int, errors: List[str]) -> Dict[str, Any]:
+    return {"line": line, "status": "error", "delivery_id": None, "errors": errors}
+
+
+async def _geocode_missing(deliveries: List[Any]) -> None:
+    """
+    Compléter les coordonnées manquantes, une seule fois par adresse distincte du lot.
+    """
+    addresses = set()
+    for delivery in deliveries:
+        if delivery.pickup_lat is None or delivery.pickup_lng is None:
+            addresses.add((delivery.pickup_address, delivery.pickup_commune))
+        if delivery.delivery_lat is None or delivery.delivery_lng is None:
+            addresses.add((delivery.delivery_address, delivery.delivery_commune))
+    if not addresses:
+        return
+
+    addresses = list(addresses)
+    coordinates = dict(zip(addresses, await asyncio.gather(
+        *(geocode_address(address, commune) for address, commune in addresses)
+    )))
+    for delivery in deliveries:
+        if delivery.pickup_lat is None or delivery.pickup_lng is None:
+            delivery.pickup_lat, delivery.pickup_lng = coordinates[(delivery.pickup_address, delivery.pickup_commune)]
+        if delivery.delivery_lat is None or delivery.delivery_lng is None:
+            delivery.delivery_lat, delivery.delivery_lng = coordinates[(delivery.delivery_address, delivery.delivery_commune)]
+
+
+def _apply_recommendations(db: Session, deliveries: List[Any], distances: List[Optional[float]]) -> None:
+    """
+    Recommander les véhicules du lot en un seul passage sur l'index des règles.
+    """
+    from ..schemas.transport import VehicleRecommendationRequest, VehicleType
+    from .transport_service import get_vehicle_recommendations
+
+    pending = [
+        (delivery, distance) for delivery, distance in zip(deliveries, distances)
+        if delivery.cargo_category and not delivery.required_vehicle_type
+    ]
+    if not pending:
+        return
+    try:
+        recommendations = get_vehicle_recommendations(db, [
+            VehicleRecommendationRequest(
+                cargo_category=delivery.cargo_category,
+                distance=distance or 10,  # Valeur par défaut si non calculable
+                weight=delivery.package_weight,
+                is_fragile=delivery.is_fragile or False
+            )
+            for delivery, distance in pending
+        ])
+    except Exception as e:
+        # Comme pour une création unitaire, continuer sans recommandation
+        logger.error(f"Erreur lors de la recommandation de véhicules: {str(e)}")
+        return
+
+    for (delivery, _), recommendation in zip(pending, recommendations):
+        delivery.proposed_price = delivery.proposed_price * recommendation["price_multiplier"]
+        delivery.required_vehicle_type = VehicleType(recommendation["recommended_vehicle"]["type"])
+
+
+def _validate_batch(rows: List[ImportRow]) -> Tuple[Dict[int, Dict[str, Any]], List[Tuple[int, Any]]]:
+    """
+    Valider les lignes d'un lot : erreurs par position dans le lot, et
+    livraisons valides à enregistrer.
+    """
+    from ..schemas.delivery import DeliveryCreate
+
+    results: Dict[int, Dict[str, Any]] = {}
+    valid: List[Tuple[int, Any]] = []
+    for index, row in enumerate(rows):
+        if row.error:
+            results[index] = _error(row.line, [row.error])
+            continue
+        try:
+            delivery = DeliveryCreate(**row.data)
+        except Exception as e:
+            results[index] = _error(row.line, _validation_errors(e))
+            continue
+        if delivery.proposed_price < settings.MIN_DELIVERY_PRICE:
+            results[index] = _error(row.line, [f"Le prix proposé doit être d'au moins {settings.MIN_DELIVERY_PRICE} FCFA"])
+            continue
+        valid.append((index, delivery))
+    return results, valid
+
+
+def _read_batch(batches: Iterator[List[ImportRow]]) -> Optional[Tuple[List[ImportRow], Dict[int, Dict[str, Any]], List[Tuple[int, Any]]]]:
+    """
+    Lire et valider le lot suivant du fichier ; None à la fin du fichier.
+    """
+    rows = next(batches, None)
+    if rows is None:
+        return None
+    return (rows, *_validate_batch(rows))
+
+
+def _store_batch(
+    db: Session,
+    rows: List[ImportRow],
+    valid: List[Tuple[int, Any]],
+    results: Dict[int, Dict[str, Any]],
+    client_id: int
+) -> None:
+    """
+    Communes, estimations, recommandations puis INSERT du lot, une fois les
+    coordonnées complétées.
+    """
+    from ..models.delivery import Delivery
+
+    deliveries = [delivery for _, delivery in valid]
+    for delivery in deliveries:
+        # La commune du fichier est conservée si elle est connue
+        delivery.pickup_commune = resolve_commune(delivery.pickup_commune, delivery.pickup_lat, delivery.pickup_lng)
+        delivery.delivery_commune = resolve_commune(delivery.delivery_commune, delivery.delivery_lat, delivery.delivery_lng)
+
+    estimates = calculate_distance_and_duration_batch([
+        (delivery.pickup_lat, delivery.pickup_lng, delivery.delivery_lat, delivery.delivery_lng)
+        for delivery in deliveries
+    ])
+    _apply_recommendations(db, deliveries, [distance for distance, _ in estimates])
+
+    values = [
+        {
+            "client_id": client_id,
+            **delivery.dict(),
+            "estimated_distance": distance,
+            "estimated_duration": duration,
+        }
+        for delivery, (distance, duration) in zip(deliveries, estimates)
+    ]
+    # Positions (dans `valid`) restant à insérer, la prochaine partie en fin de liste
+    parts = [list(range(len(valid)))]
+    while parts:
+        part = parts.pop()
+        try:
+            # Un seul INSERT multi-lignes par partie, identifiants renvoyés dans l'ordre des lignes
+            ids = db.scalars(
+                insert(Delivery).returning(Delivery.id, sort_by_parameter_order=True),
+                [values[position] for position in part]
+            ).all()
+            db.commit()
+        except (IntegrityError, DataError) as e:
+            # Ligne refusée par la base : retenter chaque moitié pour l'isoler
+            db.rollback()
+            if len(part) == 1:
+                index = valid[part[0]][0]
+                logger.warning(f"Ligne {rows[index].line} de l'import refusée par la base: {str(e)}")
+                results[index] = _error(rows[index].line, ["Données refusées par la base de données"])
+            else:
+                middle = len(part) // 2
+                parts.extend([part[middle:], part[:middle]])
+            continue
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Erreur lors de l'import d'un lot de livraisons: {str(e)}")
+            for position in part + [position for remaining in parts for position in remaining]:
+                index = valid[position][0]
+                results[index] = _error(rows[index].line, ["Erreur lors de l'enregistrement du lot"])
+            return
+        for position, delivery_id in zip(part, ids):
+            index = valid[position][0]
+            results[index] = {"line": rows[index].line, "status": "created", "delivery_id": delivery_id, "errors": []}
+
+
+def check_encoding(stream: IO[bytes], chunk_size: int = 1 << 16) -> None:
+    """
+    Vérifier que tout le fichier est en UTF-8 avant la première insertion :
+    une erreur en cours d'import laisserait des lots déjà enregistrés, que le
+    client recréerait en réessayant. Le flux est ensuite rembobiné.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    lines = 1
+    try:
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            try:
+                decoder.decode(chunk)
+            except UnicodeDecodeError as e:
+                # Les octets en attente du bloc précédent ne sont jamais des fins de ligne
+                line = lines + e.object[:e.start].count(b"\n")
+                raise BadRequestError(f"Le fichier doit être encodé en UTF-8 (ligne {line})")
+            lines += chunk.count(b"\n")
+        try:
+            decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            raise BadRequestError(f"Le fichier doit être encodé en UTF-8 (ligne {lines})")
+    finally:
+        stream.seek(0)
+
+
+async def import_deliveries(db: Session, stream: IO[bytes], fmt: str, client_id: int) -> Dict[str, Any]:
+    """
+    Importer des livraisons depuis un fichier CSV ou NDJSON, lu en flux.
+    Les lignes sont validées, géocodées et insérées par lots : chaque lot est
+    validé indépendamment, et le rapport donne le résultat de chaque ligne.
+    Lecture du fichier, calculs et requêtes passent par un thread ; seul le
+    géocodage (asynchrone) reste sur la boucle d'événements.
+    """
+    await asyncio.to_thread(check_encoding, stream)
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    rows = iter_rows(text, fmt)
+    batches = batched(islice(rows, settings.DELIVERY_IMPORT_MAX_ROWS), settings.DELIVERY_IMPORT_BATCH_SIZE)
+    report: Dict[str, Any] = {"total": 0, "created": 0, "failed": 0, "results": []}
+    try:
+        while True:
+            batch = await asyncio.to_thread(_read_batch, batches)
+            if batch is None:
+                break
+            batch_rows, results, valid = batch
+            if valid:
+                await _geocode_missing([delivery for _, delivery in valid])
+                await asyncio.to_thread(_store_batch, db, batch_rows, valid, results, client_id)
+            report["results"].extend(results[index] for index in range(len(batch_rows)))
+        extra = await asyncio.to_thread(next, rows, None)
+    except UnicodeDecodeError:
+        raise BadRequestError("Le fichier doit être encodé en UTF-8")
+    finally:
+        text.detach()
+
+    if extra is not None:
+        report["results"].append(_error(extra.line, [
+            f"Limite de {settings.DELIVERY_IMPORT_MAX_ROWS} lignes atteinte, lignes suivantes ignorées"
+        ]))
+    report["total"] = len(report["results"])
+    report["created"] = sum(1 for result in report["results"] if result["status"] == "created")
+    report["failed"] = report["total"] - report["created"]
+    return report
@@ -0,0 +1,74 @@
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Float, cast, func, literal, or_
+from sqlalchemy.orm import Session
+
+from ..core.exceptions import BadRequestError
+from .gazetteer import normalize_text
+from .pagination import ranked_paginate
+
+# Nombre maximal de mots pris en compte dans une recherche
+MAX_SEARCH_TERMS = 8
+# En dessous de cette longueur, un mot ne sert qu'en recherche par préfixe
+MIN_FUZZY_LENGTH = 3
+
+
+def search_terms(q: Optional[str]) -> List[str]:
+    """
+    Mots de la recherche, normalisés comme le texte indexé (minuscules, sans accents).
+    """
+    return normalize_text(q).split()[:MAX_SEARCH_TERMS]
+
+
+def prefix_tsquery(terms: Sequence[str]) -> str:
+    """
+    Requête tsquery où chaque mot est un préfixe : « treich cocody » trouve
+    « Treichville » et « Cocody ». Les mots normalisés ne contiennent que [a-z0-9].
+    """
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def search_deliveries(
+    db: Session,
+    q: str,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    status: Optional[Any] = None,
+    commune: Optional[str] = None,
+    delivery_type: Optional[Any] = None
+) -> List[Tuple[Any, float]]:
+    """
+    Rechercher des livraisons par adresse, description ou nom de contact,
+    sans tenir compte des accents. Une livraison correspond si tous les mots
+    y figurent en préfixe (index GIN tsvector) ou si la recherche y ressemble
+    assez pour absorber une faute d'orthographe (index GIN trigrammes).
+    Renvoie des couples (livraison, score), du plus pertinent au moins pertinent.
+    """
+    from ..models.delivery import Delivery
+
+    terms = search_terms(q)
+    if not terms:
+        raise BadRequestError("La recherche doit contenir au moins un mot")
+    phrase = " ".join(terms)
+
+    # Expressions identiques à celles des index pour qu'ils soient utilisés
+    document = func.to_tsvector("simple", Delivery.search_document)
+    query = func.to_tsquery("simple", prefix_tsquery(terms))
+    matches = [document.op("@@")(query)]
+    if len(phrase) >= MIN_FUZZY_LENGTH:
+        matches.append(literal(phrase).op("<%")(Delivery.search_document))
+
+    rank = cast(func.greatest(
+        func.ts_rank(document, query),
+        func.word_similarity(phrase, Delivery.search_document)
+    ), Float)
+
+    results = db.query(Delivery, rank).filter(or_(*matches))
+    if status:
+        results = results.filter(Delivery.status == status)
+    if commune:
+        results = results.filter(or_(Delivery.pickup_commune == commune, Delivery.delivery_commune == commune))
+    if delivery_type:
+        results = results.filter(Delivery.delivery_type == delivery_type)
+
+    return [tuple(row) for row in ranked_paginate(results, rank, Delivery.id, limit, cursor)]
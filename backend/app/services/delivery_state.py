@@ -0,0 +1,175 @@
+from typing import Dict, List, Optional, Any, Iterable, Set
+from datetime import datetime
+import logging
+
+from sqlalchemy import update, cast, func, Integer
+from sqlalchemy.orm import Session
+
+from ..core.exceptions import NotFoundError, BadRequestError, ForbiddenError, ConflictError
+
+logger = logging.getLogger(__name__)
+
+# Rôle des transitions déclenchées par la plateforme (enchères, offres automatiques)
+SYSTEM = "system"
+
+# Types d'événements écrits dans l'outbox
+EVENT_STATUS_CHANGED = "delivery.status_changed"
+EVENT_BID_PLACED = "delivery.bid_placed"
+
+PENDING = "pending"
+BIDDING = "bidding"
+ACCEPTED = "accepted"
+IN_PROGRESS = "in_progress"
+DELIVERED = "delivered"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+
+ALL_STATUSES = (PENDING, BIDDING, ACCEPTED, IN_PROGRESS, DELIVERED, COMPLETED, CANCELLED)
+
+# Transitions autorisées par rôle : statut de départ → statuts d'arrivée
+TRANSITIONS: Dict[str, Dict[str, Set[str]]] = {
+    "courier": {
+        ACCEPTED: {IN_PROGRESS},
+        IN_PROGRESS: {DELIVERED},
+    },
+    "client": {
+        DELIVERED: {COMPLETED},
+        PENDING: {CANCELLED},
+        BIDDING: {CANCELLED},
+    },
+    SYSTEM: {
+        PENDING: {BIDDING, ACCEPTED},
+        BIDDING: {BIDDING, ACCEPTED},
+    },
+    # Les gestionnaires peuvent effectuer toutes les transitions
+    "manager": {status: set(ALL_STATUSES) for status in ALL_STATUSES},
+}
+
+# Horodatage renseigné à l'entrée dans chaque statut
+STATUS_TIMESTAMPS = {
+    ACCEPTED: "accepted_at",
+    IN_PROGRESS: "pickup_at",
+    DELIVERED: "delivered_at",
+    COMPLETED: "completed_at",
+    CANCELLED: "cancelled_at",
+}
+
+
+def _value(status: Any) -> str:
+    return getattr(status, "value", status)
+
+
+def allowed_sources(role: Any, to_status: Any) -> List[str]:
+    """
+    Statuts depuis lesquels `role` peut faire passer une livraison à `to_status`.
+    """
+    transitions = TRANSITIONS.get(_value(role), {})
+    target = _value(to_status)
+    return [source for source in ALL_STATUSES if target in transitions.get(source, set())]
+
+
+def record_event(db: Session, delivery_id: int, event_type: str, payload: Dict[str, Any]) -> None:
+    """
+    Ajouter un événement à l'outbox ; il est écrit par le commit de la transaction en cours.
+    """
+    from ..models.outbox import OutboxEvent
+
+    db.add(OutboxEvent(
+        aggregate_type="delivery",
+        aggregate_id=delivery_id,
+        event_type=event_type,
+        payload=payload
+    ))
+
+
+def transition(
+    db: Session,
+    delivery_id: int,
+    to_status: Any,
+    role: Any,
+    user_id: Optional[int] = None,
+    expected_version: Optional[int] = None,
+    values: Optional[Dict[str, Any]] = None,
+    conditions: Iterable[Any] = (),
+    event_type: str = EVENT_STATUS_CHANGED,
+    payload: Optional[Dict[str, Any]] = None,
+    invalid_message: str = "Transition d'état non valide",
+    commit: bool = True
+):
+    """
+    Faire passer une livraison à `to_status` par compare-and-swap : un seul
+    UPDATE ... RETURNING vérifie le statut de départ, l'appartenance à
+    l'utilisateur et, si elle est fournie, la version lue par le client, puis
+    incrémente la version. L'événement d'outbox part dans la même transaction.
+    Sans ligne modifiée, la cause est recherchée pour renvoyer l'erreur adaptée.
+    """
+    from ..models.delivery import Delivery, DeliveryStatus
+
+    role = _value(role)
+    target = _value(to_status)
+    sources = allowed_sources(role, target)
+    if not sources:
+        raise BadRequestError(invalid_message)
+
+    criteria = [Delivery.id == delivery_id, Delivery.status.in_(sources), *conditions]
+    if role == "courier":
+        criteria.append(Delivery.courier_id == user_id)
+    elif role == "client":
+        criteria.append(Delivery.client_id == user_id)
+    if expected_version is not None:
+        criteria.append(Delivery.version == expected_version)
+
+    now = datetime.utcnow()
+    changes: Dict[str, Any] = {"status": DeliveryStatus(target), "version": Delivery.version + 1}
+    if target in STATUS_TIMESTAMPS:
+        changes[STATUS_TIMESTAMPS[target]] = now
+    if target == COMPLETED:
+        # Durée réelle depuis le ramassage, calculée par la base
+        changes["actual_duration"] = cast(func.extract("epoch", now - Delivery.pickup_at) / 60, Integer)
+    changes.update(values or {})
+
+    stmt = update(Delivery).where(*criteria).values(**changes).returning(Delivery)
+    # "fetch" : l'objet éventuellement déjà chargé dans la session reçoit les valeurs renvoyées
+    delivery = db.scalars(stmt, execution_options={"synchronize_session": "fetch"}).first()
+    if delivery is None:
+        db.rollback()
+        _raise_transition_error(db, delivery_id, role, user_id, sources, expected_version, invalid_message)
+
+    record_event(db, delivery_id, event_type, {
+        "delivery_id": delivery_id,
+        "status": target,
+        "version": delivery.version,
+        "actor_role": role,
+        "actor_id": user_id,
+        "occurred_at": now.isoformat(),
+        **(payload or {})
+    })
+    if commit:
+        db.commit()
+    return delivery
+
+
+def _raise_transition_error(
+    db: Session,
+    delivery_id: int,
+    role: str,
+    user_id: Optional[int],
+    sources: List[str],
+    expected_version: Optional[int],
+    invalid_message: str
+) -> None:
+    from ..models.delivery import Delivery
+
+    delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
+    if not delivery:
+        raise NotFoundError("Livraison non trouvée")
+    if role == "courier" and delivery.courier_id != user_id:
+        raise ForbiddenError("Vous n'êtes pas le coursier assigné à cette livraison")
+    if role == "client" and delivery.client_id != user_id:
+        raise ForbiddenError("Vous n'êtes pas le client de cette livraison")
+    if expected_version is not None and delivery.version != expected_version:
+        raise ConflictError("La livraison a été modifiée entre-temps, veuillez la recharger")
+    if _value(delivery.status) not in sources:
+        raise BadRequestError(invalid_message)
+    # Condition propre à l'appelant, ou modification concurrente entre-temps
+    raise ConflictError("La livraison a été modifiée entre-temps, veuillez réessayer")
@@ -0,0 +1,431 @@
+from typing import Dict, List, Optional, Tuple, Any, Iterable
+from datetime import datetime, timedelta
+import asyncio
+import math
+import threading
+import logging
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from .courier_index import haversine, _as_naive_utc, KM_PER_DEGREE
+
+logger = logging.getLogger(__name__)
+
+# Profil horaire par défaut (multiplicateur de la vitesse de référence), utilisé
+# tant qu'aucun historique n'est disponible. Abidjan est en UTC+0 toute l'année.
+DEFAULT_HOURLY_PROFILE = [
+    1.35, 1.40, 1.40, 1.40, 1.35, 1.20,  # 0h - 5h
+    0.95, 0.70, 0.65, 0.80, 0.95, 1.00,  # 6h - 11h
+    0.90, 0.90, 1.00, 0.95, 0.80, 0.65,  # 12h - 17h
+    0.60, 0.70, 0.90, 1.05, 1.20, 1.30   # 18h - 23h
+]
+
+# Réduction de vitesse appliquée autour d'un signalement de trafic actif
+SEVERITY_SPEED_RATIO = {
+    "low": 0.85,
+    "medium": 0.65,
+    "high": 0.45,
+    "blocked": 0.15
+}
+
+# Ratio appliqué sur un segment signalé fermé par le fournisseur de trafic
+ROAD_CLOSURE_RATIO = 0.1
+
+# Bornes de plausibilité d'une vitesse mesurée entre deux points de suivi
+MIN_TRACK_SPEED_KMH = 2.0
+MAX_TRACK_SPEED_KMH = 110.0
+MIN_TRACK_INTERVAL_SECONDS = 5
+MAX_TRACK_INTERVAL_SECONDS = 300
+
+
+class EtaEngine:
+    """
+    Estimation des temps de trajet à partir d'une grille de vitesses en mémoire.
+
+    La ville est découpée en cellules de `cell_size` degrés. Pour chaque couple
+    (cellule, heure), la vitesse historique est tirée des points de suivi des
+    livraisons, lissée vers la moyenne de la ville à la même heure (ou le profil
+    par défaut) tant que les observations sont rares. Deux couches en temps réel
+    s'y superposent pour l'heure courante : les segments du fournisseur de trafic
+    (`TrafficData`) et les signalements actifs (`TrafficReport`).
+
+    Les rafraîchissements sont incrémentaux pour l'historique : seuls les points
+    enregistrés depuis le précédent sont lus, selon leur date d'insertion
+    (`created_at`), relue avec une marge pour rattraper les transactions validées
+    dans le désordre. Ils tournent dans un thread (`eta_refresh_loop`) ; les
+    requêtes ne touchent jamais la base.
+    """
+
+    def __init__(
+        self,
+        cell_size: float = 0.01,
+        default_speed: float = 30.0,
+        prior_weight: float = 5.0,
+        max_samples: int = 500
+    ):
+        self.cell_size = cell_size
+        self.default_speed = default_speed
+        self.prior_weight = prior_weight
+        self.max_samples = max_samples
+
+        # (i, j, heure) -> [somme des vitesses, nombre d'observations]
+        self._historical: Dict[Tuple[int, int, int], List[float]] = {}
+        # heure -> [somme des vitesses, nombre d'observations], toutes cellules confondues
+        self._hourly: List[List[float]] = [[0.0, 0.0] for _ in range(24)]
+        # (i, j) -> ratio vitesse actuelle / vitesse fluide
+        self._live: Dict[Tuple[int, int], float] = {}
+        # (i, j) -> ratio imposé par les signalements actifs
+        self._incidents: Dict[Tuple[int, int], float] = {}
+        # Dernier point connu par livraison, pour calculer les vitesses entre deux points
+        self._last_points: Dict[int, Tuple[float, float, datetime]] = {}
+
+        # Date d'insertion du dernier point lu, et points déjà lus dans la marge de relecture
+        self._watermark: Optional[datetime] = None
+        self._seen: Dict[int, datetime] = {}
+        self._last_refresh: Optional[datetime] = None
+        self._lock = threading.RLock()
+        # Un seul rafraîchissement à la fois, sans faire attendre les autres appelants
+        self._refresh_lock = threading.Lock()
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_size)), int(math.floor(lng / self.cell_size))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._historical.clear()
+            self._hourly = [[0.0, 0.0] for _ in range(24)]
+            self._live.clear()
+            self._incidents.clear()
+            self._last_points.clear()
+            self._watermark = None
+            self._seen.clear()
+            self._last_refresh = None
+
+    # Alimentation de la grille
+
+    def add_speed_sample(self, lat: float, lng: float, hour: int, speed: float) -> None:
+        """
+        Ajouter une vitesse observée (km/h) dans une cellule à une heure donnée.
+        Au-delà de `max_samples` observations, les anciennes pèsent de moins en moins.
+        """
+        i, j = self._cell(lat, lng)
+        with self._lock:
+            for bucket in (self._historical.setdefault((i, j, hour), [0.0, 0.0]), self._hourly[hour]):
+                bucket[0] += speed
+                bucket[1] += 1
+                if bucket[1] > self.max_samples:
+                    bucket[0] /= 2
+                    bucket[1] /= 2
+
+    def add_tracking_point(self, delivery_id: int, lat: float, lng: float, timestamp: datetime) -> Optional[float]:
+        """
+        Enregistrer un point de suivi et en déduire la vitesse depuis le point précédent
+        de la même livraison. Retourne la vitesse retenue, ou None si elle est écartée.
+        """
+        timestamp = _as_naive_utc(timestamp)
+        with self._lock:
+            previous = self._last_points.get(delivery_id)
+            self._last_points[delivery_id] = (lat, lng, timestamp)
+
+        if previous is None:
+            return None
+        prev_lat, prev_lng, prev_time = previous
+        seconds = (timestamp - prev_time).total_seconds()
+        if seconds < MIN_TRACK_INTERVAL_SECONDS or seconds > MAX_TRACK_INTERVAL_SECONDS:
+            return None
+
+        speed = haversine(prev_lat, prev_lng, lat, lng) / (seconds / 3600.0)
+        # Arrêts (ramassage, remise du colis) et sauts GPS ne disent rien du trafic
+        if speed < MIN_TRACK_SPEED_KMH or speed > MAX_TRACK_SPEED_KMH:
+            return None
+
+        midpoint_time = prev_time + timedelta(seconds=seconds / 2)
+        self.add_speed_sample((prev_lat + lat) / 2, (prev_lng + lng) / 2, midpoint_time.hour, speed)
+        return speed
+
+    def set_live_segments(self, segments: Iterable[Tuple[float, float, Optional[float], Optional[float], bool]]) -> None:
+        """
+        Remplacer la couche temps réel par des segments (lat, lng, vitesse actuelle,
+        vitesse fluide, fermeture). Les segments d'une même cellule sont moyennés.
+        """
+        totals: Dict[Tuple[int, int], List[float]] = {}
+        for lat, lng, current_speed, free_flow_speed, road_closure in segments:
+            if lat is None or lng is None:
+                continue
+            if road_closure:
+                ratio = ROAD_CLOSURE_RATIO
+            elif current_speed and free_flow_speed:
+                ratio = min(1.0, max(ROAD_CLOSURE_RATIO, current_speed / free_flow_speed))
+            else:
+                continue
+            bucket = totals.setdefault(self._cell(lat, lng), [0.0, 0])
+            bucket[0] += ratio
+            bucket[1] += 1
+
+        with self._lock:
+            self._live = {cell: total / count for cell, (total, count) in totals.items()}
+
+    def set_incidents(self, reports: Iterable[Tuple[float, float, Any]], radius: float = 0.5) -> None:
+        """
+        Remplacer la couche des signalements par des couples (lat, lng, gravité).
+        Chaque signalement ralentit les cellules situées dans `radius` km.
+        """
+        incidents: Dict[Tuple[int, int], float] = {}
+        for lat, lng, severity in reports:
+            ratio = SEVERITY_SPEED_RATIO.get(getattr(severity, "value", severity))
+            if ratio is None or lat is None or lng is None:
+                continue
+            for cell in self._cells_within(lat, lng, radius):
+                incidents[cell] = min(ratio, incidents.get(cell, 1.0))
+
+        with self._lock:
+            self._incidents = incidents
+
+    def _cells_within(self, lat: float, lng: float, radius: float) -> List[Tuple[int, int]]:
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        dlat = radius / KM_PER_DEGREE
+        dlng = radius / (KM_PER_DEGREE * cos_lat)
+        min_i, min_j = self._cell(lat - dlat, lng - dlng)
+        max_i, max_j = self._cell(lat + dlat, lng + dlng)
+        return [(i, j) for i in range(min_i, max_i + 1) for j in range(min_j, max_j + 1)]
+
+    # Requêtes
+
+    def speed_at(self, lat: float, lng: float, when: Optional[datetime] = None) -> float:
+        """
+        Vitesse estimée (km/h) dans la cellule du point, à l'heure `when` (maintenant par défaut).
+        Les couches temps réel ne s'appliquent qu'aux trajets de l'heure qui vient.
+        """
+        now = datetime.utcnow()
+        when = _as_naive_utc(when) if when else now
+        hour = when.hour
+        i, j = self._cell(lat, lng)
+
+        hourly_total, hourly_count = self._hourly[hour]
+        prior = self.default_speed * DEFAULT_HOURLY_PROFILE[hour]
+        if hourly_count:
+            prior = (hourly_total + self.prior_weight * prior) / (hourly_count + self.prior_weight)
+
+        bucket = self._historical.get((i, j, hour))
+        if bucket:
+            speed = (bucket[0] + self.prior_weight * prior) / (bucket[1] + self.prior_weight)
+        else:
+            speed = prior
+
+        if abs((when - now).total_seconds()) <= 3600:
+            # Les deux couches décrivent la même congestion : on garde la plus pénalisante
+            ratio = min(self._live.get((i, j), 1.0), self._incidents.get((i, j), 1.0))
+            speed *= ratio
+
+        return speed
+
+    def traffic_factor(self, lat: float, lng: float, radius: float = 0.0, when: Optional[datetime] = None) -> float:
+        """
+        Facteur de trafic compatible avec `calculate_duration` (1.0 = vitesse de référence),
+        moyenné sur les cellules situées dans `radius` km.
+        """
+        if radius <= 0:
+            return self.default_speed / self.speed_at(lat, lng, when)
+        cells = self._cells_within(lat, lng, radius)
+        speeds = [
+            self.speed_at((i + 0.5) * self.cell_size, (j + 0.5) * self.cell_size, when)
+            for i, j in cells
+        ]
+        return self.default_speed * len(speeds) / sum(speeds)
+
+    def estimate_minutes(
+        self,
+        lat1: float,
+        lng1: float,
+        lat2: float,
+        lng2: float,
+        distance: Optional[float] = None,
+        when: Optional[datetime] = None
+    ) -> float:
+        """
+        Durée estimée (minutes, non arrondie) d'un trajet : le segment est découpé en
+        tronçons d'environ une cellule, chacun parcouru à la vitesse de sa cellule.
+        """
+        if distance is None:
+            distance = haversine(lat1, lng1, lat2, lng2)
+        if distance <= 0:
+            return 0.0
+
+        steps = max(1, int(math.ceil(distance / (self.cell_size * KM_PER_DEGREE))))
+        step_km = distance / steps
+        hours = 0.0
+        for step in range(steps):
+            t = (step + 0.5) / steps
+            speed = self.speed_at(lat1 + (lat2 - lat1) * t, lng1 + (lng2 - lng1) * t, when)
+            hours += step_km / speed
+        return hours * 60
+
+    def estimate_duration(
+        self,
+        lat1: float,
+        lng1: float,
+        lat2: float,
+        lng2: float,
+        distance: Optional[float] = None,
+        when: Optional[datetime] = None
+    ) -> int:
+        """
+        Durée estimée en minutes entières, comme `calculate_duration`.
+        """
+        return int(self.estimate_minutes(lat1, lng1, lat2, lng2, distance, when))
+
+    # Synchronisation avec la base
+
+    def ingest_tracking_rows(self, rows: Iterable[Any], overlap: timedelta) -> int:
+        """
+        Intégrer des points de suivi lus par date d'insertion croissante. Les
+        points déjà lus lors de la relecture de la marge `overlap` sont ignorés.
+        Retourne le nombre de points nouveaux.
+        """
+        ingested = 0
+        for row in rows:
+            if row.id in self._seen:
+                continue
+            if row.created_at is not None:
+                self._seen[row.id] = row.created_at
+                if self._watermark is None or row.created_at > self._watermark:
+                    self._watermark = row.created_at
+            if row.timestamp is not None:
+                self.add_tracking_point(row.delivery_id, row.lat, row.lng, row.timestamp)
+            ingested += 1
+
+        if self._watermark is not None:
+            # Seuls les points de la marge peuvent être relus
+            horizon = self._watermark - overlap
+            self._seen = {point_id: created_at for point_id, created_at in self._seen.items() if created_at >= horizon}
+        return ingested
+
+    def refresh(self, db: Session) -> None:
+        """
+        Mettre à jour la grille : nouveaux points de suivi depuis le dernier
+        rafraîchissement, puis reconstruction des couches temps réel.
+        """
+        from ..models.delivery import TrackingPoint
+        from ..models.traffic import TrafficData, TrafficReport
+
+        now = datetime.utcnow()
+        since = now - timedelta(days=settings.ETA_HISTORY_DAYS)
+        overlap = timedelta(seconds=settings.ETA_REFRESH_OVERLAP_SECONDS)
+
+        # Un INSERT multi-lignes validé après un autre peut porter des dates
+        # d'insertion antérieures : la marge précédant le dernier point lu est relue
+        query = db.query(
+            TrackingPoint.id,
+            TrackingPoint.delivery_id,
+            TrackingPoint.lat,
+            TrackingPoint.lng,
+            TrackingPoint.timestamp,
+            TrackingPoint.created_at
+        ).filter(TrackingPoint.timestamp >= since)
+        if self._watermark is not None:
+            query = query.filter(TrackingPoint.created_at >= self._watermark - overlap)
+
+        ingested = 0
+        cursor = None
+        while True:
+            page = query
+            if cursor is not None:
+                page = page.filter(tuple_(TrackingPoint.created_at, TrackingPoint.id) > cursor)
+            rows = page.order_by(TrackingPoint.created_at, TrackingPoint.id).limit(settings.ETA_REFRESH_BATCH_SIZE).all()
+            ingested += self.ingest_tracking_rows(rows, overlap)
+            if len(rows) < settings.ETA_REFRESH_BATCH_SIZE or rows[-1].created_at is None:
+                break
+            cursor = (rows[-1].created_at, rows[-1].id)
+
+        segments = db.query(
+            TrafficData.latitude,
+            TrafficData.longitude,
+            TrafficData.current_speed,
+            TrafficData.free_flow_speed,
+            TrafficData.road_closure
+        ).filter(
+            TrafficData.created_at >= now - timedelta(minutes=settings.ETA_LIVE_MAX_AGE_MINUTES)
+        ).all()
+        self.set_live_segments(segments)
+
+        reports = db.query(
+            TrafficReport.lat,
+            TrafficReport.lng,
+            TrafficReport.severity
+        ).filter(
+            TrafficReport.is_active == True,
+            (TrafficReport.expires_at.is_(None)) | (TrafficReport.expires_at > now)
+        ).all()
+        self.set_incidents(reports, radius=settings.ETA_INCIDENT_RADIUS_KM)
+
+        with self._lock:
+            # Oublier les livraisons sans nouveau point depuis longtemps
+            stale = now - timedelta(seconds=MAX_TRACK_INTERVAL_SECONDS)
+            self._last_points = {
+                delivery_id: point for delivery_id, point in self._last_points.items()
+                if point[2] >= stale
+            }
+            self._last_refresh = now
+
+        logger.debug(
+            f"Grille de vitesses rafraîchie: {ingested} points de suivi, "
+            f"{len(segments)} segments, {len(reports)} signalements"
+        )
+
+    def needs_refresh(self) -> bool:
+        if self._last_refresh is None:
+            return True
+        interval = timedelta(seconds=settings.ETA_REFRESH_SECONDS)
+        return datetime.utcnow() - self._last_refresh >= interval
+
+    def refresh_if_needed(self, db: Optional[Session]) -> None:
+        if db is None or not self.needs_refresh():
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            # Rafraîchissement déjà en cours dans un autre thread
+            return
+        try:
+            self.refresh(db)
+        except Exception as e:
+            # Une base indisponible ne doit pas empêcher l'estimation
+            logger.error(f"Erreur lors du rafraîchissement de la grille de vitesses: {str(e)}")
+            db.rollback()
+            self._last_refresh = datetime.utcnow()
+        finally:
+            self._refresh_lock.release()
+
+    @property
+    def last_refresh(self) -> Optional[datetime]:
+        return self._last_refresh
+
+
+async def eta_refresh_loop() -> None:
+    """
+    Rafraîchissement périodique de la grille de vitesses, lancé au démarrage de
+    l'API. Chaque processus tient sa propre grille ; la lecture de la base se
+    fait dans un thread pour ne pas bloquer la boucle d'événements. Le premier
+    passage, qui relit tout l'historique, ne retarde pas le démarrage.
+    """
+    from ..db.session import SessionLocal
+
+    def refresh() -> None:
+        with SessionLocal() as db:
+            eta_engine.refresh_if_needed(db)
+
+    while True:
+        try:
+            await asyncio.to_thread(refresh)
+        except Exception as e:
+            logger.error(f"Erreur lors du rafraîchissement de la grille de vitesses: {str(e)}")
+        await asyncio.sleep(settings.ETA_REFRESH_SECONDS)
+
+
+# Moteur partagé par le processus
+eta_engine = EtaEngine(
+    cell_size=settings.ETA_GRID_CELL_SIZE,
+    default_speed=settings.ETA_DEFAULT_SPEED_KMH,
+    prior_weight=settings.ETA_PRIOR_WEIGHT,
+    max_samples=settings.ETA_MAX_SAMPLES_PER_CELL
+)
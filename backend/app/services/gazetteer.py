@@ -0,0 +1,151 @@
+from typing import Dict, List, Optional, Any, Tuple
+from dataclasses import dataclass, field
+import json
+import math
+import os
+import re
+import unicodedata
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "abidjan_gazetteer.json")
+
+# Nombre maximal de mots dans un nom de lieu recherché dans une adresse
+MAX_ALIAS_WORDS = 6
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """
+    Normaliser un texte pour la comparaison : minuscules, sans accents,
+    ponctuation remplacée par des espaces.
+    """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^a-z0-9]+", " ", text.lower())
+    return text.strip()
+
+
+@dataclass
+class GazetteerEntry:
+    name: str
+    type: str  # commune, quartier, landmark
+    commune: str
+    lat: float
+    lng: float
+    aliases: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "type": self.type,
+            "commune": self.commune,
+            "lat": self.lat,
+            "lng": self.lng
+        }
+
+
+class Gazetteer:
+    """
+    Gazetteer hors ligne des communes, quartiers et lieux de repère d'Abidjan.
+    """
+
+    def __init__(self, entries: List[GazetteerEntry]):
+        self.entries = entries
+        self.communes: Dict[str, GazetteerEntry] = {}
+        self._by_alias: Dict[str, List[GazetteerEntry]] = {}
+
+        for entry in entries:
+            if entry.type == "commune":
+                self.communes[normalize_text(entry.name)] = entry
+            for alias in [entry.name] + entry.aliases:
+                key = normalize_text(alias)
+                if key:
+                    self._by_alias.setdefault(key, []).append(entry)
+
+    @classmethod
+    def load(cls, path: str = GAZETTEER_PATH) -> "Gazetteer":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        entries = [
+            GazetteerEntry(
+                name=item["name"],
+                type="commune",
+                commune=item["name"],
+                lat=item["lat"],
+                lng=item["lng"],
+                aliases=item.get("aliases", [])
+            )
+            for item in data.get("communes", [])
+        ]
+        entries += [
+            GazetteerEntry(
+                name=item["name"],
+                type=item.get("type", "quartier"),
+                commune=item["commune"],
+                lat=item["lat"],
+                lng=item["lng"],
+                aliases=item.get("aliases", [])
+            )
+            for item in data.get("places", [])
+        ]
+        return cls(entries)
+
+    def commune(self, name: Optional[str]) -> Optional[GazetteerEntry]:
+        """
+        Retrouver une commune par son nom (insensible aux accents et à la casse).
+        """
+        key = normalize_text(name)
+        if not key:
+            return None
+        entry = self.communes.get(key)
+        if entry is None:
+            candidates = [e for e in self._by_alias.get(key, []) if e.type == "commune"]
+            entry = candidates[0] if candidates else None
+        return entry
+
+    def lookup(self, address: str, commune: Optional[str] = None) -> Optional[GazetteerEntry]:
+        """
+        Rechercher dans une adresse libre le quartier ou lieu de repère le plus précis
+        (le nom le plus long l'emporte). Si la commune est connue, seuls les lieux
+        de cette commune sont retenus. Les communes seules ne sont pas retournées ici.
+        """
+        words = normalize_text(address).split()
+        commune_entry = self.commune(commune)
+        wanted_commune = commune_entry.name if commune_entry else None
+
+        best: Optional[Tuple[int, GazetteerEntry]] = None
+        for start in range(len(words)):
+            for size in range(min(MAX_ALIAS_WORDS, len(words) - start), 0, -1):
+                phrase = " ".join(words[start:start + size])
+                for entry in self._by_alias.get(phrase, ()):
+                    if entry.type == "commune":
+                        continue
+                    if wanted_commune and entry.commune != wanted_commune:
+                        continue
+                    if best is None or len(phrase) > best[0]:
+                        best = (len(phrase), entry)
+        return best[1] if best else None
+
+    def nearest(self, lat: float, lng: float, max_distance: Optional[float] = None, include_communes: bool = False) -> Optional[Tuple[float, GazetteerEntry]]:
+        """
+        Retourner le lieu le plus proche d'un point (distance en km).
+        """
+        best: Optional[Tuple[float, GazetteerEntry]] = None
+        cos_lat = math.cos(math.radians(lat))
+        for entry in self.entries:
+            if entry.type == "commune" and not include_communes:
+                continue
+            # Approximation équirectangulaire, précise à l'échelle d'une ville
+            dx = (entry.lng - lng) * cos_lat
+            dy = entry.lat - lat
+            distance = math.hypot(dx, dy) * 111.195
+            if best is None or distance < best[0]:
+                best = (distance, entry)
+        if best is None or (max_distance is not None and best[0] > max_distance):
+            return None
+        return best
+
+
+# Gazetteer chargé une seule fois par processus
+gazetteer = Gazetteer.load()
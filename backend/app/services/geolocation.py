@@ -1,10 +1,23 @@
-from typing import Tuple, List, Dict, Any, Optional
-import requests
+from typing import Tuple, List, Dict, Any, Optional, Union, Sequence
+import asyncio
+import httpx
+import logging
 import math
+import numpy as np
 import json
+import time
 from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
 
 from ..core.config import settings
+from .cache import LocalLRUCache, get_cache, set_cache
+from .courier_index import courier_index
+from .gazetteer import gazetteer, normalize_text, GazetteerEntry
+from .commune_classifier import commune_classifier
+from .eta_engine import eta_engine
+from .routing import routing_engine
+
+logger = logging.getLogger(__name__)
 
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
@@ -35,6 +48,8 @@ def calculate_duration(distance: float, traffic_factor: float = 1.0) -> int:
     """
     Calculer la durée estimée en minutes pour parcourir une distance en kilomètres.
     Prend en compte un facteur de trafic (1.0 = normal, > 1.0 = trafic dense).
+    Modèle à vitesse constante, utilisé lorsque le trajet n'est pas connu ;
+    voir `calculate_distance_and_duration` pour l'estimation tenant compte du trafic.
     """
     # Vitesse moyenne en km/h (ajustée pour Abidjan)
     average_speed = 30.0 / traffic_factor
@@ -52,10 +67,14 @@ def calculate_distance_and_duration(
     pickup_lng: Optional[float],
     delivery_lat: Optional[float],
     delivery_lng: Optional[float],
-    traffic_factor: float = 1.0
+    traffic_factor: float = 1.0,
+    departure_time: Optional[datetime] = None
 ) -> Tuple[Optional[float], Optional[int]]:
     """
     Calculer la distance et la durée estimée entre deux points.
+    La distance est celle de l'itinéraire routier si le graphe OSM est chargé,
+    à vol d'oiseau sinon. La durée suit la grille de vitesses (historique, trafic
+    temps réel, signalements) ; `traffic_factor` s'y applique en plus (météo, etc.).
     Retourne (distance en km, durée en minutes).
     """
     # Si les coordonnées ne sont pas fournies, retourner None
@@ -63,137 +82,368 @@ def calculate_distance_and_duration(
         return None, None
     
     # Calculer la distance
-    distance = calculate_distance(pickup_lat, pickup_lng, delivery_lat, delivery_lng)
+    route = routing_engine.route(pickup_lat, pickup_lng, delivery_lat, delivery_lng)
+    if route is not None:
+        distance = route[0]
+    else:
+        distance = calculate_distance(pickup_lat, pickup_lng, delivery_lat, delivery_lng)
     
     # Calculer la durée
-    duration = calculate_duration(distance, traffic_factor)
+    minutes = eta_engine.estimate_minutes(
+        pickup_lat, pickup_lng, delivery_lat, delivery_lng,
+        distance=distance,
+        when=departure_time
+    )
+    duration = int(minutes * traffic_factor)
     
     return distance, duration
 
+def calculate_distance_and_duration_batch(
+    trips: Sequence[Tuple[Optional[float], Optional[float], Optional[float], Optional[float]]],
+    traffic_factor: float = 1.0,
+    departure_time: Optional[datetime] = None
+) -> List[Tuple[Optional[float], Optional[int]]]:
+    """
+    Version par lot de `calculate_distance_and_duration` pour des trajets
+    (lat de ramassage, lng de ramassage, lat de livraison, lng de livraison).
+    Les trajets partageant un même point de ramassage sont calculés ensemble.
+    """
+    results: List[Tuple[Optional[float], Optional[int]]] = [(None, None)] * len(trips)
+    
+    # Regrouper les trajets par point de ramassage
+    groups: Dict[Tuple[float, float], List[int]] = {}
+    for index, (pickup_lat, pickup_lng, delivery_lat, delivery_lng) in enumerate(trips):
+        if not pickup_lat or not pickup_lng or not delivery_lat or not delivery_lng:
+            continue
+        groups.setdefault((pickup_lat, pickup_lng), []).append(index)
+    
+    for (pickup_lat, pickup_lng), indices in groups.items():
+        destinations = [(trips[i][2], trips[i][3]) for i in indices]
+        routes = routing_engine.route_matrix([(pickup_lat, pickup_lng)], destinations)
+        for k, i in enumerate(indices):
+            delivery_lat, delivery_lng = destinations[k]
+            distance = routes[0][0, k] if routes is not None else math.nan
+            if math.isnan(distance):
+                distance = calculate_distance(pickup_lat, pickup_lng, delivery_lat, delivery_lng)
+            minutes = eta_engine.estimate_minutes(
+                pickup_lat, pickup_lng, delivery_lat, delivery_lng,
+                distance=float(distance),
+                when=departure_time
+            )
+            results[i] = (float(distance), int(minutes * traffic_factor))
+    
+    return results
+
+def _as_coordinate_array(points: Union[Sequence[Sequence[float]], np.ndarray]) -> np.ndarray:
+    """
+    Convertir une liste de couples (lat, lng) en tableau NumPy de forme (n, 2).
+    """
+    array = np.asarray(points, dtype=np.float64)
+    if array.size == 0:
+        return array.reshape(0, 2)
+    if array.ndim != 2 or array.shape[1] != 2:
+        raise ValueError("Les coordonnées doivent être des couples (lat, lng)")
+    return array
+
+def distance_matrix(
+    origins: Union[Sequence[Sequence[float]], np.ndarray],
+    destinations: Union[Sequence[Sequence[float]], np.ndarray]
+) -> np.ndarray:
+    """
+    Calculer la matrice des distances (km) entre chaque origine et chaque destination.
+    Formule de Haversine vectorisée : une seule passe NumPy pour toutes les paires.
+    Retourne un tableau de forme (len(origins), len(destinations)).
+    """
+    origins_rad = np.radians(_as_coordinate_array(origins))
+    destinations_rad = np.radians(_as_coordinate_array(destinations))
+    
+    lat1 = origins_rad[:, 0][:, np.newaxis]
+    lon1 = origins_rad[:, 1][:, np.newaxis]
+    lat2 = destinations_rad[:, 0][np.newaxis, :]
+    lon2 = destinations_rad[:, 1][np.newaxis, :]
+    
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def duration_matrix(
+    distances: np.ndarray,
+    traffic_factor: Union[float, np.ndarray] = 1.0
+) -> np.ndarray:
+    """
+    Convertir une matrice de distances (km) en durées estimées (minutes entières).
+    Même modèle que `calculate_duration` ; `traffic_factor` peut être un scalaire
+    ou un tableau diffusable sur la matrice.
+    """
+    average_speed = 30.0 / np.asarray(traffic_factor, dtype=np.float64)
+    return np.floor(distances / average_speed * 60).astype(np.int64)
+
+def calculate_distance_and_duration_matrix(
+    origins: Union[Sequence[Sequence[float]], np.ndarray],
+    destinations: Union[Sequence[Sequence[float]], np.ndarray],
+    traffic_factor: Union[float, np.ndarray] = 1.0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Calculer les matrices de distances (km) et de durées (minutes) entre deux ensembles de points.
+    Les distances sont routières lorsque le graphe OSM est chargé (vol d'oiseau pour
+    les points hors réseau). Le trafic de chaque paire est la moyenne des facteurs de
+    la grille de vitesses à l'origine et à la destination, multipliée par `traffic_factor`.
+    """
+    origins = _as_coordinate_array(origins)
+    destinations = _as_coordinate_array(destinations)
+    distances = distance_matrix(origins, destinations)
+    
+    routes = routing_engine.route_matrix(origins.tolist(), destinations.tolist())
+    if routes is not None:
+        distances = np.where(np.isnan(routes[0]), distances, routes[0])
+    
+    origin_factors = np.array([eta_engine.traffic_factor(lat, lng) for lat, lng in origins], dtype=np.float64)
+    destination_factors = np.array([eta_engine.traffic_factor(lat, lng) for lat, lng in destinations], dtype=np.float64)
+    pair_factors = (origin_factors[:, np.newaxis] + destination_factors[np.newaxis, :]) / 2
+    
+    return distances, duration_matrix(distances, pair_factors * np.asarray(traffic_factor, dtype=np.float64))
+
+def get_commune(lat: Optional[float], lng: Optional[float]) -> Optional[str]:
+    """
+    Déterminer la commune d'un point GPS à partir des limites communales embarquées.
+    Aucun appel réseau ; retourne None hors des communes d'Abidjan.
+    """
+    if lat is None or lng is None:
+        return None
+    return commune_classifier.classify(lat, lng)
+
+def resolve_commune(commune: Optional[str], lat: Optional[float], lng: Optional[float]) -> Optional[str]:
+    """
+    Commune à enregistrer pour une adresse : celle fournie si c'est une commune
+    connue, sinon celle déduite des coordonnées. Les limites embarquées sont
+    approximatives ; elles ne servent qu'à compléter, jamais à corriger.
+    """
+    if commune in settings.COMMUNES:
+        return commune
+    return get_commune(lat, lng) or commune
+
+# Cache local des résultats de géocodage (premier niveau, devant Redis)
+_geocode_cache = LocalLRUCache(maxsize=settings.GEOCODE_LRU_SIZE, ttl=settings.GEOCODE_CACHE_TTL)
+
+# Limitation du débit vers Nominatim (1 requête par seconde maximum selon leur politique)
+_nominatim_lock = asyncio.Lock()
+_last_nominatim_call = 0.0
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org"
+NOMINATIM_HEADERS = {
+    "User-Agent": "LivraisonAbidjanApp/1.0"
+}
+
+def _geocode_key(address: str, commune: str) -> str:
+    return f"geocode:{normalize_text(address)}|{normalize_text(commune)}"
+
+def _reverse_geocode_key(lat: float, lng: float) -> str:
+    precision = settings.GEOCODE_REVERSE_PRECISION
+    return f"reverse_geocode:{lat:.{precision}f}:{lng:.{precision}f}"
+
+async def _get_cached_geocode(key: str) -> Optional[Any]:
+    """
+    Chercher un résultat dans le cache local puis dans Redis.
+    """
+    value = _geocode_cache.get(key)
+    if value is not None:
+        return value
+    
+    try:
+        value = await get_cache(key)
+    except Exception as e:
+        logger.warning(f"Cache Redis de géocodage indisponible: {str(e)}")
+        return None
+    
+    if isinstance(value, dict):
+        _geocode_cache.set(key, value)
+        return value
+    return None
+
+async def _set_cached_geocode(key: str, value: Dict[str, Any], expire: int):
+    _geocode_cache.set(key, value, ttl=expire)
+    try:
+        await set_cache(key, value, expire=expire)
+    except Exception as e:
+        logger.warning(f"Cache Redis de géocodage indisponible: {str(e)}")
+
+async def _nominatim_request(endpoint: str, params: Dict[str, Any]) -> Optional[Any]:
+    """
+    Appeler Nominatim sans bloquer la boucle d'événements, en respectant
+    l'intervalle minimal entre deux requêtes.
+    """
+    global _last_nominatim_call
+    
+    wait = settings.GEOCODER_MIN_INTERVAL_SECONDS - (time.monotonic() - _last_nominatim_call)
+    if wait > 0:
+        await asyncio.sleep(wait)
+    _last_nominatim_call = time.monotonic()
+    
+    try:
+        async with httpx.AsyncClient(timeout=settings.GEOCODER_TIMEOUT_SECONDS, headers=NOMINATIM_HEADERS) as client:
+            response = await client.get(f"{NOMINATIM_URL}/{endpoint}", params={**params, "format": "json"})
+            response.raise_for_status()
+            return response.json()
+    except Exception as e:
+        logger.error(f"Erreur lors de l'appel à Nominatim ({endpoint}): {str(e)}")
+        return None
+
 async def geocode_address(address: str, commune: str) -> Tuple[Optional[float], Optional[float]]:
     """
     Convertir une adresse en coordonnées GPS.
+    Ordre de résolution : cache local, Redis, gazetteer hors ligne d'Abidjan,
+    puis Nominatim pour les adresses inconnues. À défaut, le centre de la commune.
     """
-    # Construire l'adresse complète
-    full_address = f"{address}, {commune}, Abidjan, Côte d'Ivoire"
+    key = _geocode_key(address, commune)
     
-    # Appeler l'API de géocodage (OpenStreetMap Nominatim)
-    url = "https://nominatim.openstreetmap.org/search"
-    params = {
-        "q": full_address,
-        "format": "json",
-        "limit": 1
-    }
-    headers = {
-        "User-Agent": "LivraisonAbidjanApp/1.0"
-    }
+    cached = await _get_cached_geocode(key)
+    if cached is not None:
+        return cached["lat"], cached["lng"]
     
-    try:
-        response = requests.get(url, params=params, headers=headers)
-        data = response.json()
+    # Quartiers et lieux de repère connus
+    entry = gazetteer.lookup(address, commune)
+    if entry:
+        result = {"lat": entry.lat, "lng": entry.lng}
+        await _set_cached_geocode(key, result, settings.GEOCODE_CACHE_TTL)
+        return entry.lat, entry.lng
+    
+    async with _nominatim_lock:
+        # Une requête concurrente a peut-être déjà résolu cette adresse
+        cached = _geocode_cache.get(key)
+        if cached is not None:
+            return cached["lat"], cached["lng"]
         
-        if data and len(data) > 0:
-            lat = float(data[0]["lat"])
-            lon = float(data[0]["lon"])
-            return lat, lon
-        else:
-            return None, None
-    except Exception as e:
-        print(f"Erreur lors du géocodage: {str(e)}")
-        return None, None
+        data = await _nominatim_request("search", {
+            "q": f"{address}, {commune}, Abidjan, Côte d'Ivoire",
+            "limit": 1
+        })
+        
+        if data:
+            result = {"lat": float(data[0]["lat"]), "lng": float(data[0]["lon"])}
+            await _set_cached_geocode(key, result, settings.GEOCODE_CACHE_TTL)
+            return result["lat"], result["lng"]
+        
+        # Adresse introuvable : se rabattre sur le centre de la commune
+        commune_entry = gazetteer.commune(commune)
+        result = {
+            "lat": commune_entry.lat if commune_entry else None,
+            "lng": commune_entry.lng if commune_entry else None
+        }
+        await _set_cached_geocode(key, result, settings.GEOCODE_NEGATIVE_CACHE_TTL)
+        return result["lat"], result["lng"]
+
+def _gazetteer_address(entry: GazetteerEntry, lat: float, lng: float) -> Dict[str, Any]:
+    commune = get_commune(lat, lng) or entry.commune
+    return {
+        "address": f"{entry.name}, {commune}, Abidjan, Côte d'Ivoire",
+        "commune": commune,
+        "city": "Abidjan",
+        "country": "Côte d'Ivoire"
+    }
 
 async def reverse_geocode(lat: float, lng: float) -> Dict[str, Any]:
     """
     Convertir des coordonnées GPS en adresse.
+    Les coordonnées sont regroupées en cellules (~100 m) pour le cache ; un lieu
+    connu du gazetteer à proximité évite l'appel réseau.
     """
-    # Appeler l'API de géocodage inverse (OpenStreetMap Nominatim)
-    url = "https://nominatim.openstreetmap.org/reverse"
-    params = {
-        "lat": lat,
-        "lon": lng,
-        "format": "json"
-    }
-    headers = {
-        "User-Agent": "LivraisonAbidjanApp/1.0"
-    }
+    key = _reverse_geocode_key(lat, lng)
     
-    try:
-        response = requests.get(url, params=params, headers=headers)
-        data = response.json()
+    cached = await _get_cached_geocode(key)
+    if cached is not None:
+        return cached
+    
+    nearby = gazetteer.nearest(lat, lng, max_distance=settings.GEOCODE_GAZETTEER_RADIUS_KM)
+    if nearby:
+        result = _gazetteer_address(nearby[1], lat, lng)
+        await _set_cached_geocode(key, result, settings.GEOCODE_CACHE_TTL)
+        return result
+    
+    async with _nominatim_lock:
+        cached = _geocode_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        data = await _nominatim_request("reverse", {"lat": lat, "lon": lng})
         
-        if "address" in data:
-            return {
+        if data and "address" in data:
+            result = {
                 "address": data.get("display_name", ""),
-                "commune": data.get("address", {}).get("suburb", ""),
+                "commune": get_commune(lat, lng) or data.get("address", {}).get("suburb", ""),
                 "city": data.get("address", {}).get("city", "Abidjan"),
                 "country": data.get("address", {}).get("country", "Côte d'Ivoire")
             }
-        else:
-            return {
-                "address": "Adresse inconnue",
-                "commune": "",
-                "city": "Abidjan",
-                "country": "Côte d'Ivoire"
-            }
-    except Exception as e:
-        print(f"Erreur lors du géocodage inverse: {str(e)}")
-        return {
-            "address": "Erreur de géocodage",
-            "commune": "",
-            "city": "Abidjan",
-            "country": "Côte d'Ivoire"
-        }
+            await _set_cached_geocode(key, result, settings.GEOCODE_CACHE_TTL)
+            return result
+    
+    # Réseau indisponible ou point inconnu : lieu le plus proche du gazetteer, sans cache durable
+    nearby = gazetteer.nearest(lat, lng)
+    if nearby:
+        result = _gazetteer_address(nearby[1], lat, lng)
+        await _set_cached_geocode(key, result, settings.GEOCODE_NEGATIVE_CACHE_TTL)
+        return result
+    
+    return {
+        "address": "Adresse inconnue",
+        "commune": "",
+        "city": "Abidjan",
+        "country": "Côte d'Ivoire"
+    }
 
-async def get_traffic_info(lat: float, lng: float, radius: float = 1.0) -> Dict[str, Any]:
+async def get_traffic_info(lat: float, lng: float, radius: float = 1.0, db: Optional[Session] = None) -> Dict[str, Any]:
     """
-    Obtenir les informations de trafic autour d'un point.
+    Obtenir les informations de trafic autour d'un point, à partir de la grille de vitesses
+    (rafraîchie en tâche de fond par `eta_refresh_loop`).
     """
-    # Dans un environnement réel, on utiliserait une API de trafic
-    # Pour le développement, on simule des données de trafic
+    traffic_factor = eta_engine.traffic_factor(lat, lng, radius)
+    if traffic_factor < 1.2:
+        congestion_level = "low"
+    elif traffic_factor < 1.6:
+        congestion_level = "medium"
+    else:
+        congestion_level = "high"
     
-    # Générer un facteur de trafic aléatoire entre 1.0 et 2.0
-    import random
-    traffic_factor = 1.0 + random.random()
+    last_updated = eta_engine.last_refresh or datetime.utcnow()
     
     return {
         "traffic_factor": traffic_factor,
-        "congestion_level": "medium" if traffic_factor < 1.5 else "high",
-        "last_updated": datetime.now().isoformat()
+        "congestion_level": congestion_level,
+        "average_speed": settings.ETA_DEFAULT_SPEED_KMH / traffic_factor,
+        "last_updated": last_updated.isoformat()
     }
 
-async def find_nearest_couriers(lat: float, lng: float, max_distance: float = 5.0, limit: int = 5) -> List[Dict[str, Any]]:
+async def find_nearest_couriers(
+    lat: float,
+    lng: float,
+    max_distance: float = 5.0,
+    limit: int = 5,
+    vehicle_type: Optional[Union[str, List[str]]] = None,
+    db: Optional[Session] = None
+) -> List[Dict[str, Any]]:
     """
-    Trouver les coursiers les plus proches d'un point.
+    Trouver les coursiers en ligne les plus proches d'un point.
+    Utilise l'index spatial en mémoire, synchronisé avec la base si une session est fournie.
     """
-    # Dans un environnement réel, on interrogerait la base de données
-    # Pour le développement, on simule des données
-    
-    # Simuler des coursiers à proximité
-    import random
+    if db is not None and courier_index.needs_sync():
+        courier_index.sync_from_db(db)
     
-    couriers = []
-    for i in range(limit):
-        # Générer des coordonnées aléatoires dans un rayon de max_distance
-        distance = random.uniform(0.1, max_distance)
-        bearing = random.uniform(0, 360)
-        
-        # Convertir distance (km) et bearing (degrés) en delta lat/lng
-        earth_radius = 6371.0
-        delta_lat = distance * math.cos(math.radians(bearing)) / earth_radius
-        delta_lng = distance * math.sin(math.radians(bearing)) / (earth_radius * math.cos(math.radians(lat)))
-        
-        courier_lat = lat + math.degrees(delta_lat)
-        courier_lng = lng + math.degrees(delta_lng)
-        
-        couriers.append({
-            "courier_id": i + 1,
-            "distance": distance,
-            "lat": courier_lat,
-            "lng": courier_lng,
-            "estimated_arrival_time": int(distance * 2)  # 2 minutes par km
-        })
+    vehicle_types = [vehicle_type] if isinstance(vehicle_type, str) else vehicle_type
     
-    # Trier par distance
-    couriers.sort(key=lambda x: x["distance"])
+    nearest = courier_index.nearest(
+        lat, lng,
+        k=limit,
+        max_distance=max_distance,
+        vehicle_types=vehicle_types
+    )
     
-    return couriers
+    return [
+        {
+            "courier_id": position.courier_id,
+            "distance": distance,
+            "lat": position.lat,
+            "lng": position.lng,
+            "vehicle_type": position.vehicle_type,
+            "last_location_updated": position.updated_at.isoformat(),
+            "estimated_arrival_time": eta_engine.estimate_duration(position.lat, position.lng, lat, lng, distance=distance)
+        }
+        for distance, position in nearest
+    ]
@@ -0,0 +1,408 @@
+from typing import Dict, List, Optional, Tuple, Any, Sequence
+from dataclasses import dataclass, field
+import logging
+import math
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.exceptions import NotFoundError, BadRequestError, ForbiddenError
+from .assignment import VEHICLE_CAPACITY_KG, package_weight
+from .geolocation import calculate_distance
+from .tour_planner import PACKAGE_SIZE_VOLUME_M3
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PackageItem:
+    delivery_id: int
+    weight: float  # en kg
+    volume: float  # en m³
+    distance: Optional[float] = None  # trajet ramassage → livraison, en km
+
+
+@dataclass
+class VehicleBin:
+    """
+    Capacité d'un véhicule ; None signifie sans limite connue.
+    """
+    vehicle_id: int
+    vehicle_type: Optional[str] = None
+    name: Optional[str] = None
+    max_weight: Optional[float] = None
+    max_volume: Optional[float] = None
+    max_distance: Optional[float] = None
+
+    @property
+    def size(self) -> Tuple[float, float]:
+        return (
+            math.inf if self.max_weight is None else self.max_weight,
+            math.inf if self.max_volume is None else self.max_volume,
+        )
+
+    def carries(self, item: PackageItem) -> bool:
+        """
+        Le colis seul tient-il dans le véhicule, et le trajet est-il dans son rayon d'action ?
+        """
+        if self.max_distance is not None and item.distance is not None and item.distance > self.max_distance:
+            return False
+        max_weight, max_volume = self.size
+        return item.weight <= max_weight and item.volume <= max_volume
+
+
+@dataclass
+class VehicleLoad:
+    vehicle: VehicleBin
+    items: List[PackageItem] = field(default_factory=list)
+    weight: float = 0.0
+    volume: float = 0.0
+
+    def slack_after(self, item: PackageItem) -> Optional[float]:
+        """
+        Place restante (part de la capacité) après ajout du colis, ou None s'il ne tient pas.
+        """
+        if not self.vehicle.carries(item):
+            return None
+        max_weight, max_volume = self.vehicle.size
+        weight, volume = self.weight + item.weight, self.volume + item.volume
+        if weight > max_weight or volume > max_volume:
+            return None
+        # Dimension la plus contraignante : un chargement limité par le volume est plein même léger
+        return min(
+            1.0 - weight / max_weight if max_weight < math.inf else 1.0,
+            1.0 - volume / max_volume if max_volume < math.inf else 1.0,
+        )
+
+    def add(self, item: PackageItem) -> None:
+        self.items.append(item)
+        self.weight += item.weight
+        self.volume += item.volume
+
+    def holds_in(self, vehicle: VehicleBin) -> bool:
+        max_weight, max_volume = vehicle.size
+        return self.weight <= max_weight and self.volume <= max_volume and all(vehicle.carries(item) for item in self.items)
+
+
+@dataclass
+class LoadPlan:
+    loads: List[VehicleLoad]
+    unplaced: List[PackageItem]
+    lower_bound: int  # nombre minimal de véhicules, toutes capacités confondues
+
+
+def check_vehicle_load(vehicle: VehicleBin, items: Sequence[PackageItem]) -> Optional[str]:
+    """
+    Raison pour laquelle les colis ne peuvent pas voyager ensemble dans le véhicule, ou None.
+    """
+    for item in items:
+        if vehicle.max_distance is not None and item.distance is not None and item.distance > vehicle.max_distance:
+            return f"La livraison {item.delivery_id} dépasse le rayon d'action du véhicule ({vehicle.max_distance:g} km)"
+    max_weight, max_volume = vehicle.size
+    weight = sum(item.weight for item in items)
+    if weight > max_weight:
+        return f"Charge totale de {weight:g} kg supérieure à la capacité du véhicule ({max_weight:g} kg)"
+    volume = sum(item.volume for item in items)
+    if volume > max_volume:
+        return f"Volume total de {volume:g} m³ supérieur à la capacité du véhicule ({max_volume:g} m³)"
+    return None
+
+
+def _lower_bound(items: Sequence[PackageItem], vehicles: Sequence[VehicleBin]) -> int:
+    """
+    Nombre minimal de véhicules dont les capacités cumulées couvrent la charge
+    et le volume totaux.
+    """
+    if not items:
+        return 0
+    bound = 1
+    for dimension, total in ((0, sum(item.weight for item in items)), (1, sum(item.volume for item in items))):
+        capacity, count = 0.0, 0
+        for size in sorted((vehicle.size[dimension] for vehicle in vehicles), reverse=True):
+            if capacity >= total - 1e-9:
+                break
+            capacity += size
+            count += 1
+        bound = max(bound, count)
+    return bound
+
+
+def _best_fit(loads: Sequence[VehicleLoad], item: PackageItem) -> Optional[VehicleLoad]:
+    best, best_slack = None, math.inf
+    for load in loads:
+        slack = load.slack_after(item)
+        if slack is not None and slack < best_slack:
+            best, best_slack = load, slack
+    return best
+
+
+def _downsize(loads: List[VehicleLoad], free: List[VehicleBin]) -> None:
+    """
+    Donner à chaque chargement le plus petit véhicule libre qui le contient, en
+    servant d'abord les plus lourds : les gros véhicules restent disponibles.
+    """
+    for load in sorted(loads, key=lambda l: (l.weight, l.volume), reverse=True):
+        candidates = [vehicle for vehicle in free if vehicle.size < load.vehicle.size and load.holds_in(vehicle)]
+        if candidates:
+            smallest = min(candidates, key=lambda v: v.size)
+            free.remove(smallest)
+            free.append(load.vehicle)
+            load.vehicle = smallest
+
+
+def plan_loads(items: Sequence[PackageItem], vehicles: Sequence[VehicleBin]) -> LoadPlan:
+    """
+    Répartir les colis dans le moins de véhicules possible (bin packing à deux
+    dimensions, poids et volume, sur une flotte hétérogène).
+
+    Best-Fit Decreasing : les colis, triés du plus encombrant au plus petit, vont
+    dans le chargement ouvert où ils laissent le moins de place ; à défaut on
+    ouvre le plus grand véhicule libre qui les accepte. Chaque chargement passe
+    ensuite au plus petit véhicule suffisant, puis on tente de vider les
+    chargements les moins remplis dans les autres. O(colis × véhicules).
+    """
+    if not vehicles:
+        return LoadPlan([], list(items), 0)
+
+    largest_weight = max(vehicle.size[0] for vehicle in vehicles)
+    largest_volume = max(vehicle.size[1] for vehicle in vehicles)
+
+    def footprint(item: PackageItem) -> float:
+        return max(
+            item.weight / largest_weight if largest_weight < math.inf else 0.0,
+            item.volume / largest_volume if largest_volume < math.inf else 0.0,
+        )
+
+    free = sorted(vehicles, key=lambda v: v.size, reverse=True)
+    loads: List[VehicleLoad] = []
+    unplaced: List[PackageItem] = []
+    placeable: List[PackageItem] = []
+
+    for item in sorted(items, key=footprint, reverse=True):
+        load = _best_fit(loads, item)
+        if load is None:
+            vehicle = next((v for v in free if v.carries(item)), None)
+            if vehicle is None:
+                # Aucun véhicule libre ne convient : flotte insuffisante ou colis hors normes
+                unplaced.append(item)
+                continue
+            free.remove(vehicle)
+            load = VehicleLoad(vehicle)
+            loads.append(load)
+        load.add(item)
+        placeable.append(item)
+
+    _downsize(loads, free)
+
+    # Vider les chargements les moins remplis dans les autres quand c'est possible
+    for load in sorted(loads, key=lambda l: (len(l.items), l.weight)):
+        if len(loads) <= 1:
+            break
+        moves = []
+        staged: Dict[int, Tuple[float, float]] = {}
+        for item in sorted(load.items, key=footprint, reverse=True):
+            target = None
+            for other in loads:
+                if other is load or not other.vehicle.carries(item):
+                    continue
+                extra_weight, extra_volume = staged.get(id(other), (0.0, 0.0))
+                max_weight, max_volume = other.vehicle.size
+                if other.weight + extra_weight + item.weight <= max_weight and other.volume + extra_volume + item.volume <= max_volume:
+                    target = other
+                    break
+            if target is None:
+                break
+            extra_weight, extra_volume = staged.get(id(target), (0.0, 0.0))
+            staged[id(target)] = (extra_weight + item.weight, extra_volume + item.volume)
+            moves.append((item, target))
+        if len(moves) == len(load.items):
+            for item, target in moves:
+                target.add(item)
+            loads.remove(load)
+            free.append(load.vehicle)
+
+    _downsize(loads, free)
+    loads.sort(key=lambda l: l.vehicle.size, reverse=True)
+    return LoadPlan(loads, unplaced, _lower_bound(placeable, vehicles))
+
+
+def package_item(delivery: Any) -> PackageItem:
+    """
+    Colis d'une livraison, avec les estimations par taille quand le poids manque.
+    """
+    distance = None
+    if delivery.pickup_lat and delivery.pickup_lng and delivery.delivery_lat and delivery.delivery_lng:
+        distance = calculate_distance(delivery.pickup_lat, delivery.pickup_lng, delivery.delivery_lat, delivery.delivery_lng)
+    return PackageItem(
+        delivery_id=delivery.id,
+        weight=package_weight(delivery.package_weight, delivery.package_size),
+        volume=PACKAGE_SIZE_VOLUME_M3.get(delivery.package_size or "small", PACKAGE_SIZE_VOLUME_M3["small"]),
+        distance=distance,
+    )
+
+
+def vehicle_bin(vehicle: Any) -> VehicleBin:
+    """
+    Capacité d'un véhicule, à défaut la capacité indicative de son type.
+    """
+    return VehicleBin(
+        vehicle_id=vehicle.id,
+        vehicle_type=vehicle.type,
+        name=vehicle.name,
+        max_weight=vehicle.max_weight or VEHICLE_CAPACITY_KG.get(vehicle.type),
+        max_volume=vehicle.max_volume,
+        max_distance=vehicle.max_distance,
+    )
+
+
+def primary_vehicle_id(courier_id: Any) -> Any:
+    """
+    Sous-requête du véhicule principal d'un coursier (valeur ou colonne
+    corrélée), pour le lire dans la requête de l'appelant.
+    """
+    from ..models.transport import CourierVehicle
+
+    return select(CourierVehicle.vehicle_id).where(
+        CourierVehicle.courier_id == courier_id
+    ).order_by(CourierVehicle.is_primary.desc()).limit(1).scalar_subquery()
+
+
+def courier_bin(vehicle: Any, profile_vehicle_type: Any) -> Optional[VehicleBin]:
+    """
+    Capacité d'un coursier, à partir de son véhicule principal déjà lu ou, à
+    défaut, du type de véhicule de son profil.
+    """
+    if vehicle is not None:
+        return vehicle_bin(vehicle)
+    vehicle_type = getattr(profile_vehicle_type, "value", profile_vehicle_type)
+    if vehicle_type is None:
+        return None
+    return VehicleBin(vehicle_id=0, vehicle_type=vehicle_type, max_weight=VEHICLE_CAPACITY_KG.get(vehicle_type))
+
+
+def courier_vehicle_bin(db: Session, courier_id: int) -> Optional[VehicleBin]:
+    """
+    Véhicule principal du coursier, à défaut le type de véhicule de son profil.
+    """
+    from ..models.transport import Vehicle
+    from ..models.user import CourierProfile
+
+    vehicle = db.query(Vehicle).filter(Vehicle.id == primary_vehicle_id(courier_id)).first()
+    if vehicle is not None:
+        return vehicle_bin(vehicle)
+
+    profile = db.query(CourierProfile).filter(CourierProfile.user_id == courier_id).first()
+    return courier_bin(None, profile.vehicle_type if profile else None)
+
+
+def ensure_vehicle_can_carry(vehicle: Optional[VehicleBin], delivery: Any) -> None:
+    """
+    Refuser un colis que le véhicule (déjà lu) ne peut pas transporter.
+    """
+    if vehicle is None:
+        return
+    reason = check_vehicle_load(vehicle, [package_item(delivery)])
+    if reason:
+        raise BadRequestError(reason)
+
+
+def ensure_courier_can_carry(db: Session, delivery: Any, courier_id: int) -> None:
+    """
+    Refuser l'affectation d'un colis que le véhicule du coursier ne peut pas transporter.
+    """
+    ensure_vehicle_can_carry(courier_vehicle_bin(db, courier_id), delivery)
+
+
+def _pending_deliveries(db: Session, client_id: Optional[int], delivery_ids: Optional[List[int]]) -> List[Any]:
+    from ..models.delivery import Delivery, OPEN_STATUSES
+
+    query = db.query(Delivery).filter(
+        Delivery.courier_id.is_(None),
+        Delivery.status.in_(OPEN_STATUSES)
+    )
+    if client_id is not None:
+        query = query.filter(Delivery.client_id == client_id)
+    if delivery_ids:
+        query = query.filter(Delivery.id.in_(delivery_ids))
+    # Une ligne de plus que le maximum : un plan tronqué paraîtrait complet
+    deliveries = query.order_by(Delivery.id).limit(settings.LOAD_PLAN_MAX_PACKAGES + 1).all()
+    if len(deliveries) > settings.LOAD_PLAN_MAX_PACKAGES:
+        raise BadRequestError(
+            f"Plus de {settings.LOAD_PLAN_MAX_PACKAGES} livraisons en attente : "
+            "préciser les livraisons à regrouper (delivery_ids)"
+        )
+    return deliveries
+
+
+def _available_vehicles(db: Session, vehicle_ids: Optional[List[int]]) -> List[Any]:
+    from ..models.transport import Vehicle, VehicleStatus
+
+    query = db.query(Vehicle).filter(Vehicle.status == VehicleStatus.ACTIVE.value)
+    if vehicle_ids:
+        query = query.filter(Vehicle.id.in_(vehicle_ids))
+    return query.limit(settings.LOAD_PLAN_MAX_VEHICLES).all()
+
+
+def _load_response(load: VehicleLoad) -> Dict[str, Any]:
+    max_weight, max_volume = load.vehicle.size
+    return {
+        "vehicle_id": load.vehicle.vehicle_id,
+        "vehicle_type": load.vehicle.vehicle_type,
+        "vehicle_name": load.vehicle.name,
+        "delivery_ids": [item.delivery_id for item in load.items],
+        "total_weight": load.weight,
+        "total_volume": load.volume,
+        "weight_utilization": load.weight / max_weight if max_weight < math.inf else None,
+        "volume_utilization": load.volume / max_volume if max_volume < math.inf else None
+    }
+
+
+def plan_pending_loads(
+    db: Session,
+    client_id: Optional[int] = None,
+    delivery_ids: Optional[List[int]] = None,
+    vehicle_ids: Optional[List[int]] = None
+) -> Dict[str, Any]:
+    """
+    Proposer un regroupement des livraisons en attente d'un client dans les véhicules actifs.
+    """
+    deliveries = _pending_deliveries(db, client_id, delivery_ids)
+    vehicles = _available_vehicles(db, vehicle_ids)
+    if not vehicles:
+        raise NotFoundError("Aucun véhicule disponible")
+
+    plan = plan_loads([package_item(d) for d in deliveries], [vehicle_bin(v) for v in vehicles])
+    return {
+        "loads": [_load_response(load) for load in plan.loads],
+        "unplaced_delivery_ids": [item.delivery_id for item in plan.unplaced],
+        "vehicle_count": len(plan.loads),
+        "lower_bound": plan.lower_bound
+    }
+
+
+def check_delivery_load(db: Session, vehicle_id: int, delivery_ids: List[int], client_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Vérifier que des livraisons peuvent partir ensemble dans un véhicule.
+    """
+    from ..models.transport import Vehicle
+    from ..models.delivery import Delivery
+
+    vehicle = db.query(Vehicle).filter(Vehicle.id == vehicle_id).first()
+    if not vehicle:
+        raise NotFoundError("Véhicule non trouvé")
+    deliveries = db.query(Delivery).filter(Delivery.id.in_(delivery_ids)).all()
+    if len(deliveries) != len(set(delivery_ids)):
+        raise NotFoundError("Livraison non trouvée")
+    if client_id is not None and any(d.client_id != client_id for d in deliveries):
+        raise ForbiddenError("Vous n'êtes pas le client de ces livraisons")
+
+    items = [package_item(d) for d in deliveries]
+    reason = check_vehicle_load(vehicle_bin(vehicle), items)
+    return {
+        "vehicle_id": vehicle.id,
+        "fits": reason is None,
+        "reason": reason,
+        "total_weight": sum(item.weight for item in items),
+        "total_volume": sum(item.volume for item in items)
+    }
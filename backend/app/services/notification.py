@@ -1,7 +1,9 @@
 from sqlalchemy.orm import Session
-from typing import Optional, List, Dict, Any, Union
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert, select
+from typing import Optional, List, Dict, Any, Union, Sequence
 from datetime import datetime
-import requests
+import httpx
 import json
 import logging
 
@@ -9,6 +11,7 @@ from ..core.config import settings
 from ..models.notification import Notification, NotificationType, NotificationStatus, NotificationChannel
 from ..models.user import User, UserRole
 from ..db.session import get_db
+from ..db.base import AsyncSessionLocal
 
 logger = logging.getLogger(__name__)
 
@@ -143,58 +146,7 @@ class NotificationService:
         """
         Envoyer une notification push via OneSignal.
         """
-        url = "https://onesignal.com/api/v1/notifications"
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Basic {settings.ONESIGNAL_API_KEY}"
-        }
-        
-        # Préparer les données spécifiques à l'application
-        app_data = {
-            "app_id": settings.ONESIGNAL_APP_ID,
-            "include_external_user_ids": [str(user.id)],
-            "contents": {"en": message, "fr": message},
-            "headings": {"en": title, "fr": title},
-            "data": data or {}
-        }
-        
-        # Ajouter des options spécifiques selon le type d'appareil
-        if data and "device_type" in data:
-            if data["device_type"] == "android":
-                app_data["android_channel_id"] = "livraison_abidjan_channel"
-                app_data["android_accent_color"] = "FF9800"
-                app_data["android_group"] = "livraison_abidjan"
-            elif data["device_type"] == "ios":
-                app_data["ios_sound"] = "notification.wav"
-                app_data["ios_badgeType"] = "Increase"
-                app_data["ios_badgeCount"] = 1
-        
-        # Ajouter des boutons d'action si nécessaire
-        if data and "action_buttons" in data:
-            app_data["buttons"] = data["action_buttons"]
-        
-        # Ajouter une image si nécessaire
-        if data and "image_url" in data:
-            app_data["big_picture"] = data["image_url"]  # Android
-            app_data["ios_attachments"] = {"id": data["image_url"]}  # iOS
-        
-        try:
-            response = requests.post(url, json=app_data, headers=headers)
-            
-            if response.status_code == 200:
-                result = response.json()
-                return {
-                    "status": "success",
-                    "id": result.get("id"),
-                    "recipients": result.get("recipients")
-                }
-            else:
-                logger.error(f"Erreur OneSignal: {response.text}")
-                return {"status": "error", "message": response.text}
-        except Exception as e:
-            logger.error(f"Exception OneSignal: {str(e)}")
-            return {"status": "error", "message": str(e)}
+        return await send_push_notifications([user.id], title, message, data)
     
     async def send_sms_notification(self, phone: str, message: str) -> Dict[str, Any]:
         """
@@ -442,6 +394,148 @@ class NotificationService:
         return notifications
 
 # Fonctions utilitaires pour les appels directs
+ONESIGNAL_URL = "https://onesignal.com/api/v1/notifications"
+# Nombre maximal d'identifiants externes par appel OneSignal
+ONESIGNAL_MAX_RECIPIENTS = 2000
+
+def _push_payload(user_ids: Sequence[int], title: str, message: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # Préparer les données spécifiques à l'application
+    app_data = {
+        "app_id": settings.ONESIGNAL_APP_ID,
+        "include_external_user_ids": [str(user_id) for user_id in user_ids],
+        "contents": {"en": message, "fr": message},
+        "headings": {"en": title, "fr": title},
+        "data": data or {}
+    }
+    
+    # Ajouter des options spécifiques selon le type d'appareil
+    if data and "device_type" in data:
+        if data["device_type"] == "android":
+            app_data["android_channel_id"] = "livraison_abidjan_channel"
+            app_data["android_accent_color"] = "FF9800"
+            app_data["android_group"] = "livraison_abidjan"
+        elif data["device_type"] == "ios":
+            app_data["ios_sound"] = "notification.wav"
+            app_data["ios_badgeType"] = "Increase"
+            app_data["ios_badgeCount"] = 1
+    
+    # Ajouter des boutons d'action si nécessaire
+    if data and "action_buttons" in data:
+        app_data["buttons"] = data["action_buttons"]
+    
+    # Ajouter une image si nécessaire
+    if data and "image_url" in data:
+        app_data["big_picture"] = data["image_url"]  # Android
+        app_data["ios_attachments"] = {"id": data["image_url"]}  # iOS
+    
+    return app_data
+
+async def send_push_notifications(
+    user_ids: Sequence[int],
+    title: str,
+    message: str,
+    data: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Envoyer une notification push via OneSignal à plusieurs utilisateurs,
+    par paquets, sans bloquer la boucle d'événements.
+    """
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Basic {settings.ONESIGNAL_API_KEY}"
+    }
+    
+    ids, recipients = [], 0
+    try:
+        async with httpx.AsyncClient(timeout=10) as client:
+            for start in range(0, len(user_ids), ONESIGNAL_MAX_RECIPIENTS):
+                chunk = user_ids[start:start + ONESIGNAL_MAX_RECIPIENTS]
+                response = await client.post(ONESIGNAL_URL, json=_push_payload(chunk, title, message, data), headers=headers)
+                
+                if response.status_code != 200:
+                    logger.error(f"Erreur OneSignal: {response.text}")
+                    return {"status": "error", "message": response.text}
+                
+                result = response.json()
+                ids.append(result.get("id"))
+                recipients += result.get("recipients") or 0
+    except Exception as e:
+        logger.error(f"Exception OneSignal: {str(e)}")
+        return {"status": "error", "message": str(e)}
+    
+    return {
+        "status": "success",
+        "id": ids[0] if len(ids) == 1 else ids,
+        "recipients": recipients
+    }
+
+async def create_notifications_async(
+    db: AsyncSession,
+    user_ids: Sequence[int],
+    title: str,
+    message: str,
+    notification_type: str = "system",
+    data: Optional[Dict[str, Any]] = None,
+    channel: str = "in_app"
+) -> List[int]:
+    """
+    Enregistrer la même notification pour plusieurs utilisateurs en un seul INSERT.
+    """
+    if not user_ids:
+        return []
+    
+    payload = json.dumps(data) if data else None
+    ids = (await db.scalars(
+        insert(Notification).returning(Notification.id, sort_by_parameter_order=True),
+        [
+            {
+                "user_id": user_id,
+                "type": notification_type,
+                "title": title,
+                "message": message,
+                "data": payload,
+                "channel": channel,
+                "status": NotificationStatus.sent
+            }
+            for user_id in user_ids
+        ]
+    )).all()
+    await db.commit()
+    return list(ids)
+
+async def send_delivery_notification(
+    delivery_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    message: Optional[str] = None,
+    db: Any = None
+) -> List[int]:
+    """
+    Notifier un utilisateur d'une mise à jour de livraison, ou, sans user_id,
+    les coursiers d'une nouvelle livraison. Prévue pour les tâches de fond :
+    elle ouvre sa propre session asynchrone, la session `db` de la requête
+    étant déjà fermée quand la tâche s'exécute.
+    """
+    async with AsyncSessionLocal() as session:
+        if user_id:
+            recipients = [user_id]
+            title = "Mise à jour de livraison"
+            text = message or f"Mise à jour de la livraison #{delivery_id}"
+        else:
+            # Dans un environnement réel, on filtrerait les coursiers par proximité
+            recipients = list((await session.scalars(select(User.id).where(User.role == UserRole.courier))).all())
+            title = "Nouvelle livraison disponible"
+            text = message or f"Nouvelle livraison disponible #{delivery_id}"
+        
+        data = {"delivery_id": delivery_id}
+        notification_ids = await create_notifications_async(
+            session, recipients, title, text,
+            notification_type="delivery_status", data=data, channel="push"
+        )
+    
+    if recipients:
+        await send_push_notifications(recipients, title, text, data)
+    return notification_ids
+
 async def send_sms_notification(phone: str, message: str) -> Dict[str, Any]:
     """
     Fonction utilitaire pour envoyer un SMS directement.
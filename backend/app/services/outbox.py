@@ -0,0 +1,87 @@
+from typing import List
+from datetime import datetime
+import asyncio
+import json
+import logging
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.outbox import OutboxEvent
+from .cache import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# Canal Redis par type d'agrégat : events:delivery, ...
+EVENTS_CHANNEL = "events:{aggregate_type}"
+
+
+def _lock_pending_events(db: Session, batch_size: int) -> List[OutboxEvent]:
+    """
+    Verrouiller (SKIP LOCKED) le prochain lot d'événements non publiés ; la
+    transaction reste ouverte jusqu'au marquage du lot.
+    """
+    events: List[OutboxEvent] = db.query(OutboxEvent).filter(
+        OutboxEvent.published_at.is_(None)
+    ).order_by(OutboxEvent.id).limit(batch_size).with_for_update(skip_locked=True).all()
+    if not events:
+        db.rollback()
+    return events
+
+
+def _mark_published(db: Session, events: List[OutboxEvent]) -> None:
+    now = datetime.utcnow()
+    for event in events:
+        event.published_at = now
+    db.commit()
+
+
+async def publish_pending_events(db: Session, batch_size: int = 100) -> int:
+    """
+    Publier un lot d'événements de l'outbox, dans l'ordre d'écriture. Les lignes
+    sont verrouillées (SKIP LOCKED) : plusieurs relais peuvent tourner sans
+    publier deux fois le même lot. Un événement est marqué publié seulement
+    après l'envoi sur Redis (livraison au moins une fois). Les requêtes
+    synchrones passent par un thread, hors de la boucle d'événements.
+    """
+    events = await asyncio.to_thread(_lock_pending_events, db, batch_size)
+    if not events:
+        return 0
+
+    try:
+        r = await get_redis_connection()
+        pipe = r.pipeline(transaction=False)
+        for event in events:
+            pipe.publish(EVENTS_CHANNEL.format(aggregate_type=event.aggregate_type), json.dumps({
+                "id": event.id,
+                "type": event.event_type,
+                "aggregate_id": event.aggregate_id,
+                "payload": event.payload
+            }))
+        await pipe.execute()
+    except Exception:
+        await asyncio.to_thread(db.rollback)
+        raise
+
+    await asyncio.to_thread(_mark_published, db, events)
+    return len(events)
+
+
+async def outbox_relay_loop() -> None:
+    """
+    Boucle de publication de l'outbox, lancée au démarrage de l'API.
+    """
+    from ..db.session import SessionLocal
+
+    while True:
+        db = SessionLocal()
+        try:
+            published = await publish_pending_events(db, settings.OUTBOX_BATCH_SIZE)
+        except Exception as e:
+            published = 0
+            logger.error(f"Erreur lors de la publication de l'outbox: {str(e)}")
+        finally:
+            await asyncio.to_thread(db.close)
+        # Lot plein : il reste sans doute des événements, on enchaîne
+        if published < settings.OUTBOX_BATCH_SIZE:
+            await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL_SECONDS)
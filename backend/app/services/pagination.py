@@ -0,0 +1,95 @@
+from typing import Any, List, Optional, Sequence, Tuple
+from datetime import datetime
+import base64
+import binascii
+
+from sqlalchemy import desc, tuple_
+from sqlalchemy.orm import Query
+
+from ..core.exceptions import BadRequestError
+
+# En-tête HTTP portant le curseur de la page suivante
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, item_id: int) -> str:
+    """
+    Curseur opaque désignant la position (created_at, id) d'une ligne.
+    """
+    raw = f"{created_at.isoformat()}|{item_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, item_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise BadRequestError("Curseur de pagination invalide")
+
+
+def encode_rank_cursor(rank: float, item_id: int) -> str:
+    """
+    Curseur opaque désignant la position (score, id) d'un résultat classé.
+    """
+    raw = f"{rank!r}|{item_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        rank, item_id = raw.rsplit("|", 1)
+        return float(rank), int(item_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise BadRequestError("Curseur de pagination invalide")
+
+
+def keyset_select(stmt: Any, model: Any, limit: int, cursor: Optional[str] = None) -> Any:
+    """
+    Restreindre une requête (Query ou select) à la page de `limit` lignes
+    triées de la plus récente à la plus ancienne, après le curseur. La
+    comparaison de ligne (created_at, id) < (c, i) parcourt l'index
+    composite : le coût ne dépend pas de la profondeur de la page.
+    """
+    if cursor:
+        created_at, item_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(model.created_at, model.id) < (created_at, item_id))
+    return stmt.order_by(desc(model.created_at), desc(model.id)).limit(limit)
+
+
+def keyset_paginate(query: Query, model: Any, limit: int, cursor: Optional[str] = None) -> List[Any]:
+    return keyset_select(query, model, limit, cursor).all()
+
+
+def next_cursor(items: Sequence[Any], limit: int) -> Optional[str]:
+    """
+    Curseur de la page suivante, ou None quand la page est la dernière.
+    """
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(last.created_at, last.id)
+
+
+def ranked_paginate(query: Query, rank: Any, id_column: Any, limit: int, cursor: Optional[str] = None) -> List[Any]:
+    """
+    Page de `limit` résultats classés par score décroissant puis id décroissant,
+    après le curseur. La requête doit sélectionner le score en dernière colonne.
+    """
+    if cursor:
+        cursor_rank, item_id = decode_rank_cursor(cursor)
+        query = query.filter(tuple_(rank, id_column) < (cursor_rank, item_id))
+    return query.order_by(desc(rank), desc(id_column)).limit(limit).all()
+
+
+def next_rank_cursor(rows: Sequence[Any], limit: int) -> Optional[str]:
+    """
+    Curseur de la page suivante d'une pagination par score, à partir des
+    couples (élément, score) de la page.
+    """
+    if not rows or len(rows) < limit:
+        return None
+    item, rank = rows[-1]
+    return encode_rank_cursor(rank, item.id)
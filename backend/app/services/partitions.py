@@ -0,0 +1,177 @@
+from typing import Iterable, List, Optional, Tuple
+from datetime import date, datetime
+import asyncio
+import logging
+import re
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Table des points de suivi, partitionnée par mois sur `timestamp`
+TRACKING_TABLE = "tracking_points"
+PARTITION_KEY = "timestamp"
+
+# Partitions mensuelles : tracking_points_p202401, ...
+PARTITION_NAME = "{table}_p{month:%Y%m}"
+PARTITION_NAME_PATTERN = re.compile(r"_p(\d{4})(\d{2})$")
+
+# Un seul processus maintient les partitions à chaque intervalle
+MAINTENANCE_LOCK_KEY = "partitions:maintenance:lock"
+
+PARTITIONS_SQL = """
+SELECT child.relname
+FROM pg_inherits
+JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+WHERE parent.relname = :table
+"""
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return PARTITION_NAME.format(table=table, month=month)
+
+
+def partition_month(name: str) -> Optional[date]:
+    """
+    Mois couvert par une partition mensuelle, d'après son nom ; None pour les
+    autres partitions (partition par défaut).
+    """
+    match = PARTITION_NAME_PATTERN.search(name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def partition_bounds(month: date) -> Tuple[str, str]:
+    """
+    Bornes [début, fin) d'une partition mensuelle, en UTC.
+    """
+    return f"{month.isoformat()} 00:00:00+00", f"{add_months(month, 1).isoformat()} 00:00:00+00"
+
+
+def months_to_create(today: date, months_ahead: int) -> List[date]:
+    """
+    Mois dont la partition doit exister : le mois courant et les `months_ahead` suivants.
+    """
+    current = month_start(today)
+    return [add_months(current, offset) for offset in range(months_ahead + 1)]
+
+
+def expired_partitions(names: Iterable[str], today: date, retention_months: int) -> List[str]:
+    """
+    Partitions mensuelles entièrement antérieures à la période de rétention
+    (`retention_months` mois avant le mois courant). 0 : tout conserver.
+    """
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(month_start(today), -retention_months)
+    return sorted(
+        name for name in names
+        if partition_month(name) is not None and partition_month(name) < cutoff
+    )
+
+
+def existing_partitions(db: Session, table: str) -> List[str]:
+    return [row[0] for row in db.execute(text(PARTITIONS_SQL), {"table": table})]
+
+
+def create_partition(db: Session, table: str, month: date) -> None:
+    """
+    Créer la partition d'un mois. Les lignes du mois déjà tombées dans la
+    partition par défaut y sont déplacées dans la même transaction : sans cela,
+    PostgreSQL refuserait la nouvelle partition.
+    """
+    name = partition_name(table, month)
+    start, end = partition_bounds(month)
+    db.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    db.execute(text(
+        f"WITH moved AS (DELETE FROM {table}_default "
+        f"WHERE {PARTITION_KEY} >= :start AND {PARTITION_KEY} < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), {"start": start, "end": end})
+    db.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"))
+    db.commit()
+
+
+def drop_partition(db: Session, table: str, name: str) -> None:
+    db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+    db.execute(text(f"DROP TABLE {name}"))
+    db.commit()
+
+
+def maintain_partitions(
+    db: Session,
+    table: str = TRACKING_TABLE,
+    today: Optional[date] = None,
+    months_ahead: Optional[int] = None,
+    retention_months: Optional[int] = None
+) -> Tuple[List[str], List[str]]:
+    """
+    Créer à l'avance les partitions mensuelles manquantes et supprimer celles
+    sorties de la période de rétention. Retourne (créées, supprimées).
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return [], []
+
+    today = today or datetime.utcnow().date()
+    months_ahead = settings.TRACKING_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    retention_months = settings.TRACKING_RETENTION_MONTHS if retention_months is None else retention_months
+
+    existing = set(existing_partitions(db, table))
+    created, dropped = [], []
+    for month in months_to_create(today, months_ahead):
+        name = partition_name(table, month)
+        if name in existing:
+            continue
+        try:
+            create_partition(db, table, month)
+            created.append(name)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Erreur lors de la création de la partition {name}: {str(e)}")
+
+    for name in expired_partitions(existing, today, retention_months):
+        try:
+            drop_partition(db, table, name)
+            dropped.append(name)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Erreur lors de la suppression de la partition {name}: {str(e)}")
+
+    if created or dropped:
+        logger.info(f"Partitions de {table} : créées {created}, supprimées {dropped}")
+    return created, dropped
+
+
+async def partition_maintenance_loop() -> None:
+    """
+    Maintenance périodique des partitions, lancée au démarrage de l'API. Le
+    verrou Redis, pris pour la durée de l'intervalle, réserve chaque passage à
+    un seul des processus de l'API.
+    """
+    from ..db.session import SessionLocal
+    from .cache import get_redis_connection
+
+    interval = settings.PARTITION_MAINTENANCE_INTERVAL_SECONDS
+    while True:
+        try:
+            r = await get_redis_connection()
+            if await r.set(MAINTENANCE_LOCK_KEY, "1", nx=True, ex=max(1, int(interval))):
+                with SessionLocal() as db:
+                    await asyncio.to_thread(maintain_partitions, db)
+        except Exception as e:
+            logger.error(f"Erreur lors de la maintenance des partitions: {str(e)}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,172 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+import asyncio
+import logging
+import time
+
+from .geolocation import calculate_distance
+
+logger = logging.getLogger(__name__)
+
+# Message de position à envoyer, avec sa trame binaire éventuelle
+Payload = Tuple[Dict[str, Any], Optional[bytes]]
+
+
+class Subscriber:
+    """
+    Abonné d'une salle de suivi : cadence maximale déclarée et dernier état envoyé.
+    """
+
+    def __init__(self, websocket: Any, delivery_id: int, max_rate: float):
+        self.websocket = websocket
+        self.delivery_id = delivery_id
+        self.interval = 1.0 / max_rate
+        self.last_sent_at: Optional[float] = None
+        self.last_point: Optional[Tuple[float, float]] = None
+        self.pending: Optional[Payload] = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.due_at: Optional[float] = None
+        self.sending = False
+
+
+class PositionCoalescer:
+    """
+    Envoi des positions d'une salle à chacun de ses abonnés, à sa cadence.
+
+    Chaque abonné n'a au plus qu'une position en attente : une rafale reçue
+    entre deux envois se réduit à la plus récente. Un abonné n'est pas servi
+    plus souvent que sa cadence déclarée, et un déplacement inférieur à
+    `min_movement_m` (coursier à l'arrêt, bruit GPS) n'est envoyé qu'après
+    `stationary_interval` secondes. La dernière position est toujours envoyée
+    au bout du compte : elle est différée, jamais abandonnée. Un abonné lent
+    n'a qu'un envoi en cours et ne retarde pas les autres ; un envoi qui
+    dépasse `send_timeout` secondes est traité comme une connexion en erreur.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Any, Dict[str, Any], Optional[bytes]], Awaitable[None]],
+        on_error: Optional[Callable[[Any, int], Awaitable[None]]] = None,
+        min_movement_m: float = 10.0,
+        stationary_interval: float = 15.0,
+        send_timeout: float = 10.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.send = send
+        self.on_error = on_error
+        self.min_movement_m = min_movement_m
+        self.stationary_interval = stationary_interval
+        self.send_timeout = send_timeout
+        self.clock = clock
+        self.rooms: Dict[int, Set[Subscriber]] = {}
+        self.subscribers: Dict[Any, Subscriber] = {}
+        self.stats = {"received": 0, "sent": 0, "merged": 0, "timeouts": 0}
+        # Envois en cours : la boucle ne garde qu'une référence faible aux tâches
+        self._tasks: Set[asyncio.Task] = set()
+
+    def add(self, websocket: Any, delivery_id: int, max_rate: float) -> Subscriber:
+        subscriber = Subscriber(websocket, delivery_id, max_rate)
+        self.subscribers[websocket] = subscriber
+        self.rooms.setdefault(delivery_id, set()).add(subscriber)
+        return subscriber
+
+    def remove(self, websocket: Any) -> None:
+        subscriber = self.subscribers.pop(websocket, None)
+        if subscriber is None:
+            return
+        if subscriber.timer is not None:
+            subscriber.timer.cancel()
+        room = self.rooms.get(subscriber.delivery_id)
+        if room is not None:
+            room.discard(subscriber)
+            if not room:
+                del self.rooms[subscriber.delivery_id]
+
+    def mark_sent(self, websocket: Any, message: Dict[str, Any]) -> None:
+        """
+        Noter une position envoyée hors du coalesceur (dernière position à la connexion).
+        """
+        subscriber = self.subscribers.get(websocket)
+        if subscriber is not None:
+            subscriber.last_sent_at = self.clock()
+            subscriber.last_point = (message["lat"], message["lng"])
+
+    def offer(self, delivery_id: int, message: Dict[str, Any], frame: Optional[bytes] = None) -> None:
+        """
+        Nouvelle position pour une salle : elle remplace, pour chaque abonné,
+        celle qui attendait encore son tour.
+        """
+        self.stats["received"] += 1
+        for subscriber in list(self.rooms.get(delivery_id, ())):
+            if subscriber.pending is not None:
+                self.stats["merged"] += 1
+            subscriber.pending = (message, frame)
+            self._schedule(subscriber)
+
+    def due_at(self, subscriber: Subscriber) -> float:
+        """
+        Instant à partir duquel la position en attente peut être envoyée.
+        """
+        if subscriber.last_sent_at is None:
+            return self.clock()
+        interval = subscriber.interval
+        message = subscriber.pending[0]
+        if subscriber.last_point is not None and "lat" in message and "lng" in message:
+            moved_m = 1000 * calculate_distance(*subscriber.last_point, message["lat"], message["lng"])
+            if moved_m < self.min_movement_m:
+                interval = max(interval, self.stationary_interval)
+        return subscriber.last_sent_at + interval
+
+    def _schedule(self, subscriber: Subscriber) -> None:
+        if subscriber.pending is None or subscriber.sending:
+            # Envoi en cours : la position attendra sa fin
+            return
+        due_at = self.due_at(subscriber)
+        delay = due_at - self.clock()
+        if delay <= 0:
+            self._flush(subscriber)
+            return
+        if subscriber.timer is not None:
+            if subscriber.due_at is not None and subscriber.due_at <= due_at:
+                return
+            subscriber.timer.cancel()
+        subscriber.due_at = due_at
+        subscriber.timer = asyncio.get_running_loop().call_later(delay, self._on_timer, subscriber)
+
+    def _on_timer(self, subscriber: Subscriber) -> None:
+        subscriber.timer = None
+        subscriber.due_at = None
+        if self.subscribers.get(subscriber.websocket) is subscriber:
+            self._schedule(subscriber)
+
+    def _flush(self, subscriber: Subscriber) -> None:
+        message, frame = subscriber.pending
+        subscriber.pending = None
+        if subscriber.timer is not None:
+            subscriber.timer.cancel()
+            subscriber.timer = None
+            subscriber.due_at = None
+        subscriber.sending = True
+        subscriber.last_sent_at = self.clock()
+        if "lat" in message and "lng" in message:
+            subscriber.last_point = (message["lat"], message["lng"])
+        task = asyncio.ensure_future(self._deliver(subscriber, message, frame))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, subscriber: Subscriber, message: Dict[str, Any], frame: Optional[bytes]) -> None:
+        try:
+            await asyncio.wait_for(self.send(subscriber.websocket, message, frame), timeout=self.send_timeout)
+            self.stats["sent"] += 1
+        except Exception as e:
+            subscriber.pending = None
+            if isinstance(e, asyncio.TimeoutError):
+                # Abonné bloqué : le libérer plutôt que de garder l'envoi en suspens
+                self.stats["timeouts"] += 1
+                e = f"aucune réponse en {self.send_timeout} s"
+            logger.info(f"Connexion de suivi fermée pour la livraison {subscriber.delivery_id}: {str(e)}")
+            if self.on_error is not None:
+                await self.on_error(subscriber.websocket, subscriber.delivery_id)
+        finally:
+            subscriber.sending = False
+        if self.subscribers.get(subscriber.websocket) is subscriber:
+            self._schedule(subscriber)
@@ -0,0 +1,170 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from datetime import datetime, timezone
+import struct
+
+from ..core.exceptions import BadRequestError
+
+# Encodages négociés sur le canal de suivi
+JSON = "json"
+BINARY = "binary"
+
+# Trame binaire : en-tête fixe (version, identifiant de livraison, nombre de
+# points, premier point en absolu), puis les points suivants en écarts
+# varint zigzag par rapport au précédent
+FRAME_VERSION = 1
+HEADER = struct.Struct("<BIHqii")
+# Coordonnées en millionièmes de degré (environ 11 cm)
+COORDINATE_SCALE = 1_000_000
+MAX_POINTS = 0xFFFF
+
+# Point : (horodatage en millisecondes depuis l'époque Unix, latitude, longitude)
+Point = Tuple[int, float, float]
+
+
+def epoch_millis(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def valid_coordinates(lat: Any, lng: Any) -> Optional[Tuple[float, float]]:
+    """
+    Coordonnées converties en nombres et bornées (latitude ±90, longitude
+    ±180) ; None pour une valeur non numérique, infinie ou hors bornes.
+    """
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        if offset >= len(data):
+            raise BadRequestError("Trame de positions tronquée")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+        if shift > 63:
+            raise BadRequestError("Trame de positions invalide")
+
+
+def encode_positions(delivery_id: int, points: Sequence[Point]) -> bytes:
+    """
+    Encoder des positions d'une livraison en une trame binaire. Une position
+    isolée tient en 23 octets ; chaque position suivante ajoute de l'ordre de
+    4 à 6 octets, contre une centaine en JSON.
+    """
+    if not points or len(points) > MAX_POINTS:
+        raise ValueError("Une trame contient de 1 à 65535 positions")
+    scaled = [(int(ts), round(lat * COORDINATE_SCALE), round(lng * COORDINATE_SCALE)) for ts, lat, lng in points]
+    first_ts, first_lat, first_lng = scaled[0]
+    out = bytearray(HEADER.pack(FRAME_VERSION, delivery_id, len(scaled), first_ts, first_lat, first_lng))
+    previous = scaled[0]
+    for point in scaled[1:]:
+        for value, before in zip(point, previous):
+            _write_varint(out, _zigzag(value - before))
+        previous = point
+    return bytes(out)
+
+
+def decode_positions(data: bytes) -> Tuple[int, List[Point]]:
+    """
+    Décoder une trame binaire : (identifiant de livraison, positions).
+    """
+    if len(data) < HEADER.size:
+        raise BadRequestError("Trame de positions tronquée")
+    version, delivery_id, count, ts, lat, lng = HEADER.unpack_from(data)
+    if version != FRAME_VERSION:
+        raise BadRequestError("Version de trame de positions non supportée")
+    if count == 0:
+        raise BadRequestError("Trame de positions vide")
+
+    scaled = [(ts, lat, lng)]
+    offset = HEADER.size
+    for _ in range(count - 1):
+        point = []
+        for before in scaled[-1]:
+            delta, offset = _read_varint(data, offset)
+            point.append(before + _unzigzag(delta))
+        scaled.append(tuple(point))
+    if offset != len(data):
+        raise BadRequestError("Trame de positions invalide")
+    return delivery_id, [(ts, lat / COORDINATE_SCALE, lng / COORDINATE_SCALE) for ts, lat, lng in scaled]
+
+
+def bounded_points(points: Sequence[Point], not_before: int, now: int) -> List[Point]:
+    """
+    Horodatages ramenés dans [not_before, now] : l'horloge du téléphone peut
+    avancer, retarder, ou une trame corrompue porter un écart aberrant.
+    """
+    return [(min(max(ts, not_before), now), lat, lng) for ts, lat, lng in points]
+
+
+def position_message(delivery_id: int, points: Sequence[Point]) -> Dict[str, Any]:
+    """
+    Message JSON de suivi : la dernière position dans les champs historiques
+    (lat, lng, timestamp ISO), les précédentes du même lot dans `trail`.
+    """
+    ts, lat, lng = points[-1]
+    message = {
+        "type": "position",
+        "delivery_id": delivery_id,
+        "lat": lat,
+        "lng": lng,
+        "timestamp": datetime.fromtimestamp(ts / 1000, tz=timezone.utc).isoformat(),
+        "ts": ts
+    }
+    if len(points) > 1:
+        message["trail"] = [list(point) for point in points[:-1]]
+    return message
+
+
+def message_points(message: Dict[str, Any]) -> List[Point]:
+    """
+    Positions portées par un message de suivi JSON, dans l'ordre chronologique.
+    """
+    points = [tuple(point) for point in message.get("trail", ())]
+    if "ts" in message:
+        ts = int(message["ts"])
+    else:
+        ts = epoch_millis(datetime.fromisoformat(message["timestamp"]))
+    points.append((ts, message["lat"], message["lng"]))
+    return points
+
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    return encode_positions(message["delivery_id"], message_points(message))
+
+
+def parse_encoding(value: Optional[str]) -> str:
+    """
+    Encodage demandé par un abonné ; JSON par défaut, pour les clients existants.
+    """
+    if not value or value == JSON:
+        return JSON
+    if value == BINARY:
+        return BINARY
+    raise BadRequestError("Encodage de suivi non supporté (json ou binary)")
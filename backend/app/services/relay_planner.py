@@ -0,0 +1,480 @@
+from typing import Dict, List, Optional, Tuple, Any, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import math
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.exceptions import NotFoundError, BadRequestError, ForbiddenError
+from .cache import get_redis_connection
+from .courier_index import haversine
+from .gazetteer import gazetteer
+from .geolocation import calculate_distance_and_duration_matrix
+
+logger = logging.getLogger(__name__)
+
+REPLAN_LOCK_KEY = "relay:replan:lock"
+
+
+@dataclass
+class RelayPoint:
+    lat: float
+    lng: float
+    label: Optional[str] = None
+
+
+@dataclass
+class RelayCourier:
+    courier_id: int
+    lat: float
+    lng: float
+
+
+@dataclass
+class RelayLegPlan:
+    courier_id: int
+    start: RelayPoint
+    end: RelayPoint
+    distance: float  # en km
+    start_minute: float  # départ du colis depuis le début du relais
+    end_minute: float
+
+
+class RelayNetwork:
+    """
+    Réseau d'un relais : point de départ du colis, destination, points de passage
+    de relais possibles et positions des coursiers, avec les durées (minutes) et
+    distances (km) entre tous ces points.
+    """
+
+    def __init__(
+        self,
+        origin: RelayPoint,
+        destination: RelayPoint,
+        couriers: Sequence[RelayCourier],
+        handoff_points: Sequence[RelayPoint],
+        handoff_minutes: float = 5.0,
+        min_leg_km: float = 2.0,
+        busy_weight: float = 1.0
+    ):
+        self.points = [origin, destination] + list(handoff_points)
+        self.couriers = list(couriers)
+        self.handoff_minutes = handoff_minutes
+        self.min_leg_km = min_leg_km
+        self.busy_weight = busy_weight
+
+        coordinates = [(p.lat, p.lng) for p in self.points] + [(c.lat, c.lng) for c in self.couriers]
+        distances, durations = calculate_distance_and_duration_matrix(coordinates, coordinates)
+        self.distance = distances.tolist()
+        self.travel = durations.astype(float).tolist()
+        self._courier_offset = len(self.points)
+        self._remaining = [haversine(p.lat, p.lng, destination.lat, destination.lng) for p in self.points]
+
+    def courier_node(self, k: int) -> int:
+        return self._courier_offset + k
+
+    def best_plan(self, holder: Optional[int] = None, max_legs: int = 3) -> Tuple[List[RelayLegPlan], float]:
+        """
+        Relais le moins coûteux : qui porte le colis sur chaque tronçon et où ont lieu
+        les passages de relais. Le coût est l'heure d'arrivée du colis plus, pondérée
+        par `busy_weight`, la plus longue immobilisation d'un coursier (de son départ
+        à son retour à sa position initiale). Un relais évite ainsi d'immobiliser le
+        coursier de Yopougon pour un aller-retour jusqu'à Port-Bouët ; chaque coursier
+        part juste à temps pour le rendez-vous et attend le colis s'il arrive en avance.
+
+        Énumération exhaustive des relais (au plus `max_legs` tronçons, chaque point de
+        relais rapprochant d'au moins `min_leg_km` de la destination), élaguée par un
+        minorant du coût. `holder` est l'indice du coursier qui a déjà le colis.
+        Retourne les tronçons et le coût (minutes), ou ([], inf).
+        """
+        if not self.couriers:
+            return [], math.inf
+
+        travel = self.travel
+        weight = self.busy_weight
+        handoffs = [
+            h for h in range(2, len(self.points))
+            if self._remaining[h] >= self.min_leg_km
+        ]
+        best: List[Any] = [math.inf, None]
+
+        def explore(point: int, k: int, t: float, departure: float, longest: float, mask: int, path: List[Tuple[int, int, float]]):
+            if t + weight * longest >= best[0]:
+                return
+            home = self.courier_node(k)
+
+            # Le coursier termine la livraison puis rentre
+            arrival = t + travel[point][1]
+            cost = arrival + weight * max(longest, arrival + travel[1][home] - departure)
+            if cost < best[0]:
+                best[0], best[1] = cost, path + [(k, 1, t)]
+
+            if bin(mask).count("1") >= max_legs:
+                return
+            # Le coursier porte le colis jusqu'à un point de relais et le confie à un autre
+            for handoff in handoffs:
+                if self._remaining[handoff] > self._remaining[point] - self.min_leg_km:
+                    continue
+                reach = t + travel[point][handoff]
+                for other in range(len(self.couriers)):
+                    if mask & (1 << other):
+                        continue
+                    approach = travel[self.courier_node(other)][handoff]
+                    ready = max(reach, approach) + self.handoff_minutes
+                    busy = ready + travel[handoff][home] - departure
+                    explore(
+                        handoff, other, ready, ready - self.handoff_minutes - approach,
+                        max(longest, busy), mask | (1 << other), path + [(k, handoff, t)]
+                    )
+
+        for k in ([holder] if holder is not None else range(len(self.couriers))):
+            t = 0.0 if holder is not None else travel[self.courier_node(k)][0]
+            explore(0, k, t, 0.0, 0.0, 1 << k, [])
+
+        if best[1] is None:
+            return [], math.inf
+
+        legs = []
+        point = 0
+        for k, end, start_minute in best[1]:
+            # Le tronçon se termine à l'arrivée au point suivant, avant le passage de relais
+            legs.append(RelayLegPlan(
+                courier_id=self.couriers[k].courier_id,
+                start=self.points[point],
+                end=self.points[end],
+                distance=self.distance[point][end],
+                start_minute=start_minute,
+                end_minute=start_minute + travel[point][end]
+            ))
+            point = end
+        return legs, best[0]
+
+    def evaluate(self, legs: Sequence[Tuple[int, int]], holder: Optional[int] = None) -> float:
+        """
+        Coût (minutes) d'un relais déjà planifié, donné par ses tronçons (indice du
+        coursier, indice du point d'arrivée), avec les positions actuelles.
+        """
+        if not legs:
+            return math.inf
+        travel = self.travel
+        k, end = legs[0]
+        t = 0.0 if holder is not None else travel[self.courier_node(k)][0]
+        point, departure, longest = 0, 0.0, 0.0
+        for other, next_end in legs[1:]:
+            reach = t + travel[point][end]
+            approach = travel[self.courier_node(other)][end]
+            ready = max(reach, approach) + self.handoff_minutes
+            longest = max(longest, ready + travel[end][self.courier_node(k)] - departure)
+            point, k, t, departure = end, other, ready, ready - self.handoff_minutes - approach
+            end = next_end
+        arrival = t + travel[point][end]
+        return arrival + self.busy_weight * max(longest, arrival + travel[end][self.courier_node(k)] - departure)
+
+
+def corridor_handoff_points(origin: RelayPoint, destination: RelayPoint) -> List[RelayPoint]:
+    """
+    Lieux connus du gazetteer (quartiers, repères) proches du trajet, utilisables
+    comme points de rendez-vous : le détour qu'ils imposent reste sous
+    RELAY_CORRIDOR_DETOUR, et ils sont à au moins RELAY_MIN_LEG_KM des deux extrémités.
+    """
+    direct = haversine(origin.lat, origin.lng, destination.lat, destination.lng)
+    candidates = []
+    for entry in gazetteer.entries:
+        if entry.type == "commune":
+            continue
+        first = haversine(origin.lat, origin.lng, entry.lat, entry.lng)
+        second = haversine(entry.lat, entry.lng, destination.lat, destination.lng)
+        if min(first, second) < settings.RELAY_MIN_LEG_KM:
+            continue
+        detour = (first + second) / direct if direct > 0 else math.inf
+        if detour <= settings.RELAY_CORRIDOR_DETOUR:
+            candidates.append((detour, RelayPoint(entry.lat, entry.lng, f"{entry.name}, {entry.commune}")))
+    candidates.sort(key=lambda item: item[0])
+    return [point for _, point in candidates[:settings.RELAY_MAX_HANDOFF_POINTS]]
+
+
+def get_relay_legs(db: Session, delivery_id: int) -> List[Any]:
+    from ..models.collaborative_delivery import CollaborativeLeg
+
+    return db.query(CollaborativeLeg).filter(
+        CollaborativeLeg.delivery_id == delivery_id
+    ).order_by(CollaborativeLeg.sequence).all()
+
+
+def _relay_couriers(db: Session, delivery: Any, excluded: set) -> List[RelayCourier]:
+    """
+    Participants disponibles pour porter un tronçon, à leur dernière position connue.
+    """
+    from ..models.collaborative_delivery import CollaborativeDelivery, CollaborativeStatus
+    from ..models.user import CourierProfile
+
+    courier_ids = {
+        row.courier_id for row in db.query(CollaborativeDelivery.courier_id).filter(
+            CollaborativeDelivery.delivery_id == delivery.id,
+            CollaborativeDelivery.status.in_([CollaborativeStatus.ACCEPTED.value, CollaborativeStatus.IN_PROGRESS.value])
+        ).all()
+    }
+    if delivery.courier_id:
+        courier_ids.add(delivery.courier_id)
+    courier_ids -= excluded
+    if not courier_ids:
+        return []
+
+    profiles = db.query(CourierProfile).filter(
+        CourierProfile.user_id.in_(courier_ids),
+        CourierProfile.last_location_lat.isnot(None),
+        CourierProfile.last_location_lng.isnot(None)
+    ).order_by(CourierProfile.user_id).all()
+    return [RelayCourier(p.user_id, p.last_location_lat, p.last_location_lng) for p in profiles]
+
+
+def replan_relay(db: Session, delivery_id: int, force: bool = False) -> List[Any]:
+    """
+    (Re)planifier les tronçons d'une livraison collaborative à partir des positions
+    actuelles des participants. Les tronçons terminés sont conservés ; le tronçon en
+    cours garde son coursier mais peut changer de point de relais. Sans `force`, le
+    plan n'est remplacé que s'il fait gagner au moins RELAY_REPLAN_MIN_GAIN_MINUTES,
+    pour ne pas déplacer les rendez-vous à chaque mouvement des coursiers.
+    """
+    from ..models.delivery import Delivery, DeliveryStatus, DeliveryType
+    from ..models.collaborative_delivery import CollaborativeLeg, RelayLegStatus
+
+    delivery = db.query(Delivery).filter(Delivery.id == delivery_id).first()
+    if not delivery:
+        raise NotFoundError("Livraison non trouvée")
+    if delivery.delivery_type != DeliveryType.collaborative:
+        raise BadRequestError("Cette livraison n'est pas collaborative")
+    if delivery.status in [DeliveryStatus.delivered, DeliveryStatus.completed, DeliveryStatus.cancelled]:
+        raise BadRequestError("Cette livraison est terminée")
+    if None in (delivery.pickup_lat, delivery.pickup_lng, delivery.delivery_lat, delivery.delivery_lng):
+        raise BadRequestError("Les coordonnées de ramassage et de livraison sont nécessaires au relais")
+
+    legs = get_relay_legs(db, delivery_id)
+    done = [leg for leg in legs if leg.status == RelayLegStatus.COMPLETED.value]
+    current = next((leg for leg in legs if leg.status == RelayLegStatus.IN_PROGRESS.value), None)
+    planned = [leg for leg in legs if leg.status == RelayLegStatus.PLANNED.value]
+    if current is None and not done and planned and delivery.status == DeliveryStatus.in_progress:
+        # Colis ramassé par le coursier du premier tronçon
+        current = planned.pop(0)
+        current.status = RelayLegStatus.IN_PROGRESS.value
+        current.started_at = current.started_at or delivery.pickup_at
+
+    couriers = _relay_couriers(db, delivery, {leg.courier_id for leg in done})
+    destination = RelayPoint(delivery.delivery_lat, delivery.delivery_lng, delivery.delivery_address)
+    holder = None
+    if current is not None:
+        position = next((c for c in couriers if c.courier_id == current.courier_id), None)
+        if position is None:
+            # Position du porteur inconnue : repartir du début de son tronçon
+            position = RelayCourier(current.courier_id, current.start_lat, current.start_lng)
+            couriers.append(position)
+        origin = RelayPoint(position.lat, position.lng, current.start_label)
+        holder = couriers.index(position)
+    elif done:
+        origin = RelayPoint(done[-1].end_lat, done[-1].end_lng, done[-1].end_label)
+    else:
+        origin = RelayPoint(delivery.pickup_lat, delivery.pickup_lng, delivery.pickup_address)
+
+    if not couriers:
+        raise BadRequestError("Aucun participant localisé pour porter le colis")
+
+    existing = ([current] if current is not None else []) + planned
+    handoffs = corridor_handoff_points(origin, destination)
+    handoffs += [RelayPoint(leg.end_lat, leg.end_lng, leg.end_label) for leg in existing[:-1]]
+    network = RelayNetwork(
+        origin, destination, couriers, handoffs,
+        handoff_minutes=settings.RELAY_HANDOFF_MINUTES,
+        min_leg_km=settings.RELAY_MIN_LEG_KM,
+        busy_weight=settings.RELAY_BUSY_WEIGHT
+    )
+    plan, cost = network.best_plan(holder=holder, max_legs=settings.RELAY_MAX_LEGS)
+    if not plan:
+        raise BadRequestError("Impossible de planifier le relais")
+
+    if existing and not force:
+        courier_of = {c.courier_id: k for k, c in enumerate(couriers)}
+        current_plan = []
+        for i, leg in enumerate(existing):
+            end = 1 if i == len(existing) - 1 else len(network.points) - len(existing) + 1 + i
+            current_plan.append((courier_of.get(leg.courier_id), end))
+        if all(k is not None for k, _ in current_plan):
+            if network.evaluate(current_plan, holder=holder) - cost < settings.RELAY_REPLAN_MIN_GAIN_MINUTES:
+                return legs
+
+    now = datetime.utcnow()
+    for leg in planned:
+        db.delete(leg)
+    sequence = done[-1].sequence + 1 if done else 1
+    new_legs = list(done)
+    for i, step in enumerate(plan):
+        if i == 0 and current is not None:
+            leg = current
+        else:
+            leg = CollaborativeLeg(
+                delivery_id=delivery_id,
+                courier_id=step.courier_id,
+                sequence=sequence,
+                status=RelayLegStatus.PLANNED.value,
+                start_lat=step.start.lat,
+                start_lng=step.start.lng,
+                start_label=step.start.label
+            )
+            db.add(leg)
+        leg.end_lat = step.end.lat
+        leg.end_lng = step.end.lng
+        leg.end_label = step.end.label
+        leg.planned_distance = round(step.distance, 3)
+        leg.estimated_start = now + timedelta(minutes=step.start_minute)
+        leg.estimated_end = now + timedelta(minutes=step.end_minute)
+        new_legs.append(leg)
+        sequence += 1
+
+    db.commit()
+    return new_legs
+
+
+def leg_started(status: str, first: bool, picked_up: bool) -> bool:
+    """
+    Un tronçon peut être terminé s'il est en cours. Le premier démarre au
+    ramassage du colis, avant même que la replanification l'ait marqué en
+    cours ; les suivants au passage de relais.
+    """
+    if status == "in_progress":
+        return True
+    return status == "planned" and first and picked_up
+
+
+def complete_relay_leg(db: Session, delivery_id: int, leg_id: int, courier_id: int) -> List[Any]:
+    """
+    Confirmer le passage de relais (ou la remise finale) par le coursier du tronçon.
+    La distance réellement parcourue est mesurée sur les points de suivi du tronçon,
+    puis le tronçon suivant démarre.
+    """
+    from ..models.delivery import TrackingPoint, DeliveryStatus
+    from ..models.collaborative_delivery import CollaborativeDelivery, CollaborativeStatus, RelayLegStatus
+
+    legs = get_relay_legs(db, delivery_id)
+    leg = next((leg for leg in legs if leg.id == leg_id), None)
+    if leg is None:
+        raise NotFoundError("Tronçon non trouvé")
+    if leg.courier_id != courier_id:
+        raise ForbiddenError("Ce tronçon est confié à un autre coursier")
+    if leg.status == RelayLegStatus.COMPLETED.value:
+        raise BadRequestError("Ce tronçon est déjà terminé")
+    previous = [other for other in legs if other.sequence < leg.sequence]
+    if any(other.status != RelayLegStatus.COMPLETED.value for other in previous):
+        raise BadRequestError("Le tronçon précédent n'est pas terminé")
+    if not leg_started(leg.status, not previous, leg.delivery.status == DeliveryStatus.in_progress):
+        raise BadRequestError("Ce tronçon n'est pas en cours")
+
+    now = datetime.utcnow()
+    started_at = leg.started_at or (previous[-1].completed_at if previous else leg.delivery.pickup_at)
+    query = db.query(TrackingPoint.lat, TrackingPoint.lng).filter(
+        TrackingPoint.delivery_id == delivery_id,
+        TrackingPoint.timestamp <= now
+    )
+    if started_at is not None:
+        query = query.filter(TrackingPoint.timestamp >= started_at)
+    points = query.order_by(TrackingPoint.timestamp, TrackingPoint.id).all()
+    travelled = sum(haversine(a.lat, a.lng, b.lat, b.lng) for a, b in zip(points, points[1:]))
+
+    leg.status = RelayLegStatus.COMPLETED.value
+    leg.started_at = started_at
+    leg.completed_at = now
+    leg.actual_distance = round(travelled, 3) if len(points) > 1 else leg.planned_distance
+
+    following = [other for other in legs if other.sequence > leg.sequence]
+    if following:
+        following[0].status = RelayLegStatus.IN_PROGRESS.value
+        following[0].started_at = now
+
+    # Statut de participation : terminé pour ce coursier s'il n'a plus de tronçon
+    remaining = {other.courier_id for other in following}
+    participations = db.query(CollaborativeDelivery).filter(
+        CollaborativeDelivery.delivery_id == delivery_id,
+        CollaborativeDelivery.courier_id.in_({courier_id} | remaining)
+    ).all()
+    for participation in participations:
+        if participation.courier_id == courier_id and courier_id not in remaining:
+            participation.status = CollaborativeStatus.COMPLETED.value
+            participation.completed_at = now
+        elif following and participation.courier_id == following[0].courier_id:
+            participation.status = CollaborativeStatus.IN_PROGRESS.value
+
+    db.commit()
+    return legs
+
+
+def relay_carrier_id(db: Session, delivery_id: int) -> Optional[int]:
+    """
+    Coursier qui porte (ou va ramasser) le colis d'une livraison en relais.
+    """
+    from ..models.collaborative_delivery import CollaborativeLeg, RelayLegStatus
+
+    leg = db.query(CollaborativeLeg.courier_id).filter(
+        CollaborativeLeg.delivery_id == delivery_id,
+        CollaborativeLeg.status != RelayLegStatus.COMPLETED.value
+    ).order_by(CollaborativeLeg.sequence).first()
+    return leg.courier_id if leg else None
+
+
+def relay_leg_distances(db: Session, delivery_id: int) -> Dict[int, float]:
+    """
+    Distance (km) parcourue par chaque coursier sur les tronçons terminés.
+    """
+    from ..models.collaborative_delivery import RelayLegStatus
+
+    distances: Dict[int, float] = {}
+    for leg in get_relay_legs(db, delivery_id):
+        if leg.status == RelayLegStatus.COMPLETED.value:
+            distance = leg.actual_distance if leg.actual_distance is not None else leg.planned_distance
+            distances[leg.courier_id] = distances.get(leg.courier_id, 0.0) + (distance or 0.0)
+    return distances
+
+
+def replan_active_relays(db: Session) -> int:
+    """
+    Replanifier les relais actifs avec les positions actuelles des coursiers.
+    """
+    from ..models.collaborative_delivery import CollaborativeLeg, RelayLegStatus
+
+    delivery_ids = [
+        row.delivery_id for row in db.query(CollaborativeLeg.delivery_id).filter(
+            CollaborativeLeg.status == RelayLegStatus.PLANNED.value
+        ).distinct().all()
+    ]
+    for delivery_id in delivery_ids:
+        try:
+            replan_relay(db, delivery_id)
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Relais de la livraison {delivery_id} non replanifié: {str(e)}")
+    return len(delivery_ids)
+
+
+def _replan_in_session() -> int:
+    from ..db.session import SessionLocal
+
+    with SessionLocal() as db:
+        return replan_active_relays(db)
+
+
+async def relay_replan_loop() -> None:
+    """
+    Boucle de replanification des relais lancée au démarrage de l'API. Un seul
+    processus replanifie à chaque intervalle (verrou Redis), dans un thread.
+    """
+    while True:
+        await asyncio.sleep(settings.RELAY_REPLAN_INTERVAL_SECONDS)
+        try:
+            r = await get_redis_connection()
+            if not await r.set(REPLAN_LOCK_KEY, "1", nx=True, ex=max(1, settings.RELAY_REPLAN_INTERVAL_SECONDS)):
+                continue
+            await asyncio.to_thread(_replan_in_session)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Erreur lors de la replanification des relais: {str(e)}")
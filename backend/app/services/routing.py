@@ -0,0 +1,651 @@
+from typing import Dict, List, Optional, Tuple, Sequence, Iterator
+import bz2
+import gzip
+import heapq
+import logging
+import math
+import os
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from ..core.config import settings
+from .courier_index import haversine, KM_PER_DEGREE
+
+logger = logging.getLogger(__name__)
+
+# Vitesses par défaut (km/h) des types de voies carrossables OSM
+HIGHWAY_SPEEDS = {
+    "motorway": 80, "motorway_link": 45,
+    "trunk": 70, "trunk_link": 40,
+    "primary": 50, "primary_link": 35,
+    "secondary": 40, "secondary_link": 30,
+    "tertiary": 35, "tertiary_link": 25,
+    "unclassified": 30,
+    "residential": 25,
+    "living_street": 10,
+    "service": 15
+}
+
+# Version du format du fichier de précalcul (2 : coordonnées des nœuds incluses)
+CACHE_FORMAT_VERSION = 2
+
+# Nombre maximal de nœuds visités par une recherche de témoin pendant la contraction
+WITNESS_SETTLE_LIMIT = 60
+
+
+class RoadGraph:
+    """
+    Graphe routier orienté stocké en tableaux (format CSR) : pour le nœud `u`,
+    les arcs sortants sont `head[first_out[u]:first_out[u + 1]]`, avec leur
+    durée (secondes) et leur longueur (mètres).
+    """
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, tails: np.ndarray, heads: np.ndarray, times: np.ndarray, lengths: np.ndarray):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        self.first_out, self.head, self.time, self.length = _to_csr(len(self.lat), tails, heads, times, lengths)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.lat)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.head)
+
+    def edges(self) -> Iterator[Tuple[int, int, float, float]]:
+        for u in range(self.node_count):
+            for k in range(self.first_out[u], self.first_out[u + 1]):
+                yield u, int(self.head[k]), float(self.time[k]), float(self.length[k])
+
+    @classmethod
+    def from_osm(cls, path: str) -> "RoadGraph":
+        """
+        Construire le graphe à partir d'un extrait OSM au format XML (.osm, .osm.gz, .osm.bz2).
+        Seules les voies carrossables sont retenues ; les sens uniques sont respectés.
+        """
+        coordinates: Dict[int, Tuple[float, float]] = {}
+        ways: List[Tuple[List[int], float, int]] = []
+
+        with _open_osm(path) as f:
+            for _, element in ET.iterparse(f, events=("end",)):
+                if element.tag == "node":
+                    coordinates[int(element.get("id"))] = (float(element.get("lat")), float(element.get("lon")))
+                elif element.tag == "way":
+                    tags = {tag.get("k"): tag.get("v") for tag in element.iter("tag")}
+                    highway = tags.get("highway")
+                    if highway in HIGHWAY_SPEEDS and tags.get("access") not in ("no", "private"):
+                        refs = [int(nd.get("ref")) for nd in element.iter("nd")]
+                        ways.append((refs, _way_speed(tags, highway), _way_direction(tags, highway)))
+                if element.tag in ("node", "way", "relation"):
+                    element.clear()
+
+        # Ne garder que les nœuds utilisés par des voies, renumérotés de 0 à n-1
+        index: Dict[int, int] = {}
+        lat: List[float] = []
+        lng: List[float] = []
+        tails: List[int] = []
+        heads: List[int] = []
+        times: List[float] = []
+        lengths: List[float] = []
+
+        def node_index(osm_id: int) -> int:
+            if osm_id not in index:
+                index[osm_id] = len(lat)
+                lat.append(coordinates[osm_id][0])
+                lng.append(coordinates[osm_id][1])
+            return index[osm_id]
+
+        for refs, speed, direction in ways:
+            refs = [ref for ref in refs if ref in coordinates]
+            for a, b in zip(refs, refs[1:]):
+                if a == b:
+                    continue
+                u, v = node_index(a), node_index(b)
+                meters = haversine(lat[u], lng[u], lat[v], lng[v]) * 1000
+                seconds = meters / (speed / 3.6)
+                if direction >= 0:
+                    tails.append(u); heads.append(v); times.append(seconds); lengths.append(meters)
+                if direction <= 0:
+                    tails.append(v); heads.append(u); times.append(seconds); lengths.append(meters)
+
+        logger.info(f"Graphe routier chargé: {len(lat)} nœuds, {len(tails)} arcs")
+        return cls(np.array(lat), np.array(lng), np.array(tails), np.array(heads), np.array(times), np.array(lengths))
+
+
+class ContractionHierarchy:
+    """
+    Hiérarchie de contraction sur un graphe routier, optimisée sur la durée.
+
+    Le précalcul contracte les nœuds un à un (ordre par différence d'arcs) en
+    ajoutant des raccourcis ; une requête n'explore ensuite que les arcs
+    montants depuis l'origine et la destination, soit quelques centaines de
+    nœuds au lieu de tout le graphe. La longueur du plus rapide chemin est
+    portée par chaque arc pour retourner aussi la distance.
+    """
+
+    def __init__(
+        self,
+        rank: np.ndarray,
+        up: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+        down: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+        coordinates: Optional[Tuple[np.ndarray, np.ndarray]] = None
+    ):
+        self.rank = np.asarray(rank, dtype=np.int64)
+        # Coordonnées (lat, lng) des nœuds, enregistrées avec le précalcul
+        self.coordinates = coordinates
+        self._up_arrays = up
+        self._down_arrays = down
+        # Listes Python : l'accès élément par élément y est bien plus rapide qu'en NumPy
+        self._up = tuple(array.tolist() for array in up)
+        self._down = tuple(array.tolist() for array in down)
+
+    @classmethod
+    def build(cls, graph: RoadGraph) -> "ContractionHierarchy":
+        n = graph.node_count
+        out_adj: List[Dict[int, Tuple[float, float]]] = [dict() for _ in range(n)]
+        in_adj: List[Dict[int, Tuple[float, float]]] = [dict() for _ in range(n)]
+        for u, v, seconds, meters in graph.edges():
+            if u == v:
+                continue
+            if v not in out_adj[u] or seconds < out_adj[u][v][0]:
+                out_adj[u][v] = (seconds, meters)
+                in_adj[v][u] = (seconds, meters)
+
+        contracted = [False] * n
+        deleted_neighbors = [0] * n
+        # Profondeur dans la hiérarchie : favorise une contraction uniforme sur le territoire
+        level = [0] * n
+        rank = np.zeros(n, dtype=np.int64)
+        up_edges: List[Tuple[int, int, float, float]] = []
+        down_edges: List[Tuple[int, int, float, float]] = []
+
+        def shortcuts_for(v: int) -> List[Tuple[int, int, float, float]]:
+            shortcuts = []
+            targets = out_adj[v]
+            for u, (t_uv, l_uv) in in_adj[v].items():
+                if not targets:
+                    break
+                limit = t_uv + max(t for t, _ in targets.values())
+                witness = _witness_search(out_adj, u, v, limit, targets)
+                for w, (t_vw, l_vw) in targets.items():
+                    if w == u:
+                        continue
+                    through = t_uv + t_vw
+                    if witness.get(w, math.inf) > through:
+                        shortcuts.append((u, w, through, l_uv + l_vw))
+            return shortcuts
+
+        def priority(v: int, shortcuts: List[Tuple[int, int, float, float]]) -> int:
+            return 2 * (len(shortcuts) - len(in_adj[v]) - len(out_adj[v])) + deleted_neighbors[v] + level[v]
+
+        heap = [(priority(v, shortcuts_for(v)), v) for v in range(n)]
+        heapq.heapify(heap)
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if contracted[v]:
+                continue
+            # Mise à jour paresseuse : la priorité a pu augmenter depuis l'insertion
+            shortcuts = shortcuts_for(v)
+            current = priority(v, shortcuts)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, v))
+                continue
+
+            for u, w, seconds, meters in shortcuts:
+                if w not in out_adj[u] or seconds < out_adj[u][w][0]:
+                    out_adj[u][w] = (seconds, meters)
+                    in_adj[w][u] = (seconds, meters)
+
+            for w, (seconds, meters) in out_adj[v].items():
+                up_edges.append((v, w, seconds, meters))
+                del in_adj[w][v]
+                deleted_neighbors[w] += 1
+                level[w] = max(level[w], level[v] + 1)
+            for u, (seconds, meters) in in_adj[v].items():
+                down_edges.append((v, u, seconds, meters))
+                del out_adj[u][v]
+                deleted_neighbors[u] += 1
+                level[u] = max(level[u], level[v] + 1)
+            out_adj[v] = {}
+            in_adj[v] = {}
+
+            contracted[v] = True
+            rank[v] = order
+            order += 1
+
+        up = _to_csr(n, *_columns(up_edges))
+        down = _to_csr(n, *_columns(down_edges))
+        logger.info(f"Hiérarchie de contraction construite: {len(up_edges) + len(down_edges)} arcs montants")
+        return cls(rank, up, down, (graph.lat, graph.lng))
+
+    def save(self, path: str, source_signature: Tuple[int, int] = (0, 0)) -> None:
+        """
+        Enregistrer le précalcul. L'écriture passe par un fichier temporaire du
+        même dossier, renommé à la fin : un lecteur ne voit jamais de fichier partiel.
+        """
+        arrays = dict(
+            version=np.array([CACHE_FORMAT_VERSION]),
+            source=np.array(source_signature, dtype=np.int64),
+            rank=self.rank,
+            up_first=self._up_arrays[0], up_head=self._up_arrays[1], up_time=self._up_arrays[2], up_length=self._up_arrays[3],
+            down_first=self._down_arrays[0], down_head=self._down_arrays[1], down_time=self._down_arrays[2], down_length=self._down_arrays[3]
+        )
+        if self.coordinates is not None:
+            arrays.update(node_lat=self.coordinates[0], node_lng=self.coordinates[1])
+
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".routing-", suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str, source_signature: Optional[Tuple[int, int]] = None) -> Optional["ContractionHierarchy"]:
+        """
+        Charger un précalcul ; retourne None s'il est absent, d'un autre format
+        ou construit à partir d'un autre extrait OSM.
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if int(data["version"][0]) != CACHE_FORMAT_VERSION:
+                return None
+            if source_signature is not None and tuple(data["source"].tolist()) != tuple(source_signature):
+                return None
+            coordinates = (data["node_lat"], data["node_lng"]) if "node_lat" in data.files else None
+            return cls(
+                data["rank"],
+                (data["up_first"], data["up_head"], data["up_time"], data["up_length"]),
+                (data["down_first"], data["down_head"], data["down_time"], data["down_length"]),
+                coordinates
+            )
+
+    def _upward_search(self, source: int, arrays) -> Dict[int, Tuple[float, float]]:
+        """
+        Recherche de Dijkstra complète dans le graphe montant depuis `source`.
+        """
+        first, head, times, lengths = arrays
+        settled: Dict[int, Tuple[float, float]] = {}
+        best = {source: 0.0}
+        heap = [(0.0, 0.0, source)]
+        while heap:
+            seconds, meters, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled[u] = (seconds, meters)
+            for k in range(first[u], first[u + 1]):
+                v = head[k]
+                candidate = seconds + times[k]
+                if candidate < best.get(v, math.inf):
+                    best[v] = candidate
+                    heapq.heappush(heap, (candidate, meters + lengths[k], v))
+        return settled
+
+    def query(self, source: int, target: int) -> Optional[Tuple[float, float]]:
+        """
+        Plus rapide chemin entre deux nœuds : (durée en secondes, longueur en mètres),
+        ou None si la destination est inaccessible.
+        """
+        if source == target:
+            return 0.0, 0.0
+
+        # Chaque recherche : (arcs montants, arcs pour le blocage, nœuds fixés, distances provisoires, tas)
+        searches = ((self._up, self._down, {}, {source: 0.0}, [(0.0, 0.0, source)]),
+                    (self._down, self._up, {}, {target: 0.0}, [(0.0, 0.0, target)]))
+        best_time = math.inf
+        best_length = 0.0
+
+        while searches[0][4] or searches[1][4]:
+            # Arrêt dès que les deux fronts ne peuvent plus améliorer la meilleure jonction
+            tops = [s[4][0][0] if s[4] else math.inf for s in searches]
+            if min(tops) >= best_time:
+                break
+            side = 0 if tops[0] <= tops[1] else 1
+
+            (first, head, times, lengths), stall, settled, best, heap = searches[side]
+            seconds, meters, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled[u] = (seconds, meters)
+
+            other = searches[1 - side][2]
+            if u in other and seconds + other[u][0] < best_time:
+                best_time = seconds + other[u][0]
+                best_length = meters + other[u][1]
+
+            # Blocage à la demande : inutile de poursuivre depuis un nœud atteint plus
+            # court par un voisin de rang supérieur
+            stall_first, stall_head, stall_times, _ = stall
+            if any(best.get(stall_head[k], math.inf) + stall_times[k] < seconds for k in range(stall_first[u], stall_first[u + 1])):
+                continue
+
+            for k in range(first[u], first[u + 1]):
+                v = head[k]
+                candidate = seconds + times[k]
+                if candidate < best.get(v, math.inf):
+                    best[v] = candidate
+                    heapq.heappush(heap, (candidate, meters + lengths[k], v))
+
+        if best_time == math.inf:
+            return None
+        return best_time, best_length
+
+    def many_to_many(self, sources: Sequence[int], targets: Sequence[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Matrices (durées en secondes, longueurs en mètres) entre tous les couples,
+        par l'algorithme des seaux : une recherche montante par nœud au lieu d'une
+        requête par couple. Les couples inaccessibles valent NaN.
+        """
+        times = np.full((len(sources), len(targets)), np.nan)
+        lengths = np.full((len(sources), len(targets)), np.nan)
+
+        buckets: Dict[int, List[Tuple[int, float, float]]] = {}
+        for j, target in enumerate(targets):
+            for node, (seconds, meters) in self._upward_search(target, self._down).items():
+                buckets.setdefault(node, []).append((j, seconds, meters))
+
+        for i, source in enumerate(sources):
+            row_time = [math.inf] * len(targets)
+            row_length = [math.nan] * len(targets)
+            for node, (seconds, meters) in self._upward_search(source, self._up).items():
+                for j, down_seconds, down_meters in buckets.get(node, ()):
+                    total = seconds + down_seconds
+                    if total < row_time[j]:
+                        row_time[j] = total
+                        row_length[j] = meters + down_meters
+            times[i] = [t if t != math.inf else math.nan for t in row_time]
+            lengths[i] = row_length
+        return times, lengths
+
+
+class NodeLocator:
+    """
+    Rattachement d'un point GPS au nœud du graphe le plus proche (grille régulière).
+    """
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, cell_size: float = 0.005):
+        self.lat = lat.tolist()
+        self.lng = lng.tolist()
+        self.cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        for node, (node_lat, node_lng) in enumerate(zip(self.lat, self.lng)):
+            self._cells.setdefault(self._cell(node_lat, node_lng), []).append(node)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_size)), int(math.floor(lng / self.cell_size))
+
+    def nearest(self, lat: float, lng: float, max_distance: float) -> Optional[Tuple[int, float]]:
+        """
+        Retourner (nœud, distance en km) dans un rayon de `max_distance` km, ou None.
+        """
+        center_i, center_j = self._cell(lat, lng)
+        cell_km = self.cell_size * KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6)
+        max_ring = int(math.ceil(max_distance / cell_km)) + 1
+
+        best: Optional[Tuple[int, float]] = None
+        for ring in range(max_ring + 1):
+            for i in range(center_i - ring, center_i + ring + 1):
+                for j in range(center_j - ring, center_j + ring + 1):
+                    if max(abs(i - center_i), abs(j - center_j)) != ring:
+                        continue
+                    for node in self._cells.get((i, j), ()):
+                        distance = haversine(lat, lng, self.lat[node], self.lng[node])
+                        if distance <= max_distance and (best is None or distance < best[1]):
+                            best = (node, distance)
+            # Tout nœud hors des anneaux visités est au moins à `ring * cell_km`
+            if best is not None and best[1] <= ring * cell_km:
+                break
+        return best
+
+
+class RoutingEngine:
+    """
+    Calcul d'itinéraires routiers hors ligne sur un extrait OSM local.
+
+    L'API ne fait que charger le précalcul produit hors ligne par
+    scripts/build_routing_graph.py : sans lui, `available` vaut False et les
+    appelants se replient sur l'estimation à vol d'oiseau.
+    """
+
+    def __init__(self, osm_path: str = "", cache_path: str = "", snap_distance: float = 0.5):
+        self.osm_path = osm_path
+        self.cache_path = cache_path or (f"{osm_path}.ch.npz" if osm_path else "")
+        self.snap_distance = snap_distance
+        self.hierarchy: Optional[ContractionHierarchy] = None
+        self.locator: Optional[NodeLocator] = None
+        self._loading = False
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.hierarchy is not None
+
+    def use_graph(self, graph: RoadGraph, hierarchy: Optional[ContractionHierarchy] = None) -> None:
+        self.locator = NodeLocator(graph.lat, graph.lng)
+        self.hierarchy = hierarchy or ContractionHierarchy.build(graph)
+
+    def _source_signature(self) -> Optional[Tuple[int, int]]:
+        """
+        Signature (date de modification, taille) de l'extrait OSM, s'il est présent.
+        """
+        if not self.osm_path or not os.path.exists(self.osm_path):
+            return None
+        stat = os.stat(self.osm_path)
+        return int(stat.st_mtime), int(stat.st_size)
+
+    def load(self) -> bool:
+        """
+        Charger le précalcul (hiérarchie et coordonnées des nœuds), sans relire
+        l'extrait OSM. Il est rejeté s'il a été construit à partir d'un autre
+        extrait que celui présent ; l'API ne le reconstruit jamais elle-même.
+        """
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            logger.warning("Aucun précalcul d'itinéraires, distances à vol d'oiseau utilisées")
+            return False
+
+        hierarchy = ContractionHierarchy.load(self.cache_path, self._source_signature())
+        if hierarchy is None or hierarchy.coordinates is None:
+            logger.warning(
+                "Précalcul d'itinéraires périmé ou d'un ancien format, distances à vol d'oiseau utilisées "
+                "(relancer scripts/build_routing_graph.py)"
+            )
+            return False
+
+        self.locator = NodeLocator(*hierarchy.coordinates)
+        self.hierarchy = hierarchy
+        return True
+
+    def build(self) -> bool:
+        """
+        Construire le graphe et sa hiérarchie de contraction à partir de
+        l'extrait OSM, puis enregistrer le précalcul. Traitement long, réservé
+        à scripts/build_routing_graph.py.
+        """
+        signature = self._source_signature()
+        if signature is None:
+            logger.warning("Aucun extrait OSM configuré")
+            return False
+
+        graph = RoadGraph.from_osm(self.osm_path)
+        hierarchy = ContractionHierarchy.build(graph)
+        if self.cache_path:
+            hierarchy.save(self.cache_path, signature)
+        self.use_graph(graph, hierarchy)
+        return True
+
+    def load_in_background(self) -> None:
+        with self._lock:
+            if self._loading or self.available:
+                return
+            self._loading = True
+
+        def run():
+            try:
+                self.load()
+            except Exception as e:
+                logger.error(f"Erreur lors du chargement du graphe routier: {str(e)}")
+            finally:
+                self._loading = False
+
+        threading.Thread(target=run, name="routing-loader", daemon=True).start()
+
+    def _snap(self, lat: float, lng: float) -> Optional[Tuple[int, float]]:
+        return self.locator.nearest(lat, lng, self.snap_distance)
+
+    def route(self, lat1: float, lng1: float, lat2: float, lng2: float) -> Optional[Tuple[float, float]]:
+        """
+        Itinéraire le plus rapide : (distance en km, durée à vide en minutes),
+        ou None si le graphe n'est pas chargé ou si un point est hors réseau.
+        """
+        if not self.available:
+            return None
+        origin = self._snap(lat1, lng1)
+        destination = self._snap(lat2, lng2)
+        if origin is None or destination is None:
+            return None
+        result = self.hierarchy.query(origin[0], destination[0])
+        if result is None:
+            return None
+        seconds, meters = result
+        # Les tronçons d'accès au réseau sont comptés à vol d'oiseau
+        access_km = origin[1] + destination[1]
+        return meters / 1000 + access_km, seconds / 60 + access_km / HIGHWAY_SPEEDS["service"] * 60
+
+    def route_matrix(
+        self,
+        origins: Sequence[Tuple[float, float]],
+        destinations: Sequence[Tuple[float, float]]
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Matrices (distances en km, durées à vide en minutes) entre origines et destinations.
+        Les couples hors réseau ou inaccessibles valent NaN.
+        """
+        if not self.available:
+            return None
+        origin_snaps = [self._snap(lat, lng) for lat, lng in origins]
+        destination_snaps = [self._snap(lat, lng) for lat, lng in destinations]
+
+        valid_origins = [i for i, snap in enumerate(origin_snaps) if snap is not None]
+        valid_destinations = [j for j, snap in enumerate(destination_snaps) if snap is not None]
+
+        distances = np.full((len(origins), len(destinations)), np.nan)
+        durations = np.full((len(origins), len(destinations)), np.nan)
+        if not valid_origins or not valid_destinations:
+            return distances, durations
+
+        seconds, meters = self.hierarchy.many_to_many(
+            [origin_snaps[i][0] for i in valid_origins],
+            [destination_snaps[j][0] for j in valid_destinations]
+        )
+        access_km = (
+            np.array([origin_snaps[i][1] for i in valid_origins])[:, np.newaxis]
+            + np.array([destination_snaps[j][1] for j in valid_destinations])[np.newaxis, :]
+        )
+        rows = np.array(valid_origins)[:, np.newaxis]
+        columns = np.array(valid_destinations)[np.newaxis, :]
+        distances[rows, columns] = meters / 1000 + access_km
+        durations[rows, columns] = seconds / 60 + access_km / HIGHWAY_SPEEDS["service"] * 60
+        return distances, durations
+
+
+def _witness_search(
+    out_adj: List[Dict[int, Tuple[float, float]]],
+    source: int,
+    excluded: int,
+    limit: float,
+    targets: Dict[int, Tuple[float, float]]
+) -> Dict[int, float]:
+    """
+    Dijkstra local depuis `source` sans passer par `excluded`, borné en durée
+    et en nombre de nœuds visités. Un chemin trouvé évite un raccourci.
+    """
+    best = {source: 0.0}
+    settled = set()
+    heap = [(0.0, source)]
+    remaining = sum(1 for w in targets if w != source)
+    while heap and len(settled) < WITNESS_SETTLE_LIMIT and remaining > 0:
+        seconds, u = heapq.heappop(heap)
+        if u in settled:
+            continue
+        settled.add(u)
+        if u in targets and u != source:
+            remaining -= 1
+        if seconds > limit:
+            break
+        for v, (t, _) in out_adj[u].items():
+            if v == excluded:
+                continue
+            candidate = seconds + t
+            if candidate < best.get(v, math.inf):
+                best[v] = candidate
+                heapq.heappush(heap, (candidate, v))
+    return best
+
+
+def _columns(edges: List[Tuple[int, int, float, float]]):
+    if not edges:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+    tails, heads, times, lengths = zip(*edges)
+    return np.array(tails), np.array(heads), np.array(times), np.array(lengths)
+
+
+def _to_csr(n: int, tails, heads, times, lengths):
+    tails = np.asarray(tails, dtype=np.int64)
+    order = np.argsort(tails, kind="stable")
+    first_out = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tails, minlength=n), out=first_out[1:])
+    return (
+        first_out,
+        np.asarray(heads, dtype=np.int64)[order],
+        np.asarray(times, dtype=np.float64)[order],
+        np.asarray(lengths, dtype=np.float64)[order]
+    )
+
+
+def _open_osm(path: str):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _way_speed(tags: Dict[str, str], highway: str) -> float:
+    maxspeed = tags.get("maxspeed", "")
+    if maxspeed.isdigit():
+        # Vitesse pratiquée plutôt que vitesse légale
+        return min(float(maxspeed), HIGHWAY_SPEEDS[highway] * 1.5)
+    return float(HIGHWAY_SPEEDS[highway])
+
+
+def _way_direction(tags: Dict[str, str], highway: str) -> int:
+    """
+    1 : sens de saisie uniquement, -1 : sens inverse uniquement, 0 : double sens.
+    """
+    oneway = tags.get("oneway")
+    if oneway in ("yes", "true", "1"):
+        return 1
+    if oneway == "-1":
+        return -1
+    if oneway == "no":
+        return 0
+    if highway == "motorway" or tags.get("junction") == "roundabout":
+        return 1
+    return 0
+
+
+# Moteur partagé par le processus, chargé au démarrage si un extrait OSM est configuré
+routing_engine = RoutingEngine(
+    osm_path=settings.ROUTING_OSM_PATH,
+    cache_path=settings.ROUTING_CACHE_PATH,
+    snap_distance=settings.ROUTING_SNAP_MAX_KM
+)
@@ -0,0 +1,498 @@
+from typing import Dict, List, Optional, Tuple, Any, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import math
+import time
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.exceptions import BadRequestError
+from .cache import get_cache, set_cache
+from .courier_index import _as_naive_utc
+from .assignment import VEHICLE_CAPACITY_KG, package_weight
+from .geolocation import calculate_distance_and_duration_matrix
+
+logger = logging.getLogger(__name__)
+
+# Volume estimé (m³) d'un colis selon sa taille
+PACKAGE_SIZE_VOLUME_M3 = {
+    "small": 0.02,
+    "medium": 0.1,
+    "large": 0.4
+}
+
+PICKUP = "pickup"
+DROPOFF = "dropoff"
+
+TOUR_KEY = "tour:courier:{courier_id}"
+
+
+@dataclass
+class TourStop:
+    delivery_id: int
+    kind: str  # pickup ou dropoff
+    lat: float
+    lng: float
+    weight: float
+    volume: float
+    window_start: Optional[float] = None  # en minutes depuis le départ
+    window_end: Optional[float] = None
+    address: Optional[str] = None
+    commune: Optional[str] = None
+
+    @property
+    def key(self) -> Tuple[int, str]:
+        return self.delivery_id, self.kind
+
+
+class TourProblem:
+    """
+    Tournée d'un coursier : suite ordonnée d'arrêts (ramassages et remises) au
+    départ de sa position. Un ramassage précède toujours la remise du même colis,
+    la charge ne dépasse jamais la capacité du véhicule, et chaque minute de retard
+    sur une fenêtre horaire coûte `lateness_weight` minutes.
+    """
+
+    def __init__(
+        self,
+        stops: Sequence[TourStop],
+        travel: Sequence[Sequence[float]],
+        service_minutes: float = 0.0,
+        max_weight: Optional[float] = None,
+        max_volume: Optional[float] = None,
+        initial_weight: float = 0.0,
+        initial_volume: float = 0.0,
+        lateness_weight: float = 10.0
+    ):
+        # `travel` est indexé par 0 = départ, puis 1..n = arrêts
+        self.stops = list(stops)
+        self.travel = [list(row) for row in travel]
+        self.service_minutes = service_minutes
+        # Colis déjà à bord : la capacité ne peut pas être inférieure à la charge initiale
+        self.max_weight = max(max_weight, initial_weight) if max_weight else math.inf
+        self.max_volume = max(max_volume, initial_volume) if max_volume else math.inf
+        self.initial_weight = initial_weight
+        self.initial_volume = initial_volume
+        self.lateness_weight = lateness_weight
+
+        self._index = {stop.key: i for i, stop in enumerate(self.stops)}
+        self._pickup_of = [
+            self._index.get((stop.delivery_id, PICKUP), -1) if stop.kind == DROPOFF else -1
+            for stop in self.stops
+        ]
+        self._weight_delta = [stop.weight if stop.kind == PICKUP else -stop.weight for stop in self.stops]
+        self._volume_delta = [stop.volume if stop.kind == PICKUP else -stop.volume for stop in self.stops]
+
+    def __len__(self) -> int:
+        return len(self.stops)
+
+    def index_of(self, key: Tuple[int, str]) -> Optional[int]:
+        return self._index.get(key)
+
+    def pickup_of(self, stop: int) -> int:
+        return self._pickup_of[stop]
+
+    def cost(self, order: Sequence[int]) -> float:
+        """
+        Heure de fin de tournée (minutes) plus la pénalité de retard, ou l'infini si
+        l'ordre viole la capacité ou l'ordre ramassage/remise.
+        """
+        travel = self.travel
+        pickup_of = self._pickup_of
+        visited = [False] * len(self.stops)
+        clock, lateness = 0.0, 0.0
+        weight, volume = self.initial_weight, self.initial_volume
+        previous = 0
+        for stop in order:
+            pickup = pickup_of[stop]
+            if pickup >= 0 and not visited[pickup]:
+                return math.inf
+            visited[stop] = True
+            clock += travel[previous][stop + 1]
+            data = self.stops[stop]
+            if data.window_start is not None and clock < data.window_start:
+                clock = data.window_start
+            if data.window_end is not None and clock > data.window_end:
+                lateness += clock - data.window_end
+            clock += self.service_minutes
+            weight += self._weight_delta[stop]
+            volume += self._volume_delta[stop]
+            if weight > self.max_weight + 1e-9 or volume > self.max_volume + 1e-9:
+                return math.inf
+            previous = stop + 1
+        return clock + self.lateness_weight * lateness
+
+    def schedule(self, order: Sequence[int]) -> List[Dict[str, float]]:
+        """
+        Heure d'arrivée, retard et charge après chaque arrêt de la tournée.
+        """
+        result = []
+        clock = 0.0
+        weight, volume = self.initial_weight, self.initial_volume
+        previous = 0
+        for stop in order:
+            clock += self.travel[previous][stop + 1]
+            data = self.stops[stop]
+            if data.window_start is not None and clock < data.window_start:
+                clock = data.window_start
+            late = max(0.0, clock - data.window_end) if data.window_end is not None else 0.0
+            weight += self._weight_delta[stop]
+            volume += self._volume_delta[stop]
+            result.append({"arrival": clock, "late": late, "weight": weight, "volume": volume})
+            clock += self.service_minutes
+            previous = stop + 1
+        return result
+
+
+def _delivery_chains(problem: TourProblem) -> List[List[int]]:
+    """
+    Une chaîne par livraison : [ramassage, remise], ou [remise] si le colis est déjà à bord.
+    """
+    chains = []
+    for i, stop in enumerate(problem.stops):
+        if stop.kind == PICKUP:
+            dropoff = problem.index_of((stop.delivery_id, DROPOFF))
+            chains.append([i, dropoff] if dropoff is not None else [i])
+        elif problem.pickup_of(i) < 0:
+            chains.append([i])
+    return chains
+
+
+def savings_tour(problem: TourProblem) -> List[int]:
+    """
+    Construction par économies (Clarke et Wright) pour une tournée ouverte : chaque
+    livraison part d'abord seule depuis la position du coursier, puis les chaînes
+    sont mises bout à bout par ordre d'économie décroissante,
+    s(a, b) = t(départ, début de b) - t(fin de a, début de b), tant que la chaîne
+    obtenue reste réalisable. Les chaînes restantes sont enchaînées au plus proche.
+    """
+    chains = _delivery_chains(problem)
+    travel = problem.travel
+    savings = []
+    for a, chain_a in enumerate(chains):
+        tail = chain_a[-1] + 1
+        for b, chain_b in enumerate(chains):
+            if a != b:
+                head = chain_b[0] + 1
+                saving = travel[0][head] - travel[tail][head]
+                if saving > 0:
+                    savings.append((saving, chain_a[-1], chain_b[0]))
+    savings.sort(key=lambda item: -item[0])
+
+    chain_of_tail = {chain[-1]: chain for chain in chains}
+    chain_of_head = {chain[0]: chain for chain in chains}
+    for _, tail, head in savings:
+        first = chain_of_tail.get(tail)
+        second = chain_of_head.get(head)
+        if first is None or second is None or first is second:
+            continue
+        merged = first + second
+        if problem.cost(merged) == math.inf:
+            continue
+        del chain_of_tail[tail]
+        del chain_of_head[head]
+        chain_of_head[merged[0]] = merged
+        chain_of_tail[merged[-1]] = merged
+
+    remaining = list(chain_of_head.values())
+    order: List[int] = []
+    previous = 0
+    while remaining:
+        nearest = min(remaining, key=lambda chain: travel[previous][chain[0] + 1])
+        remaining.remove(nearest)
+        order.extend(nearest)
+        previous = order[-1] + 1
+    return order
+
+
+def _best_insertion(problem: TourProblem, order: List[int], chain: List[int]) -> Tuple[float, List[int]]:
+    """
+    Meilleure insertion d'un ramassage et de sa remise (ou d'un arrêt seul) dans la tournée.
+    """
+    best_cost, best_order = math.inf, order + chain
+    if len(chain) == 1:
+        for i in range(len(order) + 1):
+            candidate = order[:i] + chain + order[i:]
+            cost = problem.cost(candidate)
+            if cost < best_cost:
+                best_cost, best_order = cost, candidate
+        return best_cost, best_order
+
+    pickup, dropoff = chain
+    for i in range(len(order) + 1):
+        with_pickup = order[:i] + [pickup] + order[i:]
+        for j in range(i + 1, len(with_pickup) + 1):
+            candidate = with_pickup[:j] + [dropoff] + with_pickup[j:]
+            cost = problem.cost(candidate)
+            if cost < best_cost:
+                best_cost, best_order = cost, candidate
+    return best_cost, best_order
+
+
+def improve_tour(problem: TourProblem, order: List[int], deadline: Optional[float] = None) -> List[int]:
+    """
+    Recherche locale à première amélioration : déplacement d'un arrêt, inversion
+    d'un segment (2-opt) et réinsertion d'une livraison complète (ramassage et
+    remise ensemble). S'arrête à l'optimum local ou à l'échéance (time.monotonic()).
+    """
+    order = list(order)
+    best = problem.cost(order)
+    n = len(order)
+
+    def expired() -> bool:
+        return deadline is not None and time.monotonic() > deadline
+
+    improved = True
+    while improved and not expired():
+        improved = False
+
+        # Déplacement d'un arrêt
+        for i in range(n):
+            stop = order[i]
+            rest = order[:i] + order[i + 1:]
+            for j in range(n):
+                if j == i:
+                    continue
+                candidate = rest[:j] + [stop] + rest[j:]
+                cost = problem.cost(candidate)
+                if cost < best - 1e-9:
+                    order, best, improved = candidate, cost, True
+                    break
+            if improved or expired():
+                break
+        if improved:
+            continue
+
+        # Inversion de segment
+        for i in range(n - 1):
+            for j in range(i + 1, n):
+                candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                cost = problem.cost(candidate)
+                if cost < best - 1e-9:
+                    order, best, improved = candidate, cost, True
+                    break
+            if improved or expired():
+                break
+        if improved:
+            continue
+
+        # Réinsertion d'une livraison complète
+        for chain in _delivery_chains(problem):
+            if len(chain) < 2:
+                continue
+            rest = [stop for stop in order if stop not in chain]
+            cost, candidate = _best_insertion(problem, rest, chain)
+            if cost < best - 1e-9:
+                order, best, improved = candidate, cost, True
+                break
+            if expired():
+                break
+
+    return order
+
+
+def optimize_tour(
+    problem: TourProblem,
+    previous_order: Optional[Sequence[Tuple[int, str]]] = None,
+    time_budget: Optional[float] = None
+) -> List[int]:
+    """
+    Ordonner les arrêts de la tournée. Sans tournée précédente, construction par
+    économies puis recherche locale. Avec une tournée précédente (clés
+    (livraison, type d'arrêt)), les arrêts terminés en sont retirés, les nouvelles
+    livraisons y sont insérées au meilleur endroit, puis la recherche locale reprend
+    à partir de cet ordre : l'ordre annoncé au coursier ne change que si c'est utile.
+    """
+    deadline = time.monotonic() + time_budget if time_budget else None
+    if not problem.stops:
+        return []
+
+    if previous_order:
+        order = [problem.index_of(tuple(key)) for key in previous_order]
+        order = [stop for stop in order if stop is not None]
+        placed = set(order)
+        for chain in _delivery_chains(problem):
+            missing = [stop for stop in chain if stop not in placed]
+            if len(missing) == len(chain):
+                _, order = _best_insertion(problem, order, chain)
+            else:
+                for stop in missing:
+                    _, order = _best_insertion(problem, order, [stop])
+        if problem.cost(order) == math.inf:
+            order = savings_tour(problem)
+    else:
+        order = savings_tour(problem)
+
+    return improve_tour(problem, order, deadline)
+
+
+def _courier_capacity(db: Session, courier_id: int) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Capacité (kg, m³) du véhicule principal du coursier, à défaut la capacité
+    indicative de son type de véhicule.
+    """
+    from .load_planner import courier_vehicle_bin
+
+    vehicle = courier_vehicle_bin(db, courier_id)
+    if vehicle is None:
+        return VEHICLE_CAPACITY_KG["motorcycle"], None
+    return vehicle.max_weight, vehicle.max_volume
+
+
+def _minutes_from(now: datetime, value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    return (_as_naive_utc(value) - now).total_seconds() / 60
+
+
+def build_courier_problem(db: Session, courier_id: int, now: datetime) -> Tuple[TourProblem, List[List[float]]]:
+    """
+    Construire la tournée à ordonner à partir des livraisons acceptées ou en cours
+    du coursier. Retourne aussi les distances (km) depuis le départ et entre arrêts.
+    """
+    from ..models.delivery import Delivery, DeliveryStatus, IN_FLIGHT_STATUSES
+    from ..models.user import CourierProfile
+
+    deliveries = db.query(Delivery).filter(
+        Delivery.courier_id == courier_id,
+        Delivery.status.in_(IN_FLIGHT_STATUSES),
+        Delivery.delivery_lat.isnot(None),
+        Delivery.delivery_lng.isnot(None)
+    ).order_by(Delivery.accepted_at, Delivery.id).limit(settings.TOUR_MAX_DELIVERIES).all()
+
+    stops: List[TourStop] = []
+    initial_weight, initial_volume = 0.0, 0.0
+    for delivery in deliveries:
+        weight = package_weight(delivery.package_weight, delivery.package_size)
+        volume = PACKAGE_SIZE_VOLUME_M3.get(delivery.package_size or "small", PACKAGE_SIZE_VOLUME_M3["small"])
+        picked_up = delivery.status == DeliveryStatus.in_progress or delivery.pickup_lat is None
+        if picked_up:
+            initial_weight += weight
+            initial_volume += volume
+        else:
+            stops.append(TourStop(
+                delivery_id=delivery.id,
+                kind=PICKUP,
+                lat=delivery.pickup_lat,
+                lng=delivery.pickup_lng,
+                weight=weight,
+                volume=volume,
+                window_start=_minutes_from(now, delivery.pickup_window_start),
+                window_end=_minutes_from(now, delivery.pickup_window_end),
+                address=delivery.pickup_address,
+                commune=delivery.pickup_commune
+            ))
+        stops.append(TourStop(
+            delivery_id=delivery.id,
+            kind=DROPOFF,
+            lat=delivery.delivery_lat,
+            lng=delivery.delivery_lng,
+            weight=weight,
+            volume=volume,
+            window_start=_minutes_from(now, delivery.delivery_window_start),
+            window_end=_minutes_from(now, delivery.delivery_window_end),
+            address=delivery.delivery_address,
+            commune=delivery.delivery_commune
+        ))
+
+    profile = db.query(CourierProfile).filter(CourierProfile.user_id == courier_id).first()
+    has_start = bool(profile and profile.last_location_lat and profile.last_location_lng)
+
+    points = [(stop.lat, stop.lng) for stop in stops]
+    if has_start:
+        points.insert(0, (profile.last_location_lat, profile.last_location_lng))
+    distances, durations = calculate_distance_and_duration_matrix(points, points) if points else ([], [])
+    distances = [[float(value) for value in row] for row in distances]
+    travel = [[float(value) for value in row] for row in durations]
+    if not has_start:
+        # Position inconnue : la tournée commence au premier arrêt
+        distances.insert(0, [0.0] * len(points))
+        travel.insert(0, [0.0] * len(points))
+        for row in distances:
+            row.insert(0, 0.0)
+        for row in travel:
+            row.insert(0, 0.0)
+
+    max_weight, max_volume = _courier_capacity(db, courier_id)
+    problem = TourProblem(
+        stops,
+        travel,
+        service_minutes=settings.TOUR_SERVICE_MINUTES,
+        max_weight=max_weight,
+        max_volume=max_volume,
+        initial_weight=initial_weight,
+        initial_volume=initial_volume,
+        lateness_weight=settings.TOUR_LATENESS_WEIGHT
+    )
+    return problem, distances
+
+
+async def _get_stored_tour(courier_id: int) -> Optional[List[List[Any]]]:
+    try:
+        value = await get_cache(TOUR_KEY.format(courier_id=courier_id))
+    except Exception as e:
+        logger.warning(f"Cache Redis des tournées indisponible: {str(e)}")
+        return None
+    return value.get("stops") if isinstance(value, dict) else None
+
+
+async def _store_tour(courier_id: int, keys: List[List[Any]]) -> None:
+    try:
+        await set_cache(TOUR_KEY.format(courier_id=courier_id), {"stops": keys}, expire=settings.TOUR_CACHE_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"Cache Redis des tournées indisponible: {str(e)}")
+
+
+async def plan_courier_tour(db: Session, courier_id: int, reoptimize: bool = False) -> Dict[str, Any]:
+    """
+    Ordre de passage des livraisons en cours d'un coursier. La tournée précédente
+    (conservée dans Redis) est réutilisée et complétée par les nouvelles livraisons,
+    sauf si `reoptimize` demande de la reconstruire entièrement. Les requêtes,
+    la matrice des distances et la recherche locale tournent dans un thread ;
+    seuls les échanges avec Redis restent sur la boucle d'événements.
+    """
+    now = datetime.utcnow()
+    problem, distances = await asyncio.to_thread(build_courier_problem, db, courier_id, now)
+    if len(problem) > 2 * settings.TOUR_MAX_DELIVERIES:
+        raise BadRequestError("Trop d'arrêts pour optimiser la tournée")
+
+    previous = None if reoptimize else await _get_stored_tour(courier_id)
+    order = await asyncio.to_thread(optimize_tour, problem, previous, time_budget=settings.TOUR_TIME_BUDGET_MS / 1000)
+    if problem.cost(order) == math.inf:
+        raise BadRequestError("La capacité du véhicule ne permet pas de réaliser ces livraisons")
+
+    await _store_tour(courier_id, [list(problem.stops[stop].key) for stop in order])
+
+    schedule = problem.schedule(order)
+    stops = []
+    total_distance = 0.0
+    previous_point = 0
+    for stop, timing in zip(order, schedule):
+        data = problem.stops[stop]
+        total_distance += distances[previous_point][stop + 1]
+        previous_point = stop + 1
+        stops.append({
+            "delivery_id": data.delivery_id,
+            "type": data.kind,
+            "address": data.address,
+            "commune": data.commune,
+            "lat": data.lat,
+            "lng": data.lng,
+            "estimated_arrival": now + timedelta(minutes=timing["arrival"]),
+            "late_minutes": round(timing["late"], 1),
+            "load_weight": round(timing["weight"], 2)
+        })
+
+    duration = schedule[-1]["arrival"] + problem.service_minutes if schedule else 0.0
+    return {
+        "courier_id": courier_id,
+        "stops": stops,
+        "total_distance": round(total_distance, 2),
+        "total_duration": int(math.ceil(duration)),
+        "late_stops": sum(1 for stop in stops if stop["late_minutes"] > 0),
+        "max_weight": None if problem.max_weight == math.inf else problem.max_weight,
+        "optimized_at": now
+    }
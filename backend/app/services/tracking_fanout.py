@@ -0,0 +1,248 @@
+from typing import Any, Callable, Dict, List, Optional, Set
+import asyncio
+import json
+import logging
+
+from ..core.config import settings
+from .cache import get_redis_connection
+from .position_codec import JSON, BINARY, encode_message
+from .position_coalescer import PositionCoalescer
+
+logger = logging.getLogger(__name__)
+
+# Canal Redis des positions d'une livraison, et clé de sa dernière position connue
+TRACKING_CHANNEL = "tracking:delivery:{delivery_id}"
+LAST_POSITION_KEY = "tracking:last:{delivery_id}"
+
+
+def delivery_from_channel(channel: str) -> int:
+    return int(channel.rsplit(":", 1)[1])
+
+
+class TrackingFanout:
+    """
+    Diffusion des positions d'une livraison à tous ses abonnés WebSocket,
+    quelle que soit l'instance de l'API à laquelle ils sont connectés.
+
+    Chaque position est publiée sur le canal Redis de la livraison ; chaque
+    instance n'est abonnée qu'aux canaux des livraisons pour lesquelles elle
+    a des connexions, et relaie les messages reçus à ses propres sockets, à
+    la cadence de chacune (voir PositionCoalescer). La dernière position
+    connue est partagée dans Redis, avec une durée de vie.
+    """
+
+    def __init__(
+        self,
+        redis_factory: Callable = get_redis_connection,
+        last_position_ttl: int = 3600,
+        default_max_rate: float = 1.0,
+        min_movement_m: float = 10.0,
+        stationary_interval: float = 15.0,
+        send_timeout: float = 10.0
+    ):
+        self.redis_factory = redis_factory
+        self.last_position_ttl = last_position_ttl
+        self.default_max_rate = default_max_rate
+        self.coalescer = PositionCoalescer(
+            self._send, self._abort,
+            min_movement_m=min_movement_m,
+            stationary_interval=stationary_interval,
+            send_timeout=send_timeout
+        )
+        # Connexions locales par livraison, et encodage négocié par chacune
+        self.active_connections: Dict[int, List[Any]] = {}
+        self.encodings: Dict[Any, str] = {}
+        self._subscribed: Set[int] = set()
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def connect(self, websocket: Any, delivery_id: int, encoding: str = JSON, max_rate: Optional[float] = None) -> None:
+        """
+        Abonner une socket aux positions d'une livraison, au plus `max_rate`
+        positions par seconde.
+        """
+        await websocket.accept()
+        self.active_connections.setdefault(delivery_id, []).append(websocket)
+        self.encodings[websocket] = encoding
+        self.coalescer.add(websocket, delivery_id, max_rate or self.default_max_rate)
+        await self._sync_subscription(delivery_id)
+
+        # Envoyer la dernière position connue
+        last_position = await self.get_last_position(delivery_id)
+        if last_position is not None:
+            await self._send(websocket, last_position)
+            if last_position.get("type") == "position":
+                self.coalescer.mark_sent(websocket, last_position)
+
+    async def disconnect(self, websocket: Any, delivery_id: int) -> None:
+        connections = self.active_connections.get(delivery_id)
+        if connections is None:
+            return
+        if websocket in connections:
+            connections.remove(websocket)
+            self.encodings.pop(websocket, None)
+            self.coalescer.remove(websocket)
+        # Supprimer la liste si elle est vide, et quitter le canal
+        if not connections:
+            del self.active_connections[delivery_id]
+            await self._sync_subscription(delivery_id)
+
+    async def _abort(self, websocket: Any, delivery_id: int) -> None:
+        """
+        Abonné en erreur ou trop lent : le retirer de la salle et fermer sa
+        socket, pour que le client se reconnecte au lieu d'attendre en silence.
+        """
+        await self.disconnect(websocket, delivery_id)
+        try:
+            await asyncio.wait_for(websocket.close(code=1013), timeout=self.coalescer.send_timeout)
+        except Exception:
+            pass
+
+    async def broadcast(self, delivery_id: int, message: Dict[str, Any]) -> None:
+        """
+        Publier une position : elle devient la dernière position connue et
+        part vers toutes les instances abonnées, celle-ci comprise.
+        """
+        data = json.dumps(message)
+        try:
+            r = await self.redis_factory()
+            pipe = r.pipeline(transaction=False)
+            pipe.set(LAST_POSITION_KEY.format(delivery_id=delivery_id), data, ex=self.last_position_ttl)
+            pipe.publish(TRACKING_CHANNEL.format(delivery_id=delivery_id), data)
+            await pipe.execute()
+        except Exception as e:
+            # Redis indisponible : servir au moins les connexions de cette instance
+            logger.error(f"Erreur lors de la publication de la position: {str(e)}")
+            await self.send_local(delivery_id, message)
+            return
+        if delivery_id in self.active_connections and delivery_id not in self._subscribed:
+            # Abonnement au canal pas encore rétabli : le message publié ne
+            # reviendra pas à cette instance, servir ses connexions directement
+            await self.send_local(delivery_id, message)
+
+    async def get_last_position(self, delivery_id: int) -> Optional[Dict[str, Any]]:
+        try:
+            r = await self.redis_factory()
+            data = await r.get(LAST_POSITION_KEY.format(delivery_id=delivery_id))
+        except Exception as e:
+            logger.error(f"Erreur lors de la lecture de la dernière position: {str(e)}")
+            return None
+        return json.loads(data) if data else None
+
+    def _encode(self, message: Dict[str, Any]) -> Optional[bytes]:
+        """
+        Trame binaire d'une position ; None si elle n'est pas encodable
+        (coordonnées non numériques ou hors bornes), l'abonné la reçoit alors en JSON.
+        """
+        try:
+            return encode_message(message)
+        except Exception as e:
+            logger.warning(f"Position non encodable pour la livraison {message.get('delivery_id')}, envoyée en JSON: {str(e)}")
+            return None
+
+    async def _send(self, websocket: Any, message: Dict[str, Any], frame: Optional[bytes] = None) -> None:
+        if self.encodings.get(websocket) == BINARY and message.get("type") == "position":
+            frame = frame or self._encode(message)
+            if frame is not None:
+                await websocket.send_bytes(frame)
+                return
+        await websocket.send_json(message)
+
+    async def send_local(self, delivery_id: int, message: Dict[str, Any]) -> None:
+        connections = list(self.active_connections.get(delivery_id, []))
+        if message.get("type") == "position":
+            # Trame binaire encodée une seule fois pour tous les abonnés qui l'ont demandée
+            frame = None
+            if any(self.encodings.get(c) == BINARY for c in connections):
+                frame = self._encode(message)
+            self.coalescer.offer(delivery_id, message, frame)
+            return
+
+        for connection in connections:
+            try:
+                await self._send(connection, message)
+            except Exception as e:
+                # Connexion fermée ou en erreur : on la supprime
+                logger.info(f"Connexion de suivi fermée pour la livraison {delivery_id}: {str(e)}")
+                await self._abort(connection, delivery_id)
+
+    async def _sync_subscription(self, delivery_id: int) -> None:
+        """
+        Aligner l'abonnement au canal de la livraison sur la présence de
+        connexions locales. Sous verrou : une connexion et une déconnexion
+        simultanées ne peuvent pas laisser l'abonnement dans le mauvais état.
+        Un abonnement en échec est retenté par la boucle d'écoute.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            wanted = delivery_id in self.active_connections
+            if wanted == (delivery_id in self._subscribed):
+                return
+            channel = TRACKING_CHANNEL.format(delivery_id=delivery_id)
+            try:
+                if self._pubsub is None:
+                    r = await self.redis_factory()
+                    self._pubsub = r.pubsub(ignore_subscribe_messages=True)
+                if wanted:
+                    await self._pubsub.subscribe(channel)
+                    self._subscribed.add(delivery_id)
+                else:
+                    await self._pubsub.unsubscribe(channel)
+                    self._subscribed.discard(delivery_id)
+            except Exception as e:
+                logger.error(f"Erreur d'abonnement au canal {channel}: {str(e)}")
+            if self._listener is None or self._listener.done():
+                self._listener = asyncio.create_task(self._listen())
+
+    async def _resync_subscriptions(self) -> None:
+        """
+        Rattraper les abonnements (ou désabonnements) qui ont échoué.
+        """
+        for delivery_id in set(self.active_connections) ^ self._subscribed:
+            await self._sync_subscription(delivery_id)
+
+    async def _listen(self) -> None:
+        """
+        Relayer aux sockets locales les positions publiées par toutes les
+        instances, en rattrapant au passage les abonnements en échec.
+        """
+        while True:
+            try:
+                await self._resync_subscriptions()
+                if self._pubsub is None:
+                    await asyncio.sleep(1)
+                    continue
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message is None or message.get("type") != "message":
+                    continue
+                await self.send_local(delivery_from_channel(message["channel"]), json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Écoute des positions interrompue: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.close()
+            self._pubsub = None
+        self._subscribed.clear()
+
+
+# Instance partagée par le processus
+tracking_fanout = TrackingFanout(
+    last_position_ttl=settings.TRACKING_LAST_POSITION_TTL_SECONDS,
+    default_max_rate=settings.TRACKING_DEFAULT_MAX_RATE_HZ,
+    min_movement_m=settings.TRACKING_MIN_MOVEMENT_METERS,
+    stationary_interval=settings.TRACKING_STATIONARY_INTERVAL_SECONDS,
+    send_timeout=settings.TRACKING_SEND_TIMEOUT_SECONDS
+)
@@ -0,0 +1,279 @@
+from typing import Any, Deque, Dict, Iterable, List, Optional
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+import asyncio
+import logging
+import time
+
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PositionUpdate:
+    delivery_id: int
+    courier_id: int
+    lat: float
+    lng: float
+    timestamp: datetime
+
+
+def latest_by_courier(updates: Iterable[PositionUpdate]) -> Dict[int, PositionUpdate]:
+    """
+    Dernière position de chaque coursier dans un lot : son profil n'est mis à
+    jour qu'une fois par lot, quel que soit le nombre de points reçus.
+    """
+    latest: Dict[int, PositionUpdate] = {}
+    for position in updates:
+        previous = latest.get(position.courier_id)
+        if previous is None or position.timestamp >= previous.timestamp:
+            latest[position.courier_id] = position
+    return latest
+
+
+def write_positions(db: Session, updates: List[PositionUpdate]) -> None:
+    """
+    Écrire un lot de positions en une transaction : un INSERT multi-lignes des
+    points de suivi et une mise à jour par coursier de sa dernière position.
+    """
+    from ..models.delivery import TrackingPoint
+    from ..models.user import CourierProfile
+
+    profiles = CourierProfile.__table__
+    db.execute(insert(TrackingPoint).values([
+        {
+            "delivery_id": position.delivery_id,
+            "lat": position.lat,
+            "lng": position.lng,
+            "timestamp": position.timestamp
+        }
+        for position in updates
+    ]))
+    db.execute(
+        update(profiles).where(profiles.c.user_id == bindparam("courier_id")).values(
+            last_location_lat=bindparam("lat"),
+            last_location_lng=bindparam("lng"),
+            last_location_updated=bindparam("updated_at")
+        ),
+        [
+            {"courier_id": position.courier_id, "lat": position.lat, "lng": position.lng, "updated_at": position.timestamp}
+            for position in latest_by_courier(updates).values()
+        ]
+    )
+    db.commit()
+
+
+def write_batch(updates: List[PositionUpdate]) -> None:
+    from ..db.session import SessionLocal
+
+    db = SessionLocal()
+    try:
+        write_positions(db, updates)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class TrackingIngestor:
+    """
+    Ingestion différée (write-behind) des positions GPS reçues en temps réel.
+
+    Les positions sont mises en mémoire tampon et écrites par lots, dès que
+    `batch_size` positions attendent ou au plus tard toutes les
+    `flush_interval` secondes. Quand le tampon atteint `max_pending`
+    positions, les producteurs attendent la fin de l'écriture en cours
+    (contre-pression) plutôt que de laisser la mémoire croître. Un lot en
+    échec (base indisponible) est remis en tête du tampon et retenté ; un lot
+    refusé pour ses données est coupé en deux jusqu'à isoler les positions
+    fautives, écartées dans `dead_letters`. À l'arrêt, `close()` vide le
+    tampon en base.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_pending: int = 20000,
+        writer=write_batch,
+        max_dead_letters: int = 1000
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._writer = writer
+        self._pending: List[PositionUpdate] = []
+        # Dernières positions refusées par la base, pour analyse
+        self.dead_letters: Deque[PositionUpdate] = deque(maxlen=max_dead_letters)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._drained: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self.stats: Dict[str, Any] = {
+            "received": 0,
+            "written": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "dead_lettered": 0,
+            "backpressure_waits": 0,
+            "max_pending": 0,
+            "last_batch_size": 0,
+            "last_flush_seconds": 0.0,
+            "last_flush_at": None,
+        }
+
+    def _events(self) -> None:
+        # Créés à la première utilisation, dans la boucle d'événements de l'API
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+            self._drained = asyncio.Event()
+            self._drained.set()
+            self._flush_lock = asyncio.Lock()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Indicateurs d'ingestion et de contre-pression.
+        """
+        return {
+            **self.stats,
+            "pending": self.pending,
+            "buffer_capacity": self.max_pending,
+            "buffer_usage": self.pending / self.max_pending if self.max_pending else 0.0,
+            "running": self._task is not None and not self._task.done(),
+        }
+
+    async def submit(self, position: PositionUpdate) -> None:
+        """
+        Mettre une position en attente d'écriture. Attend si le tampon est plein.
+        """
+        self._events()
+        while len(self._pending) >= self.max_pending and not self._closed:
+            self.stats["backpressure_waits"] += 1
+            self._drained.clear()
+            self._wakeup.set()
+            await self._drained.wait()
+        if self._closed:
+            # Plus de boucle d'écriture : écrire immédiatement
+            self._pending.append(position)
+            self.stats["received"] += 1
+            await self.flush()
+            return
+
+        self._pending.append(position)
+        self.stats["received"] += 1
+        self.stats["max_pending"] = max(self.stats["max_pending"], len(self._pending))
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """
+        Écrire les positions en attente, par lots de `batch_size`. Retourne le
+        nombre de positions écrites ; s'arrête au premier lot en échec.
+        """
+        self._events()
+        written = 0
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                # Parties du lot restant à écrire, la prochaine en fin de liste
+                parts = [batch]
+                try:
+                    while parts:
+                        rows = parts.pop()
+                        started = time.perf_counter()
+                        try:
+                            await asyncio.to_thread(self._writer, rows)
+                        except (IntegrityError, DataError) as e:
+                            # Données refusées : retenter chaque moitié, écarter une position isolée
+                            if len(rows) == 1:
+                                self._dead_letter(rows[0], e)
+                            else:
+                                middle = len(rows) // 2
+                                parts.extend([rows[middle:], rows[:middle]])
+                            continue
+                        written += len(rows)
+                        self.stats["written"] += len(rows)
+                        self.stats["batches"] += 1
+                        self.stats["last_batch_size"] = len(rows)
+                        self.stats["last_flush_seconds"] = time.perf_counter() - started
+                        self.stats["last_flush_at"] = datetime.utcnow().isoformat()
+                except Exception as e:
+                    # Remettre en tête ce qui n'est pas écrit, pour le prochain passage
+                    self._pending[:0] = rows + [row for part in reversed(parts) for row in part]
+                    self.stats["failed_batches"] += 1
+                    logger.error(f"Erreur lors de l'écriture de {len(batch)} points de suivi: {str(e)}")
+                    break
+                finally:
+                    if len(self._pending) < self.max_pending:
+                        self._drained.set()
+        return written
+
+    def _dead_letter(self, position: PositionUpdate, error: Exception) -> None:
+        self.dead_letters.append(position)
+        self.stats["dead_lettered"] += 1
+        logger.error(f"Point de suivi refusé par la base, écarté ({position}): {str(error)}")
+
+    async def run(self) -> None:
+        """
+        Boucle d'écriture, lancée au démarrage de l'API.
+        """
+        self._events()
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            failed = self.stats["failed_batches"]
+            await self.flush()
+            if self.stats["failed_batches"] > failed and not self._closed:
+                # Base indisponible : laisser passer un intervalle avant de réessayer
+                await asyncio.sleep(self.flush_interval)
+
+    def start(self) -> None:
+        self._events()
+        self._closed = False
+        self._task = asyncio.create_task(self.run())
+
+    async def close(self, attempts: int = 3) -> None:
+        """
+        Arrêter la boucle et écrire tout ce qui reste en attente, en
+        réessayant quelques fois si la base ne répond pas.
+        """
+        self._events()
+        self._closed = True
+        self._wakeup.set()
+        if self._task is not None:
+            # Laisser finir l'écriture en cours plutôt que de l'interrompre
+            await self._task
+            self._task = None
+        for attempt in range(attempts):
+            await self.flush()
+            if not self._pending:
+                break
+            if attempt < attempts - 1:
+                await asyncio.sleep(self.flush_interval)
+        if self._pending:
+            logger.error(f"{len(self._pending)} points de suivi non écrits à l'arrêt")
+        self._drained.set()
+
+
+# Instance partagée
+tracking_ingestor = TrackingIngestor(
+    batch_size=settings.TRACKING_FLUSH_BATCH_SIZE,
+    flush_interval=settings.TRACKING_FLUSH_INTERVAL_SECONDS,
+    max_pending=settings.TRACKING_BUFFER_MAX_SIZE
+)
@@ -0,0 +1,243 @@
+from typing import Dict, List, Optional, Tuple, Any, Sequence
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+import asyncio
+import logging
+import threading
+import time
+
+import redis
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from .cache import subscribe_to_channel
+
+logger = logging.getLogger(__name__)
+
+# Canal Redis annonçant une modification des règles de transport ou des véhicules
+TRANSPORT_RULES_CHANNEL = "transport_rules"
+
+ALL_CATEGORIES = "*"
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    id: int
+    vehicle_id: int
+    priority: int
+    price_multiplier: float
+
+
+class IntervalColumn:
+    """
+    Index d'une dimension (distance, poids ou volume) : pour une valeur, l'ensemble
+    des règles dont l'intervalle [min, max] la contient, sous forme de masque de bits.
+    Les bornes minimales triées portent des masques cumulés (règles dont le minimum
+    est inférieur ou égal), les bornes maximales des masques cumulés en sens inverse
+    (règles dont le maximum est supérieur ou égal) : deux recherches dichotomiques
+    et un ET suffisent.
+    """
+
+    def __init__(self, bounds: Sequence[Tuple[Optional[float], Optional[float]]]):
+        self.all = (1 << len(bounds)) - 1
+
+        self._open_min = 0
+        lows = []
+        for i, (low, _) in enumerate(bounds):
+            if low is None:
+                self._open_min |= 1 << i
+            else:
+                lows.append((low, i))
+        lows.sort()
+        self._low_values = [value for value, _ in lows]
+        self._low_masks = []
+        mask = 0
+        for _, i in lows:
+            mask |= 1 << i
+            self._low_masks.append(mask)
+
+        self._open_max = 0
+        highs = []
+        for i, (_, high) in enumerate(bounds):
+            if high is None:
+                self._open_max |= 1 << i
+            else:
+                highs.append((high, i))
+        highs.sort()
+        self._high_values = [value for value, _ in highs]
+        self._high_masks = [0] * len(highs)
+        mask = 0
+        for k in range(len(highs) - 1, -1, -1):
+            mask |= 1 << highs[k][1]
+            self._high_masks[k] = mask
+
+    def matching(self, value: Optional[float]) -> int:
+        if value is None:
+            return self.all
+        i = bisect_right(self._low_values, value)
+        low = self._open_min | (self._low_masks[i - 1] if i else 0)
+        j = bisect_left(self._high_values, value)
+        high = self._open_max | (self._high_masks[j] if j < len(self._high_values) else 0)
+        return low & high
+
+
+class RuleGroup:
+    """
+    Règles actives d'une catégorie de marchandises, triées par priorité décroissante :
+    le bit de poids faible d'un masque désigne la règle la plus prioritaire.
+    """
+
+    def __init__(self, rules: Sequence[Any]):
+        rules = sorted(rules, key=lambda r: (-(r.priority or 0), r.id))
+        self.rules = [
+            CompiledRule(r.id, r.vehicle_id, r.priority or 0, r.price_multiplier or 1.0)
+            for r in rules
+        ]
+        self.distance = IntervalColumn([(r.min_distance, r.max_distance) for r in rules])
+        self.weight = IntervalColumn([(r.min_weight, r.max_weight) for r in rules])
+        self.volume = IntervalColumn([(r.min_volume, r.max_volume) for r in rules])
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def match(self, distance: float, weight: Optional[float] = None, volume: Optional[float] = None) -> List[CompiledRule]:
+        mask = self.distance.matching(distance) & self.weight.matching(weight) & self.volume.matching(volume)
+        matches = []
+        while mask:
+            lowest = mask & -mask
+            matches.append(self.rules[lowest.bit_length() - 1])
+            mask ^= lowest
+        return matches
+
+
+@dataclass(frozen=True)
+class RuleSnapshot:
+    """
+    État compilé de l'index à un instant donné. Un lot de recommandations s'évalue
+    sur un même instantané, même si l'index est reconstruit entre-temps.
+    """
+    groups: Dict[str, RuleGroup]
+    vehicles: Dict[int, Dict[str, Any]]
+    active_vehicle_ids: List[int]
+
+    def rules_for(self, cargo_category: str) -> RuleGroup:
+        group = self.groups.get(cargo_category)
+        # Sans règle propre à la catégorie, toutes les règles actives s'appliquent
+        if group is None or not len(group):
+            group = self.groups[ALL_CATEGORIES]
+        return group
+
+
+EMPTY_SNAPSHOT = RuleSnapshot({ALL_CATEGORIES: RuleGroup([])}, {}, [])
+
+
+class TransportRuleIndex:
+    """
+    Règles de transport et véhicules compilés en mémoire, pour recommander un
+    véhicule sans requête SQL. L'index est reconstruit à la première demande après
+    une invalidation : localement à chaque modification, et dans les autres processus
+    via le canal Redis `transport_rules`. Une reconstruction périodique
+    (TRANSPORT_RULE_INDEX_MAX_AGE_SECONDS) rattrape un message perdu.
+    """
+
+    def __init__(self, max_age: int = 300):
+        self.max_age = max_age
+        self.snapshot: RuleSnapshot = EMPTY_SNAPSHOT
+        self._loaded_at: Optional[float] = None
+        self._dirty = True
+        self._lock = threading.Lock()
+        self._publisher: Optional[redis.Redis] = None
+
+    @property
+    def groups(self) -> Dict[str, RuleGroup]:
+        return self.snapshot.groups
+
+    @property
+    def vehicles(self) -> Dict[int, Dict[str, Any]]:
+        return self.snapshot.vehicles
+
+    @property
+    def active_vehicle_ids(self) -> List[int]:
+        return self.snapshot.active_vehicle_ids
+
+    @property
+    def is_stale(self) -> bool:
+        return self._dirty or self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age
+
+    def load(self, rules: Sequence[Any], vehicles: Sequence[Any]) -> None:
+        """
+        Compiler les règles actives et les véhicules donnés.
+        """
+        by_category: Dict[str, List[Any]] = {}
+        active_rules = [rule for rule in rules if rule.is_active]
+        for rule in active_rules:
+            by_category.setdefault(rule.cargo_category, []).append(rule)
+        groups = {category: RuleGroup(group) for category, group in by_category.items()}
+        groups[ALL_CATEGORIES] = RuleGroup(active_rules)
+
+        vehicle_info = {
+            v.id: {"id": v.id, "type": v.type, "name": v.name}
+            for v in vehicles
+        }
+        active_ids = sorted(v.id for v in vehicles if v.status == "active")
+
+        # Remplacement en bloc : une recommandation en cours voit l'ancien ou le nouvel index
+        self.snapshot = RuleSnapshot(groups, vehicle_info, active_ids)
+        self._loaded_at = time.monotonic()
+
+    def load_from_db(self, db: Session) -> None:
+        from ..models.transport import Vehicle, TransportRule
+
+        with self._lock:
+            self._dirty = False
+            rules = db.query(TransportRule).filter(TransportRule.is_active == True).all()
+            vehicles = db.query(Vehicle).all()
+            self.load(rules, vehicles)
+        logger.info(f"Index des règles de transport: {len(self.groups[ALL_CATEGORIES])} règles, {len(self.vehicles)} véhicules")
+
+    def ensure_loaded(self, db: Session) -> RuleSnapshot:
+        if self.is_stale:
+            self.load_from_db(db)
+        return self.snapshot
+
+    def mark_dirty(self) -> None:
+        self._dirty = True
+
+    def invalidate(self) -> None:
+        """
+        Invalider l'index dans ce processus et dans les autres instances de l'API.
+        """
+        self.mark_dirty()
+        try:
+            if self._publisher is None:
+                self._publisher = redis.Redis.from_url(settings.REDIS_URL, socket_connect_timeout=1, socket_timeout=1)
+            self._publisher.publish(TRANSPORT_RULES_CHANNEL, "invalidate")
+        except Exception as e:
+            logger.warning(f"Invalidation des règles de transport non diffusée: {str(e)}")
+
+    def rules_for(self, cargo_category: str) -> RuleGroup:
+        return self.snapshot.rules_for(cargo_category)
+
+
+async def transport_rule_listener() -> None:
+    """
+    Écouter les invalidations publiées par les autres instances, lancée au démarrage de l'API.
+    """
+    while True:
+        try:
+            pubsub = await subscribe_to_channel(TRANSPORT_RULES_CHANNEL)
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is not None:
+                    transport_rule_index.mark_dirty()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Message éventuellement perdu pendant la coupure : reconstruire par précaution
+            transport_rule_index.mark_dirty()
+            logger.error(f"Écoute des règles de transport interrompue: {str(e)}")
+            await asyncio.sleep(5)
+
+
+# Index partagé par le processus
+transport_rule_index = TransportRuleIndex(max_age=settings.TRANSPORT_RULE_INDEX_MAX_AGE_SECONDS)
@@ -13,6 +13,8 @@ from app.schemas.transport import (
     VehicleUsageCreate, VehicleUsageUpdate,
     DocumentType
 )
+from app.services.transport_rule_index import transport_rule_index, RuleSnapshot
+from app.services.transport_stats import aggregate_by_vehicle, aggregate_by_type, apply_usage_delta, usage_facts
 
 
 def create_vehicle(db: Session, vehicle: VehicleCreate) -> Vehicle:
@@ -37,6 +39,7 @@ def create_vehicle(db: Session, vehicle: VehicleCreate) -> Vehicle:
     db.add(db_vehicle)
     db.commit()
     db.refresh(db_vehicle)
+    transport_rule_index.invalidate()
     return db_vehicle
 
 
@@ -87,6 +90,7 @@ def update_vehicle(db: Session, vehicle_id: int, vehicle: VehicleUpdate) -> Vehi
     
     db.commit()
     db.refresh(db_vehicle)
+    transport_rule_index.invalidate()
     return db_vehicle
 
 
@@ -95,6 +99,7 @@ def delete_vehicle(db: Session, vehicle_id: int) -> None:
     db_vehicle = get_vehicle(db, vehicle_id)
     db.delete(db_vehicle)
     db.commit()
+    transport_rule_index.invalidate()
 
 
 def upload_vehicle_document(db: Session, vehicle_id: int, document_type: DocumentType, document_url: str) -> Vehicle:
@@ -261,6 +266,7 @@ def create_transport_rule(db: Session, rule: TransportRuleCreate) -> TransportRu
     db.add(db_rule)
     db.commit()
     db.refresh(db_rule)
+    transport_rule_index.invalidate()
     return db_rule
 
 
@@ -308,6 +314,7 @@ def update_transport_rule(db: Session, rule_id: int, rule: TransportRuleUpdate)
     
     db.commit()
     db.refresh(db_rule)
+    transport_rule_index.invalidate()
     return db_rule
 
 
@@ -316,76 +323,81 @@ def delete_transport_rule(db: Session, rule_id: int) -> None:
     db_rule = get_transport_rule(db, rule_id)
     db.delete(db_rule)
     db.commit()
+    transport_rule_index.invalidate()
 
 
 def get_vehicle_recommendation(db: Session, request: VehicleRecommendationRequest) -> Dict[str, Any]:
-    """Get a vehicle recommendation based on delivery requirements"""
-    # Get all active vehicles
-    vehicles = db.query(Vehicle).filter(Vehicle.status == "active").all()
+    """Get a vehicle recommendation based on delivery requirements.
+
+    Rules and vehicles come from the in-memory transport rule index: no database
+    round-trip unless the index has been invalidated since the last call.
+    """
+    snapshot = transport_rule_index.ensure_loaded(db)
     
-    if not vehicles:
+    if not snapshot.active_vehicle_ids:
         raise ValueError("No active vehicles available")
     
-    # Get all active transport rules
-    rules = db.query(TransportRule).filter(
-        TransportRule.is_active == True,
-        TransportRule.cargo_category == request.cargo_category.value
-    ).all()
-    
-    # If no specific rules for this cargo category, get all active rules
-    if not rules:
-        rules = db.query(TransportRule).filter(TransportRule.is_active == True).all()
-    
-    # Filter rules based on delivery requirements
-    matching_rules = []
-    for rule in rules:
-        # Check distance constraints
-        if (rule.min_distance is not None and request.distance < rule.min_distance) or \
-           (rule.max_distance is not None and request.distance > rule.max_distance):
-            continue
-        
-        # Check weight constraints if provided
-        if request.weight is not None and (
-            (rule.min_weight is not None and request.weight < rule.min_weight) or
-            (rule.max_weight is not None and request.weight > rule.max_weight)
-        ):
-            continue
-        
-        # Check volume constraints if provided
-        if request.volume is not None and (
-            (rule.min_volume is not None and request.volume < rule.min_volume) or
-            (rule.max_volume is not None and request.volume > rule.max_volume)
-        ):
-            continue
-        
-        matching_rules.append(rule)
+    return _recommend_vehicle(snapshot, request)
+
+
+def get_vehicle_recommendations(db: Session, requests: List[VehicleRecommendationRequest]) -> List[Dict[str, Any]]:
+    """Get vehicle recommendations for a batch of deliveries, in input order.
+
+    The whole batch is evaluated against a single snapshot of the rule index,
+    and identical requests (same cargo, distance, weight...) are computed once.
+    """
+    snapshot = transport_rule_index.ensure_loaded(db)
+    
+    if not snapshot.active_vehicle_ids:
+        raise ValueError("No active vehicles available")
+    
+    computed: Dict[tuple, Dict[str, Any]] = {}
+    results = []
+    for request in requests:
+        key = (
+            request.cargo_category.value, request.distance, request.weight, request.volume,
+            bool(request.is_fragile), bool(request.is_urgent), request.weather_condition
+        )
+        if key not in computed:
+            computed[key] = _recommend_vehicle(snapshot, request)
+        results.append(computed[key])
+    return results
+
+
+def _recommend_vehicle(snapshot: RuleSnapshot, request: VehicleRecommendationRequest) -> Dict[str, Any]:
+    """Recommend a vehicle from a compiled rule snapshot"""
+    vehicles = snapshot.vehicles
+    
+    # Rules for this cargo category (all active rules if there are none),
+    # filtered on distance, weight and volume constraints
+    matching_rules = snapshot.rules_for(request.cargo_category.value).match(
+        request.distance, request.weight, request.volume
+    )
     
     # If no matching rules, use all vehicles
     if not matching_rules:
         # Default recommendation: use the first vehicle
-        recommended_vehicle = vehicles[0]
+        active_vehicles = [vehicles[vehicle_id] for vehicle_id in snapshot.active_vehicle_ids]
+        recommended_vehicle = active_vehicles[0]
         price_multiplier = 1.0
         reason = "No specific transport rules match your requirements. Using default vehicle."
         
         # Prepare alternatives
         alternatives = [
             {
-                "id": v.id,
-                "type": v.type,
-                "name": v.name,
+                "id": v["id"],
+                "type": v["type"],
+                "name": v["name"],
                 "price_multiplier": 1.0
             }
-            for v in vehicles[1:3]  # Limit to 2 alternatives
+            for v in active_vehicles[1:3]  # Limit to 2 alternatives
         ]
     else:
-        # Sort matching rules by priority (descending)
-        matching_rules.sort(key=lambda r: r.priority, reverse=True)
-        
-        # Get the highest priority rule
+        # Matching rules are already sorted by priority (descending)
         top_rule = matching_rules[0]
         
         # Get the vehicle for this rule
-        recommended_vehicle = db.query(Vehicle).filter(Vehicle.id == top_rule.vehicle_id).first()
+        recommended_vehicle = vehicles[top_rule.vehicle_id]
         price_multiplier = top_rule.price_multiplier
         
         # Prepare reason
@@ -408,20 +420,20 @@ def get_vehicle_recommendation(db: Session, request: VehicleRecommendationReques
         # Prepare alternatives from other matching rules
         alternatives = []
         for rule in matching_rules[1:3]:  # Limit to 2 alternatives
-            vehicle = db.query(Vehicle).filter(Vehicle.id == rule.vehicle_id).first()
-            if vehicle and vehicle.id != recommended_vehicle.id:
+            vehicle = vehicles.get(rule.vehicle_id)
+            if vehicle and vehicle["id"] != recommended_vehicle["id"]:
                 alternatives.append({
-                    "id": vehicle.id,
-                    "type": vehicle.type,
-                    "name": vehicle.name,
+                    "id": vehicle["id"],
+                    "type": vehicle["type"],
+                    "name": vehicle["name"],
                     "price_multiplier": rule.price_multiplier
                 })
     
     return {
         "recommended_vehicle": {
-            "id": recommended_vehicle.id,
-            "type": recommended_vehicle.type,
-            "name": recommended_vehicle.name
+            "id": recommended_vehicle["id"],
+            "type": recommended_vehicle["type"],
+            "name": recommended_vehicle["name"]
         },
         "reason": reason,
         "price_multiplier": price_multiplier,
@@ -441,6 +453,11 @@ def create_vehicle_usage(db: Session, usage: VehicleUsageCreate) -> VehicleUsage
         co2_emissions=usage.co2_emissions
     )
     db.add(db_usage)
+    db.flush()
+    
+    # Update daily rollups in the same transaction
+    apply_usage_delta(db, None, usage_facts(db, db_usage))
+    
     db.commit()
     db.refresh(db_usage)
     return db_usage
@@ -454,6 +471,7 @@ def get_vehicle_usage(db: Session, usage_id: int) -> Optional[VehicleUsage]:
 def update_vehicle_usage(db: Session, usage_id: int, usage: VehicleUsageUpdate) -> VehicleUsage:
     """Update a vehicle usage record"""
     db_usage = get_vehicle_usage(db, usage_id)
+    before = usage_facts(db, db_usage)
     
     # Update fields if provided
     update_data = usage.dict(exclude_unset=True)
@@ -461,6 +479,9 @@ def update_vehicle_usage(db: Session, usage_id: int, usage: VehicleUsageUpdate)
     for key, value in update_data.items():
         setattr(db_usage, key, value)
     
+    # Move the usage's contribution in the daily rollups
+    apply_usage_delta(db, before, usage_facts(db, db_usage))
+    
     db.commit()
     db.refresh(db_usage)
     return db_usage
@@ -480,29 +501,12 @@ def get_vehicle_usage_stats(
     if not end_date:
         end_date = datetime.now()
     
-    # Base query
-    query = db.query(
-        Vehicle.type,
-        func.count(VehicleUsage.id).label("usage_count"),
-        func.sum(VehicleUsage.distance_traveled).label("total_distance"),
-        func.avg(VehicleUsage.distance_traveled).label("avg_distance_per_trip")
-    ).join(
-        CourierVehicle, CourierVehicle.vehicle_id == Vehicle.id
-    ).join(
-        VehicleUsage, VehicleUsage.courier_vehicle_id == CourierVehicle.id
-    ).filter(
-        VehicleUsage.start_time >= start_date,
-        VehicleUsage.start_time <= end_date
-    )
-    
-    if vehicle_type:
-        query = query.filter(Vehicle.type == vehicle_type)
-    
-    # Group by vehicle type
-    query = query.group_by(Vehicle.type)
-    
-    # Execute query
-    results = query.all()
+    # Pre-aggregated daily buckets, raw usage rows only for partial edge days
+    totals_by_type: Dict[str, Dict[str, float]] = {}
+    for (v_type, _), counters in aggregate_by_type(db, start_date, end_date, vehicle_type).items():
+        totals = totals_by_type.setdefault(v_type, {"usage_count": 0, "distance_count": 0, "total_distance": 0})
+        for name in totals:
+            totals[name] += counters[name]
     
     # Format results
     stats = {
@@ -512,12 +516,12 @@ def get_vehicle_usage_stats(
         },
         "by_vehicle_type": [
             {
-                "type": result.type,
-                "usage_count": result.usage_count,
-                "total_distance": result.total_distance or 0,
-                "avg_distance_per_trip": result.avg_distance_per_trip or 0
+                "type": v_type,
+                "usage_count": totals["usage_count"],
+                "total_distance": totals["total_distance"],
+                "avg_distance_per_trip": totals["total_distance"] / totals["distance_count"] if totals["distance_count"] > 0 else 0
             }
-            for result in results
+            for v_type, totals in totals_by_type.items()
         ]
     }
     
@@ -548,33 +552,9 @@ def get_vehicle_performance_stats(
     if not end_date:
         end_date = datetime.now()
     
-    # Base query
-    query = db.query(
-        Vehicle.id,
-        Vehicle.name,
-        Vehicle.type,
-        func.count(VehicleUsage.id).label("usage_count"),
-        func.sum(VehicleUsage.distance_traveled).label("total_distance"),
-        func.avg(VehicleUsage.distance_traveled).label("avg_distance_per_trip"),
-        func.sum(VehicleUsage.fuel_consumed).label("total_fuel_consumed"),
-        func.avg(VehicleUsage.fuel_consumed / VehicleUsage.distance_traveled).label("avg_fuel_efficiency")
-    ).join(
-        CourierVehicle, CourierVehicle.vehicle_id == Vehicle.id
-    ).join(
-        VehicleUsage, VehicleUsage.courier_vehicle_id == CourierVehicle.id
-    ).filter(
-        VehicleUsage.start_time >= start_date,
-        VehicleUsage.start_time <= end_date
-    )
-    
-    if vehicle_type:
-        query = query.filter(Vehicle.type == vehicle_type)
-    
-    # Group by vehicle
-    query = query.group_by(Vehicle.id, Vehicle.name, Vehicle.type)
-    
-    # Execute query
-    results = query.all()
+    # Pre-aggregated daily buckets, raw usage rows only for partial edge days
+    totals_by_vehicle = aggregate_by_vehicle(db, start_date, end_date, vehicle_type)
+    vehicles = db.query(Vehicle).filter(Vehicle.id.in_(list(totals_by_vehicle))).all() if totals_by_vehicle else []
     
     # Format results
     stats = {
@@ -584,16 +564,16 @@ def get_vehicle_performance_stats(
         },
         "vehicles": [
             {
-                "id": result.id,
-                "name": result.name,
-                "type": result.type,
-                "usage_count": result.usage_count,
-                "total_distance": result.total_distance or 0,
-                "avg_distance_per_trip": result.avg_distance_per_trip or 0,
-                "total_fuel_consumed": result.total_fuel_consumed or 0,
-                "avg_fuel_efficiency": result.avg_fuel_efficiency or 0
+                "id": vehicle.id,
+                "name": vehicle.name,
+                "type": vehicle.type,
+                "usage_count": totals["usage_count"],
+                "total_distance": totals["total_distance"],
+                "avg_distance_per_trip": totals["total_distance"] / totals["distance_count"] if totals["distance_count"] > 0 else 0,
+                "total_fuel_consumed": totals["total_fuel"],
+                "avg_fuel_efficiency": totals["fuel_efficiency_sum"] / totals["fuel_efficiency_count"] if totals["fuel_efficiency_count"] > 0 else 0
             }
-            for result in results
+            for vehicle, totals in ((vehicle, totals_by_vehicle[vehicle.id]) for vehicle in vehicles)
         ]
     }
     
@@ -644,30 +624,8 @@ def get_vehicle_environmental_stats(
     if not end_date:
         end_date = datetime.now()
     
-    # Base query for CO2 emissions
-    query = db.query(
-        Vehicle.type,
-        Vehicle.is_electric,
-        func.sum(VehicleUsage.co2_emissions).label("total_co2"),
-        func.sum(VehicleUsage.distance_traveled).label("total_distance"),
-        func.avg(VehicleUsage.co2_emissions / VehicleUsage.distance_traveled).label("avg_co2_per_km")
-    ).join(
-        CourierVehicle, CourierVehicle.vehicle_id == Vehicle.id
-    ).join(
-        VehicleUsage, VehicleUsage.courier_vehicle_id == CourierVehicle.id
-    ).filter(
-        VehicleUsage.start_time >= start_date,
-        VehicleUsage.start_time <= end_date
-    )
-    
-    if vehicle_type:
-        query = query.filter(Vehicle.type == vehicle_type)
-    
-    # Group by vehicle type and electric status
-    query = query.group_by(Vehicle.type, Vehicle.is_electric)
-    
-    # Execute query
-    results = query.all()
+    # Pre-aggregated daily buckets, raw usage rows only for partial edge days
+    totals_by_type = aggregate_by_type(db, start_date, end_date, vehicle_type)
     
     # Format results
     stats = {
@@ -677,13 +635,13 @@ def get_vehicle_environmental_stats(
         },
         "emissions": [
             {
-                "type": result.type,
-                "is_electric": result.is_electric,
-                "total_co2": result.total_co2 or 0,
-                "total_distance": result.total_distance or 0,
-                "avg_co2_per_km": result.avg_co2_per_km or 0
+                "type": v_type,
+                "is_electric": is_electric,
+                "total_co2": totals["total_co2"],
+                "total_distance": totals["total_distance"],
+                "avg_co2_per_km": totals["co2_per_km_sum"] / totals["co2_per_km_count"] if totals["co2_per_km_count"] > 0 else 0
             }
-            for result in results
+            for (v_type, is_electric), totals in totals_by_type.items()
         ]
     }
     
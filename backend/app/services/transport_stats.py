@@ -0,0 +1,249 @@
+from typing import Dict, List, Optional, Tuple, Any, NamedTuple
+from datetime import datetime, date, time, timedelta, timezone
+
+from sqlalchemy import func, and_, case
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+# Compteurs additifs des tables d'agrégats : une plage de dates se résume à leur somme
+COUNTERS = (
+    "usage_count",
+    "distance_count",
+    "total_distance",
+    "total_fuel",
+    "total_co2",
+    "fuel_efficiency_sum",
+    "fuel_efficiency_count",
+    "co2_per_km_sum",
+    "co2_per_km_count",
+)
+
+
+class UsageFacts(NamedTuple):
+    """
+    Contribution d'une utilisation de véhicule aux agrégats journaliers. Les
+    agrégats sont tenus par véhicule seulement : les statistiques par type
+    joignent le type actuel du véhicule, qui peut changer.
+    """
+    day: date
+    vehicle_id: int
+    counters: Dict[str, float]
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Les dates naïves sont en UTC (heure d'Abidjan)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def usage_counters(distance: Optional[float], fuel: Optional[float], co2: Optional[float]) -> Dict[str, float]:
+    """
+    Compteurs d'un trajet, avec la même sémantique que les agrégats SQL
+    (valeurs nulles ignorées, ratios seulement pour une distance positive).
+    """
+    has_distance = distance is not None and distance > 0
+    return {
+        "usage_count": 1,
+        "distance_count": 1 if distance is not None else 0,
+        "total_distance": distance or 0.0,
+        "total_fuel": fuel or 0.0,
+        "total_co2": co2 or 0.0,
+        "fuel_efficiency_sum": fuel / distance if has_distance and fuel is not None else 0.0,
+        "fuel_efficiency_count": 1 if has_distance and fuel is not None else 0,
+        "co2_per_km_sum": co2 / distance if has_distance and co2 is not None else 0.0,
+        "co2_per_km_count": 1 if has_distance and co2 is not None else 0,
+    }
+
+
+def usage_facts(db: Session, usage: Any) -> UsageFacts:
+    """
+    Relever la contribution actuelle d'une utilisation, avant ou après sa modification.
+    """
+    from ..models.transport import CourierVehicle
+
+    vehicle_id = db.query(CourierVehicle.vehicle_id).filter(
+        CourierVehicle.id == usage.courier_vehicle_id
+    ).scalar()
+
+    return UsageFacts(
+        day=_as_utc(usage.start_time).date(),
+        vehicle_id=vehicle_id,
+        counters=usage_counters(usage.distance_traveled, usage.fuel_consumed, usage.co2_emissions),
+    )
+
+
+def _upsert(db: Session, model, keys: Dict[str, Any], constraint: str, delta: Dict[str, float]) -> None:
+    stmt = pg_insert(model).values(**keys, **delta)
+    # Incrément atomique : deux écritures concurrentes sur le même jour s'additionnent
+    stmt = stmt.on_conflict_do_update(
+        constraint=constraint,
+        set_={name: getattr(model.__table__.c, name) + getattr(stmt.excluded, name) for name in COUNTERS},
+    )
+    db.execute(stmt)
+
+
+def apply_usage_delta(db: Session, before: Optional[UsageFacts], after: Optional[UsageFacts]) -> None:
+    """
+    Reporter dans les agrégats le passage d'une utilisation de `before` à `after`
+    (None pour une création ou une suppression). À appeler dans la transaction
+    qui écrit l'utilisation.
+    """
+    from ..models.transport import VehicleDailyStats
+
+    changes: List[Tuple[UsageFacts, int]] = []
+    if before is not None:
+        changes.append((before, -1))
+    if after is not None:
+        changes.append((after, 1))
+
+    for facts, sign in changes:
+        delta = {name: sign * facts.counters[name] for name in COUNTERS}
+        _upsert(
+            db, VehicleDailyStats,
+            {"day": facts.day, "vehicle_id": facts.vehicle_id},
+            "uq_vehicle_daily_stats", delta,
+        )
+
+
+def split_period(start: datetime, end: datetime) -> Tuple[Optional[Tuple[date, date]], List[Tuple[datetime, datetime, bool]]]:
+    """
+    Découper [start, end] en jours complets, lus dans les agrégats, et en bords
+    partiels lus dans les utilisations. Renvoie (premier jour, jour suivant le
+    dernier) et les plages brutes (début, fin, fin incluse).
+    """
+    start, end = _as_utc(start), _as_utc(end)
+    if end < start:
+        return None, []
+
+    first_full = datetime.combine(start.date(), time.min, tzinfo=timezone.utc)
+    if first_full < start:
+        first_full += timedelta(days=1)
+    last_full_end = datetime.combine(end.date(), time.min, tzinfo=timezone.utc)
+
+    if first_full >= last_full_end:
+        return None, [(start, end, True)]
+
+    raw = []
+    if start < first_full:
+        raw.append((start, first_full, False))
+    raw.append((last_full_end, end, True))
+    return (first_full.date(), last_full_end.date()), raw
+
+
+def _raw_counter_columns() -> List[Any]:
+    from ..models.transport import VehicleUsage
+
+    distance = VehicleUsage.distance_traveled
+    fuel_efficiency = case((and_(distance > 0, VehicleUsage.fuel_consumed.isnot(None)), VehicleUsage.fuel_consumed / distance))
+    co2_per_km = case((and_(distance > 0, VehicleUsage.co2_emissions.isnot(None)), VehicleUsage.co2_emissions / distance))
+    return [
+        func.count(VehicleUsage.id).label("usage_count"),
+        func.count(distance).label("distance_count"),
+        func.sum(distance).label("total_distance"),
+        func.sum(VehicleUsage.fuel_consumed).label("total_fuel"),
+        func.sum(VehicleUsage.co2_emissions).label("total_co2"),
+        func.sum(fuel_efficiency).label("fuel_efficiency_sum"),
+        func.count(fuel_efficiency).label("fuel_efficiency_count"),
+        func.sum(co2_per_km).label("co2_per_km_sum"),
+        func.count(co2_per_km).label("co2_per_km_count"),
+    ]
+
+
+def _bucket_counter_columns(model) -> List[Any]:
+    return [func.sum(getattr(model, name)).label(name) for name in COUNTERS]
+
+
+def _merge(totals: Dict[Any, Dict[str, float]], key: Any, row: Any) -> None:
+    counters = totals.setdefault(key, {name: 0 for name in COUNTERS})
+    for name in COUNTERS:
+        counters[name] += getattr(row, name) or 0
+
+
+def _raw_range_filter(low: datetime, high: datetime, inclusive: bool):
+    from ..models.transport import VehicleUsage
+
+    upper = VehicleUsage.start_time <= high if inclusive else VehicleUsage.start_time < high
+    return and_(VehicleUsage.start_time >= low, upper)
+
+
+def aggregate_by_vehicle(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    vehicle_type: Optional[str] = None
+) -> Dict[int, Dict[str, float]]:
+    """
+    Compteurs par véhicule sur [start, end].
+    """
+    from ..models.transport import Vehicle, CourierVehicle, VehicleUsage, VehicleDailyStats
+
+    full_days, raw_ranges = split_period(start, end)
+    totals: Dict[int, Dict[str, float]] = {}
+
+    if full_days:
+        query = db.query(VehicleDailyStats.vehicle_id, *_bucket_counter_columns(VehicleDailyStats)).filter(
+            VehicleDailyStats.day >= full_days[0],
+            VehicleDailyStats.day < full_days[1]
+        )
+        if vehicle_type:
+            query = query.join(Vehicle, Vehicle.id == VehicleDailyStats.vehicle_id).filter(Vehicle.type == vehicle_type)
+        for row in query.group_by(VehicleDailyStats.vehicle_id).all():
+            _merge(totals, row.vehicle_id, row)
+
+    for low, high, inclusive in raw_ranges:
+        query = db.query(CourierVehicle.vehicle_id, *_raw_counter_columns()).join(
+            VehicleUsage, VehicleUsage.courier_vehicle_id == CourierVehicle.id
+        ).filter(_raw_range_filter(low, high, inclusive))
+        if vehicle_type:
+            query = query.join(Vehicle, Vehicle.id == CourierVehicle.vehicle_id).filter(Vehicle.type == vehicle_type)
+        for row in query.group_by(CourierVehicle.vehicle_id).all():
+            _merge(totals, row.vehicle_id, row)
+
+    return {key: counters for key, counters in totals.items() if counters["usage_count"] > 0}
+
+
+def aggregate_by_type(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    vehicle_type: Optional[str] = None
+) -> Dict[Tuple[str, bool], Dict[str, float]]:
+    """
+    Compteurs par (type de véhicule, électrique) sur [start, end], selon le
+    type actuel de chaque véhicule, pour les jours complets comme pour les bords.
+    """
+    from ..models.transport import Vehicle, CourierVehicle, VehicleUsage, VehicleDailyStats
+
+    full_days, raw_ranges = split_period(start, end)
+    totals: Dict[Tuple[str, bool], Dict[str, float]] = {}
+
+    if full_days:
+        query = db.query(
+            Vehicle.type,
+            Vehicle.is_electric,
+            *_bucket_counter_columns(VehicleDailyStats)
+        ).join(
+            Vehicle, Vehicle.id == VehicleDailyStats.vehicle_id
+        ).filter(
+            VehicleDailyStats.day >= full_days[0],
+            VehicleDailyStats.day < full_days[1]
+        )
+        if vehicle_type:
+            query = query.filter(Vehicle.type == vehicle_type)
+        for row in query.group_by(Vehicle.type, Vehicle.is_electric).all():
+            _merge(totals, (row.type, row.is_electric), row)
+
+    for low, high, inclusive in raw_ranges:
+        query = db.query(Vehicle.type, Vehicle.is_electric, *_raw_counter_columns()).join(
+            CourierVehicle, CourierVehicle.vehicle_id == Vehicle.id
+        ).join(
+            VehicleUsage, VehicleUsage.courier_vehicle_id == CourierVehicle.id
+        ).filter(_raw_range_filter(low, high, inclusive))
+        if vehicle_type:
+            query = query.filter(Vehicle.type == vehicle_type)
+        for row in query.group_by(Vehicle.type, Vehicle.is_electric).all():
+            _merge(totals, (row.type, row.is_electric), row)
+
+    # Seuls les couples ayant au moins une utilisation figurent dans les statistiques
+    return {key: counters for key, counters in totals.items() if counters["usage_count"] > 0}
@@ -1,10 +1,12 @@
 from typing import List, Optional
+from datetime import datetime
 from sqlalchemy.orm import Session
 from fastapi import UploadFile
 
 from ..models.user import User, UserRole, UserStatus, KYCStatus, BusinessProfile, CourierProfile
 from ..schemas.user import UserCreate, UserUpdate, UserStatusUpdate, KYCUpdate, BusinessProfileCreate, BusinessProfileUpdate, CourierProfileCreate, CourierProfileUpdate
 from ..core.exceptions import NotFoundError, ConflictError, BadRequestError
+from .courier_index import courier_index
 
 def get_user(db: Session, user_id: int) -> User:
     user = db.query(User).filter(User.id == user_id).first()
@@ -176,6 +178,9 @@ def update_courier_profile(db: Session, user_id: int, profile_data: CourierProfi
     
     db.commit()
     db.refresh(profile)
+    
+    # Répercuter le statut en ligne et le véhicule dans l'index spatial
+    courier_index.set_status(profile.user_id, bool(profile.is_online), profile.vehicle_type)
     return profile
 
 def update_courier_location(db: Session, user_id: int, lat: float, lng: float) -> CourierProfile:
@@ -187,4 +192,11 @@ def update_courier_location(db: Session, user_id: int, lat: float, lng: float) -
     
     db.commit()
     db.refresh(profile)
+    
+    courier_index.upsert(
+        user_id, lat, lng,
+        vehicle_type=profile.vehicle_type,
+        is_online=bool(profile.is_online),
+        updated_at=profile.last_location_updated
+    )
     return profile
@@ -3,56 +3,68 @@ from sqlalchemy.orm import Session
 from typing import Dict, List, Any, Optional
 import json
 import asyncio
-from datetime import datetime
+from datetime import datetime, timezone
 
 from ..db.session import get_db
 from ..core.dependencies import get_current_user_ws
-from ..models.delivery import Delivery, TrackingPoint
+from ..models.delivery import Delivery
 from ..models.user import User, UserRole
+from ..services.courier_index import courier_index
+from ..services.tracking_ingest import tracking_ingestor, PositionUpdate
+from ..services.tracking_fanout import tracking_fanout
+from ..services.position_codec import Point, bounded_points, decode_positions, epoch_millis, parse_encoding, position_message, valid_coordinates
+from ..core.exceptions import BadRequestError
+from ..core.config import settings
 
-# Gestionnaire de connexions WebSocket
-class ConnectionManager:
-    def __init__(self):
-        # Connexions actives par livraison
-        self.active_connections: Dict[int, List[WebSocket]] = {}
-        # Dernières positions par livraison
-        self.last_positions: Dict[int, Dict[str, Any]] = {}
-    
-    async def connect(self, websocket: WebSocket, delivery_id: int):
-        await websocket.accept()
-        if delivery_id not in self.active_connections:
-            self.active_connections[delivery_id] = []
-        self.active_connections[delivery_id].append(websocket)
-        
-        # Envoyer la dernière position connue
-        if delivery_id in self.last_positions:
-            await websocket.send_json(self.last_positions[delivery_id])
-    
-    def disconnect(self, websocket: WebSocket, delivery_id: int):
-        if delivery_id in self.active_connections:
-            if websocket in self.active_connections[delivery_id]:
-                self.active_connections[delivery_id].remove(websocket)
-            
-            # Supprimer la liste si elle est vide
-            if not self.active_connections[delivery_id]:
-                del self.active_connections[delivery_id]
+# Diffusion des positions entre les instances de l'API, via Redis
+manager = tracking_fanout
+
+def _received_points(received: Dict[str, Any], delivery_id: int, created_at: Optional[datetime] = None) -> List[Point]:
+    """
+    Positions envoyées par le coursier, horodatées en millisecondes. Les
+    trames binaires portent l'heure de relevé, bornée par l'heure du serveur
+    et, vers le passé, par la création de la livraison et l'ancienneté
+    maximale admise ; les messages JSON sont horodatés à réception. Les
+    positions aux coordonnées non numériques ou hors bornes sont écartées :
+    elles bloqueraient l'écriture du lot et l'encodage pour les abonnés.
+    """
+    now = epoch_millis(datetime.now(timezone.utc))
+    if received.get("bytes") is not None:
+        frame_delivery_id, points = decode_positions(received["bytes"])
+        if frame_delivery_id != delivery_id:
+            raise BadRequestError("Trame de positions d'une autre livraison")
+        not_before = now - settings.TRACKING_MAX_POINT_AGE_SECONDS * 1000
+        if created_at is not None:
+            # Les lectures de points ne remontent pas avant la création de la livraison
+            not_before = min(max(not_before, epoch_millis(created_at)), now)
+        return bounded_points([
+            (ts, lat, lng) for ts, lat, lng in points
+            if valid_coordinates(lat, lng) is not None
+        ], not_before, now)
     
-    async def broadcast(self, delivery_id: int, message: Dict[str, Any]):
-        # Stocker la dernière position
-        self.last_positions[delivery_id] = message
-        
-        if delivery_id in self.active_connections:
-            for connection in self.active_connections[delivery_id]:
-                try:
-                    await connection.send_json(message)
-                except WebSocketDisconnect:
-                    # La connexion est déjà fermée, on la supprime
-                    self.disconnect(connection, delivery_id)
-                except Exception as e:
-                    print(f"Erreur lors de l'envoi du message: {str(e)}")
+    try:
+        message = json.loads(received.get("text") or "{}")
+    except ValueError:
+        return []
+    if not isinstance(message, dict) or "lat" not in message or "lng" not in message:
+        return []
+    coordinates = valid_coordinates(message["lat"], message["lng"])
+    if coordinates is None:
+        return []
+    return [(now, *coordinates)]
 
-# Créer une instance du gestionnaire
-manager = ConnectionManager()
+def _max_rate(value: Optional[str]) -> Optional[float]:
+    """
+    Cadence maximale de positions demandée par l'abonné (par seconde), bornée
+    par la configuration ; None pour la cadence par défaut.
+    """
+    try:
+        rate = float(value) if value else None
+    except ValueError:
+        return None
+    if rate is None or rate <= 0:
+        return None
+    return min(rate, settings.TRACKING_MAX_RATE_HZ)
 
 # Endpoint WebSocket pour le tracking en temps réel
 async def tracking_endpoint(
@@ -75,42 +87,51 @@ async def tracking_endpoint(
             await websocket.close(code=4003, reason="Accès non autorisé")
             return
         
-        # Accepter la connexion
-        await manager.connect(websocket, delivery_id)
+        # Encodage des positions : JSON (par défaut) ou trames binaires compactes
+        try:
+            encoding = parse_encoding(websocket.query_params.get("encoding"))
+        except BadRequestError as e:
+            await websocket.close(code=4000, reason=e.detail)
+            return
+        
+        # Accepter la connexion, à la cadence de positions demandée par le client
+        await manager.connect(websocket, delivery_id, encoding, _max_rate(websocket.query_params.get("max_rate")))
         
         try:
             while True:
-                # Attendre les messages du client
-                data = await websocket.receive_text()
-                message = json.loads(data)
+                # Attendre les messages du client : position JSON, ou trame
+                # binaire pouvant regrouper plusieurs positions
+                received = await websocket.receive()
+                if received["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(received.get("code", 1000))
                 
-                # Si c'est le coursier qui envoie sa position
-                if user.id == delivery.courier_id and "lat" in message and "lng" in message:
-                    # Enregistrer la position dans la base de données
-                    tracking_point = TrackingPoint(
+                if user.id != delivery.courier_id:
+                    continue
+                points = _received_points(received, delivery_id, delivery.created_at)
+                if not points:
+                    continue
+                
+                # Enregistrer les positions (points de suivi et profil du coursier), écrites par lots
+                for ts, lat, lng in points:
+                    await tracking_ingestor.submit(PositionUpdate(
                         delivery_id=delivery_id,
-                        lat=message["lat"],
-                        lng=message["lng"]
-                    )
-                    db.add(tracking_point)
-                    db.commit()
-                    
-                    # Diffuser la position à tous les clients connectés
-                    await manager.broadcast(
-                        delivery_id,
-                        {
-                            "type": "position",
-                            "delivery_id": delivery_id,
-                            "lat": message["lat"],
-                            "lng": message["lng"],
-                            "timestamp": datetime.now().isoformat()
-                        }
-                    )
+                        courier_id=user.id,
+                        lat=lat,
+                        lng=lng,
+                        timestamp=datetime.fromtimestamp(ts / 1000, tz=timezone.utc)
+                    ))
+                
+                # Mettre à jour la position du coursier dans l'index spatial
+                ts, lat, lng = points[-1]
+                courier_index.upsert(user.id, lat, lng, updated_at=datetime.fromtimestamp(ts / 1000, tz=timezone.utc))
+                
+                # Diffuser les positions à tous les clients connectés
+                await manager.broadcast(delivery_id, position_message(delivery_id, points))
         except WebSocketDisconnect:
-            manager.disconnect(websocket, delivery_id)
+            await manager.disconnect(websocket, delivery_id)
         except Exception as e:
             print(f"Erreur WebSocket: {str(e)}")
-            manager.disconnect(websocket, delivery_id)
+            await manager.disconnect(websocket, delivery_id)
     except HTTPException:
         await websocket.close(code=4001, reason="Non authentifié")
     except Exception as e:
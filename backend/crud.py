@@ -1,11 +1,13 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_
+from sqlalchemy import func, desc, and_, select
 from typing import List, Optional, Dict
 from datetime import datetime, timedelta
 import json
 import redis.asyncio as redis
 from . import models, schemas
 from .auth import get_password_hash
+from .app.services.pagination import keyset_paginate
+from .app.db.base import AsyncSessionLocal
 
 # Fonctions CRUD pour les utilisateurs
 def get_user(db: Session, user_id: int):
@@ -60,40 +62,36 @@ def get_delivery(db: Session, delivery_id: int):
     return db.query(models.Delivery).filter(models.Delivery.id == delivery_id).first()
 
 async def get_delivery_async(delivery_id: int):
-    # Cette fonction est utilisée dans le contexte WebSocket
-    # Dans un vrai projet, vous utiliseriez une bibliothèque comme SQLAlchemy asyncio
-    # Pour simplifier, nous simulons une requête asynchrone
-    from .database import SessionLocal
-    db = SessionLocal()
-    try:
-        delivery = db.query(models.Delivery).filter(models.Delivery.id == delivery_id).first()
-        return delivery
-    finally:
-        db.close()
+    # Cette fonction est utilisée dans le contexte WebSocket :
+    # requête asynchrone (asyncpg), la boucle d'événements n'est pas bloquée
+    async with AsyncSessionLocal() as db:
+        return (await db.scalars(
+            select(models.Delivery).where(models.Delivery.id == delivery_id)
+        )).first()
 
-def get_deliveries(db: Session, skip: int = 0, limit: int = 100, status: Optional[str] = None):
+def get_deliveries(db: Session, cursor: Optional[str] = None, limit: int = 100, status: Optional[str] = None):
     query = db.query(models.Delivery)
     
     if status:
         query = query.filter(models.Delivery.status == status)
     
-    return query.order_by(desc(models.Delivery.created_at)).offset(skip).limit(limit).all()
+    return keyset_paginate(query, models.Delivery, limit, cursor)
 
-def get_deliveries_by_client(db: Session, client_id: int, skip: int = 0, limit: int = 100, status: Optional[str] = None):
+def get_deliveries_by_client(db: Session, client_id: int, cursor: Optional[str] = None, limit: int = 100, status: Optional[str] = None):
     query = db.query(models.Delivery).filter(models.Delivery.client_id == client_id)
     
     if status:
         query = query.filter(models.Delivery.status == status)
     
-    return query.order_by(desc(models.Delivery.created_at)).offset(skip).limit(limit).all()
+    return keyset_paginate(query, models.Delivery, limit, cursor)
 
-def get_deliveries_by_courier(db: Session, courier_id: int, skip: int = 0, limit: int = 100, status: Optional[str] = None):
+def get_deliveries_by_courier(db: Session, courier_id: int, cursor: Optional[str] = None, limit: int = 100, status: Optional[str] = None):
     query = db.query(models.Delivery).filter(models.Delivery.courier_id == courier_id)
     
     if status:
         query = query.filter(models.Delivery.status == status)
     
-    return query.order_by(desc(models.Delivery.created_at)).offset(skip).limit(limit).all()
+    return keyset_paginate(query, models.Delivery, limit, cursor)
 
 def create_delivery(db: Session, delivery: schemas.DeliveryCreate, client_id: int):
     db_delivery = models.Delivery(
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect, Request
+from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
@@ -14,6 +14,7 @@ from .database import get_db, engine
 from . import models, schemas, crud, auth
 from .config import settings
 from .websockets import ConnectionManager
+from .app.services.pagination import next_cursor, NEXT_CURSOR_HEADER
 
 # Initialiser les logs
 logging.basicConfig(level=logging.INFO)
@@ -131,20 +132,27 @@ async def create_delivery(
 
 @app.get("/deliveries/", response_model=List[schemas.DeliveryResponse])
 async def read_deliveries(
-    skip: int = 0, 
+    response: Response,
+    cursor: Optional[str] = None, 
     limit: int = 100, 
     status: Optional[str] = None,
     current_user: schemas.UserResponse = Depends(auth.get_current_user),
     db: Session = Depends(get_db)
 ):
     if current_user.role == "client":
-        return crud.get_deliveries_by_client(db, client_id=current_user.id, skip=skip, limit=limit, status=status)
+        deliveries = crud.get_deliveries_by_client(db, client_id=current_user.id, cursor=cursor, limit=limit, status=status)
     elif current_user.role == "courier":
-        return crud.get_deliveries_by_courier(db, courier_id=current_user.id, skip=skip, limit=limit, status=status)
+        deliveries = crud.get_deliveries_by_courier(db, courier_id=current_user.id, cursor=cursor, limit=limit, status=status)
     elif current_user.role in ["business", "manager"]:
-        return crud.get_deliveries(db, skip=skip, limit=limit, status=status)
+        deliveries = crud.get_deliveries(db, cursor=cursor, limit=limit, status=status)
     else:
         raise HTTPException(status_code=403, detail="Rôle non autorisé")
+    
+    # Curseur de la page suivante
+    cursor = next_cursor(deliveries, limit)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return deliveries
 
 @app.get("/deliveries/{delivery_id}", response_model=schemas.DeliveryResponse)
 async def read_delivery(
@@ -14,6 +14,7 @@ from app.models.market import Product
 from app.models.wallet import Wallet, Transaction, Loan
 from app.models.notification import Notification
 from app.models.traffic import TrafficReport, WeatherAlert
+from app.models.outbox import OutboxEvent
 from app.db.base import Base
 
 # Importer la configuration
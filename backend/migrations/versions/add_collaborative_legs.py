@@ -0,0 +1,52 @@
+"""Add relay legs for collaborative deliveries
+
+Revision ID: add_collaborative_legs
+Revises: add_delivery_time_windows
+Create Date: 2023-12-04 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_collaborative_legs'
+down_revision = 'add_delivery_time_windows'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Créer la table collaborative_legs
+    op.create_table(
+        'collaborative_legs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('delivery_id', sa.Integer(), nullable=False),
+        sa.Column('courier_id', sa.Integer(), nullable=False),
+        sa.Column('sequence', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='planned'),
+        sa.Column('start_lat', sa.Float(), nullable=False),
+        sa.Column('start_lng', sa.Float(), nullable=False),
+        sa.Column('start_label', sa.String(length=255), nullable=True),
+        sa.Column('end_lat', sa.Float(), nullable=False),
+        sa.Column('end_lng', sa.Float(), nullable=False),
+        sa.Column('end_label', sa.String(length=255), nullable=True),
+        sa.Column('planned_distance', sa.Float(), nullable=True),
+        sa.Column('actual_distance', sa.Float(), nullable=True),
+        sa.Column('estimated_start', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('estimated_end', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['delivery_id'], ['deliveries.id'], ),
+        sa.ForeignKeyConstraint(['courier_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    op.create_index(op.f('ix_collaborative_legs_id'), 'collaborative_legs', ['id'], unique=False)
+    op.create_index(op.f('ix_collaborative_legs_delivery_id'), 'collaborative_legs', ['delivery_id'], unique=False)
+
+
+def downgrade() -> None:
+    # Supprimer la table
+    op.drop_table('collaborative_legs')
@@ -0,0 +1,31 @@
+"""Add composite indexes for delivery cursor pagination
+
+Revision ID: add_delivery_keyset_indexes
+Revises: add_vehicle_daily_stats
+Create Date: 2023-12-18 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_delivery_keyset_indexes'
+down_revision = 'add_vehicle_daily_stats'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Index (filtre, created_at, id) parcourus par les listes paginées par curseur
+    op.create_index('ix_deliveries_created_at_id', 'deliveries', ['created_at', 'id'], unique=False)
+    op.create_index('ix_deliveries_client_created_at_id', 'deliveries', ['client_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_deliveries_courier_created_at_id', 'deliveries', ['courier_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_deliveries_status_created_at_id', 'deliveries', ['status', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    # Supprimer les index
+    op.drop_index('ix_deliveries_status_created_at_id', table_name='deliveries')
+    op.drop_index('ix_deliveries_courier_created_at_id', table_name='deliveries')
+    op.drop_index('ix_deliveries_client_created_at_id', table_name='deliveries')
+    op.drop_index('ix_deliveries_created_at_id', table_name='deliveries')
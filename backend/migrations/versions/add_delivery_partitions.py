@@ -0,0 +1,114 @@
+"""Partition tracking points by month and index active deliveries
+
+Revision ID: add_delivery_partitions
+Revises: add_delivery_search
+Create Date: 2023-12-29 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_delivery_partitions'
+down_revision = 'add_delivery_search'
+branch_labels = None
+depends_on = None
+
+# Partitions mensuelles couvrant l'historique existant et les trois mois à venir ;
+# la maintenance (app/services/partitions.py) crée ensuite les suivantes
+CREATE_MONTHLY_PARTITIONS_SQL = """
+DO $$
+DECLARE
+    month date;
+BEGIN
+    FOR month IN
+        SELECT generate_series(
+            date_trunc('month', coalesce((SELECT min(timestamp) FROM tracking_points_old), now()) AT TIME ZONE 'UTC'),
+            date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months',
+            interval '1 month'
+        )::date
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE tracking_points_p%s PARTITION OF tracking_points FOR VALUES FROM (%L) TO (%L)',
+            to_char(month, 'YYYYMM'),
+            month::text || ' 00:00:00+00',
+            (month + interval '1 month')::date::text || ' 00:00:00+00'
+        );
+    END LOOP;
+END $$;
+"""
+
+
+def upgrade() -> None:
+    # Index partiels des livraisons actives (ouvertes, ou en cours chez un coursier)
+    op.create_index(
+        'ix_deliveries_open_created_at_id', 'deliveries', ['created_at', 'id'], unique=False,
+        postgresql_where=sa.text("courier_id IS NULL AND status IN ('pending', 'bidding')")
+    )
+    op.create_index(
+        'ix_deliveries_in_flight_courier_created_at_id', 'deliveries', ['courier_id', 'created_at', 'id'], unique=False,
+        postgresql_where=sa.text("status IN ('accepted', 'in_progress')")
+    )
+
+    # Mettre de côté l'ancienne table, en libérant les noms de ses index
+    op.rename_table('tracking_points', 'tracking_points_old')
+    op.execute("ALTER TABLE tracking_points_old RENAME CONSTRAINT tracking_points_pkey TO tracking_points_old_pkey")
+    op.drop_index('ix_tracking_points_id', table_name='tracking_points_old')
+    op.drop_index('ix_tracking_points_delivery_id', table_name='tracking_points_old')
+    op.drop_index('ix_tracking_points_timestamp', table_name='tracking_points_old')
+
+    # Table partitionnée par mois ; la séquence des identifiants est conservée
+    op.execute("""
+        CREATE TABLE tracking_points (
+            id INTEGER NOT NULL DEFAULT nextval('tracking_points_id_seq'::regclass),
+            delivery_id INTEGER NOT NULL REFERENCES deliveries (id),
+            lat DOUBLE PRECISION NOT NULL,
+            lng DOUBLE PRECISION NOT NULL,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """)
+    op.execute("CREATE TABLE tracking_points_default PARTITION OF tracking_points DEFAULT")
+    op.execute(CREATE_MONTHLY_PARTITIONS_SQL)
+    op.create_index('ix_tracking_points_delivery_id_timestamp', 'tracking_points', ['delivery_id', 'timestamp'], unique=False)
+    op.create_index(op.f('ix_tracking_points_timestamp'), 'tracking_points', ['timestamp'], unique=False)
+
+    # Recopier l'historique, puis supprimer l'ancienne table
+    op.execute("""
+        INSERT INTO tracking_points (id, delivery_id, lat, lng, timestamp)
+        SELECT id, delivery_id, lat, lng, coalesce(timestamp, now()) FROM tracking_points_old
+    """)
+    op.execute("ALTER SEQUENCE tracking_points_id_seq OWNED BY tracking_points.id")
+    op.drop_table('tracking_points_old')
+
+
+def downgrade() -> None:
+    # Revenir à une table unique, en conservant les points et la séquence
+    op.rename_table('tracking_points', 'tracking_points_partitioned')
+    op.execute("ALTER TABLE tracking_points_partitioned RENAME CONSTRAINT tracking_points_pkey TO tracking_points_partitioned_pkey")
+    op.drop_index('ix_tracking_points_delivery_id_timestamp', table_name='tracking_points_partitioned')
+    op.drop_index('ix_tracking_points_timestamp', table_name='tracking_points_partitioned')
+
+    op.execute("""
+        CREATE TABLE tracking_points (
+            id INTEGER NOT NULL DEFAULT nextval('tracking_points_id_seq'::regclass),
+            delivery_id INTEGER NOT NULL REFERENCES deliveries (id),
+            lat DOUBLE PRECISION NOT NULL,
+            lng DOUBLE PRECISION NOT NULL,
+            timestamp TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            CONSTRAINT tracking_points_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute("""
+        INSERT INTO tracking_points (id, delivery_id, lat, lng, timestamp)
+        SELECT id, delivery_id, lat, lng, timestamp FROM tracking_points_partitioned
+    """)
+    op.execute("ALTER SEQUENCE tracking_points_id_seq OWNED BY tracking_points.id")
+    op.execute("DROP TABLE tracking_points_partitioned CASCADE")
+
+    op.create_index(op.f('ix_tracking_points_id'), 'tracking_points', ['id'], unique=False)
+    op.create_index(op.f('ix_tracking_points_delivery_id'), 'tracking_points', ['delivery_id'], unique=False)
+    op.create_index(op.f('ix_tracking_points_timestamp'), 'tracking_points', ['timestamp'], unique=False)
+
+    op.drop_index('ix_deliveries_in_flight_courier_created_at_id', table_name='deliveries')
+    op.drop_index('ix_deliveries_open_created_at_id', table_name='deliveries')
@@ -0,0 +1,57 @@
+"""Add accent-insensitive full-text search over deliveries
+
+Revision ID: add_delivery_search
+Revises: add_delivery_state_machine
+Create Date: 2023-12-22 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_delivery_search'
+down_revision = 'add_delivery_state_machine'
+branch_labels = None
+depends_on = None
+
+SEARCH_FUNCTIONS_DDL = """
+CREATE EXTENSION IF NOT EXISTS unaccent;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS
+$$ SELECT public.unaccent('public.unaccent', $1) $$
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT;
+"""
+
+SEARCH_DOCUMENT_SQL = (
+    "f_unaccent(lower("
+    "coalesce(pickup_address, '') || ' ' || coalesce(delivery_address, '') || ' ' || "
+    "coalesce(package_description, '') || ' ' || "
+    "coalesce(pickup_contact_name, '') || ' ' || coalesce(delivery_contact_name, '')"
+    "))"
+)
+
+
+def upgrade() -> None:
+    # Extensions unaccent et pg_trgm, et fonction f_unaccent immuable
+    op.execute(SEARCH_FUNCTIONS_DDL)
+    
+    # Texte de recherche maintenu par la base à chaque écriture
+    op.add_column('deliveries', sa.Column('search_document', sa.Text(), sa.Computed(SEARCH_DOCUMENT_SQL, persisted=True)))
+    
+    # Index plein texte (préfixes) et trigrammes (fautes d'orthographe)
+    op.create_index(
+        'ix_deliveries_search_tsv', 'deliveries', [sa.text("to_tsvector('simple', search_document)")],
+        unique=False, postgresql_using='gin'
+    )
+    op.create_index(
+        'ix_deliveries_search_trgm', 'deliveries', ['search_document'],
+        unique=False, postgresql_using='gin', postgresql_ops={'search_document': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    # Supprimer les index et la colonne (les extensions sont conservées)
+    op.drop_index('ix_deliveries_search_trgm', table_name='deliveries')
+    op.drop_index('ix_deliveries_search_tsv', table_name='deliveries')
+    op.drop_column('deliveries', 'search_document')
+    op.execute("DROP FUNCTION IF EXISTS f_unaccent(text)")
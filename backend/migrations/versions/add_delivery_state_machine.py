@@ -0,0 +1,50 @@
+"""Add delivery version column, bid notes and the outbox table
+
+Revision ID: add_delivery_state_machine
+Revises: add_delivery_keyset_indexes
+Create Date: 2023-12-20 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_delivery_state_machine'
+down_revision = 'add_delivery_keyset_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Version des livraisons pour les transitions conditionnelles
+    op.add_column('deliveries', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    
+    # Commentaire des enchères
+    op.add_column('bids', sa.Column('note', sa.Text(), nullable=True))
+    
+    # Événements écrits avec les transitions, publiés par le relais
+    op.create_table(
+        'outbox_events',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('aggregate_type', sa.String(length=50), nullable=False),
+        sa.Column('aggregate_id', sa.Integer(), nullable=False),
+        sa.Column('event_type', sa.String(length=100), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('published_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_outbox_events_id'), 'outbox_events', ['id'], unique=False)
+    op.create_index(
+        'ix_outbox_events_unpublished', 'outbox_events', ['id'], unique=False,
+        postgresql_where=sa.text('published_at IS NULL')
+    )
+
+
+def downgrade() -> None:
+    # Supprimer la table et les colonnes
+    op.drop_index('ix_outbox_events_unpublished', table_name='outbox_events')
+    op.drop_index(op.f('ix_outbox_events_id'), table_name='outbox_events')
+    op.drop_table('outbox_events')
+    op.drop_column('bids', 'note')
+    op.drop_column('deliveries', 'version')
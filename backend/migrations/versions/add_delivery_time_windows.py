@@ -0,0 +1,31 @@
+"""Add pickup and delivery time windows to deliveries
+
+Revision ID: add_delivery_time_windows
+Revises: add_traffic_eta_tables
+Create Date: 2023-11-27 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_delivery_time_windows'
+down_revision = 'add_traffic_eta_tables'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Ajouter les fenêtres horaires à la table deliveries
+    op.add_column('deliveries', sa.Column('pickup_window_start', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('deliveries', sa.Column('pickup_window_end', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('deliveries', sa.Column('delivery_window_start', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('deliveries', sa.Column('delivery_window_end', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    # Supprimer les fenêtres horaires
+    op.drop_column('deliveries', 'delivery_window_end')
+    op.drop_column('deliveries', 'delivery_window_start')
+    op.drop_column('deliveries', 'pickup_window_end')
+    op.drop_column('deliveries', 'pickup_window_start')
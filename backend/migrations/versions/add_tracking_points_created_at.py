@@ -0,0 +1,26 @@
+"""Record the insertion time of tracking points
+
+Revision ID: add_tracking_points_created_at
+Revises: add_delivery_partitions
+Create Date: 2024-01-05 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_tracking_points_created_at'
+down_revision = 'add_delivery_partitions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Ajoutée sur la table partitionnée, la colonne l'est aussi sur chaque partition
+    op.add_column('tracking_points', sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True))
+    op.create_index('ix_tracking_points_created_at_id', 'tracking_points', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tracking_points_created_at_id', table_name='tracking_points')
+    op.drop_column('tracking_points', 'created_at')
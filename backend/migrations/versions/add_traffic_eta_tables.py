@@ -0,0 +1,59 @@
+"""Add traffic data and tracking points tables
+
+Revision ID: add_traffic_eta_tables
+Revises: add_transport_tables
+Create Date: 2023-11-20 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_traffic_eta_tables'
+down_revision = 'add_transport_tables'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Créer la table traffic_data (segments du fournisseur de trafic)
+    op.create_table(
+        'traffic_data',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('segment_id', sa.String(), nullable=True),
+        sa.Column('latitude', sa.Float(), nullable=False),
+        sa.Column('longitude', sa.Float(), nullable=False),
+        sa.Column('current_speed', sa.Float(), nullable=True),
+        sa.Column('free_flow_speed', sa.Float(), nullable=True),
+        sa.Column('current_travel_time', sa.Integer(), nullable=True),
+        sa.Column('free_flow_travel_time', sa.Integer(), nullable=True),
+        sa.Column('confidence', sa.Float(), nullable=True),
+        sa.Column('road_closure', sa.Boolean(), nullable=True, server_default='false'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    op.create_index(op.f('ix_traffic_data_id'), 'traffic_data', ['id'], unique=False)
+    op.create_index(op.f('ix_traffic_data_created_at'), 'traffic_data', ['created_at'], unique=False)
+
+    # Créer la table tracking_points
+    op.create_table(
+        'tracking_points',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('delivery_id', sa.Integer(), nullable=False),
+        sa.Column('lat', sa.Float(), nullable=False),
+        sa.Column('lng', sa.Float(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['delivery_id'], ['deliveries.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    op.create_index(op.f('ix_tracking_points_id'), 'tracking_points', ['id'], unique=False)
+    op.create_index(op.f('ix_tracking_points_delivery_id'), 'tracking_points', ['delivery_id'], unique=False)
+    op.create_index(op.f('ix_tracking_points_timestamp'), 'tracking_points', ['timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    # Supprimer les tables
+    op.drop_table('tracking_points')
+    op.drop_table('traffic_data')
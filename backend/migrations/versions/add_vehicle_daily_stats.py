@@ -0,0 +1,102 @@
+"""Add daily rollup tables for vehicle usage statistics
+
+Revision ID: add_vehicle_daily_stats
+Revises: add_collaborative_legs
+Create Date: 2023-12-11 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_vehicle_daily_stats'
+down_revision = 'add_collaborative_legs'
+branch_labels = None
+depends_on = None
+
+
+def _counter_columns():
+    return [
+        sa.Column('usage_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('distance_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_distance', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('total_fuel', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('total_co2', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('fuel_efficiency_sum', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('fuel_efficiency_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('co2_per_km_sum', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('co2_per_km_count', sa.Integer(), nullable=False, server_default='0'),
+    ]
+
+
+# Compteurs calculés depuis vehicle_usages, dans l'ordre de _counter_columns
+COUNTER_EXPRESSIONS = """
+    COUNT(vu.id),
+    COUNT(vu.distance_traveled),
+    COALESCE(SUM(vu.distance_traveled), 0),
+    COALESCE(SUM(vu.fuel_consumed), 0),
+    COALESCE(SUM(vu.co2_emissions), 0),
+    COALESCE(SUM(CASE WHEN vu.distance_traveled > 0 AND vu.fuel_consumed IS NOT NULL THEN vu.fuel_consumed / vu.distance_traveled END), 0),
+    COUNT(CASE WHEN vu.distance_traveled > 0 AND vu.fuel_consumed IS NOT NULL THEN 1 END),
+    COALESCE(SUM(CASE WHEN vu.distance_traveled > 0 AND vu.co2_emissions IS NOT NULL THEN vu.co2_emissions / vu.distance_traveled END), 0),
+    COUNT(CASE WHEN vu.distance_traveled > 0 AND vu.co2_emissions IS NOT NULL THEN 1 END)
+"""
+
+COUNTER_NAMES = (
+    "usage_count, distance_count, total_distance, total_fuel, total_co2, "
+    "fuel_efficiency_sum, fuel_efficiency_count, co2_per_km_sum, co2_per_km_count"
+)
+
+
+def upgrade() -> None:
+    # Créer la table vehicle_daily_stats
+    op.create_table(
+        'vehicle_daily_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('vehicle_id', sa.Integer(), nullable=False),
+        *_counter_columns(),
+        sa.ForeignKeyConstraint(['vehicle_id'], ['vehicles.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'vehicle_id', name='uq_vehicle_daily_stats')
+    )
+
+    op.create_index(op.f('ix_vehicle_daily_stats_id'), 'vehicle_daily_stats', ['id'], unique=False)
+    op.create_index(op.f('ix_vehicle_daily_stats_vehicle_id'), 'vehicle_daily_stats', ['vehicle_id'], unique=False)
+
+    # Créer la table vehicle_type_daily_stats
+    op.create_table(
+        'vehicle_type_daily_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('vehicle_type', sa.String(length=50), nullable=False),
+        sa.Column('is_electric', sa.Boolean(), nullable=False, server_default=sa.false()),
+        *_counter_columns(),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'vehicle_type', 'is_electric', name='uq_vehicle_type_daily_stats')
+    )
+
+    op.create_index(op.f('ix_vehicle_type_daily_stats_id'), 'vehicle_type_daily_stats', ['id'], unique=False)
+
+    # Reprendre l'historique des utilisations (jours UTC)
+    op.execute(f"""
+        INSERT INTO vehicle_daily_stats (day, vehicle_id, {COUNTER_NAMES})
+        SELECT (vu.start_time AT TIME ZONE 'UTC')::date, cv.vehicle_id, {COUNTER_EXPRESSIONS}
+        FROM vehicle_usages vu
+        JOIN courier_vehicles cv ON cv.id = vu.courier_vehicle_id
+        GROUP BY 1, 2
+    """)
+    op.execute(f"""
+        INSERT INTO vehicle_type_daily_stats (day, vehicle_type, is_electric, {COUNTER_NAMES})
+        SELECT (vu.start_time AT TIME ZONE 'UTC')::date, v.type, v.is_electric, {COUNTER_EXPRESSIONS}
+        FROM vehicle_usages vu
+        JOIN courier_vehicles cv ON cv.id = vu.courier_vehicle_id
+        JOIN vehicles v ON v.id = cv.vehicle_id
+        GROUP BY 1, 2, 3
+    """)
+
+
+def downgrade() -> None:
+    # Supprimer les tables
+    op.drop_table('vehicle_type_daily_stats')
+    op.drop_table('vehicle_daily_stats')
@@ -0,0 +1,60 @@
+"""Derive per-type vehicle statistics from the per-vehicle rollup
+
+Revision ID: drop_vehicle_type_daily_stats
+Revises: add_tracking_points_created_at
+Create Date: 2024-01-08 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'drop_vehicle_type_daily_stats'
+down_revision = 'add_tracking_points_created_at'
+branch_labels = None
+depends_on = None
+
+COUNTER_NAMES = (
+    "usage_count, distance_count, total_distance, total_fuel, total_co2, "
+    "fuel_efficiency_sum, fuel_efficiency_count, co2_per_km_sum, co2_per_km_count"
+)
+
+
+def upgrade() -> None:
+    # Agrégats par type figés au type du véhicule lors de l'écriture : un
+    # changement de type les rendait faux. Les statistiques par type joignent
+    # désormais vehicle_daily_stats au type actuel du véhicule.
+    op.drop_index(op.f('ix_vehicle_type_daily_stats_id'), table_name='vehicle_type_daily_stats')
+    op.drop_table('vehicle_type_daily_stats')
+
+
+def downgrade() -> None:
+    op.create_table(
+        'vehicle_type_daily_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('vehicle_type', sa.String(length=50), nullable=False),
+        sa.Column('is_electric', sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column('usage_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('distance_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_distance', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('total_fuel', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('total_co2', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('fuel_efficiency_sum', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('fuel_efficiency_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('co2_per_km_sum', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('co2_per_km_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'vehicle_type', 'is_electric', name='uq_vehicle_type_daily_stats')
+    )
+    op.create_index(op.f('ix_vehicle_type_daily_stats_id'), 'vehicle_type_daily_stats', ['id'], unique=False)
+
+    op.execute(f"""
+        INSERT INTO vehicle_type_daily_stats (day, vehicle_type, is_electric, {COUNTER_NAMES})
+        SELECT s.day, v.type, v.is_electric,
+            SUM(s.usage_count), SUM(s.distance_count), SUM(s.total_distance), SUM(s.total_fuel), SUM(s.total_co2),
+            SUM(s.fuel_efficiency_sum), SUM(s.fuel_efficiency_count), SUM(s.co2_per_km_sum), SUM(s.co2_per_km_count)
+        FROM vehicle_daily_stats s
+        JOIN vehicles v ON v.id = s.vehicle_id
+        GROUP BY 1, 2, 3
+    """)
@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import random
+import time
+
+from app.services.position_codec import encode_positions, position_message
+
+def simulate_track(count, seed=0):
+    """
+    Trajet d'un coursier à Abidjan : une position par seconde, quelques mètres
+    entre deux relevés, avec un bruit GPS réaliste.
+    """
+    rng = random.Random(seed)
+    ts = int(time.time() * 1000)
+    lat, lng = 5.3364, -4.0267
+    points = []
+    for _ in range(count):
+        ts += 1000 + rng.randint(-50, 50)
+        lat += rng.gauss(0.00004, 0.00002)
+        lng += rng.gauss(0.00003, 0.00002)
+        points.append((ts, round(lat, 7), round(lng, 7)))
+    return points
+
+def measure(name, encode, batches, positions):
+    start = time.perf_counter()
+    frames = [encode(batch) for batch in batches]
+    elapsed = time.perf_counter() - start
+    size = sum(len(frame) for frame in frames)
+    print(f"{name:<28} {size / positions:>8.1f} o/position {elapsed / positions * 1e6:>8.2f} µs/position")
+
+def benchmark_position_frames(count, delivery_id=123456):
+    points = simulate_track(count)
+    print(f"{count} positions, livraison {delivery_id}")
+
+    def as_json(batch):
+        return json.dumps(position_message(delivery_id, batch)).encode()
+
+    def as_binary(batch):
+        return encode_positions(delivery_id, batch)
+
+    for batch_size in (1, 5, 10, 30):
+        batches = [points[i:i + batch_size] for i in range(0, count, batch_size)]
+        measure(f"JSON, {batch_size} pos./trame", as_json, batches, count)
+        measure(f"Binaire, {batch_size} pos./trame", as_binary, batches, count)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Comparer la taille et le coût d'encodage des trames de positions")
+    parser.add_argument("--count", type=int, default=30000, help="Nombre de positions simulées")
+
+    args = parser.parse_args()
+    benchmark_position_frames(args.count)
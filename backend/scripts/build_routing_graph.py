@@ -0,0 +1,30 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+
+from app.services.routing import RoutingEngine
+
+def build_routing_graph(osm_path, cache_path):
+    """
+    Précalculer la hiérarchie de contraction d'un extrait OSM, pour que l'API
+    n'ait plus qu'à la charger au démarrage. Le fichier est remplacé d'un
+    bloc : les instances en cours de démarrage lisent l'ancien ou le nouveau.
+    """
+    engine = RoutingEngine(osm_path=osm_path, cache_path=cache_path)
+    start = time.time()
+    if not engine.build():
+        print(f"Extrait OSM introuvable: {osm_path}")
+        return
+
+    print(f"Précalcul terminé en {time.time() - start:.1f} s: {engine.cache_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Précalculer le graphe routier hors ligne")
+    parser.add_argument("osm_path", help="Extrait OSM d'Abidjan (.osm, .osm.gz ou .osm.bz2)")
+    parser.add_argument("--cache-path", default="", help="Fichier de précalcul (par défaut <extrait>.ch.npz)")
+
+    args = parser.parse_args()
+    build_routing_graph(args.osm_path, args.cache_path)
@@ -0,0 +1,116 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+import random
+
+import pytest
+
+from app.core.exceptions import BadRequestError
+from app.services import assignment
+from app.services.assignment import solve_assignment, vehicle_fit_cost
+
+
+def _brute_force_cost(arcs, unassigned_cost):
+    best = [unassigned_cost * len(arcs)]
+
+    def explore(i, used, cost):
+        if i == len(arcs):
+            best[0] = min(best[0], cost)
+            return
+        explore(i + 1, used, cost + unassigned_cost)
+        for courier_id, arc_cost in arcs[i]:
+            if courier_id not in used and arc_cost < unassigned_cost:
+                explore(i + 1, used | {courier_id}, cost + arc_cost)
+
+    explore(0, frozenset(), 0.0)
+    return best[0]
+
+
+def test_solve_assignment_is_near_optimal():
+    rng = random.Random(5)
+    for _ in range(200):
+        deliveries = rng.randint(1, 6)
+        couriers = list(range(100, 100 + rng.randint(1, 6)))
+        arcs = [
+            [(courier_id, round(rng.uniform(0, 80), 2)) for courier_id in rng.sample(couriers, rng.randint(0, len(couriers)))]
+            for _ in range(deliveries)
+        ]
+
+        matching = solve_assignment(arcs, 60)
+
+        # Chaque coursier reçoit au plus une livraison, sur un arc admissible
+        assert len(set(matching.values())) == len(matching)
+        cost = sum(dict(arcs[i])[courier_id] for i, courier_id in matching.items())
+        cost += 60 * (deliveries - len(matching))
+        assert cost - _brute_force_cost(arcs, 60) <= 0.01 * (deliveries + len(couriers)) + 1e-6
+
+
+def test_solve_assignment_leaves_expensive_deliveries_unassigned():
+    arcs = [[(1, 10.0)], [(1, 12.0), (2, 90.0)]]
+    assert solve_assignment(arcs, 60) == {0: 1}
+    assert solve_assignment([[], []], 60) == {}
+
+
+def test_vehicle_fit_cost():
+    # Véhicule imposé par le client
+    assert vehicle_fit_cost("motorcycle", "van", 5) is None
+    # Colis trop lourd pour un vélo
+    assert vehicle_fit_cost("bicycle", None, 50) is None
+    # Un camion pour un document coûte plus cher qu'une moto
+    assert vehicle_fit_cost("moving_truck", None, 1) > vehicle_fit_cost("motorcycle", None, 1)
+
+
+class FakeRedis:
+    def __init__(self, values):
+        self.values = dict(values)
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+
+def _offer_redis(monkeypatch, delivery_id, courier_id):
+    redis = FakeRedis({
+        f"assignment:offer:{delivery_id}": json.dumps({"delivery_id": delivery_id, "courier_id": courier_id, "proposed_price": 2000}),
+        f"assignment:courier:{courier_id}": str(delivery_id),
+    })
+
+    async def connection():
+        return redis
+
+    monkeypatch.setattr(assignment, "get_redis_connection", connection)
+    return redis
+
+
+def test_refused_acceptance_keeps_the_offer(monkeypatch):
+    redis = _offer_redis(monkeypatch, 5, 9)
+
+    def overloaded(db, delivery_id, courier_id, offer):
+        raise BadRequestError("Capacité du véhicule dépassée")
+
+    monkeypatch.setattr(assignment, "_take_delivery", overloaded)
+    with pytest.raises(BadRequestError):
+        asyncio.run(assignment.accept_offer(None, 5, 9))
+    assert "assignment:offer:5" in redis.values
+    assert "assignment:courier:9" in redis.values
+
+
+def test_accepted_offer_is_removed_after_the_transition(monkeypatch):
+    redis = _offer_redis(monkeypatch, 5, 9)
+    seen = []
+
+    def take(db, delivery_id, courier_id, offer):
+        # L'offre est encore en place pendant la transition
+        seen.append("assignment:offer:5" in redis.values)
+        return {"id": delivery_id, "final_price": offer["proposed_price"]}
+
+    monkeypatch.setattr(assignment, "_take_delivery", take)
+    assert asyncio.run(assignment.accept_offer(None, 5, 9)) == {"id": 5, "final_price": 2000}
+    assert seen == [True]
+    assert redis.values == {}
@@ -0,0 +1,98 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import io
+
+import pytest
+
+from app.core.exceptions import BadRequestError
+from app.services.delivery_import import iter_rows, batched, detect_format, check_encoding, CSV, NDJSON
+
+
+def _lines(content: str):
+    return io.TextIOWrapper(io.BytesIO(content.encode("utf-8-sig")), encoding="utf-8-sig", newline="")
+
+
+def test_csv_semicolon_header_and_cleaning():
+    content = (
+        "pickup_address;pickup_commune;delivery_address;delivery_commune;proposed_price;is_fragile;package_weight\n"
+        "Rue 12;Cocody;Marché;Adjamé;1500;oui;\n"
+        "\n"
+        "Carrefour;Yopougon;Gare;Plateau;2000;non;3.5\n"
+    )
+    rows = list(iter_rows(_lines(content), CSV))
+    assert [row.line for row in rows] == [2, 4]
+    first = rows[0].data
+    # En-tête lu sans le BOM, cellules vides omises, booléens convertis
+    assert first["pickup_address"] == "Rue 12"
+    assert first["is_fragile"] is True
+    assert "package_weight" not in first
+    assert rows[1].data["is_fragile"] is False
+    assert rows[1].data["package_weight"] == "3.5"
+
+
+def test_csv_quoted_fields_and_extra_columns():
+    content = (
+        "pickup_address,pickup_commune,proposed_price\n"
+        "\"Rue 12, près de la pharmacie\",Cocody,1500\n"
+        "Rue 3,Treichville,1000,en trop\n"
+    )
+    rows = list(iter_rows(_lines(content), CSV))
+    assert rows[0].data["pickup_address"] == "Rue 12, près de la pharmacie"
+    assert rows[1].data is None and rows[1].error
+
+
+def test_ndjson_rows_report_invalid_lines():
+    content = (
+        '{"pickup_address": "Rue 12", "proposed_price": 1500, "package_weight": null}\n'
+        "\n"
+        "{pas du json}\n"
+        "[1, 2]\n"
+    )
+    rows = list(iter_rows(_lines(content), NDJSON))
+    assert [row.line for row in rows] == [1, 3, 4]
+    assert rows[0].data == {"pickup_address": "Rue 12", "proposed_price": 1500}
+    assert rows[1].error and rows[2].error
+
+
+def test_detect_format():
+    assert detect_format("commandes.CSV", None) == CSV
+    assert detect_format("commandes.jsonl", None) == NDJSON
+    assert detect_format("export", "application/x-ndjson; charset=utf-8") == NDJSON
+    assert detect_format("commandes.csv", None, "ndjson") == NDJSON
+    with pytest.raises(BadRequestError):
+        detect_format("commandes.xlsx", "application/octet-stream")
+    with pytest.raises(BadRequestError):
+        detect_format(None, None, "xml")
+
+
+def test_batched_is_lazy_and_complete():
+    consumed = []
+
+    def rows():
+        for i in range(7):
+            consumed.append(i)
+            yield i
+
+    batches = batched(rows(), 3)
+    assert next(batches) == [0, 1, 2]
+    assert consumed == [0, 1, 2]
+    assert list(batches) == [[3, 4, 5], [6]]
+
+
+def test_check_encoding_reports_the_line_and_rewinds():
+    valid = io.BytesIO("pickup_address\nAbobo Gare\nRue é\n".encode("utf-8-sig"))
+    check_encoding(valid, chunk_size=4)
+    assert valid.tell() == 0
+
+    # Octet Latin-1 à la troisième ligne, lu par petits blocs
+    invalid = io.BytesIO("pickup_address\nAbobo Gare\nRue ".encode("utf-8") + b"\xe9\n")
+    with pytest.raises(BadRequestError) as error:
+        check_encoding(invalid, chunk_size=4)
+    assert "ligne 3" in error.value.detail
+    assert invalid.tell() == 0
+
+    # Séquence multi-octets tronquée en fin de fichier
+    with pytest.raises(BadRequestError):
+        check_encoding(io.BytesIO(b"a\nb\xc3"))
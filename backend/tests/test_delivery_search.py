@@ -0,0 +1,23 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.delivery_search import search_terms, prefix_tsquery, MAX_SEARCH_TERMS
+
+
+def test_search_terms_are_accent_and_case_insensitive():
+    assert search_terms("Rue des Jardins, Deux-Plateaux") == ["rue", "des", "jardins", "deux", "plateaux"]
+    assert search_terms("Marché d'Adjamé") == search_terms("marche d adjame")
+    assert search_terms("  ") == []
+    assert search_terms(None) == []
+
+
+def test_search_terms_are_capped():
+    assert len(search_terms(" ".join(f"mot{i}" for i in range(20)))) == MAX_SEARCH_TERMS
+
+
+def test_prefix_tsquery_escapes_nothing_unsafe():
+    # Les opérateurs tsquery sont retirés par la normalisation
+    terms = search_terms("treich & !cocody | 'x':*")
+    assert terms == ["treich", "cocody", "x"]
+    assert prefix_tsquery(terms) == "treich:* & cocody:* & x:*"
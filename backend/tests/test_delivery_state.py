@@ -0,0 +1,45 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.delivery_state import (
+    allowed_sources, TRANSITIONS, ALL_STATUSES, SYSTEM,
+    PENDING, BIDDING, ACCEPTED, IN_PROGRESS, DELIVERED, COMPLETED, CANCELLED
+)
+
+
+def test_courier_transitions():
+    assert allowed_sources("courier", IN_PROGRESS) == [ACCEPTED]
+    assert allowed_sources("courier", DELIVERED) == [IN_PROGRESS]
+    # Un coursier ne clôture ni n'annule une livraison
+    assert allowed_sources("courier", COMPLETED) == []
+    assert allowed_sources("courier", CANCELLED) == []
+
+
+def test_client_transitions():
+    assert allowed_sources("client", COMPLETED) == [DELIVERED]
+    assert allowed_sources("client", CANCELLED) == [PENDING, BIDDING]
+    assert allowed_sources("client", IN_PROGRESS) == []
+
+
+def test_system_transitions_cover_bidding_and_acceptance():
+    # Une nouvelle enchère maintient la livraison en enchères
+    assert allowed_sources(SYSTEM, BIDDING) == [PENDING, BIDDING]
+    assert allowed_sources(SYSTEM, ACCEPTED) == [PENDING, BIDDING]
+    assert allowed_sources(SYSTEM, DELIVERED) == []
+
+
+def test_manager_can_reach_every_status():
+    for status in ALL_STATUSES:
+        assert allowed_sources("manager", status) == list(ALL_STATUSES)
+
+
+def test_unknown_role_and_enum_values():
+    class Role:
+        value = "courier"
+
+    assert allowed_sources("business", CANCELLED) == []
+    assert allowed_sources(Role(), DELIVERED) == [IN_PROGRESS]
+    for transitions in TRANSITIONS.values():
+        for source, targets in transitions.items():
+            assert source in ALL_STATUSES and targets <= set(ALL_STATUSES)
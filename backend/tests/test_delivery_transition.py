@@ -0,0 +1,147 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+# transition() s'appuie sur UPDATE ... RETURNING et sur le schéma PostgreSQL
+# des livraisons : ces tests tournent sur la base de test (DATABASE_URL)
+if not os.getenv("DATABASE_URL", "").startswith("postgres"):
+    pytest.skip("Base PostgreSQL de test requise (DATABASE_URL)", allow_module_level=True)
+
+from app.db.base import Base, engine, SessionLocal
+from app.models.delivery import Delivery, DeliveryStatus
+from app.models.outbox import OutboxEvent
+from app.models.user import User, UserRole, UserStatus
+from app.core.exceptions import NotFoundError, BadRequestError, ForbiddenError, ConflictError
+from app.services.delivery_state import transition, SYSTEM, EVENT_STATUS_CHANGED
+
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    Base.metadata.create_all(bind=engine)
+    yield
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    client = User(phone="+22507100001", hashed_password="x", full_name="Client", role=UserRole.client, status=UserStatus.active)
+    courier = User(phone="+22507100002", hashed_password="x", full_name="Coursier", role=UserRole.courier, status=UserStatus.active)
+    other = User(phone="+22507100003", hashed_password="x", full_name="Autre coursier", role=UserRole.courier, status=UserStatus.active)
+    session.add_all([client, courier, other])
+    session.commit()
+    session.info["users"] = (client.id, courier.id, other.id)
+    yield session
+    session.rollback()
+    user_ids = session.info["users"]
+    delivery_ids = [d.id for d in session.query(Delivery.id).filter(Delivery.client_id == user_ids[0])]
+    session.query(OutboxEvent).filter(OutboxEvent.aggregate_id.in_(delivery_ids)).delete(synchronize_session=False)
+    session.query(Delivery).filter(Delivery.id.in_(delivery_ids)).delete(synchronize_session=False)
+    session.query(User).filter(User.id.in_(user_ids)).delete(synchronize_session=False)
+    session.commit()
+    session.close()
+
+
+def _delivery(db, status=DeliveryStatus.accepted):
+    client_id, courier_id, _ = db.info["users"]
+    delivery = Delivery(
+        client_id=client_id,
+        courier_id=courier_id,
+        pickup_address="Rue des Jardins",
+        pickup_commune="Cocody",
+        delivery_address="Boulevard de Marseille",
+        delivery_commune="Marcory",
+        proposed_price=2000,
+        status=status
+    )
+    db.add(delivery)
+    db.commit()
+    return delivery.id
+
+
+def _events(db, delivery_id):
+    return db.query(OutboxEvent).filter(OutboxEvent.aggregate_id == delivery_id).all()
+
+
+def test_transition_swaps_status_and_version_in_one_update(db):
+    delivery_id = _delivery(db)
+    _, courier_id, _ = db.info["users"]
+
+    delivery = transition(db, delivery_id, DeliveryStatus.in_progress, UserRole.courier, user_id=courier_id, expected_version=1)
+
+    assert delivery.status == DeliveryStatus.in_progress
+    assert delivery.version == 2
+    assert delivery.pickup_at is not None
+    event, = _events(db, delivery_id)
+    assert event.event_type == EVENT_STATUS_CHANGED
+    assert event.payload["status"] == "in_progress"
+    assert event.payload["version"] == 2
+    assert event.payload["actor_id"] == courier_id
+
+
+def test_stale_version_is_a_conflict_and_writes_nothing(db):
+    delivery_id = _delivery(db)
+    _, courier_id, _ = db.info["users"]
+    transition(db, delivery_id, DeliveryStatus.in_progress, "courier", user_id=courier_id, expected_version=1)
+
+    # Deuxième écriture avec la version lue avant la première
+    with pytest.raises(ConflictError):
+        transition(db, delivery_id, DeliveryStatus.delivered, "courier", user_id=courier_id, expected_version=1)
+
+    delivery = db.get(Delivery, delivery_id)
+    db.refresh(delivery)
+    assert delivery.status == DeliveryStatus.in_progress and delivery.version == 2
+    assert len(_events(db, delivery_id)) == 1
+
+
+def test_concurrent_writers_only_one_wins(db):
+    delivery_id = _delivery(db)
+    _, courier_id, _ = db.info["users"]
+    other_session = SessionLocal()
+    try:
+        # Les deux sessions ont lu la version 1 ; le compare-and-swap départage
+        transition(other_session, delivery_id, DeliveryStatus.in_progress, "courier", user_id=courier_id, expected_version=1)
+        with pytest.raises(ConflictError):
+            transition(db, delivery_id, DeliveryStatus.in_progress, "courier", user_id=courier_id, expected_version=1)
+    finally:
+        other_session.close()
+
+
+def test_failed_transition_reports_the_cause(db):
+    delivery_id = _delivery(db)
+    client_id, courier_id, other_id = db.info["users"]
+
+    with pytest.raises(NotFoundError):
+        transition(db, 0, DeliveryStatus.in_progress, "courier", user_id=courier_id)
+    with pytest.raises(ForbiddenError):
+        transition(db, delivery_id, DeliveryStatus.in_progress, "courier", user_id=other_id)
+    with pytest.raises(ForbiddenError):
+        transition(db, delivery_id, DeliveryStatus.cancelled, "client", user_id=other_id)
+    # Statut de départ non autorisé pour ce rôle
+    with pytest.raises(BadRequestError):
+        transition(db, delivery_id, DeliveryStatus.delivered, "courier", user_id=courier_id)
+    # Aucune transition vers ce statut pour ce rôle
+    with pytest.raises(BadRequestError):
+        transition(db, delivery_id, DeliveryStatus.completed, "courier", user_id=courier_id)
+    # Condition propre à l'appelant non remplie
+    with pytest.raises(ConflictError):
+        transition(db, delivery_id, DeliveryStatus.cancelled, "manager", user_id=client_id, conditions=[Delivery.courier_id.is_(None)])
+    assert _events(db, delivery_id) == []
+
+
+def test_outbox_event_shares_the_transition_transaction(db):
+    delivery_id = _delivery(db, DeliveryStatus.pending)
+    client_id, _, _ = db.info["users"]
+
+    transition(db, delivery_id, DeliveryStatus.bidding, SYSTEM, user_id=client_id, payload={"bid_id": 7}, commit=False)
+    db.rollback()
+    # Annulée avec la transaction : ni changement de statut, ni événement
+    assert db.get(Delivery, delivery_id).status == DeliveryStatus.pending
+    assert _events(db, delivery_id) == []
+
+    transition(db, delivery_id, DeliveryStatus.bidding, SYSTEM, user_id=client_id, payload={"bid_id": 7}, commit=False)
+    db.commit()
+    event, = _events(db, delivery_id)
+    assert event.payload["bid_id"] == 7
+    assert event.payload["actor_role"] == SYSTEM
@@ -0,0 +1,214 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+from datetime import datetime, timedelta
+
+from app.services.courier_index import CourierLocationIndex, haversine
+
+# Centre approximatif d'Abidjan (Plateau)
+CENTER_LAT = 5.3235
+CENTER_LNG = -4.0196
+
+
+def _populate(index, count=500, seed=42):
+    rng = random.Random(seed)
+    for courier_id in range(1, count + 1):
+        index.upsert(
+            courier_id,
+            CENTER_LAT + rng.uniform(-0.15, 0.15),
+            CENTER_LNG + rng.uniform(-0.15, 0.15),
+            vehicle_type=rng.choice(["motorcycle", "bicycle", "van"]),
+            is_online=rng.random() > 0.2
+        )
+
+
+def test_nearest_matches_brute_force():
+    index = CourierLocationIndex(cell_size=0.01)
+    _populate(index)
+
+    lat, lng = 5.35, -4.0
+    results = index.nearest(lat, lng, k=10, vehicle_types=["motorcycle"])
+
+    expected = sorted(
+        haversine(lat, lng, p.lat, p.lng)
+        for p in index._positions.values()
+        if p.is_online and p.vehicle_type == "motorcycle"
+    )[:10]
+
+    assert [round(d, 6) for d, _ in results] == [round(d, 6) for d in expected]
+    assert all(p.vehicle_type == "motorcycle" and p.is_online for _, p in results)
+
+
+def test_within_radius_and_max_distance():
+    index = CourierLocationIndex(cell_size=0.01)
+    _populate(index)
+
+    lat, lng = 5.30, -4.02
+    radius = 3.0
+    in_radius = index.within_radius(lat, lng, radius)
+    expected = [p for p in index._positions.values() if p.is_online and haversine(lat, lng, p.lat, p.lng) <= radius]
+
+    assert len(in_radius) == len(expected)
+    assert all(d <= radius for d, _ in index.nearest(lat, lng, k=1000, max_distance=radius))
+
+
+def test_moves_offline_and_stale_positions():
+    index = CourierLocationIndex(cell_size=0.01, max_age_minutes=15)
+    index.upsert(1, 5.30, -4.00, vehicle_type="motorcycle", is_online=True)
+    index.upsert(2, 5.31, -4.00, vehicle_type="motorcycle", is_online=True,
+                 updated_at=datetime.utcnow() - timedelta(hours=1))
+
+    assert [p.courier_id for _, p in index.nearest(5.30, -4.00, k=5)] == [1]
+
+    # Déplacement vers une autre cellule
+    index.upsert(1, 5.40, -3.95)
+    assert index.nearest(5.30, -4.00, k=5, max_distance=2.0) == []
+    assert index.nearest(5.40, -3.95, k=1)[0][1].courier_id == 1
+
+    index.set_status(1, False)
+    assert index.nearest(5.40, -3.95, k=1) == []
+
+
+def test_distance_matrix_matches_scalar_functions():
+    from app.services.geolocation import (
+        calculate_distance, calculate_duration, calculate_distance_and_duration_matrix
+    )
+    from app.services.eta_engine import eta_engine
+
+    rng = random.Random(7)
+    origins = [(CENTER_LAT + rng.uniform(-0.1, 0.1), CENTER_LNG + rng.uniform(-0.1, 0.1)) for _ in range(20)]
+    destinations = [(CENTER_LAT + rng.uniform(-0.1, 0.1), CENTER_LNG + rng.uniform(-0.1, 0.1)) for _ in range(30)]
+
+    distances, durations = calculate_distance_and_duration_matrix(origins, destinations, traffic_factor=1.5)
+
+    assert distances.shape == (20, 30)
+    for i, (lat1, lng1) in enumerate(origins):
+        for j, (lat2, lng2) in enumerate(destinations):
+            expected = calculate_distance(lat1, lng1, lat2, lng2)
+            assert abs(distances[i, j] - expected) < 1e-9
+            pair_factor = (eta_engine.traffic_factor(lat1, lng1) + eta_engine.traffic_factor(lat2, lng2)) / 2
+            assert durations[i, j] == calculate_duration(expected, pair_factor * 1.5)
+
+
+def test_gazetteer_lookup_is_accent_insensitive():
+    from app.services.gazetteer import gazetteer
+
+    entry = gazetteer.lookup("Rue J95, près de la pharmacie, Riviera II", "Cocody")
+    assert entry is not None and entry.name == "Riviera 2"
+
+    entry = gazetteer.lookup("Carrefour ANGRE 8e tranche", "cocody")
+    assert entry is not None and entry.name == "Angré"
+
+    # Un quartier d'une autre commune n'est pas retenu
+    assert gazetteer.lookup("Zone 4, rue du Dr Blanchard", "Yopougon") is None
+
+    assert gazetteer.commune("port bouet").name == "Port-Bouët"
+
+
+def test_commune_classifier_matches_gazetteer_quartiers():
+    from app.core.config import settings
+    from app.services.commune_classifier import commune_classifier
+    from app.services.gazetteer import gazetteer
+
+    assert sorted(commune_classifier.communes) == sorted(settings.COMMUNES)
+
+    for entry in gazetteer.entries:
+        if entry.type in ("commune", "quartier"):
+            assert commune_classifier.classify(entry.lat, entry.lng) == entry.commune, entry.name
+
+    # Hors d'Abidjan
+    assert commune_classifier.classify(5.10, -3.50) is None
+
+
+def test_commune_classifier_boundaries_and_outside_points():
+    from app.services.commune_classifier import commune_classifier
+
+    # De part et d'autre des limites communes (Plateau / Adjamé, Cocody / Adjamé, Marcory / Koumassi)
+    assert commune_classifier.classify(5.3340, -4.0200) == "Plateau"
+    assert commune_classifier.classify(5.3360, -4.0200) == "Adjamé"
+    assert commune_classifier.classify(5.3600, -4.0060) == "Adjamé"
+    assert commune_classifier.classify(5.3600, -4.0040) == "Cocody"
+    assert commune_classifier.classify(5.2900, -3.9630) == "Marcory"
+    assert commune_classifier.classify(5.2900, -3.9610) == "Koumassi"
+
+    # Hors des dix communes : Bingerville, Anyama, Songon, la lagune Ébrié
+    assert commune_classifier.classify(5.3550, -3.8850) is None
+    assert commune_classifier.classify(5.4950, -4.0500) is None
+    assert commune_classifier.classify(5.3100, -4.2500) is None
+    assert commune_classifier.classify(5.3110, -3.9500) is None
+
+
+def test_resolve_commune_keeps_a_known_commune():
+    from app.services.geolocation import resolve_commune
+
+    # La commune fournie prime sur des limites approximatives
+    assert resolve_commune("Cocody", 5.2900, -3.9610) == "Cocody"
+    # Absente ou inconnue : déduite des coordonnées
+    assert resolve_commune(None, 5.2900, -3.9610) == "Koumassi"
+    assert resolve_commune("Koumassy", 5.2900, -3.9610) == "Koumassi"
+    # Hors des limites : la valeur fournie est conservée telle quelle
+    assert resolve_commune("Bingerville", 5.3550, -3.8850) == "Bingerville"
+    assert resolve_commune(None, None, None) is None
+
+
+def test_eta_engine_learns_from_tracking_and_reports():
+    from app.services.eta_engine import EtaEngine, DEFAULT_HOURLY_PROFILE
+
+    engine = EtaEngine(cell_size=0.01, default_speed=30.0, prior_weight=5)
+    when = datetime.utcnow().replace(hour=3, minute=0, second=0, microsecond=0) + timedelta(days=1)
+
+    # Sans historique : profil horaire par défaut
+    assert abs(engine.speed_at(CENTER_LAT, CENTER_LNG, when) - 30.0 * DEFAULT_HOURLY_PROFILE[3]) < 1e-9
+
+    # Une livraison qui roule à ~8 km/h dans la même cellule pendant 20 points
+    lat, lng = CENTER_LAT + 0.001, CENTER_LNG + 0.001
+    for step in range(21):
+        engine.add_tracking_point(1, lat + step * 0.0002, lng, when + timedelta(seconds=step * 10))
+    slow = engine.speed_at(CENTER_LAT + 0.0015, CENTER_LNG + 0.001, when)
+    assert 8.0 < slow < 30.0 * DEFAULT_HOURLY_PROFILE[3]
+
+    # Arrêt et saut GPS ignorés
+    assert engine.add_tracking_point(1, lat + 0.05, lng, when + timedelta(seconds=230)) is None
+    assert engine.add_tracking_point(1, lat + 0.05, lng, when + timedelta(seconds=260)) is None
+
+    # Un signalement bloquant ne ralentit que le trajet immédiat
+    now = datetime.utcnow()
+    before = engine.estimate_minutes(CENTER_LAT, CENTER_LNG, CENTER_LAT + 0.05, CENTER_LNG, when=now)
+    engine.set_incidents([(CENTER_LAT + 0.025, CENTER_LNG, "blocked")], radius=0.5)
+    after = engine.estimate_minutes(CENTER_LAT, CENTER_LNG, CENTER_LAT + 0.05, CENTER_LNG, when=now)
+    assert after > before
+    later = now + timedelta(hours=5)
+    assert engine.speed_at(CENTER_LAT + 0.025, CENTER_LNG, later) == engine.speed_at(CENTER_LAT + 0.025, CENTER_LNG + 0.5, later)
+
+
+def test_eta_engine_rereads_rows_committed_out_of_order():
+    from collections import namedtuple
+    from app.services.eta_engine import EtaEngine
+
+    Row = namedtuple("Row", "id delivery_id lat lng timestamp created_at")
+    engine = EtaEngine(cell_size=0.01)
+    overlap = timedelta(minutes=5)
+    t0 = datetime(2024, 1, 8, 9, 0)
+
+    # Le lot 2 est validé après le lot 3 : il n'est pas visible au premier passage
+    first = [
+        Row(1, 1, CENTER_LAT, CENTER_LNG, t0, t0),
+        Row(3, 1, CENTER_LAT + 0.001, CENTER_LNG, t0 + timedelta(seconds=40), t0 + timedelta(seconds=40)),
+    ]
+    assert engine.ingest_tracking_rows(first, overlap) == 2
+
+    # Relecture de la marge : le point 2 est rattrapé, les autres ne sont pas comptés deux fois
+    second = [
+        Row(1, 1, CENTER_LAT, CENTER_LNG, t0, t0),
+        Row(2, 2, CENTER_LAT, CENTER_LNG, t0 + timedelta(seconds=20), t0 + timedelta(seconds=20)),
+        Row(3, 1, CENTER_LAT + 0.001, CENTER_LNG, t0 + timedelta(seconds=40), t0 + timedelta(seconds=40)),
+    ]
+    assert engine.ingest_tracking_rows(second, overlap) == 1
+    assert engine._watermark == t0 + timedelta(seconds=40)
+
+    # Hors de la marge, les identifiants lus sont oubliés
+    later = t0 + timedelta(minutes=10)
+    assert engine.ingest_tracking_rows([Row(4, 1, CENTER_LAT, CENTER_LNG, later, later)], overlap) == 1
+    assert set(engine._seen) == {4}
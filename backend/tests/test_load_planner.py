@@ -0,0 +1,92 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import itertools
+import random
+import time
+
+from app.services.load_planner import PackageItem, VehicleBin, plan_loads, check_vehicle_load
+
+
+def _fleet():
+    return (
+        [VehicleBin(i, "motorcycle", max_weight=30, max_volume=0.15) for i in range(1, 6)]
+        + [VehicleBin(10 + i, "van", max_weight=800, max_volume=6.0) for i in range(3)]
+        + [VehicleBin(20, "kia_truck", max_weight=2500, max_volume=15.0, max_distance=30)]
+    )
+
+
+def _random_items(rng, count):
+    sizes = [(2, 0.02), (10, 0.1), (25, 0.4)]
+    items = []
+    for k in range(count):
+        weight, volume = rng.choice(sizes)
+        items.append(PackageItem(k, weight * rng.uniform(0.5, 1.5), volume, distance=rng.uniform(1, 40)))
+    return items
+
+
+def _assert_feasible(plan, items):
+    placed = [item.delivery_id for load in plan.loads for item in load.items]
+    assert sorted(placed + [item.delivery_id for item in plan.unplaced]) == sorted(item.delivery_id for item in items)
+    assert len({load.vehicle.vehicle_id for load in plan.loads}) == len(plan.loads)
+    for load in plan.loads:
+        assert check_vehicle_load(load.vehicle, load.items) is None
+
+
+def _optimal_vehicle_count(items, vehicles):
+    for count in range(1, len(vehicles) + 1):
+        for chosen in itertools.combinations(vehicles, count):
+            for assignment in itertools.product(range(count), repeat=len(items)):
+                groups = [[item for item, b in zip(items, assignment) if b == k] for k in range(count)]
+                if all(check_vehicle_load(vehicle, group) is None for vehicle, group in zip(chosen, groups)):
+                    return count
+    return None
+
+
+def test_plan_is_feasible_and_close_to_optimal():
+    rng = random.Random(8)
+    vehicles = [VehicleBin(1, max_weight=30, max_volume=0.5), VehicleBin(2, max_weight=30, max_volume=0.5),
+                VehicleBin(3, max_weight=60, max_volume=1.0), VehicleBin(4, max_weight=20, max_volume=0.3)]
+    for _ in range(20):
+        items = [PackageItem(k, rng.uniform(1, 25), rng.choice([0.02, 0.1, 0.4])) for k in range(6)]
+        plan = plan_loads(items, vehicles)
+        _assert_feasible(plan, items)
+        if not plan.unplaced:
+            assert plan.lower_bound <= len(plan.loads) <= _optimal_vehicle_count(items, vehicles) + 1
+
+
+def test_small_orders_are_consolidated_into_one_van():
+    items = [PackageItem(k, 10, 0.1) for k in range(12)]
+    plan = plan_loads(items, _fleet())
+    _assert_feasible(plan, items)
+    assert len(plan.loads) == 1
+    # Le plus petit véhicule suffisant : une camionnette, pas le camion
+    assert plan.loads[0].vehicle.vehicle_type == "van"
+
+
+def test_oversized_and_out_of_range_packages_are_left_unplaced():
+    vehicles = [VehicleBin(1, max_weight=30, max_distance=10), VehicleBin(2, max_weight=100, max_distance=5)]
+    items = [PackageItem(1, 150, 0.1), PackageItem(2, 20, 0.1, distance=12), PackageItem(3, 50, 0.1, distance=3)]
+    plan = plan_loads(items, vehicles)
+    _assert_feasible(plan, items)
+    assert sorted(item.delivery_id for item in plan.unplaced) == [1, 2]
+    assert "rayon d'action" in check_vehicle_load(vehicles[0], [items[1]])
+    assert "kg" in check_vehicle_load(vehicles[0], [items[2]])
+
+
+def test_plans_hundreds_of_packages_interactively():
+    rng = random.Random(1)
+    items = _random_items(rng, 400)
+    vehicles = _fleet() * 3
+    vehicles = [VehicleBin(k, v.vehicle_type, max_weight=v.max_weight, max_volume=v.max_volume, max_distance=v.max_distance)
+                for k, v in enumerate(vehicles)]
+
+    started = time.perf_counter()
+    plan = plan_loads(items, vehicles)
+    elapsed = time.perf_counter() - started
+
+    _assert_feasible(plan, items)
+    assert not plan.unplaced
+    assert len(plan.loads) <= plan.lower_bound + 2
+    assert elapsed < 0.5
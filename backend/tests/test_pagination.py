@@ -0,0 +1,85 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, Column, Integer, DateTime
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from app.core.exceptions import BadRequestError
+from app.services.pagination import (
+    keyset_paginate, next_cursor, encode_cursor, decode_cursor,
+    ranked_paginate, next_rank_cursor, encode_rank_cursor, decode_rank_cursor
+)
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "items"
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, nullable=False)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    origin = datetime(2024, 1, 1)
+    # Plusieurs lignes par horodatage : l'id départage
+    session.add_all([Item(id=i, created_at=origin + timedelta(minutes=i // 3)) for i in range(1, 101)])
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 17, 8, 30, 12, 345)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+    with pytest.raises(BadRequestError):
+        decode_cursor("pas-un-curseur")
+
+
+def test_pages_cover_every_row_once_in_order(db):
+    seen, cursor = [], None
+    while True:
+        page = keyset_paginate(db.query(Item), Item, 7, cursor)
+        seen.extend(item.id for item in page)
+        cursor = next_cursor(page, 7)
+        if cursor is None:
+            break
+
+    expected = [item.id for item in sorted(db.query(Item).all(), key=lambda i: (i.created_at, i.id), reverse=True)]
+    assert seen == expected
+
+
+def test_filters_apply_before_the_cursor(db):
+    query = db.query(Item).filter(Item.id % 2 == 0)
+    first = keyset_paginate(query, Item, 10)
+    second = keyset_paginate(query, Item, 10, next_cursor(first, 10))
+    assert all(item.id % 2 == 0 for item in first + second)
+    assert first[-1].id > second[0].id
+
+
+def test_rank_cursor_round_trip():
+    rank = 0.0607927106320858
+    assert decode_rank_cursor(encode_rank_cursor(rank, 7)) == (rank, 7)
+    with pytest.raises(BadRequestError):
+        decode_rank_cursor("pas-un-curseur")
+
+
+def test_ranked_paginate_orders_by_rank_then_id(db):
+    rank = (Item.id % 4).label("rank")
+    seen = []
+    cursor = None
+    while True:
+        rows = ranked_paginate(db.query(Item, rank), rank, Item.id, 30, cursor)
+        seen.extend((row[1], row[0].id) for row in rows)
+        cursor = next_rank_cursor([tuple(row) for row in rows], 30)
+        if cursor is None:
+            break
+    assert seen == sorted(((i % 4, i) for i in range(1, 101)), reverse=True)
@@ -0,0 +1,41 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import date
+
+from app.services.partitions import (
+    add_months, partition_name, partition_month, partition_bounds, months_to_create, expired_partitions
+)
+
+
+def test_add_months_crosses_years():
+    assert add_months(date(2023, 11, 1), 3) == date(2024, 2, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+
+
+def test_partition_name_round_trip():
+    name = partition_name("tracking_points", date(2024, 3, 1))
+    assert name == "tracking_points_p202403"
+    assert partition_month(name) == date(2024, 3, 1)
+    assert partition_month("tracking_points_default") is None
+
+
+def test_partition_bounds_cover_one_month_in_utc():
+    assert partition_bounds(date(2023, 12, 1)) == ("2023-12-01 00:00:00+00", "2024-01-01 00:00:00+00")
+
+
+def test_months_to_create_start_at_current_month():
+    assert months_to_create(date(2023, 12, 17), 2) == [date(2023, 12, 1), date(2024, 1, 1), date(2024, 2, 1)]
+
+
+def test_expired_partitions_keep_retention_window():
+    names = [
+        "tracking_points_default",
+        "tracking_points_p202309",
+        "tracking_points_p202310",
+        "tracking_points_p202311",
+        "tracking_points_p202312",
+    ]
+    assert expired_partitions(names, date(2023, 12, 17), 2) == ["tracking_points_p202309"]
+    assert expired_partitions(names, date(2023, 12, 17), 0) == []
@@ -0,0 +1,124 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+
+from app.services.position_coalescer import PositionCoalescer
+
+# Environ 110 m par millième de degré de latitude
+STEP = 0.001
+
+
+def _position(index: int, lat: float = 5.3) -> dict:
+    return {"type": "position", "delivery_id": 1, "lat": lat, "lng": -4.0, "index": index}
+
+
+class Recorder:
+    def __init__(self, delays=None):
+        self.sent = {}
+        self.delays = delays or {}
+
+    async def __call__(self, websocket, message, frame):
+        if websocket in self.delays:
+            await asyncio.sleep(self.delays[websocket])
+        self.sent.setdefault(websocket, []).append(message["index"])
+
+
+def test_burst_is_merged_into_latest_position():
+    recorder = Recorder()
+    coalescer = PositionCoalescer(recorder, min_movement_m=10, stationary_interval=5)
+
+    async def scenario():
+        coalescer.add("map", 1, max_rate=10)
+        for index in range(5):
+            coalescer.offer(1, _position(index, 5.3 + index * STEP))
+        await asyncio.sleep(0.2)
+
+    asyncio.run(scenario())
+    assert recorder.sent["map"] == [0, 4]
+    assert coalescer.stats["merged"] == 3
+
+
+def test_small_movement_waits_for_stationary_interval():
+    recorder = Recorder()
+    coalescer = PositionCoalescer(recorder, min_movement_m=10, stationary_interval=0.2)
+
+    async def scenario():
+        coalescer.add("map", 1, max_rate=50)
+        coalescer.offer(1, _position(0))
+        await asyncio.sleep(0.05)
+        coalescer.offer(1, _position(1, 5.3 + 0.00002))  # environ 2 m
+        await asyncio.sleep(0.08)
+        before = list(recorder.sent["map"])
+        await asyncio.sleep(0.2)
+        return before
+
+    before = asyncio.run(scenario())
+    assert before == [0]
+    # La dernière position finit toujours par partir
+    assert recorder.sent["map"] == [0, 1]
+
+
+def test_each_subscriber_gets_its_own_rate():
+    recorder = Recorder()
+    coalescer = PositionCoalescer(recorder, min_movement_m=10, stationary_interval=5)
+
+    async def scenario():
+        coalescer.add("dashboard", 1, max_rate=100)
+        coalescer.add("phone", 1, max_rate=4)
+        for index in range(10):
+            coalescer.offer(1, _position(index, 5.3 + index * STEP))
+            await asyncio.sleep(0.03)
+        await asyncio.sleep(0.3)
+
+    asyncio.run(scenario())
+    assert recorder.sent["dashboard"] == list(range(10))
+    assert len(recorder.sent["phone"]) <= 3
+    assert recorder.sent["phone"][0] == 0 and recorder.sent["phone"][-1] == 9
+
+
+def test_slow_subscriber_does_not_delay_others():
+    recorder = Recorder(delays={"slow": 0.3})
+    coalescer = PositionCoalescer(recorder, min_movement_m=10, stationary_interval=5)
+
+    async def scenario():
+        coalescer.add("slow", 1, max_rate=100)
+        coalescer.add("fast", 1, max_rate=100)
+        for index in range(3):
+            coalescer.offer(1, _position(index, 5.3 + index * STEP))
+            await asyncio.sleep(0.03)
+        await asyncio.sleep(0.02)
+        fast = list(recorder.sent.get("fast", []))
+        await asyncio.sleep(0.8)
+        return fast
+
+    fast = asyncio.run(scenario())
+    assert fast == [0, 1, 2]
+    # Une seule position envoyée pendant que la première était en cours
+    assert recorder.sent["slow"] == [0, 2]
+
+
+def test_stalled_send_times_out_and_frees_the_task():
+    recorder = Recorder(delays={"stalled": 10})
+    dropped = []
+
+    async def on_error(websocket, delivery_id):
+        dropped.append(websocket)
+        coalescer.remove(websocket)
+
+    coalescer = PositionCoalescer(recorder, on_error, min_movement_m=10, stationary_interval=5, send_timeout=0.1)
+
+    async def scenario():
+        coalescer.add("stalled", 1, max_rate=100)
+        coalescer.add("fast", 1, max_rate=100)
+        coalescer.offer(1, _position(0))
+        # Les envois en cours sont référencés jusqu'à leur fin
+        assert len(coalescer._tasks) == 2
+        await asyncio.sleep(0.3)
+        return len(coalescer._tasks)
+
+    assert asyncio.run(scenario()) == 0
+    assert dropped == ["stalled"]
+    assert recorder.sent["fast"] == [0]
+    assert coalescer.stats["timeouts"] == 1
@@ -0,0 +1,73 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+
+import pytest
+
+from app.core.exceptions import BadRequestError
+from app.services.position_codec import (
+    HEADER, encode_positions, decode_positions, position_message, message_points, encode_message, parse_encoding,
+    valid_coordinates, bounded_points
+)
+
+POINTS = [
+    (1700000000000, 5.336401, -4.026712),
+    (1700000001012, 5.336448, -4.026690),
+    (1700000001998, 5.336402, -4.026745),
+]
+
+
+def test_round_trip_keeps_microdegree_precision():
+    delivery_id, points = decode_positions(encode_positions(42, POINTS))
+    assert delivery_id == 42
+    for (ts, lat, lng), (expected_ts, expected_lat, expected_lng) in zip(points, POINTS):
+        assert ts == expected_ts
+        assert lat == pytest.approx(expected_lat, abs=1e-6)
+        assert lng == pytest.approx(expected_lng, abs=1e-6)
+
+
+def test_following_points_are_delta_encoded():
+    single = encode_positions(42, POINTS[:1])
+    assert len(single) == HEADER.size
+    assert len(encode_positions(42, POINTS)) - len(single) <= 2 * 6
+
+
+def test_json_message_keeps_legacy_fields_and_trail():
+    message = position_message(42, POINTS)
+    assert message["lat"] == POINTS[-1][1]
+    assert message["timestamp"].startswith("2023-11-14T22:13:21")
+    assert message["trail"] == [list(point) for point in POINTS[:-1]]
+    assert message_points(json.loads(json.dumps(message))) == POINTS
+    assert decode_positions(encode_message(message))[1][0][0] == POINTS[0][0]
+
+
+def test_legacy_message_without_epoch_millis():
+    message = {"type": "position", "delivery_id": 7, "lat": 5.3, "lng": -4.0, "timestamp": "2023-11-14T22:13:20+00:00"}
+    assert message_points(message) == [(1700000000000, 5.3, -4.0)]
+
+
+def test_invalid_frames_are_rejected():
+    frame = encode_positions(42, POINTS)
+    with pytest.raises(BadRequestError):
+        decode_positions(frame[:-1])
+    with pytest.raises(BadRequestError):
+        decode_positions(b"\x02" + frame[1:])
+    with pytest.raises(BadRequestError):
+        parse_encoding("xml")
+    assert parse_encoding(None) == "json"
+
+
+def test_valid_coordinates_coerces_and_bounds():
+    assert valid_coordinates("5.3364", -4.0267) == (5.3364, -4.0267)
+    assert valid_coordinates("abc", -4.0) is None
+    assert valid_coordinates(None, -4.0) is None
+    assert valid_coordinates(91, -4.0) is None
+    assert valid_coordinates(5.3, -181) is None
+    assert valid_coordinates(float("nan"), -4.0) is None
+
+
+def test_bounded_points_clamps_timestamps():
+    points = [(-2**62, 5.3, -4.0), (1500, 5.31, -4.0), (10**15, 5.32, -4.0)]
+    assert [ts for ts, _, _ in bounded_points(points, 1000, 2000)] == [1000, 1500, 2000]
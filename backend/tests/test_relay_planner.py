@@ -0,0 +1,62 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.relay_planner import RelayPoint, RelayCourier, RelayNetwork, corridor_handoff_points, leg_started
+
+YOPOUGON = RelayPoint(5.345, -4.079, "Yopougon")
+PORT_BOUET = RelayPoint(5.255, -3.940, "Port-Bouët")
+
+
+def test_corridor_handoff_points_lie_between_both_ends():
+    points = corridor_handoff_points(YOPOUGON, PORT_BOUET)
+    assert points
+    for point in points:
+        assert min(YOPOUGON.lng, PORT_BOUET.lng) - 0.02 < point.lng < max(YOPOUGON.lng, PORT_BOUET.lng) + 0.02
+
+
+def test_relay_beats_a_single_courier_on_long_trips():
+    couriers = [
+        RelayCourier(1, 5.350, -4.075),  # à Yopougon
+        RelayCourier(2, 5.300, -4.010),  # à Treichville
+        RelayCourier(3, 5.320, -4.020),  # au Plateau
+    ]
+    network = RelayNetwork(YOPOUGON, PORT_BOUET, couriers, corridor_handoff_points(YOPOUGON, PORT_BOUET))
+
+    legs, cost = network.best_plan(max_legs=3)
+    solo = min(network.best_plan(max_legs=1)[1], network.evaluate([(0, 1)]))
+
+    # Le coursier de Yopougon ramasse et passe le relais au centre : il ne rentre pas à vide de Port-Bouët
+    assert legs[0].courier_id == 1
+    assert len(legs) >= 2
+    assert cost < solo
+    assert legs[0].start == YOPOUGON and legs[-1].end == PORT_BOUET
+    for previous, leg in zip(legs, legs[1:]):
+        assert previous.end == leg.start
+        assert leg.start_minute >= previous.end_minute
+
+    # Le plan réévalué avec les mêmes positions donne le même coût
+    index = {id(point): i for i, point in enumerate(network.points)}
+    courier_index = {c.courier_id: k for k, c in enumerate(couriers)}
+    plan = [(courier_index[leg.courier_id], index[id(leg.end)]) for leg in legs]
+    assert abs(network.evaluate(plan) - cost) < 1e-9
+
+
+def test_relay_keeps_a_single_leg_when_couriers_are_together():
+    couriers = [RelayCourier(1, 5.346, -4.078), RelayCourier(2, 5.346, -4.078)]
+    network = RelayNetwork(YOPOUGON, PORT_BOUET, couriers, corridor_handoff_points(YOPOUGON, PORT_BOUET))
+
+    legs, cost = network.best_plan(max_legs=3)
+    assert len(legs) == 1
+    assert abs(network.evaluate([(legs[0].courier_id - 1, 1)]) - cost) < 1e-9
+
+
+
+def test_only_a_leg_in_progress_can_be_handed_off():
+    assert leg_started("in_progress", first=False, picked_up=True)
+    # Premier tronçon : en cours dès le ramassage du colis
+    assert leg_started("planned", first=True, picked_up=True)
+    assert not leg_started("planned", first=True, picked_up=False)
+    # Tronçon suivant pas encore démarré, ou déjà terminé
+    assert not leg_started("planned", first=False, picked_up=True)
+    assert not leg_started("completed", first=True, picked_up=True)
@@ -0,0 +1,50 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.replicas import ReplicaSet, client_key
+
+
+def test_no_replica_reads_on_primary():
+    assert ReplicaSet(0, 5).choose() is None
+
+
+def test_unmeasured_or_unreachable_replicas_are_skipped():
+    replicas = ReplicaSet(2, 5)
+    assert replicas.choose(now=100) is None
+    replicas.update_lag(0, 1.0, measured_at=100)
+    replicas.update_lag(1, None, measured_at=100)
+    assert {replicas.choose(now=100) for _ in range(4)} == {0}
+
+
+def test_round_robin_over_fresh_replicas():
+    replicas = ReplicaSet(3, 5)
+    for index in range(3):
+        replicas.update_lag(index, 0.5, measured_at=100)
+    assert sorted(replicas.choose(now=101) for _ in range(3)) == [0, 1, 2]
+
+
+def test_lagging_replica_falls_back_to_primary():
+    replicas = ReplicaSet(1, 5)
+    replicas.update_lag(0, 8.0, measured_at=100)
+    assert replicas.choose(now=100) is None
+    # Sans nouvelle mesure, un réplica à jour finit aussi par sortir de la rotation
+    replicas.update_lag(0, 0.0, measured_at=100)
+    assert replicas.choose(now=104) == 0
+    assert replicas.choose(now=106) is None
+
+
+def test_read_your_writes():
+    replicas = ReplicaSet(2, 5)
+    replicas.update_lag(0, 3.0, measured_at=100)  # rejoué jusqu'à 97
+    replicas.update_lag(1, 0.5, measured_at=100)  # rejoué jusqu'à 99.5
+    # Écriture à 98 : seul le réplica 1 l'a rejouée
+    assert {replicas.choose(last_write_at=98, now=100) for _ in range(4)} == {1}
+    # Écriture à 99.8 : aucun réplica ne l'a rejouée
+    assert replicas.choose(last_write_at=99.8, now=100) is None
+
+
+def test_client_key():
+    assert client_key(None) is None
+    assert client_key("Bearer a") == client_key("Bearer a")
+    assert client_key("Bearer a") != client_key("Bearer b")
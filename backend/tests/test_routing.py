@@ -0,0 +1,157 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import heapq
+import math
+import random
+
+import numpy as np
+
+from app.services.routing import RoadGraph, ContractionHierarchy, RoutingEngine
+
+
+def _grid_graph(size=20, seed=3):
+    rng = random.Random(seed)
+    lat = [5.30 + i * 0.002 for i in range(size) for _ in range(size)]
+    lng = [-4.05 + j * 0.002 for _ in range(size) for j in range(size)]
+    tails, heads, times, lengths = [], [], [], []
+
+    def add(u, v):
+        meters = 222.0
+        seconds = meters / (rng.choice([15, 25, 40, 60]) / 3.6)
+        direction = rng.random()
+        if direction < 0.9:
+            tails.append(u); heads.append(v); times.append(seconds); lengths.append(meters)
+        if direction < 0.8 or direction >= 0.9:
+            tails.append(v); heads.append(u); times.append(seconds); lengths.append(meters)
+
+    for i in range(size):
+        for j in range(size):
+            u = i * size + j
+            if j + 1 < size:
+                add(u, u + 1)
+            if i + 1 < size:
+                add(u, u + size)
+    return RoadGraph(np.array(lat), np.array(lng), np.array(tails), np.array(heads), np.array(times), np.array(lengths))
+
+
+def _dijkstra(graph, source, target):
+    best = {source: 0.0}
+    heap = [(0.0, source)]
+    while heap:
+        seconds, u = heapq.heappop(heap)
+        if u == target:
+            return seconds
+        if seconds > best.get(u, math.inf):
+            continue
+        for k in range(graph.first_out[u], graph.first_out[u + 1]):
+            v = int(graph.head[k])
+            candidate = seconds + graph.time[k]
+            if candidate < best.get(v, math.inf):
+                best[v] = candidate
+                heapq.heappush(heap, (candidate, v))
+    return None
+
+
+def test_contraction_hierarchy_matches_dijkstra(tmp_path):
+    graph = _grid_graph()
+    hierarchy = ContractionHierarchy.build(graph)
+
+    rng = random.Random(11)
+    for _ in range(100):
+        source, target = rng.randrange(graph.node_count), rng.randrange(graph.node_count)
+        expected = _dijkstra(graph, source, target)
+        result = hierarchy.query(source, target)
+        if expected is None:
+            assert result is None
+        else:
+            assert abs(result[0] - expected) < 1e-6
+
+    sources = [rng.randrange(graph.node_count) for _ in range(15)]
+    targets = [rng.randrange(graph.node_count) for _ in range(12)]
+    times, _ = hierarchy.many_to_many(sources, targets)
+    for i, source in enumerate(sources):
+        for j, target in enumerate(targets):
+            result = hierarchy.query(source, target)
+            assert (result is None and np.isnan(times[i, j])) or abs(result[0] - times[i, j]) < 1e-6
+
+    # Le précalcul enregistré est rechargé à l'identique, et rejeté pour un autre extrait
+    path = str(tmp_path / "graph.ch.npz")
+    hierarchy.save(path, (1, 2))
+    assert ContractionHierarchy.load(path, (1, 3)) is None
+    reloaded = ContractionHierarchy.load(path, (1, 2))
+    assert reloaded.query(sources[0], targets[0]) == hierarchy.query(sources[0], targets[0])
+
+
+OSM_EXTRACT = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="5.3000" lon="-4.0000"/>
+  <node id="2" lat="5.3000" lon="-3.9900"/>
+  <node id="3" lat="5.3100" lon="-3.9900"/>
+  <node id="4" lat="5.3100" lon="-4.0000"/>
+  <node id="5" lat="5.3050" lon="-3.9950"/>
+  <way id="10">
+    <nd ref="1"/><nd ref="2"/><nd ref="3"/>
+    <tag k="highway" v="primary"/>
+    <tag k="oneway" v="yes"/>
+  </way>
+  <way id="11">
+    <nd ref="3"/><nd ref="4"/><nd ref="1"/>
+    <tag k="highway" v="residential"/>
+  </way>
+  <way id="12">
+    <nd ref="1"/><nd ref="5"/>
+    <tag k="highway" v="footway"/>
+  </way>
+</osm>
+"""
+
+
+def test_routing_engine_loads_osm_extract(tmp_path):
+    osm_path = tmp_path / "abidjan.osm"
+    osm_path.write_text(OSM_EXTRACT)
+
+    # Sans précalcul, l'API ne construit pas le graphe : vol d'oiseau
+    engine = RoutingEngine(osm_path=str(osm_path), snap_distance=0.5)
+    assert not engine.load()
+    assert engine.route(5.30, -4.00, 5.31, -3.99) is None
+    assert not os.path.exists(engine.cache_path)
+
+    # Précalcul hors ligne, écrit d'un bloc, puis chargé sans relire l'extrait
+    assert RoutingEngine(osm_path=str(osm_path)).build()
+    assert sorted(os.listdir(tmp_path)) == ["abidjan.osm", "abidjan.osm.ch.npz"]
+    engine = RoutingEngine(osm_path=str(osm_path), snap_distance=0.5)
+    assert engine.load()
+
+    # Les chemins piétons sont ignorés : 4 nœuds carrossables
+    assert engine.hierarchy.rank.shape == (4,)
+
+    # Aller par la voie à sens unique, retour par la voie résidentielle
+    forward_km, forward_minutes = engine.route(5.30, -4.00, 5.31, -3.99)
+    backward_km, backward_minutes = engine.route(5.31, -3.99, 5.30, -4.00)
+    assert 2.1 < forward_km < 2.3
+    assert 2.1 < backward_km < 2.3
+    assert forward_minutes < backward_minutes
+
+    # Point hors réseau : pas d'itinéraire
+    assert engine.route(5.40, -4.00, 5.31, -3.99) is None
+    distances, _ = engine.route_matrix([(5.30, -4.00), (5.40, -4.00)], [(5.31, -3.99)])
+    assert 2.1 < distances[0, 0] < 2.3
+    assert np.isnan(distances[1, 0])
+
+
+def test_routing_engine_rejects_stale_cache(tmp_path):
+    osm_path = tmp_path / "abidjan.osm"
+    osm_path.write_text(OSM_EXTRACT)
+    assert RoutingEngine(osm_path=str(osm_path)).build()
+
+    # Précalcul seul (extrait absent du serveur) : accepté
+    cache_path = str(osm_path) + ".ch.npz"
+    assert RoutingEngine(cache_path=cache_path).load()
+
+    # Extrait modifié depuis le précalcul : rejeté, sans reconstruction
+    osm_path.write_text(OSM_EXTRACT + "\n")
+    engine = RoutingEngine(osm_path=str(osm_path))
+    assert not engine.load()
+    assert not engine.available
@@ -0,0 +1,81 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import itertools
+import math
+import random
+
+from app.services.geolocation import distance_matrix
+from app.services.tour_planner import TourStop, TourProblem, optimize_tour, PICKUP, DROPOFF
+
+
+def _problem(deliveries, start=(5.33, -4.02), depot=(5.35, -4.00), max_weight=None, windows=None):
+    """
+    Livraisons d'une entreprise : même point de ramassage, remises dispersées.
+    """
+    stops = []
+    for k, (lat, lng, weight) in enumerate(deliveries):
+        window = (windows or {}).get(k, (None, None))
+        stops.append(TourStop(k, PICKUP, depot[0], depot[1], weight, 0.01))
+        stops.append(TourStop(k, DROPOFF, lat, lng, weight, 0.01, window_start=window[0], window_end=window[1]))
+    points = [start] + [(stop.lat, stop.lng) for stop in stops]
+    travel = (distance_matrix(points, points) / 30.0 * 60).tolist()
+    return TourProblem(stops, travel, service_minutes=2, max_weight=max_weight)
+
+
+def _random_deliveries(rng, count):
+    return [(5.30 + rng.random() * 0.1, -4.05 + rng.random() * 0.1, rng.choice([2, 5, 10])) for _ in range(count)]
+
+
+def _brute_force(problem):
+    return min(problem.cost(order) for order in itertools.permutations(range(len(problem))))
+
+
+def test_tour_respects_precedence_and_is_near_optimal():
+    rng = random.Random(7)
+    for _ in range(15):
+        problem = _problem(_random_deliveries(rng, 3), max_weight=rng.choice([None, 12, 20]))
+        order = optimize_tour(problem)
+        assert sorted(order) == list(range(len(problem)))
+        assert problem.cost(order) < math.inf
+        assert problem.cost(order) <= _brute_force(problem) * 1.05 + 1e-6
+
+
+def test_tour_groups_pickups_within_vehicle_capacity():
+    rng = random.Random(3)
+    deliveries = [(lat, lng, 10) for lat, lng, _ in _random_deliveries(rng, 6)]
+
+    # Sans limite de charge, un seul passage au point de ramassage
+    problem = _problem(deliveries)
+    order = optimize_tour(problem)
+    assert [problem.stops[stop].kind for stop in order[:6]] == [PICKUP] * 6
+
+    # Avec 20 kg au plus, trois allers-retours de deux colis
+    problem = _problem(deliveries, max_weight=20)
+    order = optimize_tour(problem)
+    assert max(step["weight"] for step in problem.schedule(order)) <= 20
+    kinds = "".join("P" if problem.stops[stop].kind == PICKUP else "D" for stop in order)
+    assert kinds == "PPDDPPDDPPDD"
+
+
+def test_tour_honours_time_windows_and_inserts_new_stops():
+    rng = random.Random(11)
+    deliveries = _random_deliveries(rng, 5)
+    problem = _problem(deliveries)
+    order = optimize_tour(problem)
+    last = problem.stops[order[-1]].delivery_id
+
+    # Le dernier client exige d'être servi dans les 20 premières minutes
+    windows = {last: (0, 20)}
+    constrained = _problem(deliveries, windows=windows)
+    order = optimize_tour(constrained)
+    arrival = dict(zip(order, constrained.schedule(order)))[constrained.index_of((last, DROPOFF))]
+    assert arrival["late"] == 0
+
+    # Nouvelle livraison : insérée dans la tournée existante sans tout recalculer
+    previous = [constrained.stops[stop].key for stop in order]
+    extended = _problem(deliveries + _random_deliveries(rng, 1), windows=windows)
+    new_order = optimize_tour(extended, previous)
+    assert sorted(new_order) == list(range(len(extended)))
+    assert extended.cost(new_order) <= extended.cost([extended.index_of(key) for key in previous] + [10, 11])
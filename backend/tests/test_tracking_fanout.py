@@ -0,0 +1,254 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+
+from app.services.position_codec import decode_positions, position_message
+from app.services.tracking_fanout import TrackingFanout, delivery_from_channel
+
+
+class FakeBroker:
+    """
+    Redis réduit aux commandes utilisées par la diffusion : clés avec durée
+    de vie, publication et abonnements.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.subscribers = {}
+
+    def publish(self, channel, data):
+        for pubsub in list(self.subscribers.get(channel, ())):
+            pubsub.queue.put_nowait({"type": "message", "channel": channel, "data": data})
+
+
+class FakePubSub:
+    def __init__(self, broker):
+        self.broker = broker
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.broker.subscribers.setdefault(channel, set()).add(self)
+
+    async def unsubscribe(self, channel):
+        self.broker.subscribers.get(channel, set()).discard(self)
+
+    async def get_message(self, timeout=None):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        pass
+
+
+class FakePipeline:
+    def __init__(self, broker):
+        self.broker = broker
+        self.commands = []
+
+    def set(self, key, value, ex=None):
+        self.commands.append(lambda: self.broker.values.__setitem__(key, (value, ex)))
+
+    def publish(self, channel, data):
+        self.commands.append(lambda: self.broker.publish(channel, data))
+
+    async def execute(self):
+        for command in self.commands:
+            command()
+
+
+class FlakyPubSub(FakePubSub):
+    """
+    Abonnement refusé tant que Redis est indisponible.
+    """
+
+    def __init__(self, broker, failures):
+        super().__init__(broker)
+        self.failures = failures
+
+    async def subscribe(self, channel):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Redis indisponible")
+        await super().subscribe(channel)
+
+
+class FakeRedis:
+    def __init__(self, broker):
+        self.broker = broker
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self.broker)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self.broker)
+
+    async def get(self, key):
+        item = self.broker.values.get(key)
+        return item[0] if item else None
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0.0):
+        self.sent = []
+        self.delay = delay
+        self.close_code = None
+
+    async def accept(self):
+        pass
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+    async def send_json(self, message):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(message)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+
+def _node(broker, **kwargs):
+    async def factory():
+        return FakeRedis(broker)
+    return TrackingFanout(redis_factory=factory, last_position_ttl=60, **kwargs)
+
+
+def test_delivery_from_channel():
+    assert delivery_from_channel("tracking:delivery:42") == 42
+
+
+def test_positions_reach_sockets_on_other_nodes():
+    broker = FakeBroker()
+    node_a, node_b = _node(broker), _node(broker)
+    watcher_a, watcher_b = FakeWebSocket(), FakeWebSocket()
+
+    async def scenario():
+        await node_a.connect(watcher_a, 7)
+        await node_b.connect(watcher_b, 7)
+        await node_b.broadcast(7, {"type": "position", "lat": 5.3, "lng": -4.0})
+        await asyncio.sleep(0.05)
+        await node_a.close()
+        await node_b.close()
+
+    asyncio.run(scenario())
+    assert watcher_a.sent == [{"type": "position", "lat": 5.3, "lng": -4.0}]
+    assert watcher_b.sent == [{"type": "position", "lat": 5.3, "lng": -4.0}]
+    assert broker.values["tracking:last:7"][1] == 60
+
+
+def test_nodes_only_subscribe_to_rooms_with_local_sockets():
+    broker = FakeBroker()
+    node = _node(broker)
+    watcher = FakeWebSocket()
+
+    async def scenario():
+        await node.connect(watcher, 1)
+        subscribed = set(broker.subscribers)
+        await node.disconnect(watcher, 1)
+        await node.close()
+        return subscribed
+
+    assert asyncio.run(scenario()) == {"tracking:delivery:1"}
+    assert not broker.subscribers["tracking:delivery:1"]
+    assert node.active_connections == {}
+
+
+def test_new_socket_receives_last_shared_position():
+    broker = FakeBroker()
+    node_a, node_b = _node(broker), _node(broker)
+    late = FakeWebSocket()
+
+    async def scenario():
+        await node_a.broadcast(3, {"type": "position", "lat": 5.35, "lng": -4.01})
+        await node_b.connect(late, 3)
+        await node_b.close()
+
+    asyncio.run(scenario())
+    assert late.sent == [{"type": "position", "lat": 5.35, "lng": -4.01}]
+
+
+def test_binary_subscribers_receive_compact_frames():
+    broker = FakeBroker()
+    node = _node(broker)
+    json_watcher, binary_watcher = FakeWebSocket(), FakeWebSocket()
+    points = [(1700000000000, 5.3364, -4.0267), (1700000001000, 5.3365, -4.0266)]
+
+    async def scenario():
+        await node.connect(json_watcher, 9)
+        await node.connect(binary_watcher, 9, encoding="binary")
+        await node.broadcast(9, position_message(9, points))
+        await asyncio.sleep(0.05)
+        await node.close()
+
+    asyncio.run(scenario())
+    assert json_watcher.sent[0]["lat"] == 5.3365
+    assert decode_positions(binary_watcher.sent[0]) == (9, points)
+
+
+def test_unencodable_position_falls_back_to_json():
+    broker = FakeBroker()
+    node = _node(broker)
+    json_watcher, binary_watcher = FakeWebSocket(), FakeWebSocket()
+    message = {"type": "position", "delivery_id": 4, "lat": "abc", "lng": -4.0, "ts": 1700000000000}
+
+    async def scenario():
+        await node.connect(json_watcher, 4)
+        await node.connect(binary_watcher, 4, encoding="binary")
+        await node.broadcast(4, message)
+        await asyncio.sleep(0.05)
+        await node.close()
+
+    asyncio.run(scenario())
+    # Aucun abonné n'est privé de la position, ni déconnecté
+    assert json_watcher.sent == [message]
+    assert binary_watcher.sent == [message]
+    assert node.active_connections[4] == [json_watcher, binary_watcher]
+
+
+def test_stalled_subscriber_socket_is_closed():
+    broker = FakeBroker()
+    node = _node(broker, send_timeout=0.1)
+    stalled, watcher = FakeWebSocket(delay=10), FakeWebSocket()
+
+    async def scenario():
+        await node.connect(stalled, 5)
+        await node.connect(watcher, 5)
+        await node.broadcast(5, {"type": "position", "lat": 5.3, "lng": -4.0})
+        await asyncio.sleep(0.3)
+        connections = list(node.active_connections[5])
+        await node.close()
+        return connections
+
+    assert asyncio.run(scenario()) == [watcher]
+    # Le client bloqué est déconnecté, avec un code qui l'invite à se reconnecter
+    assert stalled.close_code == 1013
+    assert watcher.close_code is None
+    assert watcher.sent == [{"type": "position", "lat": 5.3, "lng": -4.0}]
+
+
+def test_failed_subscription_is_retried():
+    broker = FakeBroker()
+    node_a, node_b = _node(broker), _node(broker)
+    watcher = FakeWebSocket()
+
+    async def scenario():
+        node_a._pubsub = FlakyPubSub(broker, failures=1)
+        await node_a.connect(watcher, 8)
+        assert 8 not in node_a._subscribed
+        # En attendant, les positions publiées par cette instance arrivent quand même
+        await node_a.broadcast(8, {"type": "position", "lat": 5.3, "lng": -4.0})
+        await asyncio.sleep(1.2)
+        await node_b.broadcast(8, {"type": "position", "lat": 5.31, "lng": -4.0})
+        await asyncio.sleep(0.05)
+        subscribed = set(node_a._subscribed)
+        await node_a.close()
+        await node_b.close()
+        return subscribed
+
+    assert asyncio.run(scenario()) == {8}
+    assert [message["lat"] for message in watcher.sent] == [5.3, 5.31]
@@ -0,0 +1,156 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import DataError
+
+from app.services.tracking_ingest import TrackingIngestor, PositionUpdate, latest_by_courier
+
+START = datetime(2024, 1, 15, 8, 0, 0)
+
+
+def _position(courier_id: int, seconds: int, delivery_id: int = 1) -> PositionUpdate:
+    return PositionUpdate(delivery_id, courier_id, 5.3 + seconds / 1000, -4.0, START + timedelta(seconds=seconds))
+
+
+class FakeWriter:
+    def __init__(self, failures: int = 0):
+        self.batches = []
+        self.failures = failures
+
+    def __call__(self, batch):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("base indisponible")
+        self.batches.append(list(batch))
+
+
+class StrictWriter(FakeWriter):
+    """
+    Refuse tout le lot, comme PostgreSQL, dès qu'une latitude n'est pas numérique.
+    """
+
+    def __call__(self, batch):
+        if any(not isinstance(position.lat, float) for position in batch):
+            raise DataError("INSERT INTO tracking_points ...", {}, Exception("invalid input syntax for type double precision"))
+        super().__call__(batch)
+
+
+def test_latest_by_courier_keeps_most_recent_point():
+    latest = latest_by_courier([_position(1, 2), _position(2, 1), _position(1, 5), _position(1, 3)])
+    assert latest[1].timestamp == START + timedelta(seconds=5)
+    assert latest[2].timestamp == START + timedelta(seconds=1)
+
+
+def test_flush_writes_in_batches():
+    writer = FakeWriter()
+    ingestor = TrackingIngestor(batch_size=2, flush_interval=0.01, writer=writer)
+
+    async def scenario():
+        for second in range(5):
+            await ingestor.submit(_position(1, second))
+        return await ingestor.flush()
+
+    assert asyncio.run(scenario()) == 5
+    assert [len(batch) for batch in writer.batches] == [2, 2, 1]
+    assert ingestor.metrics()["pending"] == 0
+    assert ingestor.metrics()["batches"] == 3
+
+
+def test_failed_batch_is_kept_and_retried():
+    writer = FakeWriter(failures=1)
+    ingestor = TrackingIngestor(batch_size=10, flush_interval=0.01, writer=writer)
+
+    async def scenario():
+        await ingestor.submit(_position(1, 0))
+        await ingestor.submit(_position(1, 1))
+        first = await ingestor.flush()
+        second = await ingestor.flush()
+        return first, second
+
+    assert asyncio.run(scenario()) == (0, 2)
+    assert ingestor.stats["failed_batches"] == 1
+    assert [position.timestamp for position in writer.batches[0]] == [START, START + timedelta(seconds=1)]
+
+
+def test_full_buffer_applies_backpressure():
+    writer = FakeWriter()
+    ingestor = TrackingIngestor(batch_size=100, flush_interval=10, max_pending=3, writer=writer)
+
+    async def scenario():
+        ingestor.start()
+        for second in range(7):
+            await ingestor.submit(_position(1, second))
+        await ingestor.close()
+
+    asyncio.run(scenario())
+    assert ingestor.stats["backpressure_waits"] >= 2
+    assert ingestor.stats["max_pending"] <= 3
+    assert sum(len(batch) for batch in writer.batches) == 7
+
+
+def test_close_flushes_pending_positions():
+    writer = FakeWriter()
+    ingestor = TrackingIngestor(batch_size=100, flush_interval=10, writer=writer)
+
+    async def scenario():
+        ingestor.start()
+        for second in range(3):
+            await ingestor.submit(_position(second, second))
+        await ingestor.close()
+
+    asyncio.run(scenario())
+    assert sum(len(batch) for batch in writer.batches) == 3
+    assert not ingestor.metrics()["running"]
+
+
+def test_poison_point_is_dead_lettered_without_blocking_the_buffer():
+    writer = StrictWriter()
+    ingestor = TrackingIngestor(batch_size=5, flush_interval=0.01, max_pending=20, writer=writer)
+    poison = PositionUpdate(1, 1, "abc", -4.0, START)
+
+    async def scenario():
+        ingestor.start()
+        await ingestor.submit(poison)
+        for second in range(1, 40):
+            # Sans isolement du point fautif, le tampon plein bloquerait ici
+            await asyncio.wait_for(ingestor.submit(_position(1, second)), timeout=2)
+        await ingestor.close()
+
+    asyncio.run(scenario())
+    assert sum(len(batch) for batch in writer.batches) == 39
+    assert list(ingestor.dead_letters) == [poison]
+    assert ingestor.stats["dead_lettered"] == 1
+    assert ingestor.pending == 0
+
+
+def test_outage_during_split_keeps_unwritten_rows_in_order():
+    class Writer(StrictWriter):
+        outage = True
+
+        def __call__(self, batch):
+            # Base indisponible une fois, juste après le premier demi-lot écrit
+            if self.batches and self.outage:
+                self.outage = False
+                raise RuntimeError("base indisponible")
+            super().__call__(batch)
+
+    writer = Writer()
+    ingestor = TrackingIngestor(batch_size=4, flush_interval=0.01, writer=writer)
+    poison = PositionUpdate(1, 1, "abc", -4.0, START + timedelta(seconds=3))
+
+    async def scenario():
+        for second in range(3):
+            await ingestor.submit(_position(1, second))
+        await ingestor.submit(poison)
+        first = await ingestor.flush()
+        second = await ingestor.flush()
+        return first, second
+
+    assert asyncio.run(scenario()) == (2, 1)
+    assert [len(batch) for batch in writer.batches] == [2, 1]
+    assert list(ingestor.dead_letters) == [poison]
+    assert ingestor.stats["failed_batches"] == 1
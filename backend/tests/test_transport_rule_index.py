@@ -0,0 +1,88 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+from types import SimpleNamespace
+
+from app.services.transport_rule_index import RuleGroup, TransportRuleIndex, ALL_CATEGORIES
+
+
+def _random_rules(rng, count, category="general"):
+    def bounds(scale):
+        low = rng.choice([None, 0, rng.random() * scale])
+        high = rng.choice([None, (low or 0) + rng.random() * scale])
+        return low, high
+
+    rules = []
+    for i in range(count):
+        distance, weight, volume = bounds(50), bounds(200), bounds(5)
+        rules.append(SimpleNamespace(
+            id=i + 1, vehicle_id=rng.randint(1, 5), cargo_category=category,
+            priority=rng.randint(0, 3), price_multiplier=1.0 + rng.random(), is_active=rng.random() > 0.2,
+            min_distance=distance[0], max_distance=distance[1],
+            min_weight=weight[0], max_weight=weight[1],
+            min_volume=volume[0], max_volume=volume[1],
+        ))
+    return rules
+
+
+def _brute_force(rules, distance, weight, volume):
+    def inside(value, low, high):
+        if value is None:
+            return True
+        return (low is None or low <= value) and (high is None or value <= high)
+
+    matches = [
+        r for r in rules
+        if inside(distance, r.min_distance, r.max_distance)
+        and inside(weight, r.min_weight, r.max_weight)
+        and inside(volume, r.min_volume, r.max_volume)
+    ]
+    return [r.id for r in sorted(matches, key=lambda r: (-r.priority, r.id))]
+
+
+def test_rule_group_matches_like_a_sequential_scan():
+    rng = random.Random(5)
+    rules = _random_rules(rng, 80)
+    group = RuleGroup(rules)
+    for _ in range(500):
+        distance = rng.random() * 60
+        weight = rng.choice([None, rng.random() * 250])
+        volume = rng.choice([None, rng.random() * 6])
+        assert [r.id for r in group.match(distance, weight, volume)] == _brute_force(rules, distance, weight, volume)
+
+    # Bornes incluses
+    bounded = RuleGroup([SimpleNamespace(**{**vars(rules[0]), "min_distance": 5, "max_distance": 10, "is_active": True})])
+    assert len(bounded.match(5)) == len(bounded.match(10)) == 1
+    assert not bounded.match(10.01)
+
+
+def test_index_falls_back_to_all_rules_for_unknown_category():
+    rng = random.Random(9)
+    rules = _random_rules(rng, 10, "food") + [
+        SimpleNamespace(**{**vars(r), "id": r.id + 100}) for r in _random_rules(rng, 10, "fragile")
+    ]
+    vehicles = [SimpleNamespace(id=i, type="motorcycle", name=f"Moto {i}", status="active" if i % 2 else "inactive") for i in range(1, 6)]
+
+    index = TransportRuleIndex()
+    index.load(rules, vehicles)
+    active = [r for r in rules if r.is_active]
+
+    assert len(index.rules_for("food")) == len([r for r in active if r.cargo_category == "food"])
+    assert index.rules_for("documents") is index.groups[ALL_CATEGORIES]
+    assert len(index.rules_for("documents")) == len(active)
+    assert index.active_vehicle_ids == [1, 3, 5]
+    assert index.vehicles[2]["name"] == "Moto 2"
+
+
+def test_snapshot_is_unaffected_by_a_reload():
+    rng = random.Random(2)
+    vehicles = [SimpleNamespace(id=1, type="van", name="Van", status="active")]
+    index = TransportRuleIndex()
+    index.load(_random_rules(rng, 5), vehicles)
+    snapshot = index.snapshot
+
+    index.load([], vehicles)
+    assert len(snapshot.rules_for("general")) > 0
+    assert len(index.rules_for("general")) == 0
@@ -0,0 +1,60 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+from datetime import datetime, timedelta, timezone
+
+from app.services.transport_stats import split_period, usage_counters, COUNTERS
+
+
+def _parts_containing(instant, full_days, raw_ranges):
+    parts = 0
+    if full_days and full_days[0] <= instant.date() < full_days[1]:
+        parts += 1
+    for low, high, inclusive in raw_ranges:
+        if low <= instant and (instant <= high if inclusive else instant < high):
+            parts += 1
+    return parts
+
+
+def test_split_period_covers_the_range_exactly_once():
+    rng = random.Random(4)
+    origin = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for _ in range(200):
+        start = origin + timedelta(minutes=rng.randint(0, 60 * 24 * 10))
+        end = start + timedelta(minutes=rng.choice([0, 30, 60 * 24, rng.randint(0, 60 * 24 * 40)]))
+        full_days, raw_ranges = split_period(start, end)
+
+        # Au plus deux jours lus dans les utilisations, quelle que soit la période
+        assert len(raw_ranges) <= 2
+        assert sum((high - low for low, high, _ in raw_ranges), timedelta()) < timedelta(days=2)
+
+        for _ in range(30):
+            instant = start - timedelta(days=1) + timedelta(minutes=rng.randint(0, int((end - start).total_seconds() // 60) + 2 * 60 * 24))
+            expected = 1 if start <= instant <= end else 0
+            assert _parts_containing(instant, full_days, raw_ranges) == expected
+        assert _parts_containing(start, full_days, raw_ranges) == 1
+        assert _parts_containing(end, full_days, raw_ranges) == 1
+
+
+def test_split_period_reads_midnight_aligned_ranges_from_buckets():
+    full_days, raw_ranges = split_period(datetime(2024, 3, 1), datetime(2024, 4, 1))
+    assert full_days == (datetime(2024, 3, 1).date(), datetime(2024, 4, 1).date())
+    # Seul l'instant de fin, inclus, reste à lire dans les utilisations
+    assert raw_ranges == [(datetime(2024, 4, 1, tzinfo=timezone.utc), datetime(2024, 4, 1, tzinfo=timezone.utc), True)]
+
+
+def test_usage_counters_reproduce_sql_averages():
+    trips = [(12.0, 0.6, 1.4), (None, 0.2, None), (0.0, 0.1, 0.0), (5.0, None, 0.5)]
+    totals = {name: 0 for name in COUNTERS}
+    for trip in trips:
+        for name, value in usage_counters(*trip).items():
+            totals[name] += value
+
+    assert totals["usage_count"] == 4
+    # AVG(distance) ignore les distances inconnues
+    assert totals["total_distance"] / totals["distance_count"] == (12.0 + 0.0 + 5.0) / 3
+    # AVG(fuel / distance) sur les trajets de distance positive
+    assert totals["fuel_efficiency_sum"] / totals["fuel_efficiency_count"] == 0.6 / 12.0
+    assert totals["co2_per_km_sum"] / totals["co2_per_km_count"] == (1.4 / 12.0 + 0.5 / 5.0) / 2
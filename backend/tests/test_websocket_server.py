@@ -0,0 +1,105 @@
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+import time
+
+from websocket_server import ClientConnection, ConnectionManager, WebSocketMessage, coalesce_key
+
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.sent = []
+        self.received_at = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(text))
+        self.received_at.append(time.perf_counter())
+
+    async def close(self, code=1000):
+        self.closed = True
+
+
+def _position(room: str, index: int) -> WebSocketMessage:
+    return WebSocketMessage(type="tracking_update", room=room, payload={"index": index})
+
+
+def test_coalesce_key_only_for_positions():
+    assert coalesce_key(_position("delivery_1", 0)) == "tracking_update:delivery_1"
+    assert coalesce_key(WebSocketMessage(type="chat", room="delivery_1", payload={})) is None
+
+
+def test_pending_position_is_replaced_by_latest():
+    client = ClientConnection(FakeWebSocket(), max_queue=10)
+    client.enqueue("chat-1")
+    client.enqueue("pos-1", key="tracking_update:r")
+    client.enqueue("pos-2", key="tracking_update:r")
+    assert [text for _, text in client.queue] == ["chat-1", "pos-2"]
+    assert client.coalesced == 1
+
+
+def test_full_queue_drops_oldest_message():
+    client = ClientConnection(FakeWebSocket(), max_queue=2)
+    for index in range(4):
+        client.enqueue(f"chat-{index}")
+    assert [text for _, text in client.queue] == ["chat-2", "chat-3"]
+    assert client.dropped == 2
+
+
+def test_slow_clients_do_not_delay_the_room():
+    manager = ConnectionManager()
+    manager.listening = True  # Pas de Redis dans ce test
+    fast = [FakeWebSocket() for _ in range(495)]
+    slow = [FakeWebSocket(delay=0.5) for _ in range(5)]
+
+    async def scenario():
+        for index, websocket in enumerate(fast + slow):
+            await manager.connect(websocket, f"user-{index}", "delivery_1")
+        started = time.perf_counter()
+        broadcast_seconds = 0.0
+        for index in range(20):
+            sent_at = time.perf_counter()
+            await manager.broadcast(_position("delivery_1", index), "delivery_1")
+            broadcast_seconds = max(broadcast_seconds, time.perf_counter() - sent_at)
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        latest = max(websocket.received_at[-1] for websocket in fast) - started
+        stats = manager.stats()
+        for index, websocket in enumerate(fast + slow):
+            await manager.disconnect(websocket, f"user-{index}", "delivery_1")
+        return broadcast_seconds, latest, stats
+
+    broadcast_seconds, latest, stats = asyncio.run(scenario())
+    assert broadcast_seconds < 0.1
+    # Les clients rapides ont tout reçu avant que les lents aient fini leur deuxième envoi
+    assert latest < 0.8
+    assert all(websocket.sent[-1]["payload"] == {"index": 19} for websocket in fast)
+    assert all(len(websocket.sent) == 21 for websocket in fast)
+    # Les clients lents n'accumulent pas les positions intermédiaires
+    assert stats["coalesced"] > 0
+    assert stats["connections"] == 500
+
+
+def test_stalled_client_is_disconnected():
+    manager = ConnectionManager()
+    manager.listening = True
+    stalled = FakeWebSocket(delay=1.0)
+
+    async def scenario():
+        await manager.connect(stalled, "user-1", "delivery_2")
+        manager.clients[stalled].send_timeout = 0.05
+        await asyncio.sleep(0.2)
+
+    asyncio.run(scenario())
+    assert stalled.closed
+    assert "delivery_2" not in manager.active_connections
+    assert stalled not in manager.clients
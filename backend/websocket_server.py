@@ -12,8 +12,9 @@ import logging
 import os
 import signal
 import sys
+from collections import deque
 from datetime import datetime
-from typing import Dict, List, Optional, Set, Union
+from typing import Deque, Dict, List, Optional, Set, Tuple, Union
 
 import redis.asyncio as redis
 import uvicorn
@@ -50,6 +51,10 @@ app.add_middleware(
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 redis_pool = None
 
+# Files d'envoi par connexion : taille maximale et délai au-delà duquel un client est jugé trop lent
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "64"))
+SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "10"))
+
 
 # Modèles de données
 class WebSocketMessage(BaseModel):
@@ -69,17 +74,127 @@ class WebSocketMessage(BaseModel):
         }
 
 
+# Types de messages dont seul le dernier compte : un client en retard ne
+# reçoit que la position la plus récente au lieu de toutes les précédentes
+COALESCED_TYPES = {"tracking_update", "position"}
+
+
+def coalesce_key(message: WebSocketMessage) -> Optional[str]:
+    """Clé de fusion d'un message en attente d'envoi, ou None s'il ne doit pas être fusionné."""
+    if message.type not in COALESCED_TYPES:
+        return None
+    return f"{message.type}:{message.room or message.payload.get('delivery_id')}"
+
+
+class ClientConnection:
+    """
+    Connexion WebSocket avec sa file d'envoi bornée et sa tâche d'écriture.
+
+    Les messages sont mis en file sans attendre le client : un client lent ne
+    ralentit ni la diffusion ni les autres membres de la salle. Un message
+    fusionnable remplace le précédent de même clé encore en attente ; quand la
+    file est pleine, le plus ancien message est abandonné. Un envoi qui dépasse
+    `send_timeout` ferme la connexion.
+    """
+
+    def __init__(self, websocket: WebSocket, max_queue: int = SEND_QUEUE_SIZE, send_timeout: float = SEND_TIMEOUT_SECONDS):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        # Entrées [clé, texte] : la fusion remplace le texte sur place
+        self.queue: Deque[List[Optional[str]]] = deque()
+        self.pending_keys: Dict[str, List[Optional[str]]] = {}
+        self.ready = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.writer: Optional[asyncio.Task] = None
+        self.on_close = None
+
+    def start(self, on_close=None):
+        self.on_close = on_close
+        self.writer = asyncio.create_task(self._write_loop())
+
+    def enqueue(self, text: str, key: Optional[str] = None) -> bool:
+        """Mettre un message en file d'envoi, sans attendre. Retourne False si la connexion est fermée."""
+        if self.closed:
+            return False
+        if key is not None and key in self.pending_keys:
+            self.pending_keys[key][1] = text
+            self.coalesced += 1
+            return True
+        if len(self.queue) >= self.max_queue:
+            oldest_key, _ = oldest = self.queue.popleft()
+            if oldest_key is not None and self.pending_keys.get(oldest_key) is oldest:
+                del self.pending_keys[oldest_key]
+            self.dropped += 1
+        entry = [key, text]
+        self.queue.append(entry)
+        if key is not None:
+            self.pending_keys[key] = entry
+        self.ready.set()
+        return True
+
+    async def _write_loop(self):
+        try:
+            while not self.closed:
+                await self.ready.wait()
+                self.ready.clear()
+                while self.queue and not self.closed:
+                    key, text = entry = self.queue.popleft()
+                    if key is not None and self.pending_keys.get(key) is entry:
+                        del self.pending_keys[key]
+                    await asyncio.wait_for(self.websocket.send_text(text), timeout=self.send_timeout)
+                    self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning("Client trop lent, connexion fermée")
+            await self._abort()
+        except Exception as e:
+            logger.error(f"Erreur lors de l'envoi du message: {str(e)}")
+            await self._abort()
+
+    async def _abort(self):
+        self.closed = True
+        try:
+            await self.websocket.close(code=1013)
+        except Exception:
+            pass
+        if self.on_close:
+            await self.on_close(self)
+
+    async def close(self):
+        self.closed = True
+        if self.writer and not self.writer.done() and self.writer is not asyncio.current_task():
+            self.writer.cancel()
+            try:
+                await self.writer
+            except asyncio.CancelledError:
+                pass
+
+
 # Gestionnaire de connexions WebSocket
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, List[WebSocket]] = {}
         self.user_connections: Dict[str, Set[WebSocket]] = {}
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.client_rooms: Dict[WebSocket, Tuple[str, Optional[str]]] = {}
         self.redis_subscriber = None
         self.listening = False
+        self.listener_task: Optional[asyncio.Task] = None
 
     async def connect(self, websocket: WebSocket, user_id: str, room: Optional[str] = None):
         await websocket.accept()
         
+        # File d'envoi et tâche d'écriture propres à la connexion
+        client = ClientConnection(websocket)
+        self.clients[websocket] = client
+        self.client_rooms[websocket] = (user_id, room)
+        client.start(on_close=self._on_client_closed)
+        
         # Ajouter à la liste des connexions par utilisateur
         if user_id not in self.user_connections:
             self.user_connections[user_id] = set()
@@ -109,6 +224,12 @@ class ConnectionManager:
             await self.start_redis_listener()
 
     async def disconnect(self, websocket: WebSocket, user_id: str, room: Optional[str] = None):
+        # Arrêter la tâche d'écriture
+        client = self.clients.pop(websocket, None)
+        self.client_rooms.pop(websocket, None)
+        if client:
+            await client.close()
+        
         # Supprimer des connexions par utilisateur
         if user_id in self.user_connections:
             self.user_connections[user_id].discard(websocket)
@@ -124,29 +245,50 @@ class ConnectionManager:
         
         logger.info(f"Client déconnecté: user_id={user_id}, room={room}")
 
+    async def _on_client_closed(self, client: ClientConnection):
+        """Retirer une connexion fermée pour lenteur ou erreur d'envoi."""
+        if client.websocket in self.client_rooms:
+            user_id, room = self.client_rooms[client.websocket]
+            await self.disconnect(client.websocket, user_id, room)
+
+    def _enqueue(self, message: WebSocketMessage, connections) -> int:
+        # Sérialiser une seule fois pour toute la diffusion
+        text = message.json()
+        key = coalesce_key(message)
+        queued = 0
+        for connection in list(connections):
+            client = self.clients.get(connection)
+            if client and client.enqueue(text, key):
+                queued += 1
+        return queued
+
     async def broadcast(self, message: WebSocketMessage, room: Optional[str] = None):
         """Diffuse un message à tous les clients d'une salle spécifique ou à tous les clients."""
         if room and room in self.active_connections:
-            for connection in self.active_connections[room]:
-                await self.send_personal_message(message, connection)
+            self._enqueue(message, self.active_connections[room])
         elif not room:
             # Diffuser à tous les clients
-            for room_connections in self.active_connections.values():
-                for connection in room_connections:
-                    await self.send_personal_message(message, connection)
+            self._enqueue(message, list(self.clients))
 
     async def send_personal_message(self, message: WebSocketMessage, websocket: WebSocket):
         """Envoie un message à un client spécifique."""
-        try:
-            await websocket.send_text(message.json())
-        except Exception as e:
-            logger.error(f"Erreur lors de l'envoi du message: {str(e)}")
+        self._enqueue(message, [websocket])
 
     async def send_to_user(self, message: WebSocketMessage, user_id: str):
         """Envoie un message à tous les appareils d'un utilisateur spécifique."""
         if user_id in self.user_connections:
-            for connection in self.user_connections[user_id]:
-                await self.send_personal_message(message, connection)
+            self._enqueue(message, self.user_connections[user_id])
+
+    def stats(self) -> Dict[str, int]:
+        """Indicateurs des files d'envoi."""
+        clients = list(self.clients.values())
+        return {
+            "connections": len(clients),
+            "queued": sum(len(client.queue) for client in clients),
+            "sent": sum(client.sent for client in clients),
+            "dropped": sum(client.dropped for client in clients),
+            "coalesced": sum(client.coalesced for client in clients),
+        }
 
     async def start_redis_listener(self):
         """Démarre l'écoute des messages Redis."""
@@ -154,40 +296,55 @@ class ConnectionManager:
             return
         
         self.listening = True
-        self.redis_subscriber = await redis_pool.subscribe("notifications", "tracking", "chat")
-        
-        # Démarrer la tâche d'écoute
-        asyncio.create_task(self.redis_listener())
+        self.listener_task = asyncio.create_task(self.redis_listener())
         logger.info("Écoute Redis démarrée")
 
+    async def dispatch(self, data: Union[str, bytes]):
+        """Transmet un message Redis aux clients WebSocket concernés."""
+        ws_message = WebSocketMessage(**json.loads(data))
+        
+        # Diffuser selon le type de message
+        if ws_message.room:
+            await self.broadcast(ws_message, ws_message.room)
+        elif ws_message.payload.get("recipient_id"):
+            await self.send_to_user(ws_message, ws_message.payload["recipient_id"])
+        else:
+            await self.broadcast(ws_message)
+
     async def redis_listener(self):
-        """Écoute les messages Redis et les transmet aux clients WebSocket."""
-        try:
-            while True:
-                message = await self.redis_subscriber.get_message(ignore_subscribe_messages=True)
-                if message:
+        """
+        Écoute les messages Redis et les transmet aux clients WebSocket.
+        La lecture attend les messages sur la connexion Redis, sans boucle
+        d'interrogation ; après une coupure, l'abonnement est rétabli.
+        """
+        delay = 1
+        while True:
+            try:
+                self.redis_subscriber = redis.Redis(connection_pool=redis_pool).pubsub(ignore_subscribe_messages=True)
+                await self.redis_subscriber.subscribe("notifications", "tracking", "chat")
+                delay = 1
+                async for message in self.redis_subscriber.listen():
+                    if message.get("type") != "message":
+                        continue
                     try:
-                        data = json.loads(message["data"])
-                        ws_message = WebSocketMessage(**data)
-                        
-                        # Diffuser selon le type de message
-                        if ws_message.room:
-                            await self.broadcast(ws_message, ws_message.room)
-                        elif ws_message.payload.get("recipient_id"):
-                            await self.send_to_user(ws_message, ws_message.payload["recipient_id"])
-                        else:
-                            await self.broadcast(ws_message)
+                        await self.dispatch(message["data"])
                     except Exception as e:
                         logger.error(f"Erreur lors du traitement du message Redis: {str(e)}")
-                
-                await asyncio.sleep(0.01)
-        except asyncio.CancelledError:
-            logger.info("Tâche d'écoute Redis annulée")
-        except Exception as e:
-            logger.error(f"Erreur dans l'écouteur Redis: {str(e)}")
-            # Redémarrer l'écouteur après une courte pause
-            await asyncio.sleep(5)
-            asyncio.create_task(self.redis_listener())
+            except asyncio.CancelledError:
+                logger.info("Tâche d'écoute Redis annulée")
+                raise
+            except Exception as e:
+                logger.error(f"Erreur dans l'écouteur Redis: {str(e)}")
+                # Reprendre l'écoute après une pause croissante
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                if self.redis_subscriber is not None:
+                    try:
+                        await self.redis_subscriber.close()
+                    except Exception:
+                        pass
+                    self.redis_subscriber = None
 
 
 # Instance du gestionnaire de connexions
@@ -213,13 +370,17 @@ async def shutdown_event(sig=None):
         logger.info(f"Signal reçu: {sig.name}")
     logger.info("Arrêt du serveur WebSocket")
     
+    # Arrêter l'écoute Redis
+    if manager.listener_task:
+        manager.listener_task.cancel()
+    
     # Fermer toutes les connexions WebSocket
-    for room_connections in manager.active_connections.values():
-        for connection in room_connections:
-            try:
-                await connection.close()
-            except:
-                pass
+    for connection, client in list(manager.clients.items()):
+        await client.close()
+        try:
+            await connection.close()
+        except:
+            pass
     
     # Fermer la connexion Redis
     if redis_pool:
@@ -302,7 +463,7 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str, room: Optional[
 @app.get("/health")
 async def health_check():
     """Vérification de santé du serveur WebSocket."""
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat(), **manager.stats()}
 
 
 @app.post("/send-notification/{user_id}")